@@ -5,6 +5,7 @@ A tool for financial analysis of energy projects with a focus on solar power.
 
 import os
 from flask import Flask, render_template
+from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase
 
@@ -14,6 +15,9 @@ class Base(DeclarativeBase):
 
 db = SQLAlchemy(model_class=Base)
 
+# Schema migrations: brings databases created by an earlier version up to date
+migrate = Migrate()
+
 # Create the app
 def create_app():
     app = Flask(__name__)
@@ -29,44 +33,14 @@ def create_app():
 
     # Initialize extensions
     db.init_app(app)
+    migrate.init_app(app, db)
 
-    # Create all tables
+    # Create missing tables; columns added to existing tables come from the
+    # migrations in migrations/versions (flask --app app db upgrade)
     with app.app_context():
         db.create_all()
 
-    # Main Pages
-    @app.route("/")
-    def home():
-        return render_template("index.html")
-
-    @app.route("/upload")
-    def upload():
-        return render_template("upload.html")
-
-    @app.route("/analysis")
-    def analysis():
-        return render_template("analysis.html")
-
-    @app.route("/visualization")
-    def visualization():
-        return render_template("visualization.html")
-
-    # Project Pages
-    @app.route("/projects/import")
-    def import_project():
-        return render_template("projects/import.html")
-
-    @app.route("/projects/list")
-    def list_projects():
-        return render_template("projects/list.html")
-
-    @app.route("/projects/new")
-    def new_project():
-        return render_template("projects/new.html")
-
-    @app.route("/projects/view")
-    def view_project():
-        return render_template("projects/view.html")
+    # Page and API routes are registered on the application by main.py
 
     # Error Handlers
     @app.errorhandler(404)
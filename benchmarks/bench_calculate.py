@@ -0,0 +1,85 @@
+"""
+Latency benchmark for the /api/calculate metrics path.
+
+Times requests through the Flask test client (request parsing, vectorized
+scenario evaluation and the streamed JSON response) for a single scenario and
+for a 10k-scenario batch, and checks p50/p99 against the latency targets.
+
+Usage: python benchmarks/bench_calculate.py [--repeats N]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Inline scenarios never touch the database
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from main import app
+
+# Latency targets in milliseconds on one worker core: (p50, p99)
+LATENCY_TARGETS_MS = {
+    'single': (2.0, 5.0),
+    'batch_10k': (300.0, 500.0),
+}
+
+
+def make_scenarios(n, seed=0):
+    """Random scenarios with inline project inputs"""
+    rng = np.random.default_rng(seed)
+    return [
+        {
+            'capex': float(rng.uniform(4e6, 8e6)),
+            'opex': float(rng.uniform(5e4, 1e5)),
+            'energy_mwh': float(rng.uniform(6000, 9000)),
+            'lifetime_years': int(rng.integers(25, 41)),
+            'degradation_rate': 0.5,
+            'discount_rate': float(rng.uniform(0.05, 0.1)),
+            'ppa_price': float(rng.uniform(40, 90)),
+            'ppa_escalation': 0.02,
+            'ppa_term': 20,
+        }
+        for _ in range(n)
+    ]
+
+
+def time_request(client, body):
+    """POST one request and read the whole response, returning elapsed milliseconds"""
+    start = time.perf_counter()
+    response = client.post('/api/calculate', data=body, content_type='application/json')
+    response.get_data()
+    elapsed = (time.perf_counter() - start) * 1000
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return elapsed
+
+
+def run(name, scenarios, repeats):
+    client = app.test_client()
+    body = json.dumps(scenarios[0] if len(scenarios) == 1 else scenarios)
+    time_request(client, body)  # warm-up
+    timings = np.array([time_request(client, body) for _ in range(repeats)])
+    p50, p99 = np.percentile(timings, [50, 99])
+    target_p50, target_p99 = LATENCY_TARGETS_MS[name]
+    status = 'OK' if p50 <= target_p50 and p99 <= target_p99 else 'MISSED'
+    print(f"{name:<10} n={len(scenarios):<6} p50={p50:8.2f} ms  p99={p99:8.2f} ms  "
+          f"(target p50<={target_p50} p99<={target_p99}) {status}")
+    return status == 'OK'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeats', type=int, default=200)
+    args = parser.parse_args()
+
+    ok = run('single', make_scenarios(1), args.repeats)
+    ok &= run('batch_10k', make_scenarios(10000), max(args.repeats // 10, 5))
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""
+Throughput benchmark for cash-flow schedule persistence.
+
+Writes and reads back a batch of project schedules as CashFlow rows, as
+packed CashFlowSchedule blobs and, when pyarrow is installed, as Parquet,
+against a throwaway SQLite database (or DATABASE_URL if set).
+
+Usage: python benchmarks/bench_cash_flows.py [--projects N]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORKDIR = tempfile.mkdtemp(prefix='bench_cash_flows_')
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(WORKDIR, 'bench.db')}")
+
+import finance
+from app import app, db
+from cashflows import (load_packed_schedules, read_parquet, replace_cash_flows, save_packed_schedules,
+                       write_parquet)
+from models import CashFlow
+
+
+def make_schedule(n, seed=0):
+    """Batch schedule for n random projects"""
+    rng = np.random.default_rng(seed)
+    return finance.cash_flow_schedule(
+        capex=rng.uniform(4e6, 8e6, n),
+        opex=rng.uniform(5e4, 1e5, n),
+        energy_mwh=rng.uniform(6000, 9000, n),
+        lifetime_years=rng.integers(25, 41, n),
+    )
+
+
+def timed(label, n, func):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<14} {elapsed * 1000:9.1f} ms  {n / elapsed:12,.0f} schedules/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--projects', type=int, default=10000)
+    args = parser.parse_args()
+
+    n = args.projects
+    project_ids = np.arange(1, n + 1)
+    schedule = make_schedule(n)
+
+    with app.app_context():
+        db.create_all()
+
+        def write_rows():
+            replace_cash_flows(project_ids, schedule)
+            db.session.commit()
+
+        def read_rows():
+            rows = (db.session.query(CashFlow.project_id, CashFlow.year, CashFlow.net_cash_flow)
+                    .filter(CashFlow.project_id.in_(project_ids.tolist())).all())
+            finance.cash_flow_matrix(*(np.asarray(column) for column in zip(*rows)))
+
+        def write_packed():
+            save_packed_schedules(project_ids, schedule)
+            db.session.commit()
+
+        timed('rows write', n, write_rows)
+        timed('rows read', n, read_rows)
+        timed('packed write', n, write_packed)
+        timed('packed read', n, lambda: load_packed_schedules(project_ids.tolist()))
+
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        print("parquet        skipped (pyarrow not installed)")
+        return 0
+    path = os.path.join(WORKDIR, 'schedules.parquet')
+    timed('parquet write', n, lambda: write_parquet(path, project_ids, schedule))
+    timed('parquet read', n, lambda: read_parquet(path))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""
+Throughput benchmark for streamed exports.
+
+Stores a batch of project schedules as CashFlow rows (about a million rows
+at the default size) and as packed CashFlowSchedule blobs, then drains the
+export generators the export routes stream, in every available format,
+against a throwaway SQLite database (or DATABASE_URL if set). Reports rows/s,
+MB/s and the time to the first chunk.
+
+Usage: python benchmarks/bench_exports.py [--projects N]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORKDIR = tempfile.mkdtemp(prefix='bench_exports_')
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(WORKDIR, 'bench.db')}")
+
+import finance
+from app import app, db
+from cashflows import replace_cash_flows, save_packed_schedules
+from exports import CASH_FLOW_EXPORT_COLUMNS, cash_flow_batches, check_format, stream_export
+
+
+def make_schedule(n, seed=0):
+    """Batch schedule for n random projects"""
+    rng = np.random.default_rng(seed)
+    return finance.cash_flow_schedule(
+        capex=rng.uniform(4e6, 8e6, n),
+        opex=rng.uniform(5e4, 1e5, n),
+        energy_mwh=rng.uniform(6000, 9000, n),
+        lifetime_years=rng.integers(25, 41, n),
+    )
+
+
+def drain(label, rows, chunks):
+    """Consume an export stream as a response would, and report its throughput"""
+    start = time.perf_counter()
+    first = None
+    size = 0
+    for chunk in chunks:
+        if first is None:
+            first = time.perf_counter() - start
+        size += len(chunk)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<16} {elapsed * 1000:9.1f} ms  {rows / elapsed:12,.0f} rows/s  "
+          f"{size / elapsed / 1e6:7.1f} MB/s  first chunk {first * 1000:7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--projects', type=int, default=30000)
+    args = parser.parse_args()
+
+    n = args.projects
+    project_ids = np.arange(1, n + 1)
+    schedule = make_schedule(n)
+
+    with app.app_context():
+        db.create_all()
+        replace_cash_flows(project_ids, schedule)
+        save_packed_schedules(project_ids, schedule)
+        db.session.commit()
+        rows = int((schedule['lifetime_years'] + 1).sum())
+        print(f"{n:,} projects, {rows:,} cash-flow rows")
+
+        for export_format in ('csv', 'json', 'netcdf', 'parquet'):
+            try:
+                check_format(export_format)
+            except ValueError as e:
+                print(f"{export_format:<16} skipped ({e})")
+                continue
+            for storage in ('rows', 'packed'):
+                drain(f"{export_format} {storage}", rows,
+                      stream_export(export_format, CASH_FLOW_EXPORT_COLUMNS,
+                                    cash_flow_batches(storage=storage)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
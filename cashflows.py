@@ -0,0 +1,175 @@
+"""
+Cash-flow persistence for the Energy Finance application.
+Batch schedules from finance.cash_flow_schedule are written in bulk: as
+CashFlow rows with one DELETE and one COPY or executemany per batch, as one
+packed float64 blob per project and scenario, or as a Parquet file.
+"""
+
+import csv
+import io
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import delete, insert
+
+from app import db
+from finance import CASH_FLOW_COLUMNS
+from models import CashFlow, CashFlowSchedule
+
+
+# Scenario name used when schedules are stored without one
+DEFAULT_SCENARIO = 'base'
+
+# Storage modes accepted by store_cash_flows
+CASH_FLOW_STORAGE = ('rows', 'packed')
+
+
+def _batch_schedule(project_ids, schedule):
+    """Project ids and (projects x years) views of every schedule column."""
+    project_ids = np.asarray(list(project_ids))
+    shape = (project_ids.size, schedule['year'].shape[-1])
+    columns = {name: np.broadcast_to(schedule[name], shape) for name in CASH_FLOW_COLUMNS}
+    lifetimes = np.broadcast_to(schedule['lifetime_years'], project_ids.shape).astype(int)
+    return project_ids, columns, lifetimes
+
+
+def long_format(project_ids, schedule):
+    """
+    Flatten a batch schedule to one entry per project-year, dropping the
+    zero padding past each project's lifetime.
+
+    Parameters:
+    - project_ids: Project id of each schedule row
+    - schedule: Batch schedule from finance.cash_flow_schedule
+
+    Returns: dict of equal-length arrays keyed by 'project_id', 'year' and the
+    CASH_FLOW_COLUMNS names
+    """
+    project_ids, columns, lifetimes = _batch_schedule(project_ids, schedule)
+    year = np.arange(schedule['year'].shape[-1])
+    rows, years = np.nonzero(year <= lifetimes[:, np.newaxis])
+    flat = {'project_id': project_ids[rows], 'year': years}
+    flat.update({name: values[rows, years] for name, values in columns.items()})
+    return flat
+
+
+def copy_rows(table, names, rows):
+    """
+    Bulk-load tuples into a table on the session's connection.
+
+    PostgreSQL gets a COPY FROM STDIN of a CSV buffer; other databases a
+    single DB-API executemany, bypassing per-row parameter processing.
+    """
+    connection = db.session.connection()
+    if connection.dialect.name == 'postgresql':
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        with connection.connection.cursor() as cursor:
+            cursor.copy_expert(f"COPY {table.name} ({', '.join(names)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    else:
+        marker = '?' if connection.dialect.paramstyle == 'qmark' else '%s'
+        connection.exec_driver_sql(
+            f"INSERT INTO {table.name} ({', '.join(names)}) VALUES ({', '.join([marker] * len(names))})",
+            rows)
+
+
+def replace_cash_flows(project_ids, schedule):
+    """
+    Replace the stored CashFlow rows of a batch of projects.
+
+    Existing rows go in one DELETE and the new rows in one bulk load.
+    Cumulative cash flows come precomputed from the schedule. The caller commits.
+    """
+    flat = long_format(project_ids, schedule)
+    names = list(flat) + ['created_at', 'updated_at']
+    now = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S.%f')
+    rows = [values + (now, now) for values in zip(*(flat[name].tolist() for name in flat))]
+    db.session.execute(delete(CashFlow).where(CashFlow.project_id.in_(np.unique(flat['project_id']).tolist())))
+    if rows:
+        copy_rows(CashFlow.__table__, names, rows)
+
+
+def save_packed_schedules(project_ids, schedule, scenario=DEFAULT_SCENARIO):
+    """
+    Store each project's schedule as a single packed row.
+
+    The blob holds the CASH_FLOW_COLUMNS as a C-ordered float64 array of
+    shape (columns x years), trimmed to the project's lifetime. The caller commits.
+    """
+    project_ids, columns, lifetimes = _batch_schedule(project_ids, schedule)
+    packed = np.stack([columns[name] for name in CASH_FLOW_COLUMNS], axis=1)
+    now = datetime.utcnow()
+    records = [{
+        'project_id': int(project_id),
+        'scenario': scenario,
+        'columns': ','.join(CASH_FLOW_COLUMNS),
+        'n_years': int(lifetime) + 1,
+        'data': np.ascontiguousarray(packed[index, :, :lifetime + 1]).tobytes(),
+        'created_at': now,
+    } for index, (project_id, lifetime) in enumerate(zip(project_ids.tolist(), lifetimes))]
+    db.session.execute(delete(CashFlowSchedule).where(
+        CashFlowSchedule.project_id.in_(project_ids.tolist()), CashFlowSchedule.scenario == scenario))
+    if records:
+        db.session.execute(insert(CashFlowSchedule.__table__), records)
+
+
+def load_packed_schedules(project_ids, scenario=DEFAULT_SCENARIO):
+    """
+    Read packed schedules without copying the stored arrays.
+
+    Returns: dict mapping project id to a dict of column arrays plus 'year'
+    """
+    rows = (db.session.query(CashFlowSchedule.project_id, CashFlowSchedule.columns,
+                             CashFlowSchedule.n_years, CashFlowSchedule.data)
+            .filter(CashFlowSchedule.project_id.in_(list(project_ids)),
+                    CashFlowSchedule.scenario == scenario))
+    schedules = {}
+    for project_id, names, n_years, data in rows:
+        names = names.split(',')
+        values = np.frombuffer(data, dtype=np.float64).reshape(len(names), n_years)
+        schedules[project_id] = {'year': np.arange(n_years), **dict(zip(names, values))}
+    return schedules
+
+
+def store_cash_flows(project_ids, schedule, storage='rows', scenario=DEFAULT_SCENARIO):
+    """
+    Persist a batch schedule in one of the CASH_FLOW_STORAGE modes.
+
+    Raises: ValueError for an unknown storage mode
+    """
+    if storage == 'rows':
+        replace_cash_flows(project_ids, schedule)
+    elif storage == 'packed':
+        save_packed_schedules(project_ids, schedule, scenario)
+    else:
+        raise ValueError(f"Unknown cash-flow storage: {storage}")
+
+
+def write_parquet(path, project_ids, schedule, scenario=DEFAULT_SCENARIO):
+    """
+    Write a batch schedule to a Parquet file in long format, one row per
+    project-year. Requires pyarrow.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    flat = long_format(project_ids, schedule)
+    table = pa.table({'scenario': pa.array([scenario] * flat['year'].size, pa.string()), **flat})
+    pq.write_table(table, path)
+
+
+def read_parquet(path, project_ids=None, columns=None):
+    """
+    Read schedules written by write_parquet, optionally only some projects
+    and columns. Requires pyarrow.
+
+    Returns: dict of arrays keyed by column name
+    """
+    import pyarrow.parquet as pq
+
+    if columns is not None:
+        columns = ['project_id', 'year'] + [name for name in columns if name not in ('project_id', 'year')]
+    filters = [('project_id', 'in', list(project_ids))] if project_ids is not None else None
+    table = pq.read_table(path, columns=columns, filters=filters)
+    return {name: table.column(name).to_numpy() for name in table.column_names}
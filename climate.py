@@ -0,0 +1,547 @@
+"""
+Climate analyses of gridded datasets for the Energy Finance application.
+Every analysis is a streaming reduction over the time chunks of one NetCDF
+variable: per-cell sums, counts, extremes and run lengths are updated chunk
+by chunk, so memory is bounded by the grid rather than by the length of the
+record. Results are written to .npz files, and an identical request is
+answered from the stored result instead of being computed again.
+"""
+
+import json
+import math
+import os
+from datetime import datetime
+
+import numpy as np
+
+import datasets
+import pyramid
+from app import db
+from models import ClimateAnalysis, Dataset
+
+
+# Directory analysis results are written to
+ANALYSIS_DIR = os.environ.get('ANALYSIS_DIR', 'analyses')
+
+ANALYSIS_TYPES = (
+    {'id': 'temperature_mean', 'name': 'Temperature Mean',
+     'description': 'Mean of the variable over all time steps at every grid cell.'},
+    {'id': 'temperature_anomaly', 'name': 'Temperature Anomaly',
+     'description': 'Annual mean departure from the monthly climatology of a baseline period.'},
+    {'id': 'precipitation_total', 'name': 'Precipitation Total',
+     'description': 'Precipitation accumulated over the record at every grid cell, and its mean annual total.'},
+    {'id': 'climate_indices', 'name': 'Climate Indices',
+     'description': 'ETCCDI temperature indices from daily minima, maxima and means, averaged over the years '
+                    'of the record.'},
+    {'id': 'seasonal_cycle', 'name': 'Seasonal Cycle',
+     'description': 'Mean of the variable in each calendar month at every grid cell.'},
+)
+ANALYSIS_NAMES = tuple(analysis['id'] for analysis in ANALYSIS_TYPES)
+
+# ETCCDI indices: daily statistic they are computed from, units and description
+CLIMATE_INDICES = {
+    'FD': ('min', 'days', 'Frost days: days per year with a daily minimum temperature below 0°C'),
+    'SU': ('max', 'days', 'Summer days: days per year with a daily maximum temperature above 25°C'),
+    'ID': ('max', 'days', 'Ice days: days per year with a daily maximum temperature below 0°C'),
+    'GSL': ('mean', 'days', 'Growing season length: days per year from the first 6-day span with a daily mean '
+                            'above 5°C to the first 6-day span after July 1 with a daily mean below 5°C '
+                            '(Northern Hemisphere definition)'),
+    'TXx': ('max', 'degC', 'Warmest day: annual maximum of the daily maximum temperature'),
+    'TNn': ('min', 'degC', 'Coldest night: annual minimum of the daily minimum temperature'),
+}
+
+# Day-count indices: comparison of the daily statistic with a threshold (°C)
+COUNT_INDICES = {'FD': (np.less, 0.0), 'SU': (np.greater, 25.0), 'ID': (np.less, 0.0)}
+
+# Growing season threshold (°C) and span (days)
+GSL_THRESHOLD = 5.0
+GSL_SPAN = 6
+
+DEFAULT_BASELINE = ('1961-01-01', '1990-12-31')
+
+MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+KELVIN_UNITS = ('K', 'kelvin', 'Kelvin', 'degK', 'deg_K', 'degrees_K')
+ZERO_CELSIUS = 273.15
+
+# Precipitation rates in mm (kg m-2) per unit time, accumulated by multiplying
+# with the time step: factor per second
+PRECIPITATION_RATES = {'kg m-2 s-1': 1.0, 'kg m**-2 s**-1': 1.0, 'kg/m2/s': 1.0, 'mm s-1': 1.0, 'mm/s': 1.0,
+                       'mm h-1': 1 / 3600, 'mm/h': 1 / 3600, 'mm day-1': 1 / 86400, 'mm/day': 1 / 86400,
+                       'mm d-1': 1 / 86400}
+# Precipitation accumulated over each time step: factor to mm
+PRECIPITATION_DEPTHS = {'mm': 1.0, 'kg m-2': 1.0, 'kg m**-2': 1.0, 'm': 1000.0}
+
+SECONDS_PER_YEAR = 365.25 * 86400
+
+# Results with a time or month axis, stored (steps, lat, lon) and returned (lat, lon, steps)
+STACKED_RESULTS = ('anomaly', 'monthly_means')
+
+# Default grid size of a returned result, and the most values it may hold
+DEFAULT_RESULT_WIDTH = 360
+DEFAULT_RESULT_HEIGHT = 180
+MAX_RESULT_VALUES = 1_000_000
+
+
+def _groups(keys):
+    """(key, slice) pairs of the runs of equal consecutive keys."""
+    breaks = np.flatnonzero(np.diff(keys)) + 1
+    starts, stops = np.append(0, breaks), np.append(breaks, keys.size)
+    return [(keys[start], slice(int(start), int(stop))) for start, stop in zip(starts, stops)]
+
+
+def _chunks(selection, progress=None, done=0, total=None):
+    """
+    Stream a selection as (time index, block) pairs, the index counted from
+    the start of the file's time axis, reporting (steps done, total steps).
+    """
+    first = selection['time_index'].start
+    for offset, block in datasets.iter_chunks(selection):
+        yield first + offset, block
+        if progress is not None:
+            progress(done + offset + block.shape[0], total or selection['shape'][0])
+
+
+def _accumulate(total, count, values):
+    """Add the non-NaN values of a (steps, lat, lon) block to per-cell sums and counts."""
+    valid = ~np.isnan(values)
+    total += np.where(valid, values, np.float32(0)).sum(axis=0, dtype=np.float64)
+    count += valid.sum(axis=0)
+
+
+def _divide(total, count):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(count > 0, total / np.maximum(count, 1), np.nan).astype(np.float32)
+
+
+def _kelvin_offset(units):
+    """Offset converting a temperature variable to °C: ZERO_CELSIUS for kelvin, else 0."""
+    return ZERO_CELSIUS if (units or '').strip() in KELVIN_UNITS else 0.0
+
+
+def temperature_mean(selection, units, progress=None):
+    """
+    Mean over time at every cell, in °C for temperatures stored in kelvin.
+
+    Returns: (arrays, metadata) with the 'mean_temperature' grid
+    """
+    grid = selection['shape'][1:]
+    total, count = np.zeros(grid), np.zeros(grid, dtype=np.int64)
+    for _, block in _chunks(selection, progress):
+        _accumulate(total, count, block)
+    offset = _kelvin_offset(units)
+    return {'mean_temperature': _divide(total, count) - np.float32(offset)}, {'units': 'degC' if offset else units}
+
+
+def _monthly_sums(selection, calendar, progress=None, done=0, total_steps=None):
+    """Per-cell sums and counts of each calendar month, shape (12, lat, lon)."""
+    shape = (12,) + selection['shape'][1:]
+    total, count = np.zeros(shape), np.zeros(shape, dtype=np.int64)
+    for start, block in _chunks(selection, progress, done, total_steps):
+        for month, run in _groups(calendar['month'][start:start + block.shape[0]]):
+            _accumulate(total[month - 1], count[month - 1], block[run])
+    return total, count
+
+
+def seasonal_cycle(selection, calendar, units, progress=None):
+    """
+    Mean of each calendar month at every cell.
+
+    Returns: (arrays, metadata) with the 'monthly_means' grids, shape (12, lat, lon)
+    """
+    total, count = _monthly_sums(selection, calendar, progress)
+    return {'monthly_means': _divide(total, count)}, {'units': units, 'months': list(MONTHS)}
+
+
+def temperature_anomaly(selection, baseline, calendar, units, progress=None):
+    """
+    Annual mean anomalies against the monthly climatology of a baseline period.
+
+    The first pass averages each calendar month over the baseline; the
+    second subtracts the climatology of each step's month and averages the
+    anomalies per calendar year.
+
+    Parameters:
+    - selection: Selection of the analysed period, from datasets.select
+    - baseline: Selection of the baseline period, on the same grid
+    - calendar: Calendar fields of the dataset, from datasets.calendar_fields
+
+    Returns: (arrays, metadata) with the 'anomaly' grids, shape (years, lat, lon),
+    the years as 'times' and the 'baseline_period' actually covered by the data
+    """
+    steps = baseline['shape'][0] + selection['shape'][0]
+    total, count = _monthly_sums(baseline, calendar, progress, 0, steps)
+    climatology = _divide(total, count)
+    years = np.unique(calendar['year'][selection['time_index']])
+    grid = selection['shape'][1:]
+    annual_total = np.zeros((years.size,) + grid)
+    annual_count = np.zeros((years.size,) + grid, dtype=np.int64)
+    for start, block in _chunks(selection, progress, baseline['shape'][0], steps):
+        stop = start + block.shape[0]
+        block -= climatology[calendar['month'][start:stop] - 1]
+        for year, run in _groups(calendar['year'][start:stop]):
+            index = int(np.searchsorted(years, year))
+            _accumulate(annual_total[index], annual_count[index], block[run])
+
+    coords = datasets.coordinates(selection['path'])
+    first, last = datasets.format_times(baseline['time'][[0, -1]], coords['units'], coords['calendar'])
+    return ({'anomaly': _divide(annual_total, annual_count)},
+            {'units': units, 'times': [str(year) for year in years],
+             'baseline_period': f'{first[:10]} to {last[:10]}'})
+
+
+def _precipitation_scale(units, step_seconds):
+    """Factor turning a sum of time steps into a total in mm, and the units of the total."""
+    key = ' '.join((units or '').split())
+    if key in PRECIPITATION_RATES:
+        if step_seconds is None:
+            raise ValueError("Precipitation rates need at least two time steps to be accumulated")
+        return PRECIPITATION_RATES[key] * step_seconds, 'mm'
+    if key in PRECIPITATION_DEPTHS:
+        return PRECIPITATION_DEPTHS[key], 'mm'
+    return 1.0, units
+
+
+def precipitation_total(selection, calendar, units, progress=None):
+    """
+    Precipitation accumulated over the selected period at every cell.
+
+    Rates (e.g. kg m-2 s-1) are multiplied by the time step and depths in
+    metres converted, so totals are in mm where the units are recognized.
+    Missing steps count as no precipitation.
+
+    Returns: (arrays, metadata) with the 'total_precipitation' grid and, for a
+    regular time axis, the 'annual_precipitation' grid (total per year)
+    """
+    grid = selection['shape'][1:]
+    total, count = np.zeros(grid), np.zeros(grid, dtype=np.int64)
+    for _, block in _chunks(selection, progress):
+        _accumulate(total, count, block)
+    step_seconds = calendar['step_seconds']
+    scale, total_units = _precipitation_scale(units, step_seconds)
+    totals = np.where(count > 0, total * scale, np.nan).astype(np.float32)
+    arrays = {'total_precipitation': totals}
+    if step_seconds:
+        arrays['annual_precipitation'] = totals / np.float32(selection['shape'][0] * step_seconds / SECONDS_PER_YEAR)
+    return arrays, {'units': total_units}
+
+
+def _reduce_day(values, statistic):
+    """Partial daily statistic of some time steps of one day."""
+    if statistic == 'min':
+        return np.fmin.reduce(values, axis=0)
+    if statistic == 'max':
+        return np.fmax.reduce(values, axis=0)
+    valid = ~np.isnan(values)
+    return np.where(valid, values, np.float32(0)).sum(axis=0), valid.sum(axis=0)
+
+
+def _combine_day(first, second, statistic):
+    if statistic == 'min':
+        return np.fmin(first, second)
+    if statistic == 'max':
+        return np.fmax(first, second)
+    return first[0] + second[0], first[1] + second[1]
+
+
+def _finish_day(partial, statistic):
+    return _divide(*partial) if statistic == 'mean' else partial
+
+
+def _daily_values(selection, calendar, statistic, progress=None):
+    """
+    Stream the daily minima, maxima or means of a selection.
+
+    A day split across two chunks is held back and completed with the next chunk.
+
+    Yields: (first, values) pairs: the time index of each day's first step and
+    the (days, lat, lon) daily statistics
+    """
+    pending = None
+    for start, block in _chunks(selection, progress):
+        stop = start + block.shape[0]
+        keys = (calendar['year'][start:stop] * 10000 + calendar['month'][start:stop] * 100
+                + calendar['day'][start:stop])
+        firsts, values = [], []
+        for key, run in _groups(keys):
+            partial = _reduce_day(block[run], statistic)
+            if pending is not None and pending[0] == key:
+                pending = (key, pending[1], _combine_day(pending[2], partial, statistic))
+                continue
+            if pending is not None:
+                firsts.append(pending[1])
+                values.append(_finish_day(pending[2], statistic))
+            pending = (key, start + run.start, partial)
+        if values:
+            yield np.array(firsts), np.stack(values)
+    if pending is not None:
+        yield np.array([pending[1]]), _finish_day(pending[2], statistic)[np.newaxis]
+
+
+def _year_state(index_type, grid):
+    """Per-cell accumulators of one year of an index."""
+    if index_type in COUNT_INDICES:
+        return {'count': np.zeros(grid, dtype=np.int32), 'valid': np.zeros(grid, dtype=bool)}
+    if index_type == 'GSL':
+        return {'day': 0, 'valid': np.zeros(grid, dtype=bool),
+                'warm': np.zeros(grid, dtype=np.int32), 'start': np.full(grid, -1, dtype=np.int32),
+                'cold': np.zeros(grid, dtype=np.int32), 'end': np.full(grid, -1, dtype=np.int32)}
+    return {'extreme': np.full(grid, np.nan, dtype=np.float32)}
+
+
+def _update_year(state, index_type, days, months):
+    """Fold consecutive days of one year, (days, lat, lon) in °C, into its accumulators."""
+    if index_type in COUNT_INDICES:
+        compare, threshold = COUNT_INDICES[index_type]
+        state['count'] += compare(days, threshold).sum(axis=0, dtype=np.int32)
+        state['valid'] |= ~np.isnan(days).all(axis=0)
+    elif index_type == 'TXx':
+        state['extreme'] = np.fmax(state['extreme'], np.fmax.reduce(days, axis=0))
+    elif index_type == 'TNn':
+        state['extreme'] = np.fmin(state['extreme'], np.fmin.reduce(days, axis=0))
+    else:
+        # Run lengths are tracked per cell, one day at a time for all cells at once
+        for values, month in zip(days, months):
+            state['valid'] |= ~np.isnan(values)
+            state['warm'] = np.where(values > GSL_THRESHOLD, state['warm'] + 1, 0)
+            started = (state['start'] < 0) & (state['warm'] >= GSL_SPAN)
+            state['start'][started] = state['day'] - GSL_SPAN + 1
+            if month >= 7:
+                state['cold'] = np.where(values < GSL_THRESHOLD, state['cold'] + 1, 0)
+                ended = (state['start'] >= 0) & (state['end'] < 0) & (state['cold'] >= GSL_SPAN)
+                state['end'][ended] = state['day'] - GSL_SPAN + 1
+            state['day'] += 1
+
+
+def _close_year(state, index_type):
+    """Index value of one year at every cell, NaN where the year has no data."""
+    if index_type in COUNT_INDICES:
+        return np.where(state['valid'], state['count'], np.nan)
+    if index_type == 'GSL':
+        end = np.where(state['end'] >= 0, state['end'], state['day'])
+        length = np.where(state['start'] >= 0, end - state['start'], 0)
+        return np.where(state['valid'], length, np.nan)
+    return state['extreme']
+
+
+def climate_index(selection, calendar, index_type, units, progress=None):
+    """
+    An ETCCDI temperature index, computed per calendar year and averaged over the years.
+
+    Daily minima, maxima or means are taken over the time steps of each day,
+    so sub-daily data works as well as daily data. Temperatures in kelvin are
+    converted to °C.
+
+    Parameters:
+    - index_type: One of CLIMATE_INDICES
+
+    Returns: (arrays, metadata) with the 'index_values' grid, the 'index_type',
+    its 'description' and 'units', and the 'years' averaged
+    """
+    statistic, index_units, description = CLIMATE_INDICES[index_type]
+    offset = np.float32(_kelvin_offset(units))
+    grid = selection['shape'][1:]
+    total, count = np.zeros(grid), np.zeros(grid, dtype=np.int64)
+    years = []
+    state = None
+    for firsts, days in _daily_values(selection, calendar, statistic, progress):
+        days -= offset
+        for year, run in _groups(calendar['year'][firsts]):
+            if not years or year != years[-1]:
+                if state is not None:
+                    _accumulate(total, count, _close_year(state, index_type)[np.newaxis])
+                state = _year_state(index_type, grid)
+                years.append(int(year))
+            _update_year(state, index_type, days[run], calendar['month'][firsts[run]])
+    if state is not None:
+        _accumulate(total, count, _close_year(state, index_type)[np.newaxis])
+    return ({'index_values': _divide(total, count)},
+            {'units': index_units, 'index_type': index_type, 'description': description, 'years': years})
+
+
+def _selection(dataset, parameters, time_range=None):
+    return datasets.select(dataset, parameters['variable'],
+                           lat_range=datasets.parse_range(parameters['lat_range']),
+                           lon_range=datasets.parse_range(parameters['lon_range']),
+                           time_range=parameters['time_range'] if time_range is None else time_range,
+                           level=parameters['level'])
+
+
+def _baseline(dataset, parameters):
+    try:
+        return _selection(dataset, parameters, (parameters['baseline_start'], parameters['baseline_end']))
+    except ValueError as e:
+        if 'time steps' in str(e):
+            raise ValueError("The baseline period does not overlap the dataset's time range")
+        raise
+
+
+def analysis_parameters(dataset, analysis_type, parameters):
+    """
+    Check and normalize the parameters of an analysis request.
+
+    Parameters:
+    - dataset: A Dataset
+    - analysis_type: One of ANALYSIS_NAMES
+    - parameters: dict with the 'variable' and optionally 'level', 'lat_range',
+      'lon_range' and 'time_range' (as for the data API), 'baseline_start' and
+      'baseline_end' (YYYY-MM-DD) for anomalies, and 'index_type' for climate indices
+
+    Returns: Normalized parameters, with defaults filled in
+
+    Raises: ValueError for an unknown analysis type or index, or a variable or
+    box the analysis cannot run on
+    """
+    if analysis_type not in ANALYSIS_NAMES:
+        raise ValueError(f"Unknown analysis type: {analysis_type}")
+    if not parameters.get('variable'):
+        raise ValueError("Select a variable")
+    normalized = {'variable': str(parameters['variable']), 'level': int(parameters.get('level') or 0)}
+    for name in ('lat_range', 'lon_range', 'time_range'):
+        normalized[name] = str(parameters.get(name) or '').strip() or None
+    if analysis_type == 'temperature_anomaly':
+        normalized['baseline_start'] = str(parameters.get('baseline_start') or DEFAULT_BASELINE[0]).strip()
+        normalized['baseline_end'] = str(parameters.get('baseline_end') or DEFAULT_BASELINE[1]).strip()
+    if analysis_type == 'climate_indices':
+        normalized['index_type'] = parameters.get('index_type') or 'FD'
+        if normalized['index_type'] not in CLIMATE_INDICES:
+            raise ValueError(f"Unknown climate index: {normalized['index_type']}")
+
+    if _selection(dataset, normalized)['time_index'] is None:
+        raise ValueError(f"{normalized['variable']} has no time dimension")
+    if analysis_type != 'temperature_mean':
+        datasets.calendar_fields(dataset.path)
+    if analysis_type == 'temperature_anomaly':
+        _baseline(dataset, normalized)
+    return normalized
+
+
+def run_analysis(dataset, analysis_type, parameters, progress=None):
+    """
+    Compute an analysis in streaming passes over the dataset.
+
+    Parameters:
+    - dataset: A Dataset
+    - analysis_type: One of ANALYSIS_NAMES
+    - parameters: Normalized parameters, from analysis_parameters
+    - progress: Optional callback called with (done, total) time steps
+
+    Returns: (arrays, metadata): the result grids plus the 'latitude' and
+    'longitude' coordinates, and JSON-serializable metadata such as 'units'
+    """
+    selection = _selection(dataset, parameters)
+    units = datasets.variable_units(dataset, parameters['variable'])
+    if analysis_type == 'temperature_mean':
+        arrays, metadata = temperature_mean(selection, units, progress)
+    else:
+        calendar = datasets.calendar_fields(dataset.path)
+        if analysis_type == 'temperature_anomaly':
+            arrays, metadata = temperature_anomaly(selection, _baseline(dataset, parameters), calendar, units,
+                                                   progress)
+        elif analysis_type == 'precipitation_total':
+            arrays, metadata = precipitation_total(selection, calendar, units, progress)
+        elif analysis_type == 'climate_indices':
+            arrays, metadata = climate_index(selection, calendar, parameters['index_type'], units, progress)
+        else:
+            arrays, metadata = seasonal_cycle(selection, calendar, units, progress)
+    arrays.update(latitude=selection['latitude'], longitude=selection['longitude'])
+    return arrays, metadata
+
+
+def request_analysis(dataset, analysis_type, parameters):
+    """
+    Find the analysis answering a request, or create it. The caller commits
+    and, for a new analysis, submits run_climate_analysis as a job.
+
+    Returns: (ClimateAnalysis, created)
+
+    Raises: ValueError as for analysis_parameters
+    """
+    normalized = analysis_parameters(dataset, analysis_type, parameters)
+    key = json.dumps(normalized, sort_keys=True)
+    analysis = (ClimateAnalysis.query
+                .filter(ClimateAnalysis.dataset_id == dataset.id,
+                        ClimateAnalysis.analysis_type == analysis_type,
+                        ClimateAnalysis.parameters == key,
+                        ClimateAnalysis.status != 'failed')
+                .order_by(ClimateAnalysis.id.desc())
+                .first())
+    if analysis is not None:
+        return analysis, False
+    analysis = ClimateAnalysis(dataset_id=dataset.id, analysis_type=analysis_type,
+                               variable=normalized['variable'], parameters=key, status='queued')
+    db.session.add(analysis)
+    return analysis, True
+
+
+def run_climate_analysis(analysis_id, progress=None):
+    """
+    Compute a stored analysis and write its result, as a background job.
+
+    Returns: dict with the 'analysis_id' and the result's 'path'
+
+    Raises: ValueError if the analysis does not exist, or as for run_analysis
+    """
+    analysis = db.session.get(ClimateAnalysis, analysis_id)
+    if analysis is None:
+        raise ValueError(f"Analysis {analysis_id} not found")
+    analysis.status = 'running'
+    db.session.commit()
+    try:
+        arrays, metadata = run_analysis(db.session.get(Dataset, analysis.dataset_id), analysis.analysis_type,
+                                        json.loads(analysis.parameters), progress=progress)
+        os.makedirs(ANALYSIS_DIR, exist_ok=True)
+        path = os.path.join(ANALYSIS_DIR, f'{analysis.id}.npz')
+        with open(path + '.tmp', 'wb') as output:
+            np.savez(output, **arrays)
+        os.replace(path + '.tmp', path)
+    except Exception as e:
+        db.session.rollback()
+        analysis.status, analysis.error, analysis.finished_at = 'failed', str(e), datetime.utcnow()
+        db.session.commit()
+        raise
+    analysis.result_json = json.dumps(metadata)
+    analysis.result_path = path
+    analysis.status, analysis.finished_at = 'completed', datetime.utcnow()
+    db.session.commit()
+    return {'analysis_id': analysis.id, 'path': path}
+
+
+def load_analysis(analysis):
+    """
+    The stored result of a completed analysis at full resolution.
+
+    Returns: (arrays, metadata), the arrays including 'latitude' and 'longitude'
+    """
+    with np.load(analysis.result_path) as stored:
+        arrays = {name: stored[name] for name in stored.files}
+    return arrays, json.loads(analysis.result_json)
+
+
+def analysis_result(analysis, width=DEFAULT_RESULT_WIDTH, height=DEFAULT_RESULT_HEIGHT,
+                    max_values=MAX_RESULT_VALUES):
+    """
+    The stored result of a completed analysis, sized for a response.
+
+    Grids are block-averaged by the smallest power of two that fits
+    width x height cells and keeps the result within max_values values.
+
+    Returns: dict with the metadata, 1-D 'latitudes' and 'longitudes', the
+    'coarsening' factor and the result grids (lat, lon), or (lat, lon, steps)
+    for results with a time or month axis
+    """
+    arrays, metadata = load_analysis(analysis)
+    latitude, longitude = arrays.pop('latitude'), arrays.pop('longitude')
+    layers = max(values.shape[0] if name in STACKED_RESULTS else 1 for name, values in arrays.items())
+    factor = pyramid.coarsening(latitude.size, longitude.size, width, height)
+    while (factor < max(latitude.size, longitude.size)
+           and math.ceil(latitude.size / factor) * math.ceil(longitude.size / factor) * layers > max_values):
+        factor *= 2
+    result = {**metadata,
+              'latitudes': pyramid.coarsen_coordinates(latitude, factor),
+              'longitudes': pyramid.coarsen_coordinates(longitude, factor),
+              'coarsening': factor}
+    for name, values in arrays.items():
+        values = pyramid.block_mean(values, factor)
+        result[name] = np.moveaxis(values, 0, -1) if name in STACKED_RESULTS else values
+    return result
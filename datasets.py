@@ -0,0 +1,567 @@
+"""
+Gridded climate datasets for the Energy Finance application.
+Uploaded NetCDF files (classic or HDF5-based NetCDF-4) are registered with
+their metadata only: dimensions, variables, attributes and coordinate ranges.
+Requests read hyperslabs of one variable, time chunk by time chunk, so the
+netCDF/HDF5 library touches only the file chunks that overlap the requested
+latitude/longitude/time box and a file is never loaded whole, however large.
+"""
+
+import json
+import os
+import threading
+
+import cftime
+import netCDF4
+import numpy as np
+
+from app import db
+from models import Dataset
+
+
+# Directory uploaded datasets are written to, and server-side files may be registered from
+DATASET_DIR = os.environ.get('DATASET_DIR', 'datasets')
+
+# File extensions accepted for upload
+DATASET_EXTENSIONS = ('nc', 'nc4', 'netcdf', 'h5', 'hdf5')
+
+# Values read per chunk of a streaming pass (64 MB of float32)
+CHUNK_VALUES = 16_000_000
+
+# Largest subset read_subset returns in one response
+MAX_SUBSET_VALUES = 2_000_000
+
+# Coordinate variables are recognized by CF attributes first, then by these names
+LATITUDE_NAMES = ('lat', 'latitude', 'nav_lat', 'y')
+LONGITUDE_NAMES = ('lon', 'longitude', 'nav_lon', 'x')
+TIME_NAMES = ('time', 't', 'valid_time')
+
+# Seconds per unit of CF time units ('<unit> since <date>')
+TIME_UNIT_SECONDS = {'seconds': 1, 'second': 1, 's': 1, 'minutes': 60, 'minute': 60, 'min': 60,
+                     'hours': 3600, 'hour': 3600, 'h': 3600, 'days': 86400, 'day': 86400, 'd': 86400}
+
+_handles = {}
+_coordinates = {}
+_calendars = {}
+# The netCDF and HDF5 libraries are not thread-safe, so reads are serialized per process
+_lock = threading.RLock()
+
+
+def open_dataset(path):
+    """
+    Open a NetCDF file read only, once per process.
+
+    Returns: netCDF4.Dataset; variables are read lazily, with fill values
+    masked and scale_factor/add_offset applied
+
+    Raises: ValueError if the file cannot be read as NetCDF
+    """
+    path = os.path.abspath(path)
+    with _lock:
+        handle = _handles.get(path)
+        if handle is None:
+            try:
+                handle = netCDF4.Dataset(path, 'r')
+            except (OSError, ValueError):
+                raise ValueError(f"{os.path.basename(path)} is not a readable NetCDF file")
+            _handles[path] = handle
+    return handle
+
+
+def _json_value(value):
+    """Convert a NetCDF attribute value to a JSON-serializable one."""
+    if isinstance(value, bytes):
+        return value.decode('utf-8', 'replace')
+    if isinstance(value, (np.ndarray, np.generic)):
+        value = value.tolist()
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    if isinstance(value, list):
+        return [_json_value(item) for item in value]
+    return value
+
+
+def _attributes(item):
+    return {name: _json_value(item.getncattr(name)) for name in item.ncattrs()}
+
+
+def _find_coordinate(handle, names, standard_name, units, axis):
+    """Name of the 1-D variable holding one coordinate, or None."""
+    candidates = [name for name, variable in handle.variables.items() if variable.ndim == 1]
+    tests = (
+        lambda variable: getattr(variable, 'standard_name', None) == standard_name,
+        lambda variable: str(getattr(variable, 'units', '')) in units,
+        lambda variable: getattr(variable, 'axis', None) == axis,
+        lambda variable: variable.name.lower() in names,
+    )
+    for test in tests:
+        for name in candidates:
+            if test(handle.variables[name]):
+                return name
+    return None
+
+
+def coordinate_names(handle):
+    """
+    Names of the latitude, longitude and time coordinate variables.
+
+    Returns: dict with 'latitude', 'longitude' and 'time' (None where absent)
+    """
+    return {
+        'latitude': _find_coordinate(handle, LATITUDE_NAMES, 'latitude',
+                                     ('degrees_north', 'degree_north', 'degrees_N', 'degree_N'), 'Y'),
+        'longitude': _find_coordinate(handle, LONGITUDE_NAMES, 'longitude',
+                                      ('degrees_east', 'degree_east', 'degrees_E', 'degree_E'), 'X'),
+        'time': _find_coordinate(handle, TIME_NAMES, 'time', (), 'T'),
+    }
+
+
+def format_times(values, units, calendar):
+    """ISO strings for numeric time values, or the values when they have no CF units."""
+    if not units or ' since ' not in units:
+        return [_json_value(value) for value in np.asarray(values).tolist()]
+    dates = netCDF4.num2date(values, units, calendar=calendar or 'standard')
+    return [date.isoformat() for date in np.atleast_1d(dates)]
+
+
+def coordinates(path):
+    """
+    Coordinate arrays of a dataset, read once per process.
+
+    The coordinates are 1-D and small; the data variables are never read here.
+
+    Returns: dict with the coordinate 'names' and 'latitude', 'longitude' and
+    'time' arrays (None where absent), plus the time 'units' and 'calendar'
+    """
+    path = os.path.abspath(path)
+    with _lock:
+        cached = _coordinates.get(path)
+        if cached is None:
+            handle = open_dataset(path)
+            names = coordinate_names(handle)
+            cached = {'names': names}
+            for axis, name in names.items():
+                values = None
+                if name is not None:
+                    values = np.ma.filled(handle.variables[name][:].astype(float), np.nan)
+                    values.flags.writeable = False
+                cached[axis] = values
+            time = handle.variables[names['time']] if names['time'] else None
+            cached['units'] = getattr(time, 'units', None)
+            cached['calendar'] = getattr(time, 'calendar', None)
+            _coordinates[path] = cached
+    return cached
+
+
+def calendar_fields(path):
+    """
+    Calendar year, month and day of every time step of a dataset, computed once per process.
+
+    Returns: dict of int arrays 'year', 'month' and 'day', and 'step_seconds',
+    the median spacing of the time steps in seconds (None for a single step)
+
+    Raises: ValueError if the dataset has no time axis with calendar units
+    """
+    path = os.path.abspath(path)
+    coords = coordinates(path)
+    with _lock:
+        cached = _calendars.get(path)
+        if cached is None:
+            units = coords['units']
+            if coords['time'] is None or not units or ' since ' not in units:
+                raise ValueError("This dataset has no time axis with calendar units")
+            dates = np.atleast_1d(netCDF4.num2date(coords['time'], units,
+                                                   calendar=coords['calendar'] or 'standard'))
+            cached = {name: np.fromiter((getattr(date, name) for date in dates), dtype=np.int32, count=dates.size)
+                      for name in ('year', 'month', 'day')}
+            unit = units.split(' since ')[0].strip().lower()
+            step_seconds = None
+            if coords['time'].size > 1 and unit in TIME_UNIT_SECONDS:
+                step_seconds = float(np.median(np.diff(coords['time']))) * TIME_UNIT_SECONDS[unit]
+            cached['step_seconds'] = step_seconds
+            _calendars[path] = cached
+    return cached
+
+
+def extract_metadata(path):
+    """
+    Metadata of a NetCDF file, without reading its data variables.
+
+    Returns: dict with 'format', 'dimensions' ({name: {'size', 'unlimited'}}),
+    'variables' ({name: {'dimensions', 'shape', 'dtype', 'chunking',
+    'attributes'}}), global 'attributes', the coordinate variable names as
+    'coordinates' and the coordinate ranges as 'bounds'
+
+    Raises: ValueError if the file cannot be read as NetCDF
+    """
+    handle = open_dataset(path)
+    coords = coordinates(path)
+    with _lock:
+        variables = {}
+        for name, variable in handle.variables.items():
+            chunking = variable.chunking()
+            variables[name] = {
+                'dimensions': list(variable.dimensions),
+                'shape': [int(size) for size in variable.shape],
+                'dtype': str(variable.dtype),
+                'chunking': chunking if isinstance(chunking, list) else chunking or None,
+                'attributes': _attributes(variable),
+            }
+        metadata = {
+            'format': handle.data_model,
+            'dimensions': {name: {'size': len(dimension), 'unlimited': dimension.isunlimited()}
+                           for name, dimension in handle.dimensions.items()},
+            'variables': variables,
+            'attributes': _attributes(handle),
+            'coordinates': coords['names'],
+        }
+
+    bounds = {}
+    for axis in ('latitude', 'longitude'):
+        values = coords[axis]
+        if values is not None and values.size:
+            bounds[f'{axis}_min'] = float(np.nanmin(values))
+            bounds[f'{axis}_max'] = float(np.nanmax(values))
+    if coords['time'] is not None and coords['time'].size:
+        start, end = format_times(coords['time'][[0, -1]], coords['units'], coords['calendar'])
+        bounds.update({'time_start': start, 'time_end': end, 'time_steps': int(coords['time'].size)})
+    metadata['bounds'] = bounds
+    return metadata
+
+
+def register_dataset(path, original_filename=None, description=None):
+    """
+    Record a NetCDF file in the database. The caller commits.
+
+    Parameters:
+    - path: NetCDF file on disk
+    - original_filename: Display name (default: the file name)
+    - description: Optional description
+
+    Returns: The new Dataset
+
+    Raises: ValueError if the file cannot be read as NetCDF
+    """
+    metadata = extract_metadata(path)
+    dataset = Dataset(original_filename=original_filename or os.path.basename(path), description=description,
+                      path=os.path.abspath(path), file_type=metadata['format'],
+                      file_size=os.path.getsize(path), metadata_json=json.dumps(metadata))
+    db.session.add(dataset)
+    return dataset
+
+
+def dataset_metadata(dataset):
+    """Metadata stored for a registered Dataset, as from extract_metadata."""
+    return json.loads(dataset.metadata_json)
+
+
+def parse_range(text):
+    """
+    Parse a 'start:end' range; either end may be empty for an open range.
+
+    Returns: (start, end) strings or None, or None for an empty range
+    """
+    if text is None or not str(text).strip():
+        return None
+    start, _, end = str(text).partition(':')
+    return (start.strip() or None, end.strip() or None) if _ else (start.strip(), start.strip())
+
+
+def _float_range(value_range):
+    if value_range is None:
+        return -np.inf, np.inf
+    try:
+        low, high = (-np.inf if value_range[0] is None else float(value_range[0]),
+                     np.inf if value_range[1] is None else float(value_range[1]))
+    except ValueError:
+        raise ValueError(f"Invalid coordinate range {value_range[0]}:{value_range[1]}")
+    return min(low, high), max(low, high)
+
+
+def _runs(indices):
+    """Split ascending indices into slices of contiguous runs."""
+    if indices.size == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(indices) != 1) + 1
+    return [slice(int(run[0]), int(run[-1]) + 1) for run in np.split(indices, breaks)]
+
+
+def _time_index(coords, time_range):
+    """Index slice of the time steps in a parsed time range (indices or ISO dates, inclusive)."""
+    values = coords['time']
+    if values is None:
+        return None
+    if time_range is None:
+        return slice(0, values.size)
+    bounds = []
+    for position, bound in enumerate(time_range):
+        if bound is None:
+            bounds.append(0 if position == 0 else values.size - 1)
+        elif bound.lstrip('-').isdigit():
+            bounds.append(int(bound) % values.size if values.size else 0)
+        else:
+            if not coords['units'] or ' since ' not in coords['units']:
+                raise ValueError("This dataset's time axis has no calendar units; select time steps by index")
+            try:
+                year, month, day = (int(part) for part in bound.split('-'))
+                date = cftime.datetime(year, month, day, calendar=coords['calendar'] or 'standard')
+                number = netCDF4.date2num(date, coords['units'], calendar=coords['calendar'] or 'standard')
+            except (TypeError, ValueError):
+                raise ValueError(f"Invalid date {bound}; use YYYY-MM-DD")
+            side = 'left' if position == 0 else 'right'
+            index = int(np.searchsorted(values, number, side=side))
+            bounds.append(index if position == 0 else index - 1)
+    return slice(bounds[0], max(bounds[0], bounds[1] + 1))
+
+
+def grid_selection(latitudes, longitudes, lat_range=None, lon_range=None):
+    """
+    Index runs of the grid cells inside a latitude/longitude box.
+
+    Longitudes are compared on -180..180 or 0..360, whichever the request
+    uses, so requests work on grids stored either way; the selected longitudes
+    are returned in ascending order.
+
+    Returns: dict with 'lat_runs' and 'lon_runs' (slices in file order),
+    'lon_order' (reorders the longitudes read into ascending order) and the
+    selected 'latitude' and 'longitude' values
+
+    Raises: ValueError if the box holds no grid cells
+    """
+    low, high = _float_range(lat_range)
+    lat_index = np.flatnonzero((latitudes >= low) & (latitudes <= high))
+    low, high = _float_range(lon_range)
+    if longitudes.size and np.nanmax(longitudes) > 180 and low < 0:
+        longitudes = (longitudes + 180) % 360 - 180
+    elif longitudes.size and np.nanmin(longitudes) < 0 and high > 180 and np.isfinite(high):
+        longitudes = longitudes % 360
+    lon_index = np.flatnonzero((longitudes >= low) & (longitudes <= high))
+    if lat_index.size == 0 or lon_index.size == 0:
+        raise ValueError("The selection does not contain any grid points")
+    return {
+        'lat_runs': _runs(lat_index),
+        'lon_runs': _runs(lon_index),
+        'lon_order': np.argsort(longitudes[lon_index], kind='stable'),
+        'latitude': latitudes[lat_index],
+        'longitude': np.sort(longitudes[lon_index], kind='stable'),
+    }
+
+
+def select(dataset, variable, lat_range=None, lon_range=None, time_range=None, level=0):
+    """
+    Resolve a latitude/longitude/time box into index runs of one variable.
+
+    Only the coordinate arrays are read; the box is resolved by grid_selection.
+
+    Parameters:
+    - dataset: A Dataset
+    - variable: Name of a variable with latitude and longitude dimensions
+    - lat_range, lon_range: (min, max) in degrees, from parse_range (None for all)
+    - time_range: (start, end) time-step indices or YYYY-MM-DD dates, inclusive
+    - level: Index taken along any other dimension (e.g. pressure level)
+
+    Returns: selection dict for iter_chunks, with the selected 'latitude',
+    'longitude' and 'time' coordinates and the subset 'shape' (time, lat, lon)
+
+    Raises: ValueError for an unknown variable, one without a latitude/longitude
+    grid, or an empty selection
+    """
+    handle = open_dataset(dataset.path)
+    coords = coordinates(dataset.path)
+    names = coords['names']
+    if variable not in handle.variables:
+        raise ValueError(f"Unknown variable {variable}")
+    dimensions = handle.variables[variable].dimensions
+    if names['latitude'] not in dimensions or names['longitude'] not in dimensions:
+        raise ValueError(f"{variable} is not on a latitude/longitude grid")
+
+    grid = grid_selection(coords['latitude'], coords['longitude'], lat_range, lon_range)
+    time_index = None
+    if names['time'] in dimensions:
+        time_index = _time_index(coords, parse_range(time_range) if isinstance(time_range, str) else time_range)
+    steps = 1 if time_index is None else len(range(*time_index.indices(coords['time'].size)))
+    if steps == 0:
+        raise ValueError("The selection does not contain any time steps")
+
+    return {
+        'path': dataset.path,
+        'variable': variable,
+        'dimensions': dimensions,
+        'names': names,
+        **grid,
+        'time_index': time_index,
+        'level': int(level),
+        'time': None if time_index is None else coords['time'][time_index],
+        'shape': (steps, grid['latitude'].size, grid['longitude'].size),
+    }
+
+
+def _decode(variable, raw):
+    """
+    Unpack raw variable values to float32, NaN where missing.
+
+    Does what netCDF4's automatic masking and scaling does, but in float32
+    rather than float64, which halves the memory traffic of a streaming pass.
+    """
+    values = raw.astype(np.float32)
+    attributes = variable.ncattrs()
+    missing = np.isnan(values) if raw.dtype.kind == 'f' else np.zeros(raw.shape, dtype=bool)
+    fill_values = [variable.getncattr(name) for name in ('_FillValue', 'missing_value') if name in attributes]
+    if '_FillValue' not in attributes and raw.dtype.kind != 'S' and raw.dtype.itemsize > 1:
+        fill_values.append(netCDF4.default_fillvals.get(raw.dtype.str[1:]))
+    for fill_value in fill_values:
+        for value in np.atleast_1d(fill_value):
+            if value is not None:
+                missing |= raw == np.asarray(value, dtype=raw.dtype)
+    if 'valid_range' in attributes:
+        low, high = variable.getncattr('valid_range')
+        missing |= (raw < low) | (raw > high)
+    if 'valid_min' in attributes:
+        missing |= raw < variable.getncattr('valid_min')
+    if 'valid_max' in attributes:
+        missing |= raw > variable.getncattr('valid_max')
+    if 'scale_factor' in attributes:
+        values *= np.float32(variable.getncattr('scale_factor'))
+    if 'add_offset' in attributes:
+        values += np.float32(variable.getncattr('add_offset'))
+    values[missing] = np.nan
+    return values
+
+
+def _read_block(variable, selection, time_slice):
+    """Read one (time, lat, lon) block of a selection as float32 with NaN for missing values."""
+    names = selection['names']
+    variable.set_auto_maskandscale(False)
+    blocks = []
+    for lat_run in selection['lat_runs']:
+        row = []
+        for lon_run in selection['lon_runs']:
+            key, kept = [], []
+            for dimension, size in zip(selection['dimensions'], variable.shape):
+                if dimension == names['time']:
+                    key.append(time_slice)
+                elif dimension == names['latitude']:
+                    key.append(lat_run)
+                elif dimension == names['longitude']:
+                    key.append(lon_run)
+                else:
+                    key.append(min(selection['level'], size - 1))
+                    continue
+                kept.append(dimension)
+            values = _decode(variable, np.asarray(variable[tuple(key)]))
+            order = [kept.index(name) for name in (names['time'], names['latitude'], names['longitude'])
+                     if name in kept]
+            values = values.transpose(order)
+            row.append(values if names['time'] in kept else values[np.newaxis])
+        blocks.append(row[0] if len(row) == 1 else np.concatenate(row, axis=2))
+    block = blocks[0] if len(blocks) == 1 else np.concatenate(blocks, axis=1)
+    lon_order = selection['lon_order']
+    if np.any(lon_order != np.arange(lon_order.size)):
+        block = block[:, :, lon_order]
+    return block
+
+
+def iter_chunks(selection, chunk_values=CHUNK_VALUES):
+    """
+    Stream a selection as (time offset, block) pairs, block shaped (steps, lat, lon).
+
+    Chunks hold about chunk_values values and, for chunked NetCDF-4 variables,
+    a whole number of the file's time chunks, so no file chunk is decompressed twice.
+    """
+    handle = open_dataset(selection['path'])
+    variable = handle.variables[selection['variable']]
+    steps, n_lat, n_lon = selection['shape']
+    per_step = n_lat * n_lon
+    chunk_steps = max(1, chunk_values // per_step)
+    names = selection['names']
+    chunking = variable.chunking()
+    if isinstance(chunking, list) and names['time'] in selection['dimensions']:
+        file_steps = chunking[selection['dimensions'].index(names['time'])]
+        chunk_steps = max(file_steps, chunk_steps // file_steps * file_steps)
+
+    time_index = selection['time_index']
+    first = 0 if time_index is None else time_index.start
+    for offset in range(0, steps, chunk_steps):
+        stop = min(offset + chunk_steps, steps)
+        with _lock:
+            block = _read_block(variable, selection, slice(first + offset, first + stop))
+        yield offset, block
+
+
+# Running statistics of a stream of chunks: (count, mean, sum of squared deviations, min, max)
+EMPTY_MOMENTS = (0, 0.0, 0.0, np.inf, -np.inf)
+
+
+def update_moments(moments, values):
+    """
+    Fold the non-NaN values of a chunk into running moments.
+
+    Chunks are combined with the pairwise update of Chan et al., which stays
+    accurate for data far from zero (e.g. temperatures in kelvin).
+    """
+    values = np.ravel(values)
+    missing = np.isnan(values)
+    if missing.any():
+        values = values[~missing]
+    if values.size == 0:
+        return moments
+    count, mean, m2, low, high = moments
+    chunk_mean = values.mean(dtype=np.float64)
+    deviations = values - np.float32(chunk_mean)
+    chunk_m2 = float(np.dot(deviations, deviations))
+    total = count + values.size
+    delta = chunk_mean - mean
+    return (total, mean + delta * values.size / total, m2 + chunk_m2 + delta * delta * count * values.size / total,
+            min(low, float(values.min())), max(high, float(values.max())))
+
+
+def moments_statistics(moments):
+    """Summary dict (min, max, mean, std, count) of running moments; None where there are no values."""
+    count, mean, m2, low, high = moments
+    if not count:
+        return {'min': None, 'max': None, 'mean': None, 'std': None, 'count': 0}
+    return {'min': low, 'max': high, 'mean': float(mean), 'std': float(np.sqrt(m2 / count)), 'count': int(count)}
+
+
+def variable_units(dataset, variable):
+    """The units attribute of a dataset variable, or None."""
+    with _lock:
+        return _json_value(getattr(open_dataset(dataset.path).variables[variable], 'units', None))
+
+
+def read_subset(dataset, variable, lat_range=None, lon_range=None, time_range=None, level=0,
+                max_values=MAX_SUBSET_VALUES):
+    """
+    Read a latitude/longitude/time subset of a variable.
+
+    Parameters: as for select, plus max_values, the largest subset returned
+
+    Returns: dict with 'data' (float32, (lat, lon, time), or (lat, lon) for a
+    single time step, NaN where missing), 'latitudes', 'longitudes', 'times'
+    (ISO strings), 'variable', 'units' and 'statistics' (min, max, mean, std, count)
+
+    Raises: ValueError as for select, or if the subset exceeds max_values
+    """
+    selection = select(dataset, variable, lat_range, lon_range, time_range, level)
+    shape = selection['shape']
+    if np.prod(shape) > max_values:
+        raise ValueError(f"The selection holds {int(np.prod(shape)):,} values, more than {max_values:,}; "
+                         "narrow the latitude, longitude or time range")
+    data = np.empty(shape, dtype=np.float32)
+    moments = EMPTY_MOMENTS
+    for offset, block in iter_chunks(selection):
+        data[offset:offset + block.shape[0]] = block
+        moments = update_moments(moments, block)
+
+    coords = coordinates(dataset.path)
+    times = ([] if selection['time'] is None
+             else format_times(selection['time'], coords['units'], coords['calendar']))
+    return {
+        'data': data[0] if shape[0] == 1 else data.transpose(1, 2, 0),
+        'latitudes': selection['latitude'],
+        'longitudes': selection['longitude'],
+        'times': times,
+        'variable': variable,
+        'units': variable_units(dataset, variable),
+        'statistics': moments_statistics(moments),
+    }
@@ -0,0 +1,193 @@
+"""
+Project-finance debt sizing for the Energy Finance application.
+Debt is sculpted so each year's debt service equals cash flow available for
+debt service (CFADS) divided by a target DSCR, sized as the present value of
+that service at the interest rate and capped by a gearing limit. When taxes
+are computed on a levered basis, interest feeds back into CFADS through the
+tax shield; that loop is closed with a vectorized fixed-point iteration over
+the whole batch.
+"""
+
+import numpy as np
+
+import tax
+from finance import CASH_FLOW_COLUMNS, DEFAULT_DEBT_TERM
+
+
+DEFAULT_TARGET_DSCR = 1.3
+
+
+def cash_flow_available_for_debt_service(schedule):
+    """
+    CFADS of a schedule: revenue less operating costs and taxes.
+    """
+    return (schedule['revenue'] + schedule['opex'] + schedule['maintenance']
+            + schedule['insurance'] + schedule['taxes'])
+
+
+def dscr_profile(cfads, debt_service):
+    """
+    Annual DSCR and its minimum and average over the years with debt service.
+
+    Parameters:
+    - cfads: CFADS per year (year on the last axis)
+    - debt_service: Debt service per year as a positive amount
+
+    Returns: dict with 'dscr' (NaN in years without debt service), 'min_dscr'
+    and 'avg_dscr' (NaN for rows without debt)
+    """
+    paying = debt_service > 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dscr = np.where(paying, cfads / np.where(paying, debt_service, 1.0), np.nan)
+    has_debt = paying.any(axis=-1)
+    filled_min = np.where(paying, dscr, np.inf).min(axis=-1)
+    counts = np.maximum(paying.sum(axis=-1), 1)
+    return {
+        'dscr': dscr,
+        'min_dscr': np.where(has_debt, filled_min, np.nan),
+        'avg_dscr': np.where(has_debt, np.where(paying, dscr, 0.0).sum(axis=-1) / counts, np.nan),
+    }
+
+
+def sculpt_debt(schedule, target_dscr=DEFAULT_TARGET_DSCR, interest_rate=0.05, max_gearing=0.7,
+                debt_term=DEFAULT_DEBT_TERM, tax_rate=None, depreciation_years=None, tol=1e-8,
+                max_iter=50):
+    """
+    Size and sculpt debt for every row of a batch schedule.
+
+    Parameters:
+    - schedule: Output of finance.cash_flow_schedule (batch shape + years)
+    - target_dscr: DSCR the repayments are sculpted to
+    - interest_rate: Annual interest rate on the debt
+    - max_gearing: Cap on debt as a fraction of capex
+    - debt_term: Tenor in years, limited to the project lifetime
+    - tax_rate: If given, taxes are recomputed on a levered basis with interest
+      deductible, making CFADS depend on the debt (default: the schedule's
+      tax_rate when it taxes any row); otherwise the schedule's taxes are used
+      as they are
+    - depreciation_years: Straight-line tax depreciation period for the levered
+      tax (default: the schedule's depreciation, else debt_term)
+    - tol: Convergence tolerance on interest, relative to the debt amount
+    - max_iter: Iteration limit for the levered-tax loop
+
+    All parameters broadcast over the batch shape.
+
+    Returns: dict with 'debt_amount', 'gearing_limited' (the gearing cap binds),
+    per-year 'cfads', 'taxes', 'debt_service', 'interest', 'principal',
+    'opening_balance', 'closing_balance' and 'dscr', plus 'min_dscr',
+    'avg_dscr', 'iterations' and 'converged'
+    """
+    year = schedule['year']
+    shape = schedule['revenue'].shape
+
+    def per_row(value):
+        return np.broadcast_to(np.asarray(value, dtype=float), shape[:-1])[..., np.newaxis]
+
+    target_dscr = per_row(target_dscr)
+    rate = per_row(interest_rate)
+    lifetime = per_row(schedule['lifetime_years'])
+    tenor = np.minimum(per_row(debt_term), lifetime)
+    in_tenor = (year >= 1) & (year <= tenor)
+    operating = (year >= 1) & (year <= lifetime)
+
+    capex = -schedule['capex'].sum(axis=-1, keepdims=True)
+    debt_cap = per_row(max_gearing) * capex
+    discount = (1 + rate) ** -year
+    growth = (1 + rate) ** np.maximum(year - 1, 0)
+
+    ebitda = (schedule['revenue'] + schedule['opex'] + schedule['maintenance']
+              + schedule['insurance'])
+    if tax_rate is None and np.any(schedule.get('tax_rate', 0.0)):
+        tax_rate = schedule['tax_rate']
+    if tax_rate is not None:
+        tax_rate = np.broadcast_to(np.asarray(tax_rate, dtype=float), shape[:-1])
+        nol_limit = schedule.get('nol_limit', tax.NOL_LIMIT)
+        if depreciation_years is None and 'depreciation' in schedule:
+            depreciation = schedule['depreciation']
+        else:
+            years = per_row(depreciation_years if depreciation_years is not None else debt_term)
+            depreciation = capex / np.maximum(years, 1) * ((year >= 1) & (year <= years))
+
+    interest = np.zeros(shape)
+    converged = np.zeros(shape[:-1], dtype=bool)
+    iterations = 0
+    for iterations in range(1, max_iter + 1):
+        if tax_rate is not None:
+            taxes = -tax.income_taxes((ebitda - depreciation - interest) * operating, tax_rate, nol_limit)[0]
+        else:
+            taxes = schedule['taxes']
+        cfads = ebitda + taxes
+
+        # Sculpted service and the debt it supports, limited by the gearing cap
+        target_service = np.maximum(cfads, 0) / target_dscr * in_tenor
+        supported = np.sum(target_service * discount, axis=-1, keepdims=True)
+        debt_amount = np.minimum(supported, debt_cap)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scale = np.where(supported > 0, debt_amount / supported, 0.0)
+        debt_service = target_service * scale
+
+        # Opening balance = debt less the present value of service already paid, rolled forward
+        paid = np.cumsum(debt_service * discount, axis=-1) - debt_service * discount
+        opening = np.maximum(debt_amount - paid, 0) * growth * in_tenor
+        new_interest = rate * opening
+
+        change = np.max(np.abs(new_interest - interest), axis=-1)
+        interest = new_interest
+        converged = change <= tol * np.maximum(debt_amount[..., 0], 1.0)
+        if tax_rate is None or converged.all():
+            break
+
+    principal = debt_service - interest
+    profile = dscr_profile(cfads, debt_service)
+    return {
+        'debt_amount': debt_amount[..., 0],
+        'gearing_limited': supported[..., 0] > debt_cap[..., 0],
+        'cfads': cfads,
+        'taxes': taxes,
+        'debt_service': debt_service,
+        'interest': interest,
+        'principal': principal,
+        'opening_balance': opening,
+        'closing_balance': (opening - principal) * in_tenor,
+        'dscr': profile['dscr'],
+        'min_dscr': profile['min_dscr'],
+        'avg_dscr': profile['avg_dscr'],
+        'iterations': iterations,
+        'converged': converged,
+    }
+
+
+def sculpt_schedule(schedule, target_dscr, interest_rate=0.05, max_gearing=0.7, **kwargs):
+    """
+    Replace the level annuity debt in a schedule with sculpted debt.
+
+    Rows whose target_dscr is NaN keep their original debt. Other keyword
+    arguments are passed to sculpt_debt.
+
+    Returns: (schedule with updated debt, taxes and net cash flows, sculpt_debt result)
+    """
+    target_dscr = np.asarray(target_dscr, dtype=float)
+    rows = np.broadcast_to(~np.isnan(target_dscr), schedule['revenue'].shape[:-1])
+    debt = sculpt_debt(schedule, np.where(rows, target_dscr, DEFAULT_TARGET_DSCR), interest_rate,
+                       max_gearing, **kwargs)
+
+    def pick(new, old):
+        return np.where(rows[..., np.newaxis] if np.ndim(old) > rows.ndim else rows, new, old)
+
+    sculpted = dict(schedule)
+    sculpted['debt_service'] = pick(-debt['debt_service'], schedule['debt_service'])
+    sculpted['taxes'] = pick(debt['taxes'], schedule['taxes'])
+    sculpted['debt_drawdown'] = pick(debt['debt_amount'], schedule['debt_drawdown'])
+
+    net = sum(sculpted[name] for name in CASH_FLOW_COLUMNS
+              if name not in ('energy_production_mwh', 'net_cash_flow', 'cumulative_cash_flow'))
+    net[..., 0] += sculpted['debt_drawdown']
+    sculpted['net_cash_flow'] = net
+    sculpted['cumulative_cash_flow'] = np.cumsum(net, axis=-1)
+    return sculpted, debt
+
+
+def schedule_dscr(schedule):
+    """Minimum DSCR of each row of a schedule, NaN for rows without debt."""
+    return dscr_profile(cash_flow_available_for_debt_service(schedule),
+                        -schedule['debt_service'])['min_dscr']
@@ -0,0 +1,412 @@
+"""
+Server-side exports for the Energy Finance application.
+Cash-flow schedules, portfolio results and climate analyses are read in
+batches of column arrays and written batch by batch: CSV and JSON straight
+into the response, Parquet row group by row group and NetCDF slab by slab
+into a temporary file that is streamed back and deleted. Memory stays
+bounded by one batch however large the export.
+"""
+
+import csv
+import io
+import json
+import os
+import tempfile
+
+import netCDF4
+import numpy as np
+
+import finance
+from app import db
+from cashflows import DEFAULT_SCENARIO, load_packed_schedules
+from climate import load_analysis
+from models import CashFlow, CashFlowSchedule, FinancialMetric, Project, ScenarioResult
+from portfolio import BREAKDOWN_DIMENSIONS
+from utils import SCENARIO_METRICS
+
+
+# Export formats, with the response MIME type and file extension of each
+EXPORT_FORMATS = ('csv', 'json', 'parquet', 'netcdf')
+EXPORT_MIMETYPES = {
+    'csv': 'text/csv',
+    'json': 'application/json',
+    'parquet': 'application/vnd.apache.parquet',
+    'netcdf': 'application/x-netcdf',
+}
+EXPORT_EXTENSIONS = {'csv': 'csv', 'json': 'json', 'parquet': 'parquet', 'netcdf': 'nc'}
+
+# Rows read from the database or result file per batch
+EXPORT_BATCH_ROWS = 100_000
+
+# Projects per batch when exporting packed schedules
+EXPORT_BATCH_PROJECTS = 2000
+
+# Rows per NetCDF chunk along the unlimited row dimension
+NETCDF_CHUNK_ROWS = 65536
+
+# Bytes per chunk when streaming a finished export file
+FILE_CHUNK_BYTES = 1 << 20
+
+# Cash-flow columns read from storage
+STORED_CASH_FLOW_COLUMNS = ('project_id', 'year') + finance.CASH_FLOW_COLUMNS
+
+# Stored components that, with the year-0 debt drawdown, sum to net_cash_flow
+CASH_FLOW_COMPONENTS = ('capex', 'revenue', 'opex', 'maintenance', 'insurance', 'taxes', 'debt_service',
+                        'incentives', 'salvage_value')
+
+# net_cash_flow is the levered equity cash flow; debt_drawdown is exported so the
+# components reconcile to it
+CASH_FLOW_EXPORT_COLUMNS = STORED_CASH_FLOW_COLUMNS + ('debt_drawdown',)
+
+PORTFOLIO_EXPORT_COLUMNS = (('project_id', 'name', 'project_type', 'status', 'location', 'capacity_mw', 'capex')
+                            + SCENARIO_METRICS)
+
+
+def check_format(export_format):
+    """
+    Raises: ValueError for an unknown format, or Parquet without pyarrow
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {export_format}. Expected one of {', '.join(EXPORT_FORMATS)}")
+    if export_format == 'parquet':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ValueError("Parquet export requires pyarrow")
+
+
+def _column_arrays(names, rows, text=()):
+    """
+    Transpose fetched rows into one array per column: text columns as object
+    arrays with None as '', numeric columns with None as NaN.
+    """
+    batch = {}
+    for name, values in zip(names, zip(*rows)):
+        if name in text:
+            batch[name] = np.array(['' if value is None else value for value in values], dtype=object)
+        else:
+            batch[name] = np.array(values)
+            if batch[name].dtype == object:
+                batch[name] = batch[name].astype(float)
+    return batch
+
+
+def _with_debt_drawdown(batch):
+    """
+    Add the debt drawdown, recovered as the part of the year-0 net cash flow
+    that no stored component carries.
+    """
+    residual = batch['net_cash_flow'] - sum(batch[name] for name in CASH_FLOW_COMPONENTS)
+    batch['debt_drawdown'] = np.where(batch['year'] == 0, residual, 0.0)
+    return batch
+
+
+def cash_flow_batches(project_ids=None, storage='rows', scenario=DEFAULT_SCENARIO, batch_rows=EXPORT_BATCH_ROWS):
+    """
+    Stored cash-flow schedules in long format, one row per project-year.
+
+    CashFlow rows are paged by primary key so each batch is one indexed range
+    query; packed schedules are read EXPORT_BATCH_PROJECTS projects at a time.
+
+    Parameters:
+    - project_ids: Projects to export, or None for all
+    - storage: 'rows' for CashFlow rows or 'packed' for CashFlowSchedule blobs
+    - scenario: Scenario of the packed schedules
+    - batch_rows: Rows per batch of CashFlow rows
+
+    Yields: dicts of equal-length arrays keyed by CASH_FLOW_EXPORT_COLUMNS
+
+    Raises: ValueError for an unknown storage mode
+    """
+    if storage == 'packed':
+        query = db.session.query(CashFlowSchedule.project_id).filter(CashFlowSchedule.scenario == scenario)
+        if project_ids is not None:
+            query = query.filter(CashFlowSchedule.project_id.in_(list(project_ids)))
+        stored_ids = [row[0] for row in query.order_by(CashFlowSchedule.project_id)]
+        for start in range(0, len(stored_ids), EXPORT_BATCH_PROJECTS):
+            schedules = load_packed_schedules(stored_ids[start:start + EXPORT_BATCH_PROJECTS], scenario)
+            schedules = [(project_id, schedules[project_id]) for project_id in sorted(schedules)]
+            batch = {'project_id': np.concatenate([np.full(schedule['year'].size, project_id)
+                                                   for project_id, schedule in schedules])}
+            for name in STORED_CASH_FLOW_COLUMNS[1:]:
+                batch[name] = np.concatenate([schedule[name] for _, schedule in schedules])
+            yield _with_debt_drawdown(batch)
+        return
+    if storage != 'rows':
+        raise ValueError(f"Unknown cash-flow storage: {storage}")
+
+    columns = [getattr(CashFlow, name) for name in STORED_CASH_FLOW_COLUMNS]
+    last_id = 0
+    while True:
+        query = db.session.query(CashFlow.id, *columns).filter(CashFlow.id > last_id)
+        if project_ids is not None:
+            query = query.filter(CashFlow.project_id.in_(list(project_ids)))
+        rows = query.order_by(CashFlow.id).limit(batch_rows).all()
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        yield _with_debt_drawdown(_column_arrays(STORED_CASH_FLOW_COLUMNS, [row[1:] for row in rows]))
+
+
+def portfolio_batches(filters=None, scenario_id=None, batch_rows=EXPORT_BATCH_ROWS):
+    """
+    One row per project with its attributes and stored financial metrics.
+
+    Parameters:
+    - filters: dict mapping BREAKDOWN_DIMENSIONS names to required values
+    - scenario_id: Take the metrics from this scenario's ScenarioResult rows
+      instead of the current FinancialMetric
+    - batch_rows: Projects per batch
+
+    Yields: dicts of equal-length arrays keyed by PORTFOLIO_EXPORT_COLUMNS,
+    with NaN metrics for projects not yet calculated
+
+    Raises: ValueError for a filter outside BREAKDOWN_DIMENSIONS
+    """
+    for name in filters or {}:
+        if name not in BREAKDOWN_DIMENSIONS:
+            raise ValueError(f"Cannot filter projects by {name}")
+    if scenario_id is None:
+        metrics, joined = FinancialMetric, FinancialMetric.project_id == Project.id
+    else:
+        metrics = ScenarioResult
+        joined = (ScenarioResult.project_id == Project.id) & (ScenarioResult.scenario_id == scenario_id)
+    columns = ([Project.id] + [getattr(Project, name) for name in PORTFOLIO_EXPORT_COLUMNS[1:7]]
+               + [getattr(metrics, name) for name in SCENARIO_METRICS])
+    last_id = 0
+    while True:
+        query = db.session.query(*columns).outerjoin(metrics, joined).filter(Project.id > last_id)
+        for name, value in (filters or {}).items():
+            query = query.filter(getattr(Project, name) == value)
+        rows = query.order_by(Project.id).limit(batch_rows).all()
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        yield _column_arrays(PORTFOLIO_EXPORT_COLUMNS, rows, text=('name', 'project_type', 'status', 'location'))
+
+
+def _analysis_axes(metadata):
+    """Name and values of the stacked axis of an analysis result, or None"""
+    if 'times' in metadata:
+        return 'year', np.array([int(year) for year in metadata['times']])
+    if 'months' in metadata:
+        return 'month', np.arange(1, len(metadata['months']) + 1)
+    return None
+
+
+def analysis_columns(analysis):
+    """Column names of analysis_batches for a completed analysis"""
+    arrays, metadata = load_analysis(analysis)
+    axis = _analysis_axes(metadata)
+    results = [name for name in arrays if name not in ('latitude', 'longitude')]
+    return ['latitude', 'longitude'] + ([axis[0]] if axis else []) + results
+
+
+def analysis_batches(analysis, batch_rows=EXPORT_BATCH_ROWS):
+    """
+    A completed climate analysis in long format, one row per grid cell (and
+    year or month for results with a stacked axis), a band of latitudes per batch.
+
+    Yields: dicts of equal-length arrays keyed by analysis_columns
+    """
+    arrays, metadata = load_analysis(analysis)
+    latitude, longitude = arrays.pop('latitude'), arrays.pop('longitude')
+    axis = _analysis_axes(metadata)
+    steps = axis[1].size if axis else 1
+    band = max(1, batch_rows // (longitude.size * steps))
+    for start in range(0, latitude.size, band):
+        stop = min(start + band, latitude.size)
+        # Row order is latitude, longitude, then the stacked axis
+        lat, lon, step = np.meshgrid(latitude[start:stop], longitude, np.arange(steps), indexing='ij')
+        batch = {'latitude': lat.ravel(), 'longitude': lon.ravel()}
+        if axis:
+            batch[axis[0]] = axis[1][step.ravel()]
+        for name, values in arrays.items():
+            if values.ndim == 3:
+                batch[name] = np.moveaxis(values[:, start:stop], 0, -1).ravel()
+            else:
+                batch[name] = np.repeat(values[start:stop].ravel(), steps)
+        yield batch
+
+
+def stream_csv(columns, batches):
+    """
+    Yields: CSV text, a header line then one chunk per batch, with NaN and
+    missing values as empty fields
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue()
+    for batch in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        values = [np.where(np.isnan(batch[name]), None, batch[name]).tolist() if batch[name].dtype.kind == 'f'
+                  else batch[name].tolist() for name in columns]
+        writer.writerows(zip(*values))
+        yield buffer.getvalue()
+
+
+def stream_json(columns, batches):
+    """
+    Yields: JSON text fragments that concatenate to an array of records, NaN as null
+    """
+    yield '['
+    first = True
+    for batch in batches:
+        values = [np.where(np.isnan(batch[name]), None, batch[name]).tolist() if batch[name].dtype.kind == 'f'
+                  else batch[name].tolist() for name in columns]
+        records = json.dumps([dict(zip(columns, record)) for record in zip(*values)])
+        if len(records) > 2:
+            yield ('' if first else ',') + records[1:-1]
+            first = False
+    yield ']'
+
+
+def write_parquet(path, columns, batches):
+    """
+    Write batches to a Parquet file, one row group per batch. Requires pyarrow.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    try:
+        for batch in batches:
+            table = pa.table({name: batch[name] for name in columns})
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+        if writer is None:
+            pq.write_table(pa.table({name: pa.array([], pa.float64()) for name in columns}), path)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def write_netcdf(path, columns, batches, attributes=None):
+    """
+    Write batches to a NetCDF4 file as one variable per column along an
+    unlimited 'row' dimension, text columns as variable-length strings.
+    """
+    with netCDF4.Dataset(path, 'w', format='NETCDF4') as output:
+        output.createDimension('row', None)
+        output.setncatts(attributes or {})
+        variables = {}
+        rows = 0
+        for batch in batches:
+            size = len(batch[columns[0]])
+            for name in columns:
+                values = batch[name]
+                if name not in variables:
+                    if values.dtype.kind in 'OU':
+                        variables[name] = output.createVariable(name, str, ('row',))
+                    else:
+                        variables[name] = output.createVariable(name, values.dtype, ('row',), zlib=True,
+                                                                chunksizes=(NETCDF_CHUNK_ROWS,))
+                variables[name][rows:rows + size] = values
+            rows += size
+
+
+def write_analysis_netcdf(path, analysis):
+    """
+    Write a completed climate analysis to NetCDF4 as gridded variables on
+    latitude and longitude (and year or month), with the analysis metadata
+    as attributes.
+    """
+    arrays, metadata = load_analysis(analysis)
+    latitude, longitude = arrays.pop('latitude'), arrays.pop('longitude')
+    axis = _analysis_axes(metadata)
+    with netCDF4.Dataset(path, 'w', format='NETCDF4') as output:
+        output.setncatts({
+            'analysis_type': analysis.analysis_type,
+            'variable': analysis.variable,
+            'parameters': analysis.parameters,
+            'source_dataset_id': analysis.dataset_id,
+        })
+        for name, values in (('latitude', latitude), ('longitude', longitude)) + ((axis,) if axis else ()):
+            output.createDimension(name, values.size)
+            output.createVariable(name, values.dtype, (name,))[:] = values
+        output['latitude'].units = 'degrees_north'
+        output['longitude'].units = 'degrees_east'
+        for name, values in arrays.items():
+            dimensions = (axis[0], 'latitude', 'longitude') if values.ndim == 3 else ('latitude', 'longitude')
+            variable = output.createVariable(name, values.dtype, dimensions, zlib=True, fill_value=np.nan)
+            variable[:] = values
+            if metadata.get('units'):
+                # Annual rates are per year of the stored total's units
+                variable.units = metadata['units'] + (' year-1' if name.startswith('annual_') else '')
+        for name, value in metadata.items():
+            if name not in ('units', 'times', 'months') and isinstance(value, (str, int, float)):
+                output.setncattr(name, value)
+
+
+def stream_file(path, chunk_size=FILE_CHUNK_BYTES):
+    """
+    Yields: the bytes of a file chunk by chunk, removing the file afterwards
+    """
+    try:
+        with open(path, 'rb') as source:
+            while True:
+                chunk = source.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.remove(path)
+
+
+def _temporary_path(export_format):
+    handle, path = tempfile.mkstemp(suffix='.' + EXPORT_EXTENSIONS[export_format])
+    os.close(handle)
+    return path
+
+
+def stream_export(export_format, columns, batches, attributes=None):
+    """
+    Stream batches in an export format.
+
+    CSV and JSON are generated as the batches are read; Parquet and NetCDF
+    need a seekable file, so they are written to a temporary file first and
+    that is streamed.
+
+    Parameters:
+    - export_format: One of EXPORT_FORMATS
+    - columns: Column names, in output order
+    - batches: Iterable of dicts of equal-length arrays keyed by column
+    - attributes: Global attributes of a NetCDF export
+
+    Yields: str chunks for CSV and JSON, bytes for Parquet and NetCDF
+    """
+    if export_format == 'csv':
+        yield from stream_csv(columns, batches)
+    elif export_format == 'json':
+        yield from stream_json(columns, batches)
+    else:
+        path = _temporary_path(export_format)
+        try:
+            if export_format == 'parquet':
+                write_parquet(path, columns, batches)
+            else:
+                write_netcdf(path, columns, batches, attributes)
+        except Exception:
+            os.remove(path)
+            raise
+        yield from stream_file(path)
+
+
+def stream_analysis_export(export_format, analysis):
+    """
+    Stream a completed climate analysis: gridded for NetCDF, long format
+    otherwise (see analysis_batches).
+    """
+    if export_format != 'netcdf':
+        yield from stream_export(export_format, analysis_columns(analysis), analysis_batches(analysis))
+        return
+    path = _temporary_path(export_format)
+    try:
+        write_analysis_netcdf(path, analysis)
+    except Exception:
+        os.remove(path)
+        raise
+    yield from stream_file(path)
@@ -0,0 +1,303 @@
+"""
+Vectorized cash-flow engine for the Energy Finance application.
+Cash-flow schedules are built as NumPy arrays with the year on the last axis,
+so one call can evaluate a single project or a whole batch of projects.
+"""
+
+import numpy as np
+
+import tax
+from returns import mirr
+
+
+# Default assumptions used when a project or request does not supply them
+DEFAULT_PPA_PRICE = 50.0  # $/MWh
+DEFAULT_DEBT_TERM = 18  # years
+
+# Columns of the CashFlow table produced by cash_flow_schedule
+CASH_FLOW_COLUMNS = (
+    'capex',
+    'revenue',
+    'opex',
+    'maintenance',
+    'insurance',
+    'taxes',
+    'debt_service',
+    'incentives',
+    'salvage_value',
+    'energy_production_mwh',
+    'net_cash_flow',
+    'cumulative_cash_flow',
+)
+
+# Keyword arguments of cash_flow_schedule that batch evaluators take from their input dicts
+CASH_FLOW_INPUTS = ('capex', 'opex', 'energy_mwh', 'lifetime_years', 'degradation_rate', 'inflation_rate',
+                    'debt_ratio', 'interest_rate', 'debt_term', 'ppa_price', 'ppa_escalation', 'ppa_term',
+                    'salvage_fraction', 'merchant_revenue', 'ppa_share', 'market_revenue', 'tax_rate',
+                    'depreciation_method', 'depreciation_years', 'itc_rate', 'ptc_rate', 'ptc_years',
+                    'nol_limit')
+
+
+def cash_flow_inputs(values):
+    """
+    Select the cash_flow_schedule keyword arguments from a mapping of inputs,
+    dropping other keys such as discount_rate or target_dscr.
+    """
+    return {name: values[name] for name in CASH_FLOW_INPUTS if name in values}
+
+
+def cash_flow_schedule(capex, opex, energy_mwh, lifetime_years, degradation_rate=0.5,
+                       inflation_rate=0.025, debt_ratio=0.7, interest_rate=0.05,
+                       debt_term=DEFAULT_DEBT_TERM, ppa_price=DEFAULT_PPA_PRICE,
+                       ppa_escalation=0.0, ppa_term=None, salvage_fraction=0.0,
+                       merchant_revenue=0.0, ppa_share=1.0, market_revenue=None,
+                       tax_rate=tax.DEFAULT_TAX_RATE, depreciation_method=tax.DEFAULT_DEPRECIATION_METHOD,
+                       depreciation_years=tax.DEFAULT_DEPRECIATION_YEARS, itc_rate=0.0, ptc_rate=0.0,
+                       ptc_years=tax.PTC_YEARS, nol_limit=tax.NOL_LIMIT, n_years=None):
+    """
+    Build year-by-year cash flows for one or many projects in a single pass.
+
+    All parameters are scalars or arrays that broadcast to a common batch shape.
+    Year 0 holds the investment, years 1-N the operational period.
+
+    Parameters:
+    - capex: Total capital expenditure ($)
+    - opex: Operating expenditure in the first operational year ($)
+    - energy_mwh: Energy production in the first operational year (MWh)
+    - lifetime_years: Operational lifetime in years
+    - degradation_rate: Annual production degradation (%)
+    - inflation_rate: Annual opex inflation (fraction)
+    - debt_ratio: Share of capex funded by debt (fraction)
+    - interest_rate: Interest rate on debt (fraction)
+    - debt_term: Debt tenor in years, capped at the lifetime
+    - ppa_price: PPA price in the first operational year ($/MWh)
+    - ppa_escalation: Annual PPA price escalation (fraction)
+    - ppa_term: PPA term in years (default: whole lifetime); energy sold after
+      the term is priced at the initial PPA price indexed to inflation
+    - salvage_fraction: End-of-life value as a fraction of capex
+    - merchant_revenue: Revenue earned at market prices outside the PPA in the
+      first operational year ($), e.g. storage arbitrage; indexed to inflation
+    - ppa_share: Share of energy sold under the PPA (fraction); the rest is
+      merchant energy whose value comes in through market_revenue
+    - market_revenue: Optional revenue from merchant energy per operational
+      year ($), batch shape + (years,) with year 1 first; later years get none
+    - tax_rate: Income tax rate (fraction); taxable income is operating income
+      less interest and tax depreciation, with losses carried forward
+    - depreciation_method: 'macrs', 'straight_line' or 'none', or its tax.method_code
+    - depreciation_years: MACRS recovery period or straight-line period in years
+    - itc_rate: Investment tax credit as a fraction of capex, which also
+      reduces the depreciable basis
+    - ptc_rate: Production tax credit in the first operational year ($/MWh),
+      indexed to inflation
+    - ptc_years: Years of operation that earn the PTC
+    - nol_limit: Share of taxable income that carried-forward losses may offset
+    - n_years: Number of operational years in the output (default: longest lifetime)
+
+    Returns: dict mapping 'year' and each CASH_FLOW_COLUMNS entry to arrays of
+    shape batch + (n_years + 1,). Also includes 'debt_drawdown' (debt funding
+    received in year 0, not a CashFlow column), 'lifetime_years', and the
+    'interest', 'depreciation', 'tax_rate' and 'nol_limit' taxes were computed with.
+    """
+    if ppa_term is None:
+        ppa_term = lifetime_years
+    (capex, opex, energy_mwh, lifetime_years, degradation_rate, inflation_rate,
+     debt_ratio, interest_rate, debt_term, ppa_price, ppa_escalation, ppa_term,
+     salvage_fraction, merchant_revenue, ppa_share, tax_rate, depreciation_years, itc_rate, ptc_rate,
+     ptc_years, nol_limit) = np.broadcast_arrays(*(
+        np.asarray(value, dtype=float) for value in (
+            capex, opex, energy_mwh, lifetime_years, degradation_rate, inflation_rate,
+            debt_ratio, interest_rate, debt_term, ppa_price, ppa_escalation, ppa_term,
+            salvage_fraction, merchant_revenue, ppa_share, tax_rate, depreciation_years, itc_rate,
+            ptc_rate, ptc_years, nol_limit)))
+
+    if n_years is None:
+        n_years = int(np.max(lifetime_years)) if lifetime_years.size else 0
+
+    year = np.arange(n_years + 1)
+    # Operational age: 0 in the first operational year
+    age = np.maximum(year - 1, 0)
+
+    def per_year(value):
+        return value[..., np.newaxis]
+
+    life = per_year(lifetime_years)
+    operating = (year >= 1) & (year <= life)
+
+    # Energy and revenue
+    energy = per_year(energy_mwh) * (1 - per_year(degradation_rate) / 100) ** age * operating
+    price = np.where(
+        year <= per_year(ppa_term),
+        per_year(ppa_price) * (1 + per_year(ppa_escalation)) ** age,
+        per_year(ppa_price) * (1 + per_year(inflation_rate)) ** age,
+    )
+    revenue = energy * per_year(ppa_share) * price
+    revenue = revenue + per_year(merchant_revenue) * (1 + per_year(inflation_rate)) ** age * operating
+    if market_revenue is not None:
+        market_revenue = np.asarray(market_revenue, dtype=float)
+        market = np.zeros(market_revenue.shape[:-1] + (n_years + 1,))
+        covered = min(market_revenue.shape[-1], n_years)
+        market[..., 1:covered + 1] = market_revenue[..., :covered]
+        revenue = revenue + market * operating
+
+    # Operating costs indexed to inflation
+    opex_flow = -per_year(opex) * (1 + per_year(inflation_rate)) ** age * operating
+
+    # Level annuity debt service over the debt term
+    debt = debt_ratio * capex
+    term = np.minimum(debt_term, lifetime_years)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        payment = np.where(
+            interest_rate > 0,
+            debt * interest_rate / (1 - (1 + interest_rate) ** -term),
+            debt / term,
+        )
+    payment = np.where(term > 0, payment, 0.0)
+    in_term = (year >= 1) & (year <= per_year(term))
+    debt_service = -per_year(payment) * in_term
+
+    # Interest part of the level payment: the rate times the balance owed at the start of the year
+    growth = (1 + per_year(interest_rate)) ** np.maximum(year - 1, 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        repaid = np.where(per_year(interest_rate) > 0,
+                          per_year(payment) * (growth - 1) / per_year(interest_rate),
+                          per_year(payment) * np.maximum(year - 1, 0))
+    interest = per_year(interest_rate) * np.maximum(per_year(debt) * growth - repaid, 0) * in_term
+
+    # Capex is spent and debt drawn in year 0, salvage received in the final year
+    capex_flow = -per_year(capex) * (year == 0)
+    debt_drawdown = np.where(term > 0, debt, 0.0)
+    salvage = per_year(salvage_fraction * capex) * (year == life)
+
+    # Income taxes after depreciation and interest, and credits earned
+    depreciation = tax.depreciation(capex, depreciation_method, depreciation_years, lifetime_years, n_years,
+                                    itc_rate)
+    taxes, _ = tax.income_taxes((revenue + opex_flow - interest - depreciation) * operating, tax_rate, nol_limit)
+    incentives = tax.tax_credits(capex, energy, itc_rate, ptc_rate, ptc_years, inflation_rate)
+
+    net_cash_flow = capex_flow + revenue + opex_flow - taxes + debt_service + incentives + salvage
+    net_cash_flow[..., 0] += debt_drawdown
+
+    return {
+        'year': year,
+        'capex': capex_flow,
+        'revenue': revenue,
+        'opex': opex_flow,
+        'maintenance': np.zeros(revenue.shape),
+        'insurance': np.zeros(revenue.shape),
+        'taxes': -taxes,
+        'debt_service': debt_service,
+        'incentives': incentives,
+        'salvage_value': salvage,
+        'energy_production_mwh': energy,
+        'net_cash_flow': net_cash_flow,
+        'cumulative_cash_flow': np.cumsum(net_cash_flow, axis=-1),
+        'debt_drawdown': debt_drawdown,
+        'lifetime_years': lifetime_years,
+        'interest': interest,
+        'depreciation': depreciation,
+        'tax_rate': tax_rate,
+        'nol_limit': nol_limit,
+    }
+
+
+def cash_flow_matrix(project_ids, years, values):
+    """
+    Pivot CashFlow rows into a (projects x years) matrix.
+
+    Parameters:
+    - project_ids: project_id of each row
+    - years: year of each row
+    - values: value of each row, e.g. net_cash_flow
+
+    Returns: (sorted unique project ids, matrix) with missing years filled with zeros
+    """
+    ids, rows = np.unique(np.asarray(project_ids), return_inverse=True)
+    years = np.asarray(years, dtype=int)
+    matrix = np.zeros((ids.size, years.max() + 1 if years.size else 0))
+    matrix[rows, years] = values
+    return ids, matrix
+
+
+def discount_factors(rate, n_periods):
+    """
+    Discount factors (1 + rate)^-t for t = 0..n_periods-1, broadcast over rate.
+    """
+    rate = np.asarray(rate, dtype=float)
+    return (1 + rate[..., np.newaxis]) ** -np.arange(n_periods)
+
+
+def npv(cash_flows, rate):
+    """
+    Net present value of cash flows (year on the last axis) at a discount rate.
+    """
+    cash_flows = np.asarray(cash_flows, dtype=float)
+    return np.sum(cash_flows * discount_factors(rate, cash_flows.shape[-1]), axis=-1)
+
+
+def payback_period(cash_flows):
+    """
+    Payback period in years, interpolated within the year the cumulative
+    cash flow turns non-negative. NaN where the investment is never recovered.
+    """
+    cash_flows = np.asarray(cash_flows, dtype=float)
+    cumulative = np.cumsum(cash_flows, axis=-1)
+    recovered = cumulative >= 0
+    first = np.argmax(recovered, axis=-1)[..., np.newaxis]
+
+    previous = np.take_along_axis(cumulative, np.maximum(first - 1, 0), axis=-1)
+    current = np.take_along_axis(cash_flows, first, axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        period = np.where(first > 0, first - 1 - previous / current, 0.0)[..., 0]
+    return np.where(recovered.any(axis=-1), period, np.nan)
+
+
+def lcoe(schedule, discount_rate):
+    """
+    Levelized cost of energy ($/MWh): discounted capex and operating costs
+    divided by discounted energy production, on an unlevered basis.
+    """
+    n_periods = schedule['year'].shape[-1]
+    factors = discount_factors(discount_rate, n_periods)
+    costs = -(schedule['capex'] + schedule['opex'] + schedule['maintenance']
+              + schedule['insurance'])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (np.sum(costs * factors, axis=-1)
+                / np.sum(schedule['energy_production_mwh'] * factors, axis=-1))
+
+
+def profitability_index(cash_flows, rate):
+    """
+    Present value of future cash flows divided by the initial investment.
+    NaN where there is no initial outflow.
+    """
+    cash_flows = np.asarray(cash_flows, dtype=float)
+    factors = discount_factors(rate, cash_flows.shape[-1])
+    future_value = np.sum(cash_flows[..., 1:] * factors[..., 1:], axis=-1)
+    investment = -cash_flows[..., 0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(investment > 0, future_value / investment, np.nan)
+
+
+def schedule_metrics(schedule, discount_rate, finance_rate, reinvest_rate=None):
+    """
+    Derive financial metrics from a schedule built by cash_flow_schedule.
+
+    Parameters:
+    - schedule: Output of cash_flow_schedule
+    - discount_rate: Discount rate (fraction), also the default reinvestment rate
+    - finance_rate: Finance rate for MIRR outflows, typically the interest rate
+    - reinvest_rate: Reinvestment rate for MIRR inflows
+
+    Returns: dict of metric arrays with the batch shape of the schedule
+    """
+    if reinvest_rate is None:
+        reinvest_rate = discount_rate
+    cash_flows = schedule['net_cash_flow']
+    return {
+        'npv': npv(cash_flows, discount_rate),
+        'payback_period': payback_period(cash_flows),
+        'lcoe': lcoe(schedule, discount_rate),
+        'profitability_index': profitability_index(cash_flows, discount_rate),
+        'mirr': mirr(cash_flows, finance_rate, reinvest_rate,
+                     n_periods=schedule['lifetime_years']),
+    }
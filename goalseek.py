@@ -0,0 +1,154 @@
+"""
+Goal seek for the Energy Finance application.
+Solves, for many projects at once, the PPA price, capex or performance ratio
+at which NPV reaches a target or the IRR reaches a hurdle rate.
+
+With level annuity debt the NPV is linear in each of these variables, so two
+batched evaluations give every root in closed form. Where that does not hold
+(sculpted debt) the remaining rows go to a vectorized bracketing root finder.
+"""
+
+import numpy as np
+
+import debt
+import finance
+from utils import SCENARIO_DEFAULTS, project_cash_flow_inputs
+
+
+# Variables that can be solved for
+GOAL_SEEK_VARIABLES = ('ppa_price', 'capex', 'performance_ratio')
+
+# Objectives: 'npv' reaches the target value, 'irr' reaches the target rate
+GOAL_SEEK_OBJECTIVES = ('npv', 'irr')
+
+
+def project_goal_inputs(projects, assumptions=None):
+    """
+    Batched engine parameters for a list of projects.
+
+    Returns: dict of arrays with one entry per project: the cash_flow_schedule
+    keyword arguments plus 'discount_rate', 'target_dscr' and 'performance_ratio'
+    """
+    rows = []
+    for project in projects:
+        row = {name: (assumptions or {}).get(name, default) for name, default in SCENARIO_DEFAULTS.items()}
+        row.update(project_cash_flow_inputs(project))
+        if row['ppa_term'] is None:
+            row['ppa_term'] = row['lifetime_years']
+        # The energy estimate already includes the project's performance ratio
+        row['performance_ratio'] = getattr(project, 'performance_ratio', None) or 1.0
+        rows.append(row)
+    return {name: np.array([row[name] if row[name] is not None else np.nan for row in rows], dtype=float)
+            for name in rows[0]} if rows else {}
+
+
+def _residual(params, variable, values, objective, target):
+    """Distance of each row from its goal with the variable set to values."""
+    values = np.asarray(values, dtype=float)
+    inputs = finance.cash_flow_inputs(params)
+    if variable == 'performance_ratio':
+        inputs['energy_mwh'] = params['energy_mwh'] * values / params['performance_ratio']
+    else:
+        inputs[variable] = values
+    schedule = finance.cash_flow_schedule(**inputs)
+    if not np.isnan(params['target_dscr']).all():
+        schedule, _ = debt.sculpt_schedule(schedule, params['target_dscr'],
+                                           interest_rate=params['interest_rate'],
+                                           max_gearing=params['debt_ratio'])
+    # IRR equals the hurdle where NPV at the hurdle rate is zero
+    if objective == 'irr':
+        return finance.npv(schedule['net_cash_flow'], target)
+    return finance.npv(schedule['net_cash_flow'], params['discount_rate']) - target
+
+
+def _bracket_and_solve(func, lo, hi, tol, max_iter):
+    """
+    Vectorized Illinois (modified regula falsi) root finder.
+
+    The upper bound is doubled until the residual changes sign; rows that
+    never bracket a root are returned as NaN.
+    """
+    f_lo, f_hi = func(lo), func(hi)
+    for _ in range(60):
+        open_rows = np.sign(f_lo) == np.sign(f_hi)
+        if not open_rows.any():
+            break
+        hi = np.where(open_rows, hi * 2, hi)
+        f_hi = np.where(open_rows, func(hi), f_hi)
+    bracketed = np.sign(f_lo) != np.sign(f_hi)
+
+    x = np.where(bracketed, hi, np.nan)
+    converged = ~bracketed
+    side = np.zeros(lo.shape)
+    for _ in range(max_iter):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            step = np.where(converged, x, (lo * f_hi - hi * f_lo) / (f_hi - f_lo))
+        f_x = func(np.where(np.isnan(step), lo, step))
+        converged |= (np.abs(step - x) <= tol * np.maximum(np.abs(step), 1.0)) | (f_x == 0)
+        x = step
+        if converged.all():
+            break
+        # x replaces the endpoint whose residual has the same sign; when the same
+        # endpoint is replaced twice running, the other residual is halved (Illinois)
+        left = np.sign(f_x) == np.sign(f_lo)
+        f_hi = np.where(left & (side == 1), f_hi / 2, f_hi)
+        f_lo = np.where(~left & (side == -1), f_lo / 2, f_lo)
+        lo, f_lo = np.where(left, x, lo), np.where(left, f_x, f_lo)
+        hi, f_hi = np.where(left, hi, x), np.where(left, f_hi, f_x)
+        side = np.where(left, 1, -1)
+    return np.where(bracketed, x, np.nan), bracketed & converged
+
+
+def goal_seek(params, variable, objective='npv', target=0.0, tol=1e-9, max_iter=100):
+    """
+    Solve for the variable value that meets the goal for every row.
+
+    Parameters:
+    - params: Batched inputs from project_goal_inputs
+    - variable: One of GOAL_SEEK_VARIABLES
+    - objective: 'npv' to reach an NPV of target, 'irr' to reach an IRR of target
+    - target: Target NPV ($) or IRR (fraction)
+    - tol: Relative tolerance of the root finder and of the linearity check
+    - max_iter: Root-finder iteration limit
+
+    Returns: dict with per-row arrays 'value' (NaN where there is no solution),
+    'closed_form' (solved by the linear fast path) and 'converged'
+
+    Raises: ValueError for an unknown variable or objective
+    """
+    if variable not in GOAL_SEEK_VARIABLES:
+        raise ValueError(f"Cannot solve for {variable}")
+    if objective not in GOAL_SEEK_OBJECTIVES:
+        raise ValueError(f"Unknown objective: {objective}")
+
+    def residual(values):
+        return _residual(params, variable, values, objective, target)
+
+    # Linear fast path: two evaluations give slope and intercept for every row
+    n = params['capex'].shape[0]
+    at_zero, at_one = residual(np.zeros(n)), residual(np.ones(n))
+    slope = at_one - at_zero
+    with np.errstate(divide='ignore', invalid='ignore'):
+        value = np.where(slope != 0, -at_zero / slope, np.nan)
+
+    # Keep the closed form only where the residual really vanishes there
+    scale = np.maximum(np.abs(at_zero), np.abs(slope)) + 1.0
+    closed_form = np.isfinite(value) & (value >= 0)
+    closed_form &= np.abs(residual(np.where(closed_form, value, 0.0))) <= 1e-6 * scale
+    converged = closed_form.copy()
+
+    pending = ~closed_form
+    if pending.any():
+        rows = np.flatnonzero(pending)
+        subset = {name: values[rows] for name, values in params.items()}
+
+        def residual_subset(values):
+            return _residual(subset, variable, values, objective, target)
+
+        start = np.where(np.isfinite(value[rows]) & (value[rows] > 0), value[rows], 1.0)
+        solved, ok = _bracket_and_solve(residual_subset, np.zeros(rows.size), start * 2, tol, max_iter)
+        value[rows] = solved
+        converged[rows] = ok
+    value = np.where(closed_form | converged, value, np.nan)
+
+    return {'value': value, 'closed_form': closed_form, 'converged': converged}
@@ -0,0 +1,313 @@
+"""
+Streaming bulk project import for the Energy Finance application.
+CSV files are read in chunks and Excel workbooks row by row, each batch is
+validated with column-wise operations and inserted with one bulk INSERT.
+"""
+
+import os
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import insert
+
+from app import db
+from models import HybridProject, SolarProject, WindProject
+from solar import TRACKING_TYPES
+from tax import DEPRECIATION_METHODS, MACRS_PERCENTAGES
+from utils import PROJECT_TEMPLATE_DATA
+
+
+# Rows validated and inserted per batch
+IMPORT_BATCH_SIZE = 5000
+
+# Largest number of row errors kept in the report
+MAX_REPORTED_ERRORS = 1000
+
+TEMPLATE_COLUMNS = tuple(PROJECT_TEMPLATE_DATA)
+REQUIRED_COLUMNS = ('name', 'capacity_mw', 'project_type')
+
+FLOAT_COLUMNS = ('capacity_mw', 'capex', 'capex_per_mw', 'opex_per_year', 'opex_per_mw',
+                 'panel_efficiency', 'panel_capacity_w', 'latitude', 'longitude', 'tilt_angle',
+                 'azimuth', 'degradation_rate', 'performance_ratio', 'land_area_acres', 'itc_rate',
+                 'ptc_rate', 'hub_height_m', 'mean_wind_speed', 'measurement_height_m', 'weibull_k')
+INTEGER_COLUMNS = ('expected_lifetime_years', 'num_panels', 'depreciation_years')
+DATE_COLUMNS = ('start_date', 'commercial_operation_date')
+STRING_COLUMNS = ('name', 'description', 'location', 'project_type', 'status', 'panel_type',
+                  'tracking_type', 'depreciation_method')
+
+# Columns stored on solar_projects rather than projects
+SOLAR_COLUMNS = ('panel_type', 'panel_efficiency', 'num_panels', 'panel_capacity_w', 'latitude',
+                 'longitude', 'tilt_angle', 'azimuth', 'degradation_rate', 'performance_ratio',
+                 'land_area_acres', 'tracking_type')
+
+# Template columns wind_projects shares with solar_projects
+WIND_COLUMNS = ('latitude', 'longitude', 'degradation_rate')
+
+# Columns stored on wind_projects only
+WIND_RESOURCE_COLUMNS = ('hub_height_m', 'mean_wind_speed', 'measurement_height_m', 'weibull_k')
+
+# Allowed values and (low, high) ranges checked on every row
+ALLOWED_VALUES = {
+    'project_type': ('solar', 'hybrid', 'wind'),
+    'status': ('planning', 'construction', 'operational', 'decommissioned'),
+    'tracking_type': TRACKING_TYPES,
+    'depreciation_method': DEPRECIATION_METHODS,
+}
+VALUE_RANGES = {
+    'capacity_mw': (0, None),
+    'latitude': (-90, 90),
+    'longitude': (-180, 180),
+    'performance_ratio': (0, 1),
+    'expected_lifetime_years': (1, 100),
+    'depreciation_years': (1, 100),
+    'itc_rate': (0, 1),
+    'ptc_rate': (0, None),
+    'hub_height_m': (0, None),
+    'mean_wind_speed': (0, 40),
+    'measurement_height_m': (0, None),
+    'weibull_k': (0, None),
+}
+
+# Defaults mirroring the model column defaults
+DEFAULTS = {
+    'status': 'planning',
+    'expected_lifetime_years': 25,
+    'degradation_rate': 0.5,
+    'performance_ratio': 0.75,
+    'tracking_type': 'fixed',
+    'depreciation_method': 'macrs',
+    'depreciation_years': 5,
+    'itc_rate': 0.0,
+    'ptc_rate': 0.0,
+    'weibull_k': 2.0,
+}
+
+
+class ImportFormatError(ValueError):
+    """Raised when a file cannot be imported at all, e.g. missing required columns."""
+
+
+def read_batches(file_path, has_header=True, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Stream a CSV or Excel file as DataFrames of at most batch_size rows.
+
+    CSV files are read with pandas in chunks. .xlsx files are read through
+    openpyxl in read-only mode, one row at a time. Legacy .xls files cannot be
+    streamed and are read whole.
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    names = None if has_header else list(TEMPLATE_COLUMNS)
+
+    if extension == '.csv':
+        yield from pd.read_csv(file_path, chunksize=batch_size, dtype=str, keep_default_na=False,
+                               header=0 if has_header else None, names=names)
+    elif extension == '.xlsx':
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            rows = workbook.worksheets[0].iter_rows(values_only=True)
+            columns = names or [str(value).strip() if value is not None else ''
+                                for value in next(rows, ())]
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                yield pd.DataFrame([row[:len(columns)] for row in batch], columns=columns)
+        finally:
+            workbook.close()
+    else:
+        frame = pd.read_excel(file_path, header=0 if has_header else None, names=names)
+        for start in range(0, len(frame), batch_size):
+            yield frame.iloc[start:start + batch_size]
+
+
+def validate_batch(frame):
+    """
+    Validate and convert one batch of rows.
+
+    Parameters:
+    - frame: DataFrame with template columns as read from the file
+
+    Returns: (records, errors) where records is a list of dicts for valid rows
+    and errors maps the position of each invalid row to its messages
+    """
+    frame = frame.reset_index(drop=True)
+    n_rows = len(frame)
+    problems = [[] for _ in range(n_rows)]
+
+    def blank_mask(series):
+        return series.isna().to_numpy() | (series.astype(str).str.strip() == '').to_numpy()
+
+    def report(mask, message):
+        for position in np.flatnonzero(mask):
+            problems[position].append(message)
+
+    columns = {}
+    blanks = {}
+    for name in TEMPLATE_COLUMNS:
+        series = frame[name] if name in frame else pd.Series([None] * n_rows, dtype=object)
+        blanks[name] = blank_mask(series)
+
+        if name in FLOAT_COLUMNS or name in INTEGER_COLUMNS:
+            values = pd.to_numeric(series.where(~blanks[name]), errors='coerce').to_numpy(dtype=float)
+            report(np.isnan(values) & ~blanks[name], f"{name}: not a number")
+            if name in INTEGER_COLUMNS:
+                report(~np.isnan(values) & (values != np.round(values)), f"{name}: not a whole number")
+        elif name in DATE_COLUMNS:
+            parsed = pd.to_datetime(series.where(~blanks[name]), errors='coerce')
+            report(parsed.isna().to_numpy() & ~blanks[name], f"{name}: not a date (YYYY-MM-DD)")
+            values = parsed.dt.date.to_numpy(dtype=object)
+        else:
+            values = series.astype(str).str.strip().to_numpy(dtype=object)
+            if name in ('project_type', 'status', 'tracking_type', 'depreciation_method'):
+                values = np.char.lower(values.astype(str)).astype(object)
+            if name in ALLOWED_VALUES:
+                allowed = np.isin(values, ALLOWED_VALUES[name])
+                report(~allowed & ~blanks[name],
+                       f"{name}: must be one of {', '.join(ALLOWED_VALUES[name])}")
+        columns[name] = values
+
+    for name in REQUIRED_COLUMNS:
+        report(blanks[name], f"{name}: required")
+
+    for name, (low, high) in VALUE_RANGES.items():
+        values = columns[name]
+        with np.errstate(invalid='ignore'):
+            out_of_range = np.zeros(n_rows, dtype=bool)
+            if low is not None:
+                out_of_range |= values < low
+            if high is not None:
+                out_of_range |= values > high
+        report(out_of_range, f"{name}: out of range")
+
+    # MACRS only has tables for its recovery periods; a blank method means MACRS
+    macrs = (columns['depreciation_method'] == 'macrs') | blanks['depreciation_method']
+    report(macrs & ~blanks['depreciation_years'] & ~np.isin(columns['depreciation_years'], list(MACRS_PERCENTAGES)),
+           f"depreciation_years: MACRS recovery periods are {', '.join(map(str, MACRS_PERCENTAGES))} years")
+
+    # Fully empty rows (like the blank row in the template) are skipped silently
+    empty = np.logical_and.reduce([blanks[name] for name in TEMPLATE_COLUMNS])
+    invalid = np.array([bool(messages) for messages in problems], dtype=bool)
+    keep = ~empty & ~invalid
+
+    # Build the records column by column; blanks take the model default or NULL
+    record_columns = []
+    for name in TEMPLATE_COLUMNS:
+        values = columns[name][keep]
+        blank = blanks[name][keep]
+        column = np.full(values.shape[0], DEFAULTS.get(name), dtype=object)
+        if name in INTEGER_COLUMNS:
+            column[~blank] = values[~blank].astype(np.int64).tolist()
+        elif name in FLOAT_COLUMNS:
+            column[~blank] = values[~blank].tolist()
+        elif name in DATE_COLUMNS:
+            column[~blank] = list(values[~blank])
+        else:
+            column[~blank] = values[~blank]
+        record_columns.append(column.tolist())
+
+    records = [dict(zip(TEMPLATE_COLUMNS, row)) for row in zip(*record_columns)]
+    errors = {int(position): problems[position] for position in np.flatnonzero(invalid & ~empty)}
+    return records, errors
+
+
+def insert_projects(records):
+    """
+    Insert validated project records with one bulk INSERT per project class.
+
+    Solar rows become SolarProject rows, hybrid rows HybridProject rows with
+    their solar columns (storage is sized later), and wind rows WindProject
+    rows with the site, degradation and wind resource columns (joined-table
+    inheritance is handled by the ORM bulk insert).
+    """
+    def without(record, columns):
+        return {name: value for name, value in record.items() if name not in columns}
+
+    solar = [without(record, WIND_RESOURCE_COLUMNS) for record in records if record['project_type'] == 'solar']
+    hybrid = [without(record, WIND_RESOURCE_COLUMNS) for record in records if record['project_type'] == 'hybrid']
+    wind = [without(record, set(SOLAR_COLUMNS) - set(WIND_COLUMNS))
+            for record in records if record['project_type'] == 'wind']
+    if solar:
+        db.session.execute(insert(SolarProject), solar)
+    if hybrid:
+        db.session.execute(insert(HybridProject), hybrid)
+    if wind:
+        db.session.execute(insert(WindProject), wind)
+
+
+def count_rows(file_path, has_header=True):
+    """
+    Cheap estimate of the number of data rows, used for progress reporting.
+    CSV newlines are counted in binary blocks; Excel uses the sheet dimensions.
+    Returns None when the count is unknown.
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension == '.csv':
+        lines = 0
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                lines += block.count(b'\n')
+    elif extension == '.xlsx':
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(file_path, read_only=True)
+        lines = workbook.worksheets[0].max_row
+        workbook.close()
+        if lines is None:
+            return None
+    else:
+        return None
+    return max(lines - (1 if has_header else 0), 0)
+
+
+def import_projects(file_path, has_header=True, batch_size=IMPORT_BATCH_SIZE, progress=None):
+    """
+    Import projects from a CSV or Excel file in the template format.
+
+    Each batch is validated, inserted and committed before the next one is
+    read, so memory stays flat regardless of file size.
+
+    Parameters:
+    - file_path: Path of the uploaded file
+    - has_header: Whether the first row holds column names
+    - batch_size: Rows validated and inserted per batch
+    - progress: Optional callback called with (rows done, estimated total rows)
+
+    Returns: dict with 'rows', 'imported' and 'failed' counts and 'errors', a list
+    of {'row': spreadsheet row number, 'errors': [messages]}
+
+    Raises: ImportFormatError if required columns are missing
+    """
+    report = {'rows': 0, 'imported': 0, 'failed': 0, 'errors': [], 'errors_truncated': False}
+    first_row = 2 if has_header else 1
+    total_rows = count_rows(file_path, has_header) if progress else None
+
+    for frame in read_batches(file_path, has_header, batch_size):
+        if report['rows'] == 0:
+            missing = [name for name in REQUIRED_COLUMNS if name not in frame.columns]
+            if missing:
+                raise ImportFormatError(f"Missing required columns: {', '.join(missing)}")
+
+        records, errors = validate_batch(frame)
+        try:
+            insert_projects(records)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        for position, messages in sorted(errors.items()):
+            if len(report['errors']) < MAX_REPORTED_ERRORS:
+                report['errors'].append({'row': first_row + report['rows'] + position,
+                                         'errors': messages})
+            else:
+                report['errors_truncated'] = True
+        report['imported'] += len(records)
+        report['failed'] += len(errors)
+        report['rows'] += len(frame)
+        if progress:
+            progress(report['rows'], max(total_rows or 0, report['rows']))
+
+    return report
@@ -0,0 +1,129 @@
+"""
+In-process background jobs for the Energy Finance application.
+Long-running work (imports, valuations, Monte Carlo runs) is handed to a
+worker pool and tracked in the jobs table, so request threads return at once
+and clients poll /api/jobs/<id> for progress and results.
+"""
+
+import json
+import os
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from app import db
+from models import Job
+
+
+# Worker threads shared by all jobs; CPU-heavy jobs fan out to their own process pools
+executor = ThreadPoolExecutor(max_workers=int(os.environ.get('JOB_WORKERS', 4)),
+                              thread_name_prefix='job')
+
+# Minimum seconds between progress writes for one job
+PROGRESS_INTERVAL = 0.5
+
+
+class JobProgress:
+    """
+    Progress callback handed to job functions.
+
+    Call it with (done, total) or with a percentage; writes are throttled so
+    reporting from a tight loop does not flood the database.
+    """
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self._last_write = 0.0
+
+    def __call__(self, done, total=100):
+        now = time.monotonic()
+        if now - self._last_write < PROGRESS_INTERVAL or not total:
+            return
+        self._last_write = now
+        percent = min(100.0, 100.0 * done / total)
+        db.session.query(Job).filter_by(id=self.job_id).update({'progress': percent})
+        db.session.commit()
+
+
+def submit_job(app, kind, func, *args, **kwargs):
+    """
+    Create a job row and schedule func on the worker pool.
+
+    func is called inside an application context as
+    func(*args, progress=JobProgress, **kwargs) and must return a
+    JSON-serializable result, or a (result, result_path) tuple.
+
+    Parameters:
+    - app: Flask application providing the database configuration
+    - kind: Job kind recorded on the row, e.g. 'import'
+    - func: Callable doing the work
+
+    Returns: The new job id
+    """
+    job = Job(id=uuid.uuid4().hex, kind=kind, status='queued', progress=0.0)
+    db.session.add(job)
+    db.session.commit()
+    executor.submit(_run_job, app, job.id, func, args, kwargs)
+    return job.id
+
+
+def _run_job(app, job_id, func, args, kwargs):
+    """Execute one job and record its outcome."""
+    with app.app_context():
+        try:
+            _update(job_id, status='running', started_at=datetime.utcnow())
+            outcome = func(*args, progress=JobProgress(job_id), **kwargs)
+            result, result_path = outcome if isinstance(outcome, tuple) else (outcome, None)
+            _update(job_id, status='completed', progress=100.0, result=json.dumps(result),
+                    result_path=result_path, finished_at=datetime.utcnow())
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error("Job %s failed:\n%s", job_id, traceback.format_exc())
+            _update(job_id, status='failed', error=str(e), finished_at=datetime.utcnow())
+        finally:
+            db.session.remove()
+
+
+def fail_interrupted_jobs():
+    """
+    Mark jobs left queued or running by a previous process as failed.
+
+    Jobs live in this process's worker pool, so after a restart nothing
+    will ever pick them up again. Call once at startup, inside an
+    application context.
+
+    Returns: Number of jobs marked as failed
+    """
+    count = db.session.query(Job).filter(Job.status.in_(('queued', 'running'))).update(
+        {'status': 'failed', 'error': 'Interrupted by an application restart', 'finished_at': datetime.utcnow()},
+        synchronize_session=False)
+    db.session.commit()
+    return count
+
+
+def _update(job_id, **values):
+    db.session.query(Job).filter_by(id=job_id).update(values)
+    db.session.commit()
+
+
+def job_to_dict(job, include_result=False):
+    """
+    Serialize a Job for the polling API.
+    """
+    data = {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'progress': job.progress,
+        'error': job.error,
+        'has_result': job.result is not None or job.result_path is not None,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+    if include_result:
+        data['result'] = json.loads(job.result) if job.result else None
+        data['result_path'] = job.result_path
+    return data
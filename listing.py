@@ -0,0 +1,104 @@
+"""
+Project listing for the Energy Finance application.
+Pages are fetched with keyset pagination: the cursor carries the sort value
+and id of the last row shown, so every page is an index range scan of the
+same cost however deep into the registry it is.
+"""
+
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import with_polymorphic
+
+from app import db
+from models import PROJECT_SUBCLASSES, Project
+
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Columns the listing can be sorted by. Each has a composite index ending in id,
+# alone and behind the status and project_type filter columns.
+SORT_COLUMNS = ('created_at', 'capacity_mw')
+
+
+def encode_cursor(value, project_id):
+    """Encode the sort value and id of the last row on a page as a URL-safe token."""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = json.dumps([value, project_id]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+
+def decode_cursor(cursor, sort):
+    """
+    Decode a cursor produced by encode_cursor.
+
+    Raises: ValueError if the cursor is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        value, project_id = json.loads(base64.urlsafe_b64decode(padded))
+        if sort == 'created_at':
+            value = datetime.fromisoformat(value)
+        return value, int(project_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def project_page(status=None, project_type=None, min_capacity=None, max_capacity=None,
+                 sort='created_at', descending=True, after=None, page_size=PAGE_SIZE):
+    """
+    Fetch one page of projects, filtered and sorted in the database.
+
+    Subclass columns are loaded in the same query, so rendering solar
+    attributes does not trigger a lazy load per row.
+
+    Parameters:
+    - status, project_type: Exact-match filters
+    - min_capacity, max_capacity: Inclusive capacity_mw bounds
+    - sort: One of SORT_COLUMNS; ties are broken by id
+    - descending: Sort direction
+    - after: Cursor of the last row of the previous page
+    - page_size: Rows per page (capped at MAX_PAGE_SIZE)
+
+    Returns: (projects, cursor of the next page or None on the last page)
+
+    Raises: ValueError for an unknown sort column or a malformed cursor
+    """
+    if sort not in SORT_COLUMNS:
+        raise ValueError(f"Cannot sort projects by {sort}")
+    page_size = max(1, min(int(page_size), MAX_PAGE_SIZE))
+
+    projects = with_polymorphic(Project, list(PROJECT_SUBCLASSES))
+    column = getattr(projects, sort)
+    query = db.session.query(projects)
+
+    if status is not None:
+        query = query.filter(projects.status == status)
+    if project_type is not None:
+        query = query.filter(projects.project_type == project_type)
+    if min_capacity is not None:
+        query = query.filter(projects.capacity_mw >= min_capacity)
+    if max_capacity is not None:
+        query = query.filter(projects.capacity_mw <= max_capacity)
+
+    if after:
+        key = tuple_(column, projects.id)
+        last = tuple_(*decode_cursor(after, sort))
+        query = query.filter(key < last if descending else key > last)
+
+    if descending:
+        query = query.order_by(column.desc(), projects.id.desc())
+    else:
+        query = query.order_by(column.asc(), projects.id.asc())
+
+    # One extra row tells whether another page follows
+    rows = query.limit(page_size + 1).all()
+    page = rows[:page_size]
+    next_cursor = None
+    if len(rows) > page_size:
+        next_cursor = encode_cursor(getattr(page[-1], sort), page[-1].id)
+    return page, next_cursor
@@ -4,13 +4,42 @@ This is the main entry point for the Energy Finance application.
 A powerful tool for financial analysis of energy projects with a focus on solar power.
 """
 
+import json
 import os
-import pandas as pd
+import uuid
 from datetime import datetime
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash
+
+import numpy as np
+from flask import Flask, Response, abort, render_template, request, jsonify, redirect, url_for, flash, stream_with_context
 from werkzeug.utils import secure_filename
 from app import create_app, db
-from models import Project, SolarProject, CashFlow, FinancialMetric
+from models import (Project, SolarProject, WindProject, HybridProject, CashFlow, FinancialMetric, Job, PriceDeck,
+                    Dataset, ClimateAnalysis, Scenario, ScenarioResult)
+from cashflows import CASH_FLOW_STORAGE, DEFAULT_SCENARIO
+from climate import (ANALYSIS_TYPES, DEFAULT_RESULT_HEIGHT, DEFAULT_RESULT_WIDTH, analysis_result, request_analysis,
+                     run_climate_analysis)
+from datasets import DATASET_DIR, DATASET_EXTENSIONS, dataset_metadata, parse_range, register_dataset
+from debt import sculpt_debt
+from exports import (CASH_FLOW_EXPORT_COLUMNS, EXPORT_EXTENSIONS, EXPORT_MIMETYPES, PORTFOLIO_EXPORT_COLUMNS,
+                     cash_flow_batches, check_format, portfolio_batches, stream_analysis_export, stream_export)
+from goalseek import goal_seek, project_goal_inputs
+from importer import import_projects
+from jobs import fail_interrupted_jobs, job_to_dict, submit_job
+from listing import PAGE_SIZE, SORT_COLUMNS, project_page
+from merchant import (DEFAULT_CURTAILMENT_PRICE, MERCHANT_METRICS, PRICE_DECK_DIR, merchant_valuation,
+                      register_price_deck)
+from montecarlo import check_distributions
+from portfolio import BREAKDOWN_DIMENSIONS, DEFAULT_DISCOUNT_RATE, portfolio_summary
+from pyramid import DEFAULT_HEIGHT, DEFAULT_WIDTH, build_dataset_pyramid, encode_array, render
+from scenarios import (SCENARIO_FIELDS, apply_scenario_fields, create_board_scenarios, run_scenarios,
+                       scenario_report)
+from sensitivity import DEFAULT_STEPS, DEFAULT_SWING, DRIVERS, sensitivity_analysis
+from site_resource import SAMPLING_METHODS, assess_portfolio
+from storage import HOURS_PER_YEAR, project_dispatch
+from valuation import (evaluate_project_scenarios, load_projects, project_metrics_by_id, revalue_projects,
+                       simulate_project_by_id, value_storage_variants_by_id)
+from utils import SCENARIO_DEFAULTS, SCENARIO_METRICS, build_project_cash_flows, iter_json_results, json_float
+from wind import check_turbines, power_curve_arrays
 
 # Create the Flask application
 app = create_app()
@@ -20,12 +49,22 @@ UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'csv', 'xlsx', 'xls'}
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
+# Largest batch accepted by /api/calculate
+MAX_SCENARIOS = 50000
+
+# Most paths accepted for one Monte Carlo run
+MAX_MONTE_CARLO_PATHS = 1000000
+
 # Set a secret key for flash messages
 app.secret_key = os.environ.get("SECRET_KEY", "dev_secret_key_for_energy_finance")
 
 # Create uploads directory if it doesn't exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# Jobs interrupted by the last shutdown would otherwise stay queued forever
+with app.app_context():
+    fail_interrupted_jobs()
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
@@ -37,9 +76,25 @@ def index():
 
 @app.route('/projects')
 def list_projects():
-    """List all projects"""
-    projects = Project.query.all()
-    return render_template('projects/list.html', projects=projects)
+    """List projects one keyset page at a time, filtered and sorted in the database"""
+    args = request.args
+    filters = {
+        'status': args.get('status') or None,
+        'project_type': args.get('project_type') or None,
+        'min_capacity': args.get('min_capacity', type=float),
+        'max_capacity': args.get('max_capacity', type=float),
+    }
+    sort = args.get('sort', 'created_at')
+    descending = args.get('order', 'desc') != 'asc'
+    page_size = args.get('page_size', PAGE_SIZE, type=int)
+    try:
+        projects, next_cursor = project_page(sort=sort, descending=descending, after=args.get('after'),
+                                             page_size=page_size, **filters)
+    except ValueError as e:
+        abort(400, str(e))
+    return render_template('projects/list.html', projects=projects, next_cursor=next_cursor,
+                           filters=filters, sort=sort, descending=descending, page_size=page_size,
+                           paged=bool(args.get('after')), sort_columns=SORT_COLUMNS)
 
 @app.route('/projects/new', methods=['GET', 'POST'])
 def new_project():
@@ -75,7 +130,7 @@ def new_project():
                 commercial_operation_date = datetime.strptime(commercial_operation_date_str, '%Y-%m-%d').date()
             
             # Create a new project based on type
-            if project_type == 'solar':
+            if project_type in ('solar', 'hybrid'):
                 # Extract solar-specific information
                 panel_type = request.form.get('panel_type')
                 panel_efficiency = request.form.get('panel_efficiency')
@@ -90,8 +145,9 @@ def new_project():
                 land_area_acres = request.form.get('land_area_acres')
                 tracking_type = request.form.get('tracking_type', 'fixed')
                 
-                # Create a new solar project
-                project = SolarProject(
+                # Create a new solar project, with a battery for hybrids
+                project_class = HybridProject if project_type == 'hybrid' else SolarProject
+                project = project_class(
                     name=name,
                     description=description,
                     location=location,
@@ -118,6 +174,74 @@ def new_project():
                     land_area_acres=float(land_area_acres) if land_area_acres else None,
                     tracking_type=tracking_type
                 )
+                if project_type == 'hybrid':
+                    storage_power_mw = request.form.get('storage_power_mw')
+                    storage_energy_mwh = request.form.get('storage_energy_mwh')
+                    round_trip_efficiency = request.form.get('round_trip_efficiency', 0.85)
+                    min_state_of_charge = request.form.get('min_state_of_charge', 0.1)
+                    max_state_of_charge = request.form.get('max_state_of_charge', 1.0)
+                    export_limit_mw = request.form.get('export_limit_mw')
+                    
+                    project.storage_power_mw = float(storage_power_mw) if storage_power_mw else None
+                    project.storage_energy_mwh = float(storage_energy_mwh) if storage_energy_mwh else None
+                    project.round_trip_efficiency = float(round_trip_efficiency) if round_trip_efficiency else 0.85
+                    project.min_state_of_charge = float(min_state_of_charge) if min_state_of_charge else 0.1
+                    project.max_state_of_charge = float(max_state_of_charge) if max_state_of_charge else 1.0
+                    project.export_limit_mw = float(export_limit_mw) if export_limit_mw else None
+                    project.grid_charging = request.form.get('grid_charging') == 'on'
+            elif project_type == 'wind':
+                # Extract wind-specific information
+                num_turbines = request.form.get('num_turbines')
+                turbine_capacity_mw = request.form.get('turbine_capacity_mw')
+                hub_height_m = request.form.get('hub_height_m')
+                rotor_diameter_m = request.form.get('rotor_diameter_m')
+                latitude = request.form.get('wind_latitude')
+                longitude = request.form.get('wind_longitude')
+                mean_wind_speed = request.form.get('mean_wind_speed')
+                measurement_height_m = request.form.get('measurement_height_m')
+                weibull_k = request.form.get('weibull_k', 2.0)
+                wake_loss = request.form.get('wake_loss', 8.0)
+                availability = request.form.get('availability', 97.0)
+                electrical_loss = request.form.get('electrical_loss', 2.0)
+                degradation_rate = request.form.get('wind_degradation_rate', 0.5)
+                power_curve = (request.form.get('power_curve') or '').strip() or None
+                
+                # Reject a malformed power curve before it is stored
+                if power_curve:
+                    power_curve_arrays(power_curve)
+                
+                # Create a new wind project
+                project = WindProject(
+                    name=name,
+                    description=description,
+                    location=location,
+                    capacity_mw=float(capacity_mw) if capacity_mw else None,
+                    project_type=project_type,
+                    status=status,
+                    capex=float(capex) if capex else None,
+                    capex_per_mw=float(capex_per_mw) if capex_per_mw else None,
+                    opex_per_year=float(opex_per_year) if opex_per_year else None,
+                    opex_per_mw=float(opex_per_mw) if opex_per_mw else None,
+                    start_date=start_date,
+                    commercial_operation_date=commercial_operation_date,
+                    expected_lifetime_years=int(expected_lifetime_years) if expected_lifetime_years else 25,
+                    turbine_model=request.form.get('turbine_model'),
+                    num_turbines=int(num_turbines) if num_turbines else None,
+                    turbine_capacity_mw=float(turbine_capacity_mw) if turbine_capacity_mw else None,
+                    hub_height_m=float(hub_height_m) if hub_height_m else None,
+                    rotor_diameter_m=float(rotor_diameter_m) if rotor_diameter_m else None,
+                    power_curve=power_curve,
+                    latitude=float(latitude) if latitude else None,
+                    longitude=float(longitude) if longitude else None,
+                    mean_wind_speed=float(mean_wind_speed) if mean_wind_speed else None,
+                    measurement_height_m=float(measurement_height_m) if measurement_height_m else None,
+                    weibull_k=float(weibull_k) if weibull_k else 2.0,
+                    wake_loss=float(wake_loss) if wake_loss else 8.0,
+                    availability=float(availability) if availability else 97.0,
+                    electrical_loss=float(electrical_loss) if electrical_loss else 2.0,
+                    degradation_rate=float(degradation_rate) if degradation_rate else 0.5
+                )
+                check_turbines(project)
             else:
                 # Create a generic project for other types (will be expanded later)
                 project = Project(
@@ -156,7 +280,7 @@ def new_project():
 
 @app.route('/projects/import', methods=['GET', 'POST'])
 def import_project():
-    """Import a project from CSV or Excel file"""
+    """Import projects from a CSV or Excel file as a background job"""
     if request.method == 'POST':
         # Check if a file was uploaded
         if 'projectFile' not in request.files:
@@ -167,53 +291,878 @@ def import_project():
             return render_template('projects/import.html', error="No file selected")
         
         if file and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
+            # Prefix with a unique id so concurrent uploads of the same file do not collide
+            filename = f"{uuid.uuid4().hex}_{secure_filename(file.filename)}"
             file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
             file.save(file_path)
             
-            # Process the file (implementation to be added later)
-            # This would read the file, validate data, and create a project
-            
-            # Demo implementation (to be replaced with actual processing)
-            try:
-                # Read file data based on file type
-                if filename.endswith('.csv'):
-                    df = pd.read_csv(file_path)
-                else:  # Excel file
-                    df = pd.read_excel(file_path)
-                
-                # At this point, you'd parse the DataFrame and create a Project
-                # For now, just redirect to the projects list page
-                return redirect(url_for('list_projects'))
-            
-            except Exception as e:
-                return render_template('projects/import.html', 
-                                      error=f"Error processing file: {str(e)}")
+            job_id = submit_job(app, 'import', _import_upload, file_path,
+                                has_header=bool(request.form.get('headerRow')))
+            if request.accept_mimetypes.best == 'application/json':
+                return jsonify({'status': 'queued', 'job_id': job_id}), 202
+            return redirect(url_for('import_project', job_id=job_id))
         else:
             return render_template('projects/import.html', 
                                   error="Invalid file type. Please upload a CSV or Excel file.")
     
+    # Show the progress or outcome of an import job
+    job_id = request.args.get('job_id')
+    if job_id:
+        job = db.session.get(Job, job_id)
+        if job is None or job.kind != 'import':
+            abort(404)
+        job = job_to_dict(job, include_result=True)
+        if job['status'] == 'failed':
+            return render_template('projects/import.html', error=f"Error processing file: {job['error']}")
+        return render_template('projects/import.html', job=job, report=job['result'])
+    
     return render_template('projects/import.html')
 
+def _import_upload(file_path, has_header=True, progress=None):
+    """Import an uploaded file, removing it once processed"""
+    try:
+        return import_projects(file_path, has_header=has_header, progress=progress)
+    finally:
+        os.remove(file_path)
+
 @app.route('/projects/<int:project_id>')
 def view_project(project_id):
-    """View a specific project"""
+    """View a specific project, with the progress of an analysis job if one is given"""
     project = Project.query.get_or_404(project_id)
+    job_id = request.args.get('job_id')
+    if job_id:
+        job = db.session.get(Job, job_id)
+        if job is None or job.kind != 'project_metrics':
+            abort(404)
+        if job.status == 'completed':
+            flash("Financial metrics are up to date.", "success")
+            return redirect(url_for('view_project', project_id=project.id))
+        if job.status == 'failed':
+            flash(f"Error calculating financial metrics: {job.error}", "danger")
+            return redirect(url_for('view_project', project_id=project.id))
+        return render_template('projects/view.html', project=project, job=job_to_dict(job))
     return render_template('projects/view.html', project=project)
 
 @app.route('/analysis/<int:project_id>')
 def analyze_project(project_id):
-    """Financial analysis of a project"""
+    """Start a background financial analysis of a project"""
     project = Project.query.get_or_404(project_id)
-    # This will be expanded with actual analysis logic
-    return render_template('analysis/project.html', project=project)
+    # Stored metrics are reused unless the project inputs changed since they were computed
+    job_id = submit_job(app, 'project_metrics', project_metrics_by_id, project.id)
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify({'status': 'queued', 'job_id': job_id}), 202
+    return redirect(url_for('view_project', project_id=project.id, job_id=job_id))
 
 @app.route('/api/calculate', methods=['POST'])
 def calculate_metrics():
-    """API endpoint for calculating financial metrics"""
-    data = request.json
-    # This will be implemented with actual calculation logic
-    return jsonify({'status': 'success', 'metrics': {}})
+    """
+    API endpoint for calculating financial metrics.
+    
+    Accepts one parameter set, a JSON array of scenarios, or an object with
+    shared parameters and a 'scenarios' array. Each scenario references a
+    project_id or carries its project inputs inline. Batches are evaluated in
+    one vectorized call and their metrics streamed back in scenario order
+    as they are serialized.
+    """
+    data = request.get_json(silent=True)
+    if data is None:
+        return jsonify({'status': 'error', 'message': 'Expected a JSON body'}), 400
+    
+    if isinstance(data, list):
+        base, scenarios, batch = {}, data, True
+    else:
+        base = {key: value for key, value in data.items() if key != 'scenarios'}
+        scenarios = data.get('scenarios')
+        batch = scenarios is not None
+        if not batch:
+            scenarios = [{}]
+    
+    if not isinstance(scenarios, list) or not all(isinstance(s, dict) for s in scenarios):
+        return jsonify({'status': 'error', 'message': 'Scenarios must be a list of objects'}), 400
+    if len(scenarios) > MAX_SCENARIOS:
+        return jsonify({'status': 'error',
+                        'message': f'At most {MAX_SCENARIOS} scenarios per request'}), 400
+    scenarios = [{**base, **scenario} for scenario in scenarios]
+    if any(s.get('project_id') is not None
+           and (not isinstance(s['project_id'], int) or isinstance(s['project_id'], bool)) for s in scenarios):
+        return jsonify({'status': 'error', 'message': 'project_id must be an integer'}), 400
+    
+    # Load every referenced project in a single query
+    project_ids = {s['project_id'] for s in scenarios if s.get('project_id') is not None}
+    projects = []
+    if project_ids:
+        projects = load_projects(project_ids)
+    unknown = project_ids - {project.id for project in projects}
+    if unknown:
+        return jsonify({'status': 'error',
+                        'message': f'Unknown project ids: {sorted(unknown)}'}), 404
+    
+    try:
+        # Scenarios matching a project's stored metrics are served without recomputing
+        results = evaluate_project_scenarios(scenarios, projects)
+    except (ValueError, TypeError) as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    
+    if not batch:
+        metrics = {name: json_float(values[0]) for name, values in results.items()}
+        return jsonify({'status': 'success', 'metrics': metrics})
+    
+    # Batch results carry only the metrics, in scenario order
+    metrics = {name: results[name] for name in SCENARIO_METRICS}
+    
+    def generate():
+        yield '{"status": "success", "results": '
+        yield from iter_json_results(metrics)
+        yield '}'
+    
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+@app.route('/api/goal-seek', methods=['POST'])
+def goal_seek_api():
+    """
+    Solve for a breakeven value across many projects in one batch.
+    
+    Expects a JSON body with project_ids, variable (ppa_price, capex or
+    performance_ratio), objective ('npv' or 'irr'), target (NPV in $ or IRR
+    as a fraction, default 0 NPV) and optional assumptions.
+    """
+    data = request.get_json(silent=True) or {}
+    project_ids = data.get('project_ids')
+    if not isinstance(project_ids, list) or not project_ids:
+        return jsonify({'status': 'error', 'message': 'project_ids must be a non-empty list'}), 400
+    if any(not isinstance(project_id, int) or isinstance(project_id, bool) for project_id in project_ids):
+        return jsonify({'status': 'error', 'message': 'project_ids must be integers'}), 400
+    if len(project_ids) > MAX_SCENARIOS:
+        return jsonify({'status': 'error',
+                        'message': f'At most {MAX_SCENARIOS} projects per request'}), 400
+    
+    projects = load_projects(project_ids)
+    unknown = set(project_ids) - {project.id for project in projects}
+    if unknown:
+        return jsonify({'status': 'error',
+                        'message': f'Unknown project ids: {sorted(unknown)}'}), 404
+    
+    variable = data.get('variable', 'ppa_price')
+    objective = data.get('objective', 'npv')
+    try:
+        target = float(data.get('target', 0.0))
+        solution = goal_seek(project_goal_inputs(projects, data.get('assumptions')), variable,
+                             objective, target)
+    except (TypeError, ValueError) as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    
+    results = [{
+        'project_id': project.id,
+        'value': json_float(solution['value'][index]),
+        'closed_form': bool(solution['closed_form'][index]),
+        'converged': bool(solution['converged'][index]),
+    } for index, project in enumerate(projects)]
+    return jsonify({'status': 'success', 'variable': variable, 'objective': objective,
+                    'target': target, 'results': results})
+
+@app.route('/api/portfolio')
+def portfolio_api():
+    """
+    Aggregate cash flows and metrics across all projects.
+    
+    Query parameters: discount_rate (default 0.08) and optional project_type,
+    status and location filters.
+    """
+    try:
+        discount_rate = float(request.args.get('discount_rate', DEFAULT_DISCOUNT_RATE))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'discount_rate must be a number'}), 400
+    filters = {name: request.args[name] for name in BREAKDOWN_DIMENSIONS if name in request.args}
+    return jsonify({'status': 'success', 'portfolio': portfolio_summary(discount_rate, filters)})
+
+def _export_response(chunks, export_format, name):
+    """A streamed file download of export chunks"""
+    filename = f"{name}.{EXPORT_EXTENSIONS[export_format]}"
+    return Response(stream_with_context(chunks), mimetype=EXPORT_MIMETYPES[export_format],
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+@app.route('/api/export/cash-flows')
+def export_cash_flows():
+    """
+    Stream stored cash-flow schedules, one row per project-year.
+    
+    Query parameters: format (csv, json, parquet or netcdf; default csv),
+    optional comma-separated project_ids, storage ('rows' or 'packed') and
+    the scenario of packed schedules.
+    """
+    export_format = request.args.get('format', 'csv')
+    storage = request.args.get('storage', 'rows')
+    try:
+        check_format(export_format)
+        if storage not in CASH_FLOW_STORAGE:
+            raise ValueError(f"storage must be one of {', '.join(CASH_FLOW_STORAGE)}")
+        project_ids = request.args.get('project_ids')
+        if project_ids:
+            project_ids = [int(value) for value in project_ids.split(',')]
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    batches = cash_flow_batches(project_ids or None, storage, request.args.get('scenario', DEFAULT_SCENARIO))
+    return _export_response(stream_export(export_format, CASH_FLOW_EXPORT_COLUMNS, batches), export_format,
+                            'cash_flows')
+
+@app.route('/api/export/portfolio')
+def export_portfolio():
+    """
+    Stream every project with its stored financial metrics.
+    
+    Query parameters: format (csv, json, parquet or netcdf; default csv),
+    optional project_type, status and location filters, and a scenario_id to
+    export that scenario's results instead of the current metrics.
+    """
+    export_format = request.args.get('format', 'csv')
+    scenario_id = request.args.get('scenario_id', type=int)
+    try:
+        check_format(export_format)
+        if scenario_id is not None and db.session.get(Scenario, scenario_id) is None:
+            raise ValueError(f'Scenario {scenario_id} not found')
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    filters = {name: request.args[name] for name in BREAKDOWN_DIMENSIONS if name in request.args}
+    batches = portfolio_batches(filters, scenario_id)
+    return _export_response(stream_export(export_format, PORTFOLIO_EXPORT_COLUMNS, batches), export_format,
+                            f'portfolio_scenario_{scenario_id}' if scenario_id is not None else 'portfolio')
+
+@app.route('/api/analysis/valuation', methods=['POST'])
+def start_valuation():
+    """Start a background revaluation of some or all projects"""
+    data = request.get_json(silent=True) or {}
+    if data.get('cash_flows') not in (None,) + CASH_FLOW_STORAGE:
+        return jsonify({'status': 'error',
+                        'message': f"cash_flows must be one of {', '.join(CASH_FLOW_STORAGE)}"}), 400
+    job_id = submit_job(app, 'valuation', revalue_projects,
+                        project_ids=data.get('project_ids'),
+                        assumptions=data.get('assumptions'),
+                        force=bool(data.get('force', False)),
+                        cash_flows=data.get('cash_flows'))
+    return jsonify({'status': 'queued', 'job_id': job_id}), 202
+
+@app.route('/api/analysis/<int:project_id>/sensitivity', methods=['GET', 'POST'])
+def project_sensitivity(project_id):
+    """
+    Tornado and spider-chart data for a project.
+    
+    Accepts swing and steps as query parameters or, with assumptions and
+    drivers, in a JSON body.
+    """
+    project = Project.query.get_or_404(project_id)
+    data = request.get_json(silent=True) or {}
+    try:
+        swing = float(data.get('swing', request.args.get('swing', DEFAULT_SWING)))
+        steps = int(data.get('steps', request.args.get('steps', DEFAULT_STEPS)))
+        result = sensitivity_analysis(project, data.get('assumptions'),
+                                      drivers=data.get('drivers', tuple(DRIVERS)), swing=swing, steps=steps)
+    except (TypeError, ValueError) as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    return jsonify({'status': 'success', 'sensitivity': result})
+
+@app.route('/api/analysis/<int:project_id>/debt', methods=['GET', 'POST'])
+def project_debt(project_id):
+    """
+    Sculpted debt schedule and DSCR profile for a project.
+    
+    Accepts target_dscr, max_gearing, interest_rate, debt_term, tax_rate and
+    assumptions as query parameters or in a JSON body.
+    """
+    project = Project.query.get_or_404(project_id)
+    data = request.get_json(silent=True) or {}
+    options = {}
+    try:
+        for name, cast in (('target_dscr', float), ('max_gearing', float), ('interest_rate', float),
+                           ('debt_term', int), ('tax_rate', float)):
+            value = data.get(name, request.args.get(name))
+            if value is not None:
+                options[name] = cast(value)
+    except (TypeError, ValueError) as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    
+    assumptions = {key: value for key, value in (data.get('assumptions') or {}).items()
+                   if key != 'target_dscr'}
+    # The gearing cap and interest rate default to the scenario's debt terms
+    options.setdefault('max_gearing', assumptions.get('debt_ratio', SCENARIO_DEFAULTS['debt_ratio']))
+    options.setdefault('interest_rate', assumptions.get('interest_rate', SCENARIO_DEFAULTS['interest_rate']))
+    schedule = build_project_cash_flows(project, **assumptions)
+    result = sculpt_debt(schedule, **options)
+    
+    per_year = ('cfads', 'debt_service', 'interest', 'principal', 'opening_balance',
+                'closing_balance', 'dscr')
+    return jsonify({
+        'status': 'success',
+        'debt': {
+            'debt_amount': json_float(result['debt_amount']),
+            'gearing_limited': bool(result['gearing_limited']),
+            'min_dscr': json_float(result['min_dscr']),
+            'avg_dscr': json_float(result['avg_dscr']),
+            'converged': bool(result['converged']),
+            'iterations': result['iterations'],
+            'year': schedule['year'].tolist(),
+            **{name: [json_float(value) for value in result[name]] for name in per_year},
+        },
+    })
+
+@app.route('/api/analysis/<int:project_id>/dispatch', methods=['POST'])
+def project_storage_dispatch(project_id):
+    """
+    Optimize battery dispatch of a hybrid project against an hourly price curve.
+    
+    The JSON body holds 'prices' (8760 $/MWh values) and optionally
+    'hourly' to return the hourly schedule and 'store' to save the project's
+    arbitrage revenue for its cash flows. With 'variants' (a list of
+    storage_power_mw / storage_energy_mwh sizes, each with an optional total
+    'capex') the sizes are instead dispatched and valued under 'assumptions'
+    as a background job, and the response holds its job id.
+    """
+    project = Project.query.get_or_404(project_id)
+    if not isinstance(project, HybridProject):
+        return jsonify({'status': 'error', 'message': 'Storage dispatch needs a hybrid project'}), 400
+    data = request.get_json(silent=True) or {}
+    variants = data.get('variants')
+    if variants:
+        try:
+            if len(data.get('prices') or []) != HOURS_PER_YEAR:
+                raise ValueError(f"prices needs {HOURS_PER_YEAR} hourly values")
+            variants = [{'storage_power_mw': float(variant['storage_power_mw']),
+                         'storage_energy_mwh': float(variant['storage_energy_mwh']),
+                         'capex': float(variant['capex']) if variant.get('capex') is not None else None}
+                        for variant in variants]
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        job_id = submit_job(app, 'storage_dispatch', value_storage_variants_by_id, project.id, data['prices'],
+                            variants, assumptions=data.get('assumptions'))
+        return jsonify({'status': 'queued', 'job_id': job_id}), 202
+    
+    try:
+        result = project_dispatch(project, data.get('prices') or [])
+    except (TypeError, ValueError) as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    if data.get('store'):
+        project.arbitrage_revenue = float(result['revenue'])
+        db.session.commit()
+    response = {name: json_float(result[name]) for name in
+                ('revenue', 'energy_charged', 'energy_discharged', 'cycles')}
+    if data.get('hourly'):
+        response.update({name: result[name].tolist() for name in
+                         ('charge', 'discharge', 'state_of_charge', 'export')})
+    return jsonify({'status': 'success', 'dispatch': response})
+
+def _scenario_to_dict(scenario):
+    return {
+        'id': scenario.id,
+        'name': scenario.name,
+        **{name: getattr(scenario, name) for name in SCENARIO_FIELDS},
+        'created_at': scenario.created_at.isoformat() if scenario.created_at else None,
+    }
+
+def _id_list(value):
+    # Comma-separated ids from a query string, or a JSON list; None for all
+    if value is None or value == '':
+        return None
+    if isinstance(value, str):
+        value = value.split(',')
+    return [int(item) for item in value]
+
+@app.route('/api/scenarios', methods=['GET', 'POST'])
+def scenarios_api():
+    """
+    List scenarios, or create one from a JSON body with a 'name' and any of
+    the rate, PPA and price-deck fields.
+    """
+    if request.method == 'GET':
+        return jsonify({'status': 'success',
+                        'scenarios': [_scenario_to_dict(scenario) for scenario in Scenario.query.order_by(Scenario.id)]})
+    
+    data = request.get_json(silent=True) or {}
+    scenario = Scenario()
+    try:
+        apply_scenario_fields(scenario, data)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    if Scenario.query.filter_by(name=scenario.name).first() is not None:
+        return jsonify({'status': 'error', 'message': f'Scenario {scenario.name} already exists'}), 409
+    db.session.add(scenario)
+    db.session.commit()
+    return jsonify({'status': 'success', 'scenario': _scenario_to_dict(scenario)}), 201
+
+@app.route('/api/scenarios/board', methods=['POST'])
+def board_scenarios():
+    """Create the base, downside and upside scenarios that do not exist yet"""
+    scenarios = create_board_scenarios()
+    db.session.commit()
+    return jsonify({'status': 'success', 'scenarios': [_scenario_to_dict(scenario) for scenario in scenarios]})
+
+@app.route('/api/scenarios/<int:scenario_id>', methods=['GET', 'PUT', 'DELETE'])
+def scenario_api(scenario_id):
+    """
+    Show, update or delete a scenario. Updating clears its stored results,
+    which no longer match its assumptions; deleting removes them.
+    """
+    scenario = db.session.get(Scenario, scenario_id)
+    if scenario is None:
+        return jsonify({'status': 'error', 'message': 'Scenario not found'}), 404
+    if request.method == 'GET':
+        return jsonify({'status': 'success', 'scenario': _scenario_to_dict(scenario)})
+    
+    ScenarioResult.query.filter_by(scenario_id=scenario.id).delete(synchronize_session=False)
+    if request.method == 'DELETE':
+        db.session.delete(scenario)
+        db.session.commit()
+        return jsonify({'status': 'success', 'message': 'Scenario deleted'})
+    try:
+        with db.session.no_autoflush:
+            apply_scenario_fields(scenario, request.get_json(silent=True) or {})
+            if Scenario.query.filter(Scenario.name == scenario.name, Scenario.id != scenario.id).first() is not None:
+                raise ValueError(f'Scenario {scenario.name} already exists')
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    db.session.commit()
+    return jsonify({'status': 'success', 'scenario': _scenario_to_dict(scenario)})
+
+@app.route('/api/scenarios/evaluate', methods=['POST'])
+def evaluate_scenarios_api():
+    """
+    Evaluate projects under scenarios as a background job, storing a result
+    per project and scenario. The JSON body may limit 'scenario_ids' and
+    'project_ids' (default: all).
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        scenario_ids = _id_list(data.get('scenario_ids'))
+        project_ids = _id_list(data.get('project_ids'))
+    except (TypeError, ValueError):
+        return jsonify({'status': 'error', 'message': 'scenario_ids and project_ids must be lists of ids'}), 400
+    query = Scenario.query if scenario_ids is None else Scenario.query.filter(Scenario.id.in_(scenario_ids))
+    if query.first() is None:
+        return jsonify({'status': 'error', 'message': 'No scenarios to evaluate'}), 400
+    job_id = submit_job(app, 'scenarios', run_scenarios, scenario_ids=scenario_ids, project_ids=project_ids)
+    return jsonify({'status': 'queued', 'job_id': job_id}), 202
+
+@app.route('/api/scenarios/report')
+def scenarios_report_api():
+    """
+    Portfolio totals per scenario from the stored results.
+    
+    Query parameters: optional comma-separated scenario_ids and project_type,
+    status and location filters.
+    """
+    try:
+        scenario_ids = _id_list(request.args.get('scenario_ids'))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'scenario_ids must be comma-separated ids'}), 400
+    filters = {name: request.args[name] for name in BREAKDOWN_DIMENSIONS if name in request.args}
+    return jsonify({'status': 'success', 'scenarios': scenario_report(scenario_ids, filters)})
+
+@app.route('/api/price-decks', methods=['GET', 'POST'])
+def price_decks():
+    """
+    List registered price decks, or upload a new one.
+    
+    Uploads are multipart: a 'deck' .npy file of shape (nodes, scenarios,
+    years, 8760) or (scenarios, years, 8760), plus 'name', optional
+    comma-separated 'nodes', 'start_year' and 'description' fields.
+    """
+    if request.method == 'GET':
+        return jsonify({'status': 'success', 'price_decks': [{
+            'id': deck.id,
+            'name': deck.name,
+            'description': deck.description,
+            'nodes': deck.nodes.split(','),
+            'n_scenarios': deck.n_scenarios,
+            'start_year': deck.start_year,
+            'n_years': deck.n_years,
+        } for deck in PriceDeck.query.order_by(PriceDeck.id)]})
+    
+    file = request.files.get('deck')
+    if file is None or not file.filename.lower().endswith('.npy'):
+        return jsonify({'status': 'error', 'message': 'Upload a .npy price deck as "deck"'}), 400
+    os.makedirs(PRICE_DECK_DIR, exist_ok=True)
+    file_path = os.path.join(PRICE_DECK_DIR, f"{uuid.uuid4().hex}_{secure_filename(file.filename)}")
+    file.save(file_path)
+    try:
+        nodes = [node.strip() for node in request.form.get('nodes', '').split(',') if node.strip()]
+        start_year = request.form.get('start_year', type=int)
+        deck = register_price_deck(request.form.get('name') or file.filename, file_path, nodes or None,
+                                   start_year, request.form.get('description'))
+        db.session.commit()
+    except ValueError as e:
+        db.session.rollback()
+        os.remove(file_path)
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    return jsonify({'status': 'success', 'price_deck_id': deck.id}), 201
+
+@app.route('/api/analysis/<int:project_id>/merchant', methods=['POST'])
+def project_merchant_valuation(project_id):
+    """
+    Value a project with a PPA/merchant split under every scenario of a price deck.
+    
+    The JSON body holds 'price_deck_id' and optionally 'node', 'ppa_share',
+    'curtailment_price' and 'assumptions'.
+    """
+    project = Project.query.get_or_404(project_id)
+    data = request.get_json(silent=True) or {}
+    price_deck = db.session.get(PriceDeck, data.get('price_deck_id') or 0)
+    if price_deck is None:
+        return jsonify({'status': 'error', 'message': 'Price deck not found'}), 404
+    try:
+        result = merchant_valuation(project, price_deck, node=data.get('node'),
+                                    ppa_share=float(data.get('ppa_share', 0.0)),
+                                    curtailment_price=float(data.get('curtailment_price',
+                                                                     DEFAULT_CURTAILMENT_PRICE)),
+                                    assumptions=data.get('assumptions'))
+    except (TypeError, ValueError) as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    
+    npv = result['npv']
+    return jsonify({
+        'status': 'success',
+        'merchant': {
+            'scenarios': {name: [json_float(value) for value in result[name]] for name in MERCHANT_METRICS},
+            'npv_percentiles': {f'p{q}': json_float(np.percentile(npv, q)) for q in (10, 50, 90)},
+            # Per operational year, averaged over the price scenarios
+            'merchant_revenue': [json_float(value) for value in result['merchant_revenue'].mean(axis=0)],
+            'capture_price': [json_float(value) for value in result['mean_capture_price']],
+            'curtailed_mwh': [json_float(value) for value in result['curtailed_mwh'].mean(axis=0)],
+        },
+    })
+
+def _dataset_to_dict(dataset):
+    return {
+        'id': dataset.id,
+        'original_filename': dataset.original_filename,
+        'description': dataset.description,
+        'file_type': dataset.file_type,
+        'file_size': dataset.file_size,
+        'created_at': dataset.created_at.isoformat() if dataset.created_at else None,
+    }
+
+def _json_array(values):
+    # NaN (missing values) is not valid JSON
+    return np.where(np.isnan(values), None, values.astype(float)).tolist()
+
+@app.route('/upload', methods=['GET', 'POST'])
+def upload():
+    """Upload a NetCDF climate dataset and register its metadata"""
+    if request.method == 'POST':
+        file = request.files.get('file')
+        if file is None or file.filename == '':
+            return render_template('upload.html', error="No file selected")
+        extension = file.filename.rsplit('.', 1)[-1].lower() if '.' in file.filename else ''
+        if extension not in DATASET_EXTENSIONS:
+            return render_template('upload.html',
+                                   error="Invalid file type. Please upload a NetCDF (.nc, .nc4, .netcdf) "
+                                         "or NetCDF-4/HDF5 (.h5, .hdf5) file.")
+        
+        os.makedirs(DATASET_DIR, exist_ok=True)
+        file_path = os.path.join(DATASET_DIR, f"{uuid.uuid4().hex}_{secure_filename(file.filename)}")
+        file.save(file_path)
+        try:
+            dataset = register_dataset(file_path, file.filename, request.form.get('description') or None)
+            db.session.commit()
+        except ValueError as e:
+            db.session.rollback()
+            os.remove(file_path)
+            return render_template('upload.html', error=str(e))
+        if request.accept_mimetypes.best == 'application/json':
+            return jsonify({'success': True, 'dataset': _dataset_to_dict(dataset)}), 201
+        return render_template('upload.html', dataset=dataset, metadata=dataset_metadata(dataset))
+    
+    return render_template('upload.html')
+
+@app.route('/api/datasets', methods=['GET', 'POST'])
+def datasets_api():
+    """
+    List registered datasets, or register a NetCDF file already on the server.
+    
+    Files of tens of GB are better copied into the dataset directory than
+    uploaded; the JSON body holds their 'path' relative to that directory
+    and optionally a 'description'.
+    """
+    if request.method == 'GET':
+        return jsonify({'success': True,
+                        'datasets': [_dataset_to_dict(dataset) for dataset in Dataset.query.order_by(Dataset.id)]})
+    
+    data = request.get_json(silent=True) or {}
+    root = os.path.abspath(DATASET_DIR)
+    file_path = os.path.abspath(os.path.join(root, str(data.get('path') or '')))
+    if os.path.commonpath([root, file_path]) != root or not os.path.isfile(file_path):
+        return jsonify({'success': False, 'error': 'No such file in the dataset directory'}), 400
+    try:
+        dataset = register_dataset(file_path, os.path.basename(file_path), data.get('description'))
+        db.session.commit()
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return jsonify({'success': True, 'dataset': _dataset_to_dict(dataset)}), 201
+
+@app.route('/api/dataset/<int:dataset_id>/metadata')
+def dataset_metadata_api(dataset_id):
+    """Dimensions, variables, attributes and coordinate ranges of a dataset"""
+    dataset = db.session.get(Dataset, dataset_id)
+    if dataset is None:
+        return jsonify({'success': False, 'error': 'Dataset not found'}), 404
+    return jsonify({'success': True, 'dataset': _dataset_to_dict(dataset), 'metadata': dataset_metadata(dataset)})
+
+@app.route('/api/dataset/<int:dataset_id>/data')
+def dataset_data_api(dataset_id):
+    """
+    A view of one dataset variable sized to a pixel budget.
+    
+    Query parameters: 'variable', 'lat_range' and 'lon_range' as 'min:max'
+    degrees, 'time_range' as a time-step index or 'start:end' indices or
+    YYYY-MM-DD dates (inclusive; default: all), 'level' for variables with a
+    vertical or other extra dimension, 'width' and 'height' in pixels, and
+    'encoding': 'float32' (default; base64 little-endian arrays) or 'json'.
+    
+    The grid is the mean over the selected time steps, block-averaged to fit
+    the budget; the series is the area-weighted box mean per time step,
+    downsampled to 'width' points.
+    """
+    dataset = db.session.get(Dataset, dataset_id)
+    if dataset is None:
+        return jsonify({'success': False, 'error': 'Dataset not found'}), 404
+    variable = request.args.get('variable')
+    if not variable:
+        return jsonify({'success': False, 'error': 'Select a variable'}), 400
+    encoding = request.args.get('encoding', 'float32')
+    if encoding not in ('float32', 'json'):
+        return jsonify({'success': False, 'error': f'Unknown encoding: {encoding}'}), 400
+    try:
+        view = render(dataset, variable,
+                      lat_range=parse_range(request.args.get('lat_range')),
+                      lon_range=parse_range(request.args.get('lon_range')),
+                      time_range=request.args.get('time_range'),
+                      level=request.args.get('level', 0, type=int),
+                      width=request.args.get('width', DEFAULT_WIDTH, type=int),
+                      height=request.args.get('height', DEFAULT_HEIGHT, type=int))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    def encode(values):
+        return encode_array(values) if encoding == 'float32' else _json_array(values)
+    
+    series = view['series']
+    return jsonify({
+        'success': True,
+        'data': {
+            'grid': encode(view['grid']),
+            'latitudes': view['latitudes'].tolist(),
+            'longitudes': view['longitudes'].tolist(),
+            'series': series and {'times': series['times'], 'values': encode(series['values'])},
+            'steps': view['steps'],
+            'coarsening': view['coarsening'],
+            'source': view['source'],
+            'variable': view['variable'],
+            'units': view['units'],
+            'statistics': view['statistics'],
+        },
+    })
+
+@app.route('/api/dataset/<int:dataset_id>/pyramid', methods=['POST'])
+def build_dataset_pyramid_api(dataset_id):
+    """
+    Precompute the coarsened grids of a variable as a background job.
+    
+    The JSON body holds 'variable' and optionally 'level'. Views are served
+    from the pyramid once it is built, and block-averaged on the fly before.
+    """
+    if db.session.get(Dataset, dataset_id) is None:
+        return jsonify({'success': False, 'error': 'Dataset not found'}), 404
+    data = request.get_json(silent=True) or {}
+    if not data.get('variable'):
+        return jsonify({'success': False, 'error': 'Select a variable'}), 400
+    job_id = submit_job(app, 'pyramid', build_dataset_pyramid, dataset_id, data['variable'],
+                        level=int(data.get('level', 0)))
+    return jsonify({'status': 'queued', 'job_id': job_id}), 202
+
+@app.route('/datasets/<int:dataset_id>/visualization')
+def visualization(dataset_id):
+    """Interactive maps and time series of a dataset"""
+    dataset = db.session.get(Dataset, dataset_id)
+    if dataset is None:
+        abort(404)
+    return render_template('visualization.html', dataset=dataset)
+
+@app.route('/datasets/<int:dataset_id>/analysis')
+def analysis(dataset_id):
+    """Run climate analyses of a dataset and browse past ones"""
+    dataset = db.session.get(Dataset, dataset_id)
+    if dataset is None:
+        abort(404)
+    past_analyses = (ClimateAnalysis.query.filter_by(dataset_id=dataset_id)
+                     .order_by(ClimateAnalysis.created_at.desc()).all())
+    return render_template('analysis.html', dataset=dataset, analysis_types=list(ANALYSIS_TYPES),
+                           past_analyses=past_analyses)
+
+@app.route('/api/dataset/<int:dataset_id>/analyze', methods=['POST'])
+def analyze_dataset(dataset_id):
+    """
+    Start a climate analysis of a dataset variable as a background job.
+    
+    The JSON body holds the 'analysis_type' and its 'parameters' (see
+    climate.analysis_parameters). A request identical to an earlier one that
+    has not failed returns that analysis, so its result is served at once.
+    """
+    dataset = db.session.get(Dataset, dataset_id)
+    if dataset is None:
+        return jsonify({'success': False, 'error': 'Dataset not found'}), 404
+    data = request.get_json(silent=True) or {}
+    try:
+        analysis, created = request_analysis(dataset, data.get('analysis_type'), data.get('parameters') or {})
+        db.session.commit()
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 400
+    if created:
+        analysis.job_id = submit_job(app, 'climate_analysis', run_climate_analysis, analysis.id)
+        db.session.commit()
+    return jsonify({'success': True, 'analysis_id': analysis.id, 'status': analysis.status,
+                    'job_id': analysis.job_id}), 202 if created else 200
+
+@app.route('/api/analysis/<int:analysis_id>')
+def climate_analysis_api(analysis_id):
+    """
+    Status or result of a climate analysis.
+    
+    While the analysis runs, the response carries its 'status' and job
+    'progress'; once completed, the 'result' grids are block-averaged to at
+    most 'width' x 'height' cells (query parameters). With a 'format' query
+    parameter, the result holds the 'export_url' of a download in that format.
+    """
+    analysis = db.session.get(ClimateAnalysis, analysis_id)
+    if analysis is None:
+        return jsonify({'success': False, 'error': 'Analysis not found'}), 404
+    export_format = request.args.get('format')
+    if export_format:
+        try:
+            check_format(export_format)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        if analysis.status != 'completed':
+            return jsonify({'success': False, 'error': f'Analysis is {analysis.status}'}), 409
+        return jsonify({'success': True, 'result': {
+            'format': export_format,
+            'extension': EXPORT_EXTENSIONS[export_format],
+            'export_url': url_for('export_climate_analysis', analysis_id=analysis.id, format=export_format),
+        }})
+    response = {
+        'id': analysis.id,
+        'dataset_id': analysis.dataset_id,
+        'analysis_type': analysis.analysis_type,
+        'variable': analysis.variable,
+        'parameters': json.loads(analysis.parameters),
+        'status': analysis.status,
+        'error': analysis.error,
+        'created_at': analysis.created_at.isoformat() if analysis.created_at else None,
+    }
+    if analysis.status in ('queued', 'running'):
+        job = db.session.get(Job, analysis.job_id) if analysis.job_id else None
+        response['progress'] = job.progress if job else 0.0
+    elif analysis.status == 'completed':
+        result = analysis_result(analysis, width=request.args.get('width', DEFAULT_RESULT_WIDTH, type=int),
+                                 height=request.args.get('height', DEFAULT_RESULT_HEIGHT, type=int))
+        response['result'] = {name: _json_array(value) if isinstance(value, np.ndarray) else value
+                              for name, value in result.items()}
+    return jsonify({'success': True, 'result': response})
+
+@app.route('/api/analysis/<int:analysis_id>/export')
+def export_climate_analysis(analysis_id):
+    """
+    Stream a completed climate analysis at full resolution.
+    
+    Query parameter: format (csv, json, parquet or netcdf; default csv). NetCDF
+    keeps the latitude/longitude grid; the other formats have one row per
+    grid cell (and year or month).
+    """
+    analysis = db.session.get(ClimateAnalysis, analysis_id)
+    if analysis is None:
+        return jsonify({'success': False, 'error': 'Analysis not found'}), 404
+    export_format = request.args.get('format', 'csv')
+    try:
+        check_format(export_format)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    if analysis.status != 'completed':
+        return jsonify({'success': False, 'error': f'Analysis is {analysis.status}'}), 409
+    return _export_response(stream_analysis_export(export_format, analysis), export_format,
+                            f'{analysis.analysis_type}_{analysis.variable}_{analysis.id}')
+
+@app.route('/api/dataset/<int:dataset_id>/resource-assessment', methods=['POST'])
+def resource_assessment_api(dataset_id):
+    """
+    Assess the solar resource of sited projects against a dataset, and
+    revalue them with the new yields, as a background job.
+    
+    The JSON body holds the 'irradiance_variable' and optionally the
+    'temperature_variable', 'method' ('nearest' or 'bilinear'), 'time_range'
+    (e.g. '2041-01-01:2070-12-31' for a climate-scenario period), 'level',
+    'project_ids', 'revalue' (default true) and revaluation 'assumptions'.
+    """
+    dataset = db.session.get(Dataset, dataset_id)
+    if dataset is None:
+        return jsonify({'success': False, 'error': 'Dataset not found'}), 404
+    data = request.get_json(silent=True) or {}
+    variables = dataset_metadata(dataset)['variables']
+    for name in ('irradiance_variable', 'temperature_variable'):
+        if data.get(name) and data[name] not in variables:
+            return jsonify({'success': False, 'error': f"Unknown variable {data[name]}"}), 400
+    if not data.get('irradiance_variable'):
+        return jsonify({'success': False, 'error': 'Select an irradiance variable'}), 400
+    if data.get('method', 'nearest') not in SAMPLING_METHODS:
+        return jsonify({'success': False,
+                        'error': f"method must be one of {', '.join(SAMPLING_METHODS)}"}), 400
+    job_id = submit_job(app, 'resource_assessment', assess_portfolio, dataset_id, data['irradiance_variable'],
+                        temperature_variable=data.get('temperature_variable'),
+                        project_ids=data.get('project_ids'),
+                        method=data.get('method', 'nearest'),
+                        time_range=data.get('time_range'),
+                        level=int(data.get('level', 0)),
+                        revalue=bool(data.get('revalue', True)),
+                        assumptions=data.get('assumptions'))
+    return jsonify({'status': 'queued', 'job_id': job_id}), 202
+
+@app.route('/api/analysis/<int:project_id>/monte-carlo', methods=['POST'])
+def start_monte_carlo(project_id):
+    """Start a background Monte Carlo simulation for a project"""
+    Project.query.get_or_404(project_id)
+    data = request.get_json(silent=True) or {}
+    n_paths = data.get('n_paths', 100000)
+    if not isinstance(n_paths, int) or isinstance(n_paths, bool) or not 1 <= n_paths <= MAX_MONTE_CARLO_PATHS:
+        return jsonify({'status': 'error',
+                        'message': f'n_paths must be an integer from 1 to {MAX_MONTE_CARLO_PATHS}'}), 400
+    seed = data.get('seed')
+    if seed is not None and (not isinstance(seed, int) or isinstance(seed, bool) or seed < 0):
+        return jsonify({'status': 'error', 'message': 'seed must be a non-negative integer'}), 400
+    try:
+        check_distributions(data.get('distributions'))
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    
+    options = {key: data[key] for key in ('n_paths', 'seed', 'distributions') if key in data}
+    job_id = submit_job(app, 'monte_carlo', simulate_project_by_id, project_id,
+                        assumptions=data.get('assumptions'), **options)
+    return jsonify({'status': 'queued', 'job_id': job_id}), 202
+
+@app.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    """Poll the status and progress of a background job"""
+    job = db.session.get(Job, job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Job not found'}), 404
+    return jsonify(job_to_dict(job))
+
+@app.route('/api/jobs/<job_id>/result')
+def get_job_result(job_id):
+    """Fetch the result of a finished background job"""
+    job = db.session.get(Job, job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Job not found'}), 404
+    if job.status not in ('completed', 'failed'):
+        return jsonify(job_to_dict(job)), 202
+    return jsonify(job_to_dict(job, include_result=True))
 
 # Error handlers
 @app.errorhandler(404)
@@ -0,0 +1,252 @@
+"""
+Merchant revenue for the Energy Finance application.
+Hourly production is priced against hourly market price decks: multi-year,
+multi-scenario, per-node forward curves stored as .npy arrays of shape
+(nodes x scenarios x years x 8760). Decks are opened memory-mapped and read
+only, so every worker process shares one copy through the OS page cache,
+and a project touches only its node's pages, one deck year at a time.
+"""
+
+import os
+import threading
+from datetime import datetime
+
+import numpy as np
+
+import debt
+import finance
+import returns
+import solar
+from app import db
+from models import PriceDeck
+from utils import SCENARIO_DEFAULTS, estimate_energy_production, project_cash_flow_inputs
+
+
+HOURS_PER_YEAR = 8760
+
+# Directory new price decks are written to
+PRICE_DECK_DIR = os.environ.get('PRICE_DECK_DIR', 'price_decks')
+
+# Storage type of decks written by write_price_deck
+DECK_DTYPE = np.float32
+
+# Merchant energy is curtailed in hours priced below this ($/MWh)
+DEFAULT_CURTAILMENT_PRICE = 0.0
+
+# Metrics returned per price scenario
+MERCHANT_METRICS = ('npv', 'irr', 'lcoe')
+
+_decks = {}
+_decks_lock = threading.Lock()
+
+
+def write_price_deck(path, prices):
+    """
+    Write a price deck to a .npy file without holding a second copy in memory.
+
+    Parameters:
+    - path: Destination file
+    - prices: Array-like of shape (nodes, scenarios, years, 8760) or
+      (scenarios, years, 8760) for a single node, in $/MWh
+
+    Returns: Shape of the stored deck
+
+    Raises: ValueError if the last axis is not 8760 hours
+    """
+    prices = np.asarray(prices)
+    if prices.ndim == 3:
+        prices = prices[np.newaxis]
+    if prices.ndim != 4 or prices.shape[-1] != HOURS_PER_YEAR:
+        raise ValueError(f"A price deck needs shape (nodes, scenarios, years, {HOURS_PER_YEAR})")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    deck = np.lib.format.open_memmap(path, mode='w+', dtype=DECK_DTYPE, shape=prices.shape)
+    for node in range(prices.shape[0]):
+        deck[node] = prices[node]
+    deck.flush()
+    del deck
+    return prices.shape
+
+
+def open_price_deck(path):
+    """
+    Open a deck file memory-mapped and read only, once per process.
+
+    Returns: Array of shape (nodes, scenarios, years, 8760)
+
+    Raises: ValueError if the file does not hold a price deck
+    """
+    path = os.path.abspath(path)
+    with _decks_lock:
+        deck = _decks.get(path)
+        if deck is None:
+            try:
+                deck = np.load(path, mmap_mode='r')
+            except (OSError, ValueError):
+                raise ValueError(f"{os.path.basename(path)} is not a readable .npy file")
+            if deck.ndim == 3:
+                deck = deck[np.newaxis]
+            if deck.ndim != 4 or deck.shape[-1] != HOURS_PER_YEAR or deck.dtype.kind != 'f':
+                raise ValueError(f"{os.path.basename(path)} is not a price deck of hourly floats")
+            _decks[path] = deck
+    return deck
+
+
+def register_price_deck(name, path, nodes=None, start_year=None, description=None):
+    """
+    Record a deck file in the database. The caller commits.
+
+    Parameters:
+    - name: Display name
+    - path: .npy file, as written by write_price_deck
+    - nodes: Node names in array order (default: 'node-1', 'node-2', ...)
+    - start_year: Calendar year of the first deck year (default: this year)
+
+    Returns: The new PriceDeck
+
+    Raises: ValueError if the file is not a deck or the node names do not match it
+    """
+    deck = open_price_deck(path)
+    nodes = list(nodes) if nodes else [f'node-{index + 1}' for index in range(deck.shape[0])]
+    if len(nodes) != deck.shape[0]:
+        raise ValueError(f"The deck has {deck.shape[0]} nodes, {len(nodes)} names were given")
+    if any(',' in node for node in nodes):
+        raise ValueError("Node names cannot contain commas")
+    if start_year is None:
+        start_year = datetime.utcnow().year
+    price_deck = PriceDeck(name=name, description=description, path=os.path.abspath(path),
+                           nodes=','.join(nodes), n_scenarios=deck.shape[1], start_year=int(start_year),
+                           n_years=deck.shape[2])
+    db.session.add(price_deck)
+    return price_deck
+
+
+def deck_prices(price_deck, node=None):
+    """
+    Lazy (scenarios, years, 8760) view of one node of a registered deck.
+
+    Raises: ValueError for an unknown node
+    """
+    nodes = price_deck.nodes.split(',')
+    if node is None:
+        node = nodes[0]
+    if node not in nodes:
+        raise ValueError(f"Unknown node {node} in price deck {price_deck.name}")
+    return open_price_deck(price_deck.path)[nodes.index(node)]
+
+
+def hourly_production(project, n_years):
+    """
+    Hourly production (MWh) of each operational year, shape (n_years, 8760).
+
+    Solar arrays use the hourly irradiance model; other projects spread
+    their annual energy evenly over the hours of the year.
+    """
+    if (project.project_type in ('solar', 'hybrid') and getattr(project, 'latitude', None) is not None
+            and getattr(project, 'longitude', None) is not None):
+        return solar.hourly_production(project, n_years)
+    annual = estimate_energy_production(project, np.arange(n_years))
+    return np.broadcast_to(np.asarray(annual, dtype=float)[:, np.newaxis] / HOURS_PER_YEAR,
+                           (n_years, HOURS_PER_YEAR))
+
+
+def merchant_revenue(production, prices, merchant_share=1.0, curtailment_price=DEFAULT_CURTAILMENT_PRICE,
+                     year_offset=0, escalation=0.0):
+    """
+    Market revenue of the merchant share of hourly production under every price scenario.
+
+    Parameters:
+    - production: Hourly production (MWh) per operational year, (years, 8760)
+    - prices: Price deck view (scenarios, deck years, 8760), e.g. from deck_prices
+    - merchant_share: Share of production sold at market prices (fraction)
+    - curtailment_price: Merchant energy is curtailed in hours priced below this
+    - year_offset: Deck year of the first operational year; years before the
+      deck use its first year
+    - escalation: Annual escalation of the last deck year's prices for
+      operational years past the end of the deck (fraction)
+
+    Returns: dict of (scenarios, years) arrays: 'revenue' ($), 'sold_mwh',
+    'curtailed_mwh' and 'capture_price' ($/MWh, NaN where nothing is sold)
+    """
+    production = np.asarray(production, dtype=float) * merchant_share
+    n_years = production.shape[0]
+    n_scenarios, deck_years = prices.shape[0], prices.shape[1]
+    revenue = np.zeros((n_scenarios, n_years))
+    sold = np.zeros((n_scenarios, n_years))
+    curtailed = np.zeros((n_scenarios, n_years))
+    for year in range(n_years):
+        deck_year = year + year_offset
+        index = min(max(deck_year, 0), deck_years - 1)
+        factor = (1 + escalation) ** max(deck_year - (deck_years - 1), 0)
+        # One deck year of one node: only these pages are read from the mapping
+        year_prices = np.asarray(prices[:, index], dtype=float) * factor
+        selling = year_prices >= curtailment_price
+        revenue[:, year] = np.where(selling, year_prices, 0.0) @ production[year]
+        sold[:, year] = selling @ production[year]
+        curtailed[:, year] = production[year].sum() - sold[:, year]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        capture_price = np.where(sold > 0, revenue / sold, np.nan)
+    return {'revenue': revenue, 'sold_mwh': sold, 'curtailed_mwh': curtailed, 'capture_price': capture_price}
+
+
+def merchant_valuation(project, price_deck, node=None, ppa_share=0.0,
+                       curtailment_price=DEFAULT_CURTAILMENT_PRICE, assumptions=None):
+    """
+    Value a project with a PPA/merchant split under every scenario of a price deck.
+
+    The PPA share of energy earns the PPA price through the cash-flow engine;
+    the merchant share earns the deck's hourly prices, curtailed below
+    curtailment_price. Operation starts in the project's commercial operation
+    year (default: the deck's first year); years past the deck escalate its
+    last year at the inflation rate.
+
+    Parameters:
+    - project: A Project instance
+    - price_deck: A PriceDeck
+    - node: Node of the deck to price at (default: the first)
+    - ppa_share: Share of energy under the PPA (fraction)
+    - curtailment_price: As for merchant_revenue
+    - assumptions: Overrides of the SCENARIO_DEFAULTS assumptions; a
+      target_dscr sculpts the debt, capped at debt_ratio of capex
+
+    Returns: dict with per-scenario MERCHANT_METRICS, per-year 'merchant_revenue',
+    'capture_price' and 'curtailed_mwh' arrays (scenarios x years) and the
+    'mean_capture_price' of each year over all scenarios
+
+    Raises: ValueError for an unknown node or a ppa_share outside 0..1
+    """
+    if not 0 <= ppa_share <= 1:
+        raise ValueError("ppa_share must be between 0 and 1")
+    base = {name: (assumptions or {}).get(name, default) for name, default in SCENARIO_DEFAULTS.items()}
+    discount_rate = float(base.pop('discount_rate'))
+    target_dscr = base.pop('target_dscr')
+    inputs = project_cash_flow_inputs(project)
+    lifetime = int(inputs['lifetime_years'])
+    if base['ppa_term'] is None:
+        base['ppa_term'] = lifetime
+
+    prices = deck_prices(price_deck, node)
+    start_year = (project.commercial_operation_date.year if project.commercial_operation_date
+                  else price_deck.start_year)
+    market = merchant_revenue(hourly_production(project, lifetime), prices, 1 - ppa_share, curtailment_price,
+                              year_offset=start_year - price_deck.start_year,
+                              escalation=base['inflation_rate'])
+
+    n_scenarios = prices.shape[0]
+    params = {name: np.full(n_scenarios, float(value)) for name, value in {**inputs, **base}.items()}
+    schedule = finance.cash_flow_schedule(**params, ppa_share=ppa_share, market_revenue=market['revenue'])
+    if target_dscr is not None:
+        schedule, _ = debt.sculpt_schedule(schedule, target_dscr, interest_rate=params['interest_rate'],
+                                           max_gearing=params['debt_ratio'])
+    net = schedule['net_cash_flow']
+    total_sold = market['sold_mwh'].sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_capture_price = np.where(total_sold > 0, market['revenue'].sum(axis=0) / total_sold, np.nan)
+    return {
+        'npv': finance.npv(net, discount_rate),
+        'irr': returns.irr(net),
+        'lcoe': finance.lcoe(schedule, discount_rate),
+        'merchant_revenue': market['revenue'],
+        'capture_price': market['capture_price'],
+        'curtailed_mwh': market['curtailed_mwh'],
+        'mean_capture_price': mean_capture_price,
+    }
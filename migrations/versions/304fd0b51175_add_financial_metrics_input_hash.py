@@ -0,0 +1,30 @@
+"""add financial_metrics.input_hash
+
+Revision ID: 304fd0b51175
+Revises: 
+Create Date: 2026-10-18 03:10:37.920118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '304fd0b51175'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases created by db.create_all() after the change already have the column
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('financial_metrics')}
+    if 'input_hash' not in columns:
+        op.add_column('financial_metrics', sa.Column('input_hash', sa.String(length=64), nullable=True))
+        op.create_index('ix_financial_metrics_input_hash', 'financial_metrics', ['input_hash'])
+
+
+def downgrade():
+    op.drop_index('ix_financial_metrics_input_hash', table_name='financial_metrics')
+    with op.batch_alter_table('financial_metrics') as batch_op:
+        batch_op.drop_column('input_hash')
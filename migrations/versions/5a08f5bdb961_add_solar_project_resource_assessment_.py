@@ -0,0 +1,35 @@
+"""add solar project resource assessment columns
+
+Revision ID: 5a08f5bdb961
+Revises: a50318dae62d
+Create Date: 2026-10-18 03:11:51.321604
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5a08f5bdb961'
+down_revision = 'a50318dae62d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases created by db.create_all() after the change already have the columns
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('solar_projects')}
+    # Batch mode, as SQLite cannot add a foreign key to an existing table in place
+    with op.batch_alter_table('solar_projects') as batch_op:
+        if 'specific_yield' not in columns:
+            batch_op.add_column(sa.Column('specific_yield', sa.Float(), nullable=True))
+        if 'resource_dataset_id' not in columns:
+            batch_op.add_column(sa.Column('resource_dataset_id', sa.Integer(), nullable=True))
+            batch_op.create_foreign_key('fk_solar_projects_resource_dataset_id', 'datasets',
+                                        ['resource_dataset_id'], ['id'])
+
+
+def downgrade():
+    with op.batch_alter_table('solar_projects') as batch_op:
+        batch_op.drop_column('resource_dataset_id')
+        batch_op.drop_column('specific_yield')
@@ -0,0 +1,48 @@
+"""add tax treatment columns
+
+Revision ID: 87957f79c41b
+Revises: 5a08f5bdb961
+Create Date: 2026-10-18 03:12:31.009937
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '87957f79c41b'
+down_revision = '5a08f5bdb961'
+branch_labels = None
+depends_on = None
+
+
+# New columns by table; rows stored before the change keep NULL, which the
+# engine reads as the tax module defaults
+COLUMNS = {
+    'projects': {
+        'depreciation_method': sa.String(length=20),
+        'depreciation_years': sa.Integer(),
+        'itc_rate': sa.Float(),
+        'ptc_rate': sa.Float(),
+    },
+    'financial_metrics': {
+        'tax_rate': sa.Float(),
+    },
+}
+
+
+def upgrade():
+    # Databases created by db.create_all() after the change already have the columns
+    inspector = sa.inspect(op.get_bind())
+    for table, columns in COLUMNS.items():
+        existing = {column['name'] for column in inspector.get_columns(table)}
+        for name, column_type in columns.items():
+            if name not in existing:
+                op.add_column(table, sa.Column(name, column_type, nullable=True))
+
+
+def downgrade():
+    for table, columns in COLUMNS.items():
+        with op.batch_alter_table(table) as batch_op:
+            for name in columns:
+                batch_op.drop_column(name)
@@ -0,0 +1,27 @@
+"""add cash_flows project year index
+
+Revision ID: 9aafdcb98c8d
+Revises: ca1ecc43ce2d
+Create Date: 2026-10-18 03:11:29.834719
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9aafdcb98c8d'
+down_revision = 'ca1ecc43ce2d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases created by db.create_all() after the change already have the index
+    existing = {index['name'] for index in sa.inspect(op.get_bind()).get_indexes('cash_flows')}
+    if 'ix_cash_flows_project_id_year' not in existing:
+        op.create_index('ix_cash_flows_project_id_year', 'cash_flows', ['project_id', 'year'])
+
+
+def downgrade():
+    op.drop_index('ix_cash_flows_project_id_year', table_name='cash_flows')
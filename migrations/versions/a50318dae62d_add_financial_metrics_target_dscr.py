@@ -0,0 +1,28 @@
+"""add financial_metrics.target_dscr
+
+Revision ID: a50318dae62d
+Revises: 9aafdcb98c8d
+Create Date: 2026-10-18 03:11:42.348311
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a50318dae62d'
+down_revision = '9aafdcb98c8d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases created by db.create_all() after the change already have the column
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('financial_metrics')}
+    if 'target_dscr' not in columns:
+        op.add_column('financial_metrics', sa.Column('target_dscr', sa.Float(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('financial_metrics') as batch_op:
+        batch_op.drop_column('target_dscr')
@@ -0,0 +1,40 @@
+"""add project listing indexes
+
+Revision ID: ca1ecc43ce2d
+Revises: 304fd0b51175
+Create Date: 2026-10-18 03:11:13.034733
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'ca1ecc43ce2d'
+down_revision = '304fd0b51175'
+branch_labels = None
+depends_on = None
+
+
+# Composite indexes of the keyset-paginated project listing, see models.Project
+INDEXES = {
+    'ix_projects_created_at_id': ['created_at', 'id'],
+    'ix_projects_capacity_mw_id': ['capacity_mw', 'id'],
+    'ix_projects_status_created_at_id': ['status', 'created_at', 'id'],
+    'ix_projects_status_capacity_mw_id': ['status', 'capacity_mw', 'id'],
+    'ix_projects_project_type_created_at_id': ['project_type', 'created_at', 'id'],
+    'ix_projects_project_type_capacity_mw_id': ['project_type', 'capacity_mw', 'id'],
+}
+
+
+def upgrade():
+    # Databases created by db.create_all() after the change already have the indexes
+    existing = {index['name'] for index in sa.inspect(op.get_bind()).get_indexes('projects')}
+    for name, columns in INDEXES.items():
+        if name not in existing:
+            op.create_index(name, 'projects', columns)
+
+
+def downgrade():
+    for name in INDEXES:
+        op.drop_index(name, table_name='projects')
@@ -30,6 +30,12 @@ class Project(db.Model):
     commercial_operation_date = db.Column(db.Date)
     expected_lifetime_years = db.Column(db.Integer, default=25)
     
+    # Tax treatment
+    depreciation_method = db.Column(db.String(20), default='macrs')  # macrs, straight_line, none
+    depreciation_years = db.Column(db.Integer, default=5)  # MACRS recovery or straight-line period
+    itc_rate = db.Column(db.Float, default=0.0)  # Investment tax credit (fraction of capex)
+    ptc_rate = db.Column(db.Float, default=0.0)  # Production tax credit in the first year ($/MWh)
+    
     # Project status
     status = db.Column(db.String(50), default='planning')  # planning, construction, operational, decommissioned
     
@@ -45,6 +51,16 @@ class Project(db.Model):
         'polymorphic_identity': 'project'
     }
     
+    # Composite indexes backing the filtered, keyset-paginated project listing
+    __table_args__ = (
+        db.Index('ix_projects_created_at_id', 'created_at', 'id'),
+        db.Index('ix_projects_capacity_mw_id', 'capacity_mw', 'id'),
+        db.Index('ix_projects_status_created_at_id', 'status', 'created_at', 'id'),
+        db.Index('ix_projects_status_capacity_mw_id', 'status', 'capacity_mw', 'id'),
+        db.Index('ix_projects_project_type_created_at_id', 'project_type', 'created_at', 'id'),
+        db.Index('ix_projects_project_type_capacity_mw_id', 'project_type', 'capacity_mw', 'id'),
+    )
+    
     def __repr__(self):
         return f'<Project {self.name} ({self.capacity_mw} MW)>'
 
@@ -77,6 +93,10 @@ class SolarProject(Project):
     # Tracking system (if any)
     tracking_type = db.Column(db.String(50), default='fixed')  # fixed, single-axis, dual-axis
     
+    # Site resource assessment against a climate dataset, see site_resource.py
+    specific_yield = db.Column(db.Float)  # MWh per MW per year before performance ratio
+    resource_dataset_id = db.Column(db.Integer, db.ForeignKey('datasets.id'))
+    
     __mapper_args__ = {
         'polymorphic_identity': 'solar'
     }
@@ -85,6 +105,76 @@ class SolarProject(Project):
         return f'<SolarProject {self.name} ({self.capacity_mw} MW)>'
 
 
+class WindProject(Project):
+    """Model for wind energy projects"""
+    __tablename__ = 'wind_projects'
+    
+    id = db.Column(db.Integer, db.ForeignKey('projects.id'), primary_key=True)
+    
+    # Turbine parameters
+    turbine_model = db.Column(db.String(100))
+    num_turbines = db.Column(db.Integer)
+    turbine_capacity_mw = db.Column(db.Float)  # rated capacity per turbine in MW
+    hub_height_m = db.Column(db.Float)
+    rotor_diameter_m = db.Column(db.Float)
+    power_curve = db.Column(db.Text)  # JSON list of [wind speed m/s, power kW] points
+    
+    # Location parameters
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    
+    # Wind resource
+    mean_wind_speed = db.Column(db.Float)  # long-term mean wind speed in m/s
+    measurement_height_m = db.Column(db.Float)  # height of mean_wind_speed (default: hub height)
+    weibull_k = db.Column(db.Float, default=2.0)  # Weibull shape parameter
+    shear_exponent = db.Column(db.Float, default=0.143)  # power-law wind shear exponent
+    
+    # Losses and performance
+    wake_loss = db.Column(db.Float, default=8.0)  # array wake loss (%)
+    availability = db.Column(db.Float, default=97.0)  # turbine availability (%)
+    electrical_loss = db.Column(db.Float, default=2.0)  # collection and transformer loss (%)
+    degradation_rate = db.Column(db.Float, default=0.5)  # annual degradation rate (%)
+    
+    __mapper_args__ = {
+        'polymorphic_identity': 'wind'
+    }
+    
+    def __repr__(self):
+        return f'<WindProject {self.name} ({self.capacity_mw} MW)>'
+
+
+class HybridProject(SolarProject):
+    """Model for solar projects with co-located battery storage"""
+    __tablename__ = 'hybrid_projects'
+    
+    id = db.Column(db.Integer, db.ForeignKey('solar_projects.id'), primary_key=True)
+    
+    # Battery parameters
+    storage_power_mw = db.Column(db.Float)  # charge and discharge power limit in MW
+    storage_energy_mwh = db.Column(db.Float)  # energy capacity in MWh
+    round_trip_efficiency = db.Column(db.Float, default=0.85)  # fraction of charged energy returned
+    min_state_of_charge = db.Column(db.Float, default=0.1)  # fraction of capacity
+    max_state_of_charge = db.Column(db.Float, default=1.0)  # fraction of capacity
+    
+    # Grid connection
+    export_limit_mw = db.Column(db.Float)  # interconnection limit in MW (none if empty)
+    grid_charging = db.Column(db.Boolean, default=False)  # battery may charge from the grid
+    
+    # First-year arbitrage revenue from the latest dispatch run ($)
+    arbitrage_revenue = db.Column(db.Float)
+    
+    __mapper_args__ = {
+        'polymorphic_identity': 'hybrid'
+    }
+    
+    def __repr__(self):
+        return f'<HybridProject {self.name} ({self.capacity_mw} MW + {self.storage_power_mw} MW storage)>'
+
+
+# Joined-table subclasses loaded together with Project
+PROJECT_SUBCLASSES = (SolarProject, WindProject, HybridProject)
+
+
 class CashFlow(db.Model):
     """Model for tracking project cash flows"""
     __tablename__ = 'cash_flows'
@@ -120,10 +210,42 @@ class CashFlow(db.Model):
     # Relationships
     project = db.relationship('Project', backref=db.backref('cash_flows', lazy=True))
     
+    # Schedules are replaced and read per project in year order
+    __table_args__ = (
+        db.Index('ix_cash_flows_project_id_year', 'project_id', 'year'),
+    )
+    
     def __repr__(self):
         return f'<CashFlow Project={self.project_id} Year={self.year} Net={self.net_cash_flow}>'
 
 
+class CashFlowSchedule(db.Model):
+    """Model for storing a whole cash-flow schedule as one packed array"""
+    __tablename__ = 'cash_flow_schedules'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), nullable=False)
+    scenario = db.Column(db.String(64), nullable=False, default='base')  # Scenario the schedule belongs to
+    
+    # Packed float64 array of shape (columns x years), C order
+    columns = db.Column(db.Text, nullable=False)  # Comma-separated column names, in array order
+    n_years = db.Column(db.Integer, nullable=False)  # Number of years including year 0
+    data = db.Column(db.LargeBinary, nullable=False)
+    
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    project = db.relationship('Project', backref=db.backref('cash_flow_schedules', lazy=True))
+    
+    __table_args__ = (
+        db.UniqueConstraint('project_id', 'scenario', name='uq_cash_flow_schedules_project_scenario'),
+    )
+    
+    def __repr__(self):
+        return f'<CashFlowSchedule Project={self.project_id} Scenario={self.scenario} Years={self.n_years}>'
+
+
 class FinancialMetric(db.Model):
     """Model for storing calculated financial metrics for a project"""
     __tablename__ = 'financial_metrics'
@@ -147,12 +269,19 @@ class FinancialMetric(db.Model):
     inflation_rate = db.Column(db.Float)  # Inflation rate used (%)
     debt_ratio = db.Column(db.Float)  # Debt to total capital ratio
     interest_rate = db.Column(db.Float)  # Interest rate on debt (%)
+    tax_rate = db.Column(db.Float)  # Income tax rate used (%)
     
     # PPA details if applicable
     ppa_price = db.Column(db.Float)  # Power Purchase Agreement price ($/MWh)
     ppa_escalation = db.Column(db.Float)  # Annual escalation rate for PPA (%)
     ppa_term = db.Column(db.Integer)  # PPA term in years
     
+    # Debt sculpting, if applicable
+    target_dscr = db.Column(db.Float)  # DSCR the debt was sculpted to
+    
+    # Fingerprint of the project fields and assumptions the metrics were derived from
+    input_hash = db.Column(db.String(64), index=True)
+    
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -161,4 +290,177 @@ class FinancialMetric(db.Model):
     project = db.relationship('Project', backref=db.backref('financial_metrics', uselist=False))
     
     def __repr__(self):
-        return f'<FinancialMetric Project={self.project_id} NPV={self.npv} IRR={self.irr}>'
\ No newline at end of file
+        return f'<FinancialMetric Project={self.project_id} NPV={self.npv} IRR={self.irr}>'
+
+
+class Job(db.Model):
+    """Model for tracking background jobs such as imports and valuations"""
+    __tablename__ = 'jobs'
+    
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    kind = db.Column(db.String(50), nullable=False)  # e.g., 'import', 'valuation', 'monte_carlo'
+    status = db.Column(db.String(20), default='queued')  # queued, running, completed, failed
+    progress = db.Column(db.Float, default=0.0)  # Percent complete (0-100)
+    
+    # Outcome
+    result = db.Column(db.Text)  # JSON-encoded result summary
+    result_path = db.Column(db.String(255))  # Pointer to a larger result stored on disk
+    error = db.Column(db.Text)  # Error message if the job failed
+    
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<Job {self.id} {self.kind} {self.status} {self.progress}%>'
+
+
+class PriceDeck(db.Model):
+    """Model for registering an hourly market price deck stored on disk"""
+    __tablename__ = 'price_decks'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    description = db.Column(db.Text)
+    
+    # .npy array of shape (nodes x scenarios x years x 8760) in $/MWh, read memory-mapped
+    path = db.Column(db.String(255), nullable=False)
+    nodes = db.Column(db.Text, nullable=False)  # Comma-separated node names, in array order
+    n_scenarios = db.Column(db.Integer, nullable=False)
+    start_year = db.Column(db.Integer, nullable=False)  # Calendar year of the first deck year
+    n_years = db.Column(db.Integer, nullable=False)
+    
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<PriceDeck {self.name} ({self.start_year}+{self.n_years}y, {self.n_scenarios} scenarios)>'
+
+
+class Dataset(db.Model):
+    """Model for registering an uploaded gridded climate dataset (NetCDF)"""
+    __tablename__ = 'datasets'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    original_filename = db.Column(db.String(255), nullable=False)
+    description = db.Column(db.Text)
+    
+    # File on disk, opened lazily: only the slabs a request needs are read
+    path = db.Column(db.String(255), nullable=False)
+    file_type = db.Column(db.String(20), nullable=False)  # e.g. 'NETCDF4', 'NETCDF3_CLASSIC'
+    file_size = db.Column(db.BigInteger, nullable=False)  # bytes
+    
+    # Dimensions, variables, attributes and coordinate bounds as JSON, extracted at upload
+    metadata_json = db.Column(db.Text, nullable=False)
+    
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<Dataset {self.original_filename} ({self.file_type})>'
+
+
+class ClimateAnalysis(db.Model):
+    """Model for a climate analysis of one dataset variable, computed as a background job"""
+    __tablename__ = 'climate_analyses'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    dataset_id = db.Column(db.Integer, db.ForeignKey('datasets.id'), nullable=False)
+    analysis_type = db.Column(db.String(50), nullable=False)  # e.g., 'temperature_mean', 'climate_indices'
+    variable = db.Column(db.String(100), nullable=False)
+    
+    # Normalized request parameters as JSON; identical requests reuse the analysis
+    parameters = db.Column(db.Text, nullable=False)
+    
+    # Progress
+    status = db.Column(db.String(20), default='queued')  # queued, running, completed, failed
+    job_id = db.Column(db.String(32), db.ForeignKey('jobs.id'))
+    error = db.Column(db.Text)
+    
+    # Outcome: units, coordinates and other metadata as JSON, grids in a .npz file
+    result_json = db.Column(db.Text)
+    result_path = db.Column(db.String(255))
+    
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    
+    # Relationships
+    dataset = db.relationship('Dataset', backref=db.backref('analyses', lazy=True))
+    
+    def __repr__(self):
+        return f'<ClimateAnalysis {self.analysis_type} of {self.variable} Dataset={self.dataset_id} {self.status}>'
+
+
+class Scenario(db.Model):
+    """Model for a named set of valuation assumptions applied across the portfolio"""
+    __tablename__ = 'scenarios'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False, unique=True)  # e.g., 'base', 'downside', 'upside'
+    description = db.Column(db.Text)
+    
+    # Rates (fractions)
+    discount_rate = db.Column(db.Float, default=0.08)
+    inflation_rate = db.Column(db.Float, default=0.025)
+    debt_ratio = db.Column(db.Float, default=0.7)
+    interest_rate = db.Column(db.Float, default=0.05)
+    target_dscr = db.Column(db.Float)  # Sculpt debt to this DSCR; level annuity debt if empty
+    tax_rate = db.Column(db.Float, default=0.21)  # Income tax rate
+    
+    # PPA terms
+    ppa_price = db.Column(db.Float, default=50.0)  # $/MWh in the first operational year
+    ppa_escalation = db.Column(db.Float, default=0.0)  # Annual escalation (fraction)
+    ppa_term = db.Column(db.Integer)  # Years; the project lifetime if empty
+    ppa_share = db.Column(db.Float, default=1.0)  # Share of energy under the PPA (fraction)
+    
+    # Market prices for the energy outside the PPA: one scenario of one node of a price deck
+    price_deck_id = db.Column(db.Integer, db.ForeignKey('price_decks.id'))
+    price_deck_node = db.Column(db.String(100))  # The deck's first node if empty
+    price_deck_scenario = db.Column(db.Integer, default=0)  # Index into the deck's scenarios
+    curtailment_price = db.Column(db.Float, default=0.0)  # Merchant energy is curtailed below this ($/MWh)
+    
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Relationships
+    price_deck = db.relationship('PriceDeck')
+    
+    def __repr__(self):
+        return f'<Scenario {self.name}>'
+
+
+class ScenarioResult(db.Model):
+    """Model for the financial metrics of one project under one scenario"""
+    __tablename__ = 'scenario_results'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    scenario_id = db.Column(db.Integer, db.ForeignKey('scenarios.id'), nullable=False)
+    project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), nullable=False, index=True)
+    
+    # Metrics, as in FinancialMetric
+    npv = db.Column(db.Float)
+    irr = db.Column(db.Float)
+    payback_period = db.Column(db.Float)
+    lcoe = db.Column(db.Float)
+    mirr = db.Column(db.Float)
+    profitability_index = db.Column(db.Float)
+    debt_service_coverage_ratio = db.Column(db.Float)
+    
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Relationships
+    scenario = db.relationship('Scenario', backref=db.backref('results', lazy=True))
+    project = db.relationship('Project', backref=db.backref('scenario_results', lazy=True))
+    
+    __table_args__ = (
+        db.UniqueConstraint('scenario_id', 'project_id', name='uq_scenario_results_scenario_project'),
+    )
+    
+    def __repr__(self):
+        return f'<ScenarioResult Scenario={self.scenario_id} Project={self.project_id} NPV={self.npv}>'
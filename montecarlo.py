@@ -0,0 +1,241 @@
+"""
+Monte Carlo risk engine for the Energy Finance application.
+Samples uncertain project inputs and evaluates every path through the
+vectorized cash-flow engine as one (paths x years) array per chunk.
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import debt
+import finance
+import returns
+from utils import SCENARIO_DEFAULTS, project_cash_flow_inputs
+
+
+# Uncertain drivers and their default distributions. Parameters are
+# multiplicative factors on the base-case value unless 'absolute' is set.
+DEFAULT_DISTRIBUTIONS = {
+    'capex': {'dist': 'triangular', 'low': 0.9, 'mode': 1.0, 'high': 1.25},
+    'opex': {'dist': 'normal', 'mean': 1.0, 'std': 0.1},
+    'performance_ratio': {'dist': 'normal', 'mean': 1.0, 'std': 0.05},
+    'degradation_rate': {'dist': 'uniform', 'low': 0.6, 'high': 1.6},
+    'ppa_price': {'dist': 'normal', 'mean': 1.0, 'std': 0.1},
+    'discount_rate': {'dist': 'normal', 'mean': 1.0, 'std': 0.1},
+}
+
+# Drivers that may be given a distribution; each has a base-case value
+MONTE_CARLO_DRIVERS = ('capex', 'opex', 'performance_ratio', 'degradation_rate', 'ppa_price', 'discount_rate',
+                       'inflation_rate', 'interest_rate', 'ppa_escalation', 'tax_rate')
+
+# Parameters required by each distribution
+DISTRIBUTION_PARAMETERS = {
+    'normal': ('mean', 'std'),
+    'lognormal': ('mean', 'sigma'),
+    'uniform': ('low', 'high'),
+    'triangular': ('low', 'mode', 'high'),
+    'fixed': (),
+}
+
+# Default IRR histogram bin edges
+IRR_BINS = np.linspace(-0.1, 0.3, 41)
+
+# Paths evaluated per chunk; bounds memory to chunk_size x years per array
+DEFAULT_CHUNK_SIZE = 10000
+
+
+def sample(spec, size, rng):
+    """
+    Draw samples from a distribution spec.
+
+    Parameters:
+    - spec: dict with 'dist' (normal, lognormal, uniform, triangular or fixed)
+      and its parameters
+    - size: Number of samples
+    - rng: numpy.random.Generator
+
+    Returns: Array of samples
+    """
+    dist = spec.get('dist', 'fixed')
+    if dist == 'normal':
+        return rng.normal(spec['mean'], spec['std'], size)
+    if dist == 'lognormal':
+        return rng.lognormal(spec['mean'], spec['sigma'], size)
+    if dist == 'uniform':
+        return rng.uniform(spec['low'], spec['high'], size)
+    if dist == 'triangular':
+        return rng.triangular(spec['low'], spec['mode'], spec['high'], size)
+    if dist == 'fixed':
+        return np.full(size, float(spec.get('value', 1.0)))
+    raise ValueError(f"Unknown distribution '{dist}'")
+
+
+def check_distributions(distributions):
+    """
+    Validate user-supplied distribution specs before a run is queued.
+
+    Parameters:
+    - distributions: Distribution specs keyed by driver, or None for the defaults
+
+    Raises: ValueError naming the first unknown driver, distribution or bad parameter
+    """
+    if distributions is None:
+        return
+    if not isinstance(distributions, dict):
+        raise ValueError("distributions must be an object keyed by driver")
+    for driver, spec in distributions.items():
+        if driver not in MONTE_CARLO_DRIVERS:
+            raise ValueError(f"Unknown driver '{driver}'")
+        if not isinstance(spec, dict):
+            raise ValueError(f"Distribution of {driver} must be an object")
+        dist = spec.get('dist', 'fixed')
+        if dist not in DISTRIBUTION_PARAMETERS:
+            raise ValueError(f"Unknown distribution '{dist}'")
+        for name in DISTRIBUTION_PARAMETERS[dist] + (('value',) if 'value' in spec else ()):
+            value = spec.get(name)
+            if not isinstance(value, (int, float)) or isinstance(value, bool) or not np.isfinite(value):
+                raise ValueError(f"{driver}: '{name}' must be a number")
+
+
+def draw_values(base, distributions, n_paths, seed=None):
+    """
+    Sample every driver for all paths from one seeded generator.
+
+    Drivers are drawn in turn for the whole run, so the values of each path
+    depend only on the seed and not on how the paths are later chunked.
+
+    Returns: dict of arrays of length n_paths keyed by driver
+    """
+    rng = np.random.default_rng(seed)
+    values = {}
+    for driver, spec in distributions.items():
+        draws = sample(spec, n_paths, rng)
+        values[driver] = draws if spec.get('absolute') else base[driver] * draws
+    return values
+
+
+def _simulate_chunk(base, values):
+    """
+    Evaluate one chunk of paths.
+
+    Parameters:
+    - base: Base-case engine inputs and assumptions (plain dict, picklable)
+    - values: Sampled driver values of the chunk's paths, keyed by driver
+
+    Returns: (npv, irr) arrays, one value per path
+    """
+    # Energy scales linearly with the performance ratio
+    energy_mwh = base['energy_mwh']
+    if 'performance_ratio' in values:
+        energy_mwh = energy_mwh * np.maximum(values['performance_ratio'], 0) / base['performance_ratio']
+
+    inputs = finance.cash_flow_inputs({**base, **values})
+    inputs['energy_mwh'] = energy_mwh
+    for name in ('capex', 'opex', 'degradation_rate', 'ppa_price'):
+        inputs[name] = np.maximum(inputs[name], 0)
+    schedule = finance.cash_flow_schedule(**inputs, n_years=int(base['lifetime_years']))
+    if base.get('target_dscr') is not None:
+        schedule, _ = debt.sculpt_schedule(schedule, base['target_dscr'],
+                                           interest_rate=base['interest_rate'],
+                                           max_gearing=base['debt_ratio'])
+    discount_rate = values.get('discount_rate', base['discount_rate'])
+    cash_flows = schedule['net_cash_flow']
+    return finance.npv(cash_flows, discount_rate), returns.irr(cash_flows)
+
+
+def exceedance_levels(values):
+    """
+    P10/P50/P90 in the lender convention: P90 is the value exceeded
+    on 90% of paths (the 10th percentile).
+    """
+    p90, p50, p10 = np.nanpercentile(values, [10, 50, 90])
+    return {'p10': float(p10), 'p50': float(p50), 'p90': float(p90)}
+
+
+def run_monte_carlo(base, n_paths=100000, distributions=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                    workers=None, seed=None, irr_bins=IRR_BINS, progress=None):
+    """
+    Run a Monte Carlo simulation of project NPV and IRR.
+
+    Parameters:
+    - base: Base-case inputs: the keys of utils.project_cash_flow_inputs plus
+      performance_ratio and the SCENARIO_DEFAULTS assumptions
+    - n_paths: Number of simulated paths
+    - distributions: Distribution specs keyed by driver (default DEFAULT_DISTRIBUTIONS)
+    - chunk_size: Paths evaluated per chunk
+    - workers: Number of worker processes (default: all cores; 1 runs in-process)
+    - seed: Seed for reproducible results, independent of the number of workers
+      and of the chunk size
+    - irr_bins: Bin edges of the IRR histogram
+    - progress: Optional callback called with (chunks done, total chunks)
+
+    Returns: dict with NPV percentiles, probability of loss and the IRR distribution
+    """
+    distributions = DEFAULT_DISTRIBUTIONS if distributions is None else distributions
+    base = dict(base)
+    if base.get('ppa_term') is None:
+        base['ppa_term'] = base['lifetime_years']
+
+    values = draw_values(base, distributions, n_paths, seed)
+    sizes = [min(chunk_size, n_paths - start) for start in range(0, n_paths, chunk_size)]
+    chunk_args = ([base] * len(sizes),
+                  [{driver: drawn[start:start + chunk_size] for driver, drawn in values.items()}
+                   for start in range(0, n_paths, chunk_size)])
+
+    def collect(results):
+        chunks = []
+        for chunk in results:
+            chunks.append(chunk)
+            if progress:
+                progress(len(chunks), len(sizes))
+        return chunks
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(sizes) == 1:
+        chunks = collect(map(_simulate_chunk, *chunk_args))
+    else:
+        # Spawn fresh workers: forking the multithreaded web process would copy held locks and open handles
+        with ProcessPoolExecutor(max_workers=min(workers, len(sizes)),
+                                 mp_context=multiprocessing.get_context('spawn')) as executor:
+            chunks = collect(executor.map(_simulate_chunk, *chunk_args))
+
+    npv = np.concatenate([chunk[0] for chunk in chunks])
+    irr = np.concatenate([chunk[1] for chunk in chunks])
+    defined_irr = irr[~np.isnan(irr)]
+    counts, edges = np.histogram(np.clip(defined_irr, irr_bins[0], irr_bins[-1]), bins=irr_bins)
+
+    return {
+        'paths': n_paths,
+        'npv': {
+            **exceedance_levels(npv),
+            'mean': float(npv.mean()),
+            'std': float(npv.std()),
+        },
+        'probability_of_loss': float(np.mean(npv < 0)),
+        'irr': {
+            **(exceedance_levels(defined_irr) if defined_irr.size else {}),
+            'undefined': int(irr.size - defined_irr.size),
+            'histogram': {'bin_edges': edges.tolist(), 'counts': counts.tolist()},
+        },
+    }
+
+
+def simulate_project(project, assumptions=None, **kwargs):
+    """
+    Run a Monte Carlo simulation for a Project.
+
+    Parameters:
+    - project: A Project or SolarProject instance
+    - assumptions: Overrides of the SCENARIO_DEFAULTS assumptions
+    - kwargs: Forwarded to run_monte_carlo
+
+    Returns: Result of run_monte_carlo
+    """
+    base = dict(SCENARIO_DEFAULTS)
+    base.update(assumptions or {})
+    base.update(project_cash_flow_inputs(project))
+    base['performance_ratio'] = getattr(project, 'performance_ratio', None) or 1.0
+    return run_monte_carlo(base, **kwargs)
@@ -0,0 +1,220 @@
+"""
+Portfolio aggregation for the Energy Finance application.
+Cash flows and project attributes are summed with grouped SQL so only the
+per-year and per-group totals reach Python, where NPV and IRR are evaluated
+with NumPy in one pass over all groups.
+
+Stored cash flows are indexed by project year. They are placed on calendar years
+before summing: operating year 1 falls in the commercial operation date's year
+(year 0, construction, the year before), as in the merchant price-deck alignment.
+"""
+
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import case, func
+
+import finance
+import returns
+from app import db
+from models import CashFlow, CashFlowSchedule, FinancialMetric, Project
+from utils import json_float
+
+
+# Project attributes the portfolio can be broken down and filtered by
+BREAKDOWN_DIMENSIONS = ('project_type', 'status', 'location')
+
+DEFAULT_DISCOUNT_RATE = 0.08
+
+# Project capex in SQL, priced per MW when no total is given
+PROJECT_CAPEX = func.coalesce(Project.capex, Project.capex_per_mw * Project.capacity_mw, 0.0)
+
+# Cash-flow columns summed per year; the cumulative column is rebuilt from the sums
+SUMMED_COLUMNS = tuple(name for name in finance.CASH_FLOW_COLUMNS if name != 'cumulative_cash_flow')
+
+# Calendar year of a project's commercial operation date in SQL (NULL when undated)
+COD_YEAR = func.extract('year', Project.commercial_operation_date)
+
+
+def _filter_projects(query, filters):
+    for name, value in (filters or {}).items():
+        if name not in BREAKDOWN_DIMENSIONS:
+            raise ValueError(f"Cannot filter projects by {name}")
+        query = query.filter(getattr(Project, name) == value)
+    return query
+
+
+def _calendar_years(cod_years, years, start_year):
+    """Calendar year of each (COD year, project year) pair; undated projects start operating in start_year."""
+    if start_year is None:
+        start_year = datetime.utcnow().year
+    return np.array([int(cod if cod is not None else start_year) + year - 1
+                     for cod, year in zip(cod_years, years)], dtype=int)
+
+
+def yearly_cash_flows(filters=None, start_year=None):
+    """
+    Combined cash flows of all matching projects on calendar years, one grouped
+    query by COD year and project year.
+
+    Parameters:
+    - filters: dict mapping BREAKDOWN_DIMENSIONS names to required values
+    - start_year: Year undated projects are assumed to start operating (default: this year)
+
+    Returns: dict mapping 'year' (calendar years) and each CashFlow column to
+    arrays, with years missing from every project filled with zeros
+    """
+    sums = [func.coalesce(func.sum(getattr(CashFlow, name)), 0.0) for name in SUMMED_COLUMNS]
+    query = (db.session.query(COD_YEAR, CashFlow.year, *sums)
+             .join(Project, Project.id == CashFlow.project_id))
+    rows = _filter_projects(query, filters).group_by(COD_YEAR, CashFlow.year).all()
+
+    calendar = _calendar_years([row[0] for row in rows], [row[1] for row in rows], start_year)
+    first = calendar.min() if rows else 0
+    n_years = calendar.max() - first + 1 if rows else 0
+    curves = {'year': np.arange(first, first + n_years)}
+    curves.update({name: np.zeros(n_years) for name in SUMMED_COLUMNS})
+    for position, row in zip(calendar - first, rows):
+        for name, value in zip(SUMMED_COLUMNS, row[2:]):
+            curves[name][position] += value
+    curves['cumulative_cash_flow'] = np.cumsum(curves['net_cash_flow'])
+    return curves
+
+
+def grouped_net_cash_flows(dimension, filters=None, start_year=None):
+    """
+    Net cash flow per calendar year for each value of a project attribute,
+    spanning the same years as yearly_cash_flows with the same filters.
+
+    Returns: (group keys, matrix of shape (groups x years))
+    """
+    key = getattr(Project, dimension)
+    query = (db.session.query(key, COD_YEAR, CashFlow.year, func.sum(CashFlow.net_cash_flow))
+             .join(Project, Project.id == CashFlow.project_id))
+    rows = _filter_projects(query, filters).group_by(key, COD_YEAR, CashFlow.year).all()
+
+    groups = {}
+    for row in rows:
+        groups.setdefault(row[0], len(groups))
+    calendar = _calendar_years([row[1] for row in rows], [row[2] for row in rows], start_year)
+    first = calendar.min() if rows else 0
+    n_years = calendar.max() - first + 1 if rows else 0
+    matrix = np.zeros((len(groups), n_years))
+    for position, (group, _, _, value) in zip(calendar - first, rows):
+        matrix[groups[group], position] += value or 0.0
+    return list(groups), matrix
+
+
+def cash_flow_coverage(filters=None):
+    """
+    How many matching projects the yearly cash flows cover. Projects stored
+    only as packed schedules, or never valued, have no CashFlow rows and are
+    left out of the curves; undated ones are placed on assumed calendar years.
+
+    Returns: dict with the number of matching projects 'with_cash_flows',
+    'packed_only', 'without_cash_flows' and 'undated' (with cash flows but no
+    commercial operation date)
+    """
+    has_rows = db.session.query(CashFlow.id).filter(CashFlow.project_id == Project.id).exists()
+    has_packed = (db.session.query(CashFlowSchedule.id)
+                  .filter(CashFlowSchedule.project_id == Project.id).exists())
+    undated = Project.commercial_operation_date.is_(None)
+    query = db.session.query(
+        func.count(Project.id),
+        func.sum(case((has_rows, 1), else_=0)),
+        func.sum(case((~has_rows & has_packed, 1), else_=0)),
+        func.sum(case((has_rows & undated, 1), else_=0)),
+    )
+    count, with_rows, packed_only, undated_count = _filter_projects(query, filters).one()
+    with_rows = with_rows or 0
+    return {
+        'with_cash_flows': with_rows,
+        'packed_only': packed_only or 0,
+        'without_cash_flows': count - with_rows,
+        'undated': undated_count or 0,
+    }
+
+
+def project_totals(dimension=None, filters=None):
+    """
+    Project count, capacity, capex and capacity-weighted LCOE, either for the
+    whole portfolio or per value of a project attribute.
+
+    Returns: list of dicts, one per group (a single dict when dimension is None)
+    """
+    has_lcoe = FinancialMetric.lcoe.isnot(None)
+    columns = [
+        func.count(Project.id),
+        func.sum(Project.capacity_mw),
+        func.sum(PROJECT_CAPEX),
+        func.sum(case((has_lcoe, FinancialMetric.lcoe * Project.capacity_mw))),
+        func.sum(case((has_lcoe, Project.capacity_mw))),
+    ]
+    if dimension is not None:
+        columns.insert(0, getattr(Project, dimension))
+    query = (db.session.query(*columns)
+             .outerjoin(FinancialMetric, FinancialMetric.project_id == Project.id))
+    query = _filter_projects(query, filters)
+    if dimension is not None:
+        query = query.group_by(getattr(Project, dimension))
+
+    totals = []
+    for row in query.all():
+        group, (count, capacity, capex, weighted_lcoe, lcoe_capacity) = (
+            (row[0], row[1:]) if dimension is not None else (None, row))
+        totals.append({
+            'key': group,
+            'projects': count,
+            'capacity_mw': capacity or 0.0,
+            'capex': capex or 0.0,
+            'lcoe': weighted_lcoe / lcoe_capacity if lcoe_capacity else None,
+        })
+    return totals if dimension is not None else totals[0]
+
+
+def portfolio_summary(discount_rate=DEFAULT_DISCOUNT_RATE, filters=None, dimensions=BREAKDOWN_DIMENSIONS,
+                      start_year=None):
+    """
+    Aggregate stored cash flows and metrics across the portfolio.
+
+    Parameters:
+    - discount_rate: Rate used for portfolio and group NPVs
+    - filters: dict mapping BREAKDOWN_DIMENSIONS names to required values
+    - dimensions: Project attributes to break the portfolio down by
+    - start_year: Year undated projects are assumed to start operating (default: this year)
+
+    Returns: dict with portfolio totals, combined calendar-year cash-flow curves,
+    NPV (as of the first calendar year), IRR, capacity-weighted LCOE, the
+    cash-flow coverage of the matching projects and a breakdown per dimension
+    """
+    totals = project_totals(filters=filters)
+    curves = yearly_cash_flows(filters, start_year)
+    net = curves['net_cash_flow']
+
+    summary = {
+        'projects': totals['projects'],
+        'capacity_mw': totals['capacity_mw'],
+        'capex': totals['capex'],
+        'lcoe': totals['lcoe'],
+        'npv': json_float(finance.npv(net, discount_rate)) if net.size else None,
+        'irr': json_float(returns.irr(net)) if net.size else None,
+        'discount_rate': discount_rate,
+        'cash_flows': {name: values.tolist() for name, values in curves.items()},
+        'coverage': cash_flow_coverage(filters),
+        'breakdowns': {},
+    }
+
+    for dimension in dimensions:
+        groups = project_totals(dimension, filters)
+        keys, matrix = grouped_net_cash_flows(dimension, filters, start_year)
+        # NPV and IRR of every group in one vectorized pass
+        npvs = finance.npv(matrix, discount_rate) if matrix.size else np.zeros(len(keys))
+        irrs = returns.irr(matrix) if matrix.size else np.full(len(keys), np.nan)
+        positions = {key: index for index, key in enumerate(keys)}
+        for group in groups:
+            index = positions.get(group['key'])
+            group['npv'] = json_float(npvs[index]) if index is not None else None
+            group['irr'] = json_float(irrs[index]) if index is not None else None
+        summary['breakdowns'][dimension] = sorted(groups, key=lambda group: -group['capacity_mw'])
+
+    return summary
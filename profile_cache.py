@@ -0,0 +1,150 @@
+"""
+Production-profile cache for the Energy Finance application.
+Normalized per-MW hourly production profiles are stored under a key made of
+the site grid cell and array geometry, so projects sharing a site and layout
+reuse one irradiance-model run.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+# Size of the latitude/longitude grid cell used in cache keys (degrees)
+DEFAULT_GRID_DEGREES = 0.1
+
+# Cumulative hour at the start of each month in a non-leap year
+MONTH_START_HOURS = 24 * np.cumsum([0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30])
+
+
+def profile_key(latitude, longitude, tilt_angle, azimuth, tracking_type, grid=DEFAULT_GRID_DEGREES):
+    """
+    Cache key for a site and array geometry.
+
+    Latitude and longitude are snapped to the centre of a grid cell, angles to
+    whole degrees. Missing angles stay None so model defaults apply.
+    """
+    def snap(value):
+        return round((np.floor(value / grid) + 0.5) * grid, 6)
+
+    def degrees(value):
+        return None if value is None else float(round(value))
+
+    return (snap(latitude), snap(longitude), degrees(tilt_angle), degrees(azimuth),
+            tracking_type or 'fixed')
+
+
+def monthly_totals(profile):
+    """Monthly sums of an hourly 8760 profile."""
+    return np.add.reduceat(profile, MONTH_START_HOURS)
+
+
+class ProductionProfileCache:
+    """
+    Two-tier cache of hourly per-MW production profiles.
+
+    The memory tier holds up to maxsize profiles with LRU eviction. The
+    optional disk tier keeps every computed profile as a .npy file under
+    directory, loaded memory-mapped so repeated processes share pages.
+    """
+
+    def __init__(self, maxsize=1024, directory=None):
+        self.maxsize = maxsize
+        self.directory = directory
+        self._profiles = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self.directory, f'{digest}.npy')
+
+    def _remember(self, key, profile):
+        self._profiles[key] = profile
+        self._profiles.move_to_end(key)
+        while len(self._profiles) > self.maxsize:
+            self._profiles.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key):
+        """Return the cached profile for key, or None."""
+        with self._lock:
+            profile = self._profiles.get(key)
+            if profile is not None:
+                self._profiles.move_to_end(key)
+                self.hits += 1
+                return profile
+
+            if self.directory:
+                path = self._path(key)
+                if os.path.exists(path):
+                    profile = np.load(path, mmap_mode='r')
+                    self._remember(key, profile)
+                    self.disk_hits += 1
+                    return profile
+        return None
+
+    def put(self, key, profile):
+        """
+        Store a profile in memory and, if configured, on disk.
+
+        The cached copy is read-only: it is shared by every caller, so an
+        in-place edit would corrupt the profile of other projects.
+        """
+        profile = np.array(profile, dtype=np.float32)
+        profile.flags.writeable = False
+        with self._lock:
+            if self.directory:
+                path = self._path(key)
+                tmp_path = f'{path}.{os.getpid()}.tmp'
+                with open(tmp_path, 'wb') as f:
+                    np.save(f, profile)
+                os.replace(tmp_path, path)
+            self._remember(key, profile)
+        return profile
+
+    def get_or_compute(self, key, compute):
+        """
+        Return the profile for key, calling compute() to build it on a miss.
+        """
+        profile = self.get(key)
+        if profile is None:
+            with self._lock:
+                self.misses += 1
+            profile = self.put(key, compute())
+        return profile
+
+    def clear(self):
+        """Drop the memory tier and reset the counters."""
+        with self._lock:
+            self._profiles.clear()
+            self.hits = self.disk_hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """Hit/miss counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'size': len(self._profiles),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
+
+
+# Shared cache used by the solar model; set PROFILE_CACHE_DIR to enable the disk tier
+profile_cache = ProductionProfileCache(
+    maxsize=int(os.environ.get('PROFILE_CACHE_SIZE', 1024)),
+    directory=os.environ.get('PROFILE_CACHE_DIR'),
+)
@@ -0,0 +1,320 @@
+"""
+Multi-resolution views of gridded datasets for visualization.
+A request names a pixel budget and its box is served at the coarsest power-of-two
+coarsening that still fills it: from a precomputed pyramid level when one has
+been built (block means stored as memory-mapped float32 .npy files), otherwise
+by block-averaging each time chunk as it is read. Time series are area-weighted
+means over the box, reduced to the pixel budget with Largest-Triangle-Three-
+Buckets so peaks and troughs survive the downsampling.
+"""
+
+import base64
+import math
+import os
+import threading
+
+import numpy as np
+
+import datasets
+from app import db
+from models import Dataset
+
+
+# Directory precomputed pyramid levels are written to
+PYRAMID_DIR = os.environ.get('PYRAMID_DIR', 'pyramids')
+
+# Pyramid levels are built until the coarsest grid has at most this many cells per axis
+MIN_PYRAMID_SIZE = 64
+
+# Default pixel budget of a rendered view, and the largest accepted per axis
+DEFAULT_WIDTH = 720
+DEFAULT_HEIGHT = 360
+MAX_PIXELS = 4096
+
+# Multi-step views are read from coarser pyramid levels, where built, until
+# they touch at most this many values
+MAX_VIEW_VALUES = 20_000_000
+
+_levels = {}
+_levels_lock = threading.Lock()
+
+
+def _block_sums(values, factor):
+    """Sums over factor x factor blocks of the last two axes, padding cut-short edge blocks with zeros."""
+    *lead, n_lat, n_lon = values.shape
+    pad_lat, pad_lon = -n_lat % factor, -n_lon % factor
+    if pad_lat or pad_lon:
+        values = np.pad(values, [(0, 0)] * len(lead) + [(0, pad_lat), (0, pad_lon)])
+    return values.reshape(*lead, (n_lat + pad_lat) // factor, factor,
+                          (n_lon + pad_lon) // factor, factor).sum(axis=(-3, -1))
+
+
+def _sums_and_counts(values):
+    """Value sums (NaN as zero) and valid counts of a float32 array, the inputs to block means."""
+    valid = ~np.isnan(values)
+    return np.where(valid, values, np.float32(0)), valid.astype(np.int32)
+
+
+def _mean(total, count):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(count > 0, total / np.maximum(count, 1), np.nan).astype(np.float32)
+
+
+def block_mean(values, factor):
+    """
+    Mean over factor x factor blocks of the last two axes, ignoring NaN.
+
+    Edge blocks that are cut short average the cells they have.
+
+    Returns: float32 array with the last two axes shrunk by factor (rounded up)
+    """
+    values = np.asarray(values, dtype=np.float32)
+    if factor == 1:
+        return values
+    total, count = _sums_and_counts(values)
+    return _mean(_block_sums(total, factor), _block_sums(count, factor))
+
+
+def coarsen_coordinates(values, factor):
+    """Centres of the factor-wide blocks of a 1-D coordinate array."""
+    return block_mean(np.asarray(values)[np.newaxis], factor)[0].astype(float)
+
+
+def coarsening(n_lat, n_lon, width=DEFAULT_WIDTH, height=DEFAULT_HEIGHT):
+    """Smallest power-of-two factor that fits an n_lat x n_lon grid into width x height pixels."""
+    factor = 1
+    while math.ceil(n_lat / factor) > height or math.ceil(n_lon / factor) > width:
+        factor *= 2
+    return factor
+
+
+def lttb(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling of a series.
+
+    The first and last points are kept; from each of threshold - 2 equal
+    buckets in between, the point forming the largest triangle with the point
+    kept before it and the mean of the next bucket is kept.
+
+    Parameters:
+    - x, y: Series coordinates, x ascending, no NaN
+    - threshold: Number of points to keep
+
+    Returns: Indices of the kept points, ascending
+    """
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    n = x.size
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    edges = np.floor(np.arange(threshold - 1) * (n - 2) / (threshold - 2)).astype(np.intp) + 1
+    edges = np.append(edges, n)
+    kept = np.empty(threshold, dtype=np.intp)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for bucket in range(threshold - 2):
+        start, stop, next_stop = edges[bucket], edges[bucket + 1], edges[bucket + 2]
+        mean_x, mean_y = x[stop:next_stop].mean(), y[stop:next_stop].mean()
+        area = np.abs((x[a] - mean_x) * (y[start:stop] - y[a]) - (x[a] - x[start:stop]) * (mean_y - y[a]))
+        a = start + int(np.argmax(area))
+        kept[bucket + 1] = a
+    return kept
+
+
+def encode_array(values):
+    """
+    Compact JSON encoding of an array: little-endian float32 bytes in base64.
+
+    Returns: dict with 'dtype', 'shape' and 'data'; NaN marks missing values
+    """
+    values = np.ascontiguousarray(values, dtype='<f4')
+    return {'dtype': 'float32', 'shape': list(values.shape),
+            'data': base64.b64encode(values.tobytes()).decode('ascii')}
+
+
+def pyramid_path(dataset, variable, level, zoom):
+    """File of one pyramid level: the grid coarsened by 2 ** zoom."""
+    return os.path.join(PYRAMID_DIR, str(dataset.id), f'{variable}_{level}_{zoom}.npy')
+
+
+def open_level(dataset, variable, level, zoom):
+    """
+    A built pyramid level, memory-mapped read only, once per process.
+
+    Returns: Array of shape (time, lat, lon) in the cell order of the full-grid
+    selection, or None if the level has not been built
+    """
+    path = os.path.abspath(pyramid_path(dataset, variable, level, zoom))
+    with _levels_lock:
+        grid = _levels.get(path)
+        if grid is None and os.path.exists(path):
+            grid = np.load(path, mmap_mode='r')
+            _levels[path] = grid
+    return grid
+
+
+def build_pyramid(dataset, variable, level=0, progress=None):
+    """
+    Precompute the block-mean pyramid of a variable in one streaming pass.
+
+    Level zoom holds the full grid coarsened by 2 ** zoom for every time step;
+    levels are added until the coarsest fits MIN_PYRAMID_SIZE cells per axis.
+    Each level is written to a temporary file and moved into place when
+    complete, so readers never see a partial level.
+
+    Parameters:
+    - dataset: A Dataset
+    - variable: Variable on a latitude/longitude grid
+    - level: Index along any other dimension, as for datasets.select
+    - progress: Optional callback called with (done, total) time steps
+
+    Returns: dict with the 'variable', 'level' and built 'levels' (list of
+    {'zoom', 'shape'})
+
+    Raises: ValueError as for datasets.select
+    """
+    selection = datasets.select(dataset, variable, level=level)
+    steps, n_lat, n_lon = selection['shape']
+    zooms = []
+    while max(n_lat, n_lon) / 2 ** len(zooms) > MIN_PYRAMID_SIZE:
+        zooms.append(len(zooms) + 1)
+    os.makedirs(os.path.dirname(pyramid_path(dataset, variable, level, 0)), exist_ok=True)
+
+    outputs = {}
+    for zoom in zooms:
+        shape = (steps, math.ceil(n_lat / 2 ** zoom), math.ceil(n_lon / 2 ** zoom))
+        outputs[zoom] = np.lib.format.open_memmap(pyramid_path(dataset, variable, level, zoom) + '.tmp',
+                                                  mode='w+', dtype=np.float32, shape=shape)
+    for offset, block in datasets.iter_chunks(selection):
+        # Each level sums 2 x 2 blocks of the one below, so the means stay exact
+        total, count = _sums_and_counts(block)
+        for zoom, output in outputs.items():
+            total, count = _block_sums(total, 2), _block_sums(count, 2)
+            output[offset:offset + block.shape[0]] = _mean(total, count)
+        if progress is not None:
+            progress(offset + block.shape[0], steps)
+
+    built = []
+    for zoom, output in outputs.items():
+        output.flush()
+        built.append({'zoom': zoom, 'shape': list(output.shape)})
+        del output
+        path = pyramid_path(dataset, variable, level, zoom)
+        os.replace(path + '.tmp', path)
+        with _levels_lock:
+            _levels.pop(os.path.abspath(path), None)
+    outputs.clear()
+    return {'variable': variable, 'level': level, 'levels': built}
+
+
+def build_dataset_pyramid(dataset_id, variable, level=0, progress=None):
+    """
+    Build the pyramid of a stored dataset's variable, as a background job.
+
+    Raises: ValueError if the dataset does not exist, or as for build_pyramid
+    """
+    dataset = db.session.get(Dataset, dataset_id)
+    if dataset is None:
+        raise ValueError(f"Dataset {dataset_id} not found")
+    return build_pyramid(dataset, variable, level, progress=progress)
+
+
+def _pyramid_chunks(grid, selection, first):
+    """Stream (offset, block) pairs of a box from a memory-mapped pyramid level."""
+    steps, n_lat, n_lon = selection['shape']
+    chunk_steps = max(1, datasets.CHUNK_VALUES // (n_lat * n_lon))
+    for offset in range(0, steps, chunk_steps):
+        times = slice(first + offset, first + min(offset + chunk_steps, steps))
+        block = np.concatenate([np.concatenate([grid[times, lat_run, lon_run] for lon_run in selection['lon_runs']],
+                                               axis=2) for lat_run in selection['lat_runs']], axis=1)
+        yield offset, block[:, :, selection['lon_order']]
+
+
+def render(dataset, variable, lat_range=None, lon_range=None, time_range=None, level=0,
+           width=DEFAULT_WIDTH, height=DEFAULT_HEIGHT):
+    """
+    A view of a dataset box sized to a pixel budget.
+
+    The box is read at the coarsest power-of-two coarsening that fills
+    width x height (coarser still for long series, up to MAX_VIEW_VALUES, when
+    the pyramid is built), in one streaming pass over its time steps: the grid is the
+    mean over the selected time steps (the step itself for a single one) and
+    the series is the area-weighted box mean of each step, downsampled to
+    width points by LTTB.
+
+    Parameters: as for datasets.select, plus the 'width' and 'height' budget
+    in pixels (at most MAX_PIXELS)
+
+    Returns: dict with float32 'grid' (lat, lon), 'latitudes', 'longitudes',
+    'series' ({'times', 'values'}, or None for a single time step), 'steps',
+    'coarsening' (cells per block side), 'source' ('pyramid' or 'file'),
+    'variable', 'units' and 'statistics' (min, max, mean, std, count) of the
+    values read
+
+    Raises: ValueError as for datasets.select
+    """
+    width = int(min(max(width, 3), MAX_PIXELS))
+    height = int(min(max(height, 1), MAX_PIXELS))
+    selection = datasets.select(dataset, variable, lat_range, lon_range, time_range, level)
+    steps, n_lat, n_lon = selection['shape']
+    factor = coarsening(n_lat, n_lon, width, height)
+    coords = datasets.coordinates(dataset.path)
+
+    # Long series at full detail are read from a coarser level when one is built
+    while (steps * math.ceil(n_lat / factor) * math.ceil(n_lon / factor) > MAX_VIEW_VALUES
+           and open_level(dataset, variable, level, int(math.log2(factor)) + 1) is not None):
+        factor *= 2
+    grid = open_level(dataset, variable, level, int(math.log2(factor))) if factor > 1 else None
+    if grid is not None:
+        # Levels are stored in the cell order of the full-grid selection they were built from
+        full = datasets.grid_selection(coords['latitude'], coords['longitude'])
+        box = datasets.grid_selection(coarsen_coordinates(full['latitude'], factor),
+                                      coarsen_coordinates(full['longitude'], factor), lat_range, lon_range)
+        box['shape'] = (steps,) + (box['latitude'].size, box['longitude'].size)
+        first = 0 if selection['time_index'] is None else selection['time_index'].start
+        chunks, source = _pyramid_chunks(grid, box, first), 'pyramid'
+        latitudes, longitudes = box['latitude'], box['longitude']
+    else:
+        chunks = ((offset, block_mean(block, factor)) for offset, block in datasets.iter_chunks(selection))
+        source = 'file'
+        latitudes = coarsen_coordinates(selection['latitude'], factor)
+        longitudes = coarsen_coordinates(selection['longitude'], factor)
+
+    weights = np.clip(np.cos(np.radians(latitudes)), 0, None)
+    total = np.zeros((latitudes.size, longitudes.size))
+    count = np.zeros(total.shape, dtype=np.int64)
+    series = np.full(steps, np.nan)
+    moments = datasets.EMPTY_MOMENTS
+    for offset, block in chunks:
+        valid = ~np.isnan(block)
+        filled = block if valid.all() else np.where(valid, block, np.float32(0))
+        total += filled.sum(axis=0, dtype=np.float64)
+        count += valid.sum(axis=0)
+        area = valid.sum(axis=2) @ weights
+        with np.errstate(divide='ignore', invalid='ignore'):
+            series[offset:offset + block.shape[0]] = np.where(
+                area > 0, filled.sum(axis=2, dtype=np.float64) @ weights / area, np.nan)
+        moments = datasets.update_moments(moments, block)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_grid = np.where(count > 0, total / count, np.nan).astype(np.float32)
+
+    result_series = None
+    if steps > 1:
+        present = np.flatnonzero(~np.isnan(series))
+        kept = present[lttb(selection['time'][present], series[present], width)]
+        result_series = {
+            'times': datasets.format_times(selection['time'][kept], coords['units'], coords['calendar']),
+            'values': series[kept].astype(np.float32),
+        }
+    return {
+        'grid': mean_grid,
+        'latitudes': latitudes,
+        'longitudes': longitudes,
+        'series': result_series,
+        'steps': steps,
+        'coarsening': factor,
+        'source': source,
+        'variable': variable,
+        'units': datasets.variable_units(dataset, variable),
+        'statistics': datasets.moments_statistics(moments),
+    }
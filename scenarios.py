@@ -0,0 +1,324 @@
+"""
+Scenario manager for the Energy Finance application.
+A Scenario is a named assumption set: rates, PPA terms and optionally a
+price-deck scenario for the energy sold outside the PPA. Every project is
+evaluated under every scenario as one (projects x scenarios x years) tensor:
+project inputs vary along the first axis and scenario assumptions along the
+second, so the cash-flow engine, debt sculpting and the return solvers run
+once per batch of projects however many scenarios there are.
+"""
+
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import case, func, insert, update
+
+import debt
+import finance
+from app import db
+from merchant import deck_prices, hourly_production, merchant_revenue
+from models import PriceDeck, Project, Scenario, ScenarioResult
+from portfolio import BREAKDOWN_DIMENSIONS, PROJECT_CAPEX
+from utils import (OPTIONAL_INPUT_DEFAULTS, PROJECT_INPUT_FIELDS, SCENARIO_DEFAULTS, SCENARIO_METRICS,
+                   json_float, project_cash_flow_inputs, scenario_metrics)
+from valuation import VALUATION_BATCH_SIZE, load_projects
+
+
+# Scenario columns a request may set, with their types; None clears a column
+SCENARIO_FIELDS = {
+    'description': str,
+    'discount_rate': float,
+    'inflation_rate': float,
+    'debt_ratio': float,
+    'interest_rate': float,
+    'target_dscr': float,
+    'tax_rate': float,
+    'ppa_price': float,
+    'ppa_escalation': float,
+    'ppa_term': int,
+    'ppa_share': float,
+    'price_deck_id': int,
+    'price_deck_node': str,
+    'price_deck_scenario': int,
+    'curtailment_price': float,
+}
+
+# Board reporting cases, as overrides of the SCENARIO_DEFAULTS assumptions
+BOARD_SCENARIOS = {
+    'base': {'description': 'Default assumptions'},
+    'downside': {'description': 'Higher rates and inflation, PPA price 15% below base',
+                 'discount_rate': 0.09, 'inflation_rate': 0.035, 'interest_rate': 0.065, 'ppa_price': 42.5},
+    'upside': {'description': 'Lower rates and inflation, PPA price 15% above base',
+               'discount_rate': 0.07, 'inflation_rate': 0.02, 'interest_rate': 0.04, 'ppa_price': 57.5},
+}
+
+
+def scenario_assumptions(scenario):
+    """
+    The SCENARIO_DEFAULTS assumptions of a scenario, defaults filling empty
+    columns, as accepted by evaluate_scenarios and calculate_financial_metrics.
+    """
+    values = {}
+    for name, default in SCENARIO_DEFAULTS.items():
+        value = getattr(scenario, name)
+        values[name] = default if value is None else value
+    return values
+
+
+def apply_scenario_fields(scenario, data):
+    """
+    Set scenario columns from request data and check the result.
+
+    Parameters:
+    - scenario: A Scenario, new or stored
+    - data: dict with an optional 'name' and SCENARIO_FIELDS values
+
+    Raises: ValueError for a missing name, a value of the wrong type, a PPA
+    share outside 0..1, merchant energy without a price deck, or a deck node
+    or scenario the deck does not have
+    """
+    if 'name' in data:
+        scenario.name = str(data['name'] or '').strip()
+    if not scenario.name:
+        raise ValueError("A scenario needs a name")
+    for name, cast in SCENARIO_FIELDS.items():
+        if name in data:
+            try:
+                setattr(scenario, name, None if data[name] is None else cast(data[name]))
+            except (TypeError, ValueError):
+                raise ValueError(f"Invalid {name}: {data[name]!r}")
+
+    ppa_share = 1.0 if scenario.ppa_share is None else scenario.ppa_share
+    if not 0 <= ppa_share <= 1:
+        raise ValueError("ppa_share must be between 0 and 1")
+    if scenario.price_deck_id is None:
+        if ppa_share < 1:
+            raise ValueError("Energy outside the PPA needs a price_deck_id to be priced against")
+        return
+    price_deck = db.session.get(PriceDeck, scenario.price_deck_id)
+    if price_deck is None:
+        raise ValueError(f"Price deck {scenario.price_deck_id} not found")
+    deck_prices(price_deck, scenario.price_deck_node)
+    if not 0 <= (scenario.price_deck_scenario or 0) < price_deck.n_scenarios:
+        raise ValueError(f"Price deck {price_deck.name} has scenarios 0 to {price_deck.n_scenarios - 1}")
+
+
+def create_board_scenarios():
+    """
+    Create the BOARD_SCENARIOS not stored yet. The caller commits.
+
+    Returns: The base, downside and upside Scenarios
+    """
+    stored = {scenario.name: scenario for scenario in Scenario.query.filter(Scenario.name.in_(BOARD_SCENARIOS))}
+    scenarios = []
+    for name, fields in BOARD_SCENARIOS.items():
+        scenario = stored.get(name)
+        if scenario is None:
+            scenario = Scenario(name=name, **{**SCENARIO_DEFAULTS, **fields})
+            db.session.add(scenario)
+        scenarios.append(scenario)
+    return scenarios
+
+
+def scenario_market_revenue(projects, lifetimes, scenarios):
+    """
+    Revenue of each project's energy outside the PPA under each scenario.
+
+    Each project's hourly production is modelled once and priced against every
+    distinct deck, node, curtailment price and inflation rate once, for all
+    the deck scenarios that use them.
+
+    Parameters:
+    - projects: Project instances
+    - lifetimes: Operational lifetime of each project in years
+    - scenarios: Scenario instances
+
+    Returns: (projects, scenarios, years) array of merchant revenue ($) per
+    operational year, or None when every scenario sells all energy under the PPA
+    """
+    groups = {}
+    for index, scenario in enumerate(scenarios):
+        ppa_share = 1.0 if scenario.ppa_share is None else scenario.ppa_share
+        if scenario.price_deck_id is None or ppa_share >= 1:
+            continue
+        assumptions = scenario_assumptions(scenario)
+        key = (scenario.price_deck_id, scenario.price_deck_node, scenario.curtailment_price or 0.0,
+               assumptions['inflation_rate'])
+        groups.setdefault(key, []).append((index, scenario.price_deck_scenario or 0, 1 - ppa_share))
+    if not groups:
+        return None
+
+    priced = []
+    for (deck_id, node, curtailment_price, inflation_rate), members in groups.items():
+        price_deck = db.session.get(PriceDeck, deck_id)
+        deck_scenarios = sorted({deck_scenario for _, deck_scenario, _ in members})
+        # Only the deck scenarios in use are read from the mapping
+        prices = deck_prices(price_deck, node)[deck_scenarios]
+        members = [(index, deck_scenarios.index(deck_scenario), share) for index, deck_scenario, share in members]
+        priced.append((price_deck, prices, curtailment_price, inflation_rate, members))
+
+    lifetimes = [int(lifetime) for lifetime in lifetimes]
+    revenue = np.zeros((len(projects), len(scenarios), max(lifetimes)))
+    for row, (project, lifetime) in enumerate(zip(projects, lifetimes)):
+        production = hourly_production(project, lifetime)
+        for price_deck, prices, curtailment_price, inflation_rate, members in priced:
+            start_year = (project.commercial_operation_date.year if project.commercial_operation_date
+                          else price_deck.start_year)
+            # Revenue is linear in the merchant share, so one pricing serves every share
+            market = merchant_revenue(production, prices, 1.0, curtailment_price,
+                                      year_offset=start_year - price_deck.start_year, escalation=inflation_rate)
+            for index, deck_scenario, share in members:
+                revenue[row, index, :lifetime] = market['revenue'][deck_scenario] * share
+    return revenue
+
+
+def evaluate_scenario_grid(project_inputs, assumptions, ppa_share=1.0, market_revenue=None,
+                           include_schedule=False):
+    """
+    Evaluate every project under every assumption set in one pass.
+
+    Parameters:
+    - project_inputs: List of project_cash_flow_inputs dicts, one per project
+    - assumptions: List of dicts of SCENARIO_DEFAULTS values, one per scenario
+    - ppa_share: Share of energy under the PPA, scalar or one per scenario
+    - market_revenue: Optional (projects, scenarios, years) revenue of the
+      energy outside the PPA, as from scenario_market_revenue
+    - include_schedule: Also return the (projects, scenarios, years) schedule under 'schedule'
+
+    Returns: dict of (projects, scenarios) arrays keyed by SCENARIO_METRICS
+    """
+    projects = {name: np.array([inputs.get(name, OPTIONAL_INPUT_DEFAULTS.get(name)) for inputs in project_inputs],
+                               dtype=float)[:, np.newaxis]
+                for name in PROJECT_INPUT_FIELDS}
+    cases = {name: np.array([case.get(name, default) for case in assumptions], dtype=float)[np.newaxis]
+             for name, default in SCENARIO_DEFAULTS.items()}
+    ppa_term = np.where(np.isnan(cases['ppa_term']), projects['lifetime_years'], cases['ppa_term'])
+
+    inputs = finance.cash_flow_inputs({**projects, **cases, 'ppa_term': ppa_term})
+    schedule = finance.cash_flow_schedule(**inputs, ppa_share=np.asarray(ppa_share, dtype=float)[np.newaxis],
+                                          market_revenue=market_revenue)
+    if not np.isnan(cases['target_dscr']).all():
+        schedule, _ = debt.sculpt_schedule(schedule, cases['target_dscr'], interest_rate=cases['interest_rate'],
+                                           max_gearing=cases['debt_ratio'])
+    results = scenario_metrics(schedule, cases['discount_rate'], cases['interest_rate'])
+    if include_schedule:
+        results['schedule'] = schedule
+    return results
+
+
+def save_scenario_results(project_ids, scenario_ids, results):
+    """
+    Upsert the ScenarioResult rows of a (projects x scenarios) grid with one
+    bulk UPDATE and one bulk INSERT. The caller commits.
+    """
+    existing = {(scenario_id, project_id): result_id for result_id, scenario_id, project_id in
+                db.session.query(ScenarioResult.id, ScenarioResult.scenario_id, ScenarioResult.project_id)
+                .filter(ScenarioResult.project_id.in_(project_ids), ScenarioResult.scenario_id.in_(scenario_ids))}
+    values = {name: np.where(np.isnan(results[name]), None, results[name]).tolist() for name in SCENARIO_METRICS}
+    now = datetime.utcnow()
+    updates, inserts = [], []
+    for row, project_id in enumerate(project_ids):
+        for column, scenario_id in enumerate(scenario_ids):
+            record = {'scenario_id': scenario_id, 'project_id': project_id, 'updated_at': now}
+            record.update({name: values[name][row][column] for name in SCENARIO_METRICS})
+            result_id = existing.get((scenario_id, project_id))
+            if result_id is None:
+                inserts.append(record)
+            else:
+                updates.append({**record, 'id': result_id})
+    if updates:
+        db.session.execute(update(ScenarioResult), updates)
+    if inserts:
+        db.session.execute(insert(ScenarioResult), inserts)
+
+
+def run_scenarios(scenario_ids=None, project_ids=None, batch_size=VALUATION_BATCH_SIZE, progress=None):
+    """
+    Evaluate projects under scenarios and store a ScenarioResult for each pair.
+
+    Parameters:
+    - scenario_ids: Scenarios to evaluate (default: all scenarios)
+    - project_ids: Projects to evaluate (default: all projects)
+    - batch_size: Projects evaluated and committed per batch
+    - progress: Optional callback called with (done, total)
+
+    Returns: dict with the number of projects, scenarios and results stored
+
+    Raises: ValueError if there are no scenarios to evaluate
+    """
+    query = Scenario.query.order_by(Scenario.id)
+    if scenario_ids is not None:
+        query = query.filter(Scenario.id.in_(scenario_ids))
+    scenarios = query.all()
+    if not scenarios:
+        raise ValueError("No scenarios to evaluate")
+    assumptions = [scenario_assumptions(scenario) for scenario in scenarios]
+    ppa_share = [1.0 if scenario.ppa_share is None else scenario.ppa_share for scenario in scenarios]
+
+    query = db.session.query(Project.id).order_by(Project.id)
+    if project_ids is not None:
+        query = query.filter(Project.id.in_(project_ids))
+    ids = [project_id for project_id, in query]
+
+    for start in range(0, len(ids), batch_size):
+        projects = load_projects(ids[start:start + batch_size])
+        inputs = [project_cash_flow_inputs(project) for project in projects]
+        market = scenario_market_revenue(projects, [values['lifetime_years'] for values in inputs], scenarios)
+        results = evaluate_scenario_grid(inputs, assumptions, ppa_share, market)
+        save_scenario_results([project.id for project in projects], [scenario.id for scenario in scenarios],
+                              results)
+        db.session.commit()
+        if progress:
+            progress(min(start + batch_size, len(ids)), len(ids))
+
+    return {'projects': len(ids), 'scenarios': len(scenarios), 'results': len(ids) * len(scenarios)}
+
+
+def scenario_report(scenario_ids=None, filters=None):
+    """
+    Portfolio totals of each scenario from its stored results, one grouped query.
+
+    Parameters:
+    - scenario_ids: Scenarios to report (default: all scenarios)
+    - filters: dict mapping BREAKDOWN_DIMENSIONS names to required values
+
+    Returns: List of dicts, one per scenario in id order, with the number of
+    'projects' evaluated, their 'capacity_mw' and 'capex', the 'total_npv',
+    capex-weighted 'irr' and the mean 'lcoe' and minimum 'min_dscr'
+
+    Raises: ValueError for a filter outside BREAKDOWN_DIMENSIONS
+    """
+    query = (db.session.query(
+        Scenario.id, Scenario.name,
+        func.count(ScenarioResult.id),
+        func.sum(Project.capacity_mw),
+        func.sum(PROJECT_CAPEX),
+        func.sum(ScenarioResult.npv),
+        func.sum(ScenarioResult.irr * PROJECT_CAPEX),
+        func.sum(case((ScenarioResult.irr.is_(None), 0.0), else_=PROJECT_CAPEX)),
+        func.avg(ScenarioResult.lcoe),
+        func.min(ScenarioResult.debt_service_coverage_ratio))
+        .join(ScenarioResult, ScenarioResult.scenario_id == Scenario.id)
+        .join(Project, Project.id == ScenarioResult.project_id))
+    if scenario_ids is not None:
+        query = query.filter(Scenario.id.in_(scenario_ids))
+    for name, value in (filters or {}).items():
+        if name not in BREAKDOWN_DIMENSIONS:
+            raise ValueError(f"Cannot filter projects by {name}")
+        query = query.filter(getattr(Project, name) == value)
+
+    report = []
+    for (scenario_id, name, projects, capacity, total_capex, total_npv, weighted_irr, irr_capex, lcoe,
+         min_dscr) in query.group_by(Scenario.id, Scenario.name).order_by(Scenario.id):
+        report.append({
+            'scenario_id': scenario_id,
+            'name': name,
+            'projects': projects,
+            'capacity_mw': json_float(capacity or 0.0),
+            'capex': json_float(total_capex or 0.0),
+            'total_npv': json_float(total_npv if total_npv is not None else np.nan),
+            'irr': json_float(weighted_irr / irr_capex if irr_capex else np.nan),
+            'lcoe': json_float(lcoe if lcoe is not None else np.nan),
+            'min_dscr': json_float(min_dscr if min_dscr is not None else np.nan),
+        })
+    return report
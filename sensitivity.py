@@ -0,0 +1,149 @@
+"""
+Sensitivity analysis for the Energy Finance application.
+Each driver is perturbed over a grid of relative changes around the project's
+base case and NPV, IRR and LCOE are returned as tornado and spider-chart data.
+
+The base-case inputs are computed once: the first-year energy estimate (the
+expensive, production-model part) is scaled rather than re-estimated when the
+performance ratio moves, every cash-flow driver is evaluated in one batched
+schedule, and discount-rate changes reuse the base schedule with a single
+matrix of discount factors.
+"""
+
+import numpy as np
+
+import debt
+import finance
+import returns
+from utils import SCENARIO_DEFAULTS, json_float, project_cash_flow_inputs
+
+
+# Drivers and the cash-flow input each one perturbs. performance_ratio scales
+# energy linearly; discount_rate only changes discounting, not the schedule.
+DRIVERS = {
+    'capex': 'capex',
+    'opex_per_year': 'opex',
+    'performance_ratio': 'energy_mwh',
+    'degradation_rate': 'degradation_rate',
+    'ppa_price': 'ppa_price',
+    'discount_rate': None,
+    'debt_ratio': 'debt_ratio',
+}
+
+DEFAULT_SWING = 0.2  # +/-20%
+DEFAULT_STEPS = 11
+
+SENSITIVITY_METRICS = ('npv', 'irr', 'lcoe')
+
+
+def sensitivity_analysis(project, assumptions=None, drivers=tuple(DRIVERS), swing=DEFAULT_SWING,
+                         steps=DEFAULT_STEPS):
+    """
+    Perturb each driver around a project's base case.
+
+    Parameters:
+    - project: A Project instance
+    - assumptions: Overrides of the SCENARIO_DEFAULTS assumptions for the base case
+    - drivers: Names from DRIVERS to perturb
+    - swing: Largest relative change, e.g. 0.2 for -20%..+20%
+    - steps: Number of grid points from -swing to +swing
+
+    Returns: dict with 'base' metrics, the relative 'changes' grid, 'spider'
+    data per driver (driver values and metric values at each change) and
+    'tornado' data per metric (drivers sorted by the spread between the
+    -swing and +swing results)
+
+    Raises: ValueError for an unknown driver or fewer than two steps
+    """
+    unknown = [name for name in drivers if name not in DRIVERS]
+    if unknown:
+        raise ValueError(f"Unknown sensitivity drivers: {', '.join(unknown)}")
+    if steps < 2:
+        raise ValueError("At least two steps are needed")
+
+    inputs = project_cash_flow_inputs(project)
+    base = {name: (assumptions or {}).get(name, default) for name, default in SCENARIO_DEFAULTS.items()}
+    discount_rate = float(base.pop('discount_rate'))
+    target_dscr = base.pop('target_dscr')
+    if base['ppa_term'] is None:
+        base['ppa_term'] = inputs['lifetime_years']
+    base.update(inputs)
+    changes = np.linspace(-swing, swing, steps)
+    factors = 1 + changes
+
+    # One batched schedule: a row per (cash-flow driver, step) plus the base case last
+    schedule_drivers = [name for name in drivers if DRIVERS[name] is not None]
+    n_rows = len(schedule_drivers) * steps + 1
+    params = {name: np.full(n_rows, float(value)) for name, value in base.items()}
+    for index, name in enumerate(schedule_drivers):
+        rows = slice(index * steps, (index + 1) * steps)
+        params[DRIVERS[name]][rows] = params[DRIVERS[name]][rows] * factors
+    params['debt_ratio'] = np.clip(params['debt_ratio'], 0.0, 1.0)
+
+    schedule = finance.cash_flow_schedule(**params)
+    if target_dscr is not None:
+        schedule, _ = debt.sculpt_schedule(schedule, target_dscr, interest_rate=params['interest_rate'],
+                                           max_gearing=params['debt_ratio'])
+    net = schedule['net_cash_flow']
+    results = {
+        'npv': finance.npv(net, discount_rate),
+        'irr': returns.irr(net),
+        'lcoe': finance.lcoe(schedule, discount_rate),
+    }
+
+    base_values = {name: values[-1] for name, values in results.items()}
+    grid = {name: {metric: values[index * steps:(index + 1) * steps] for metric, values in results.items()}
+            for index, name in enumerate(schedule_drivers)}
+
+    if 'discount_rate' in drivers:
+        # The schedule does not depend on the discount rate: reuse the base row
+        rates = discount_rate * factors
+        base_schedule = {name: values[-1] for name, values in schedule.items()
+                         if isinstance(values, np.ndarray) and values.ndim == 2}
+        base_schedule['year'] = schedule['year']
+        grid['discount_rate'] = {
+            'npv': finance.discount_factors(rates, net.shape[-1]) @ net[-1],
+            'irr': np.full(steps, base_values['irr']),
+            'lcoe': finance.lcoe(base_schedule, rates),
+        }
+
+    driver_base = {
+        'capex': inputs['capex'],
+        'opex_per_year': inputs['opex'],
+        'performance_ratio': getattr(project, 'performance_ratio', None),
+        'degradation_rate': inputs['degradation_rate'],
+        'ppa_price': base['ppa_price'],
+        'discount_rate': discount_rate,
+        'debt_ratio': base['debt_ratio'],
+    }
+
+    spider = {}
+    for name in drivers:
+        value = driver_base[name]
+        driver_values = None if value is None else (value * factors).tolist()
+        if name == 'debt_ratio':
+            driver_values = np.clip(driver_values, 0.0, 1.0).tolist()
+        spider[name] = {'base': value, 'values': driver_values}
+        spider[name].update({metric: [json_float(v) for v in grid[name][metric]]
+                             for metric in SENSITIVITY_METRICS})
+
+    tornado = {}
+    for metric in SENSITIVITY_METRICS:
+        bars = []
+        for name in drivers:
+            low, high = grid[name][metric][0], grid[name][metric][-1]
+            spread = abs(high - low)
+            bars.append({
+                'driver': name,
+                'low': json_float(low),
+                'high': json_float(high),
+                'spread': 0.0 if np.isnan(spread) else float(spread),
+            })
+        tornado[metric] = sorted(bars, key=lambda bar: -bar['spread'])
+
+    return {
+        'base': {metric: json_float(value) for metric, value in base_values.items()},
+        'changes': changes.tolist(),
+        'spider': spider,
+        'tornado': tornado,
+    }
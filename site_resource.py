@@ -0,0 +1,277 @@
+"""
+Site resource assessment for the Energy Finance application.
+Irradiance and temperature at project sites are sampled from a registered
+climate dataset. The grid cells of all sites (the nearest cell, or the four
+bilinear neighbours) are resolved once; each time chunk read from the file
+is then reduced to per-site values with one vectorized gather, however many
+sites there are, and folded into per-site monthly means. The monthly climate
+drives the hourly solar model, giving every project a site-specific yield.
+"""
+
+import numpy as np
+from sqlalchemy import update
+from sqlalchemy.orm import with_polymorphic
+
+import datasets
+import solar
+from app import db
+from climate import KELVIN_UNITS, ZERO_CELSIUS
+from models import PROJECT_SUBCLASSES, Dataset, Project, SolarProject
+from valuation import revalue_projects
+
+
+SAMPLING_METHODS = ('nearest', 'bilinear')
+
+# Irradiance units: factor to W/m2, and whether values are accumulated over each time step
+IRRADIANCE_UNITS = {'W m-2': (1.0, False), 'W m**-2': (1.0, False), 'W/m2': (1.0, False), 'W/m^2': (1.0, False),
+                    'kW m-2': (1000.0, False), 'kW/m2': (1000.0, False),
+                    'J m-2': (1.0, True), 'J m**-2': (1.0, True), 'J/m2': (1.0, True)}
+
+
+def _neighbours(coords, values, method):
+    """
+    Grid indices and weights of values along one coordinate axis (ascending or descending).
+
+    Returns: list of (indices, weights) pairs, one for nearest, two for bilinear;
+    values beyond the grid take the edge cell
+    """
+    order = np.argsort(coords, kind='stable')
+    ordered = coords[order]
+    if ordered.size == 1:
+        return [(np.zeros(values.size, dtype=np.intp), np.ones(values.size))]
+    upper = np.clip(np.searchsorted(ordered, values), 1, ordered.size - 1)
+    lower = upper - 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fraction = np.clip((values - ordered[lower]) / (ordered[upper] - ordered[lower]), 0.0, 1.0)
+    if method == 'nearest':
+        return [(order[np.where(fraction < 0.5, lower, upper)], np.ones(values.size))]
+    return [(order[lower], 1 - fraction), (order[upper], fraction)]
+
+
+def site_cells(selection, latitudes, longitudes, method='nearest'):
+    """
+    Grid cells of sites within a selection.
+
+    Parameters:
+    - selection: Selection from datasets.select
+    - latitudes, longitudes: Site coordinates (decimal degrees, east positive)
+    - method: 'nearest' cell or 'bilinear' interpolation between the four surrounding cells
+
+    Returns: list of (lat_index, lon_index, weight) arrays, one entry per
+    neighbour; sites more than one grid spacing beyond the grid get zero weight
+    """
+    grid_longitudes = selection['longitude']
+    latitudes = np.asarray(latitudes, dtype=float)
+    longitudes = np.asarray(longitudes, dtype=float)
+    # Sites are compared on the selection's longitude convention (0..360 or -180..180)
+    longitudes = longitudes % 360 if grid_longitudes.max() > 180 else (longitudes + 180) % 360 - 180
+    inside = np.ones(latitudes.size, dtype=bool)
+    for coords, values in ((selection['latitude'], latitudes), (grid_longitudes, longitudes)):
+        # A single cell stands for the whole area around it
+        spacing = float(np.abs(np.diff(coords)).max()) if coords.size > 1 else np.inf
+        inside &= (values >= coords.min() - spacing) & (values <= coords.max() + spacing)
+    lat_neighbours = _neighbours(selection['latitude'], latitudes, method)
+    lon_neighbours = _neighbours(grid_longitudes, longitudes, method)
+    return [(lat_index, lon_index, lat_weight * lon_weight * inside)
+            for lat_index, lat_weight in lat_neighbours for lon_index, lon_weight in lon_neighbours]
+
+
+def gather_sites(block, cells):
+    """
+    Values of a (steps, lat, lon) block at the sites, shape (steps, sites).
+
+    Missing neighbours are dropped and the remaining weights renormalized,
+    so sites on a coast take their land (or sea) cells.
+    """
+    total = np.zeros((block.shape[0], cells[0][0].size), dtype=np.float32)
+    weight = np.zeros_like(total)
+    for lat_index, lon_index, cell_weight in cells:
+        values = block[:, lat_index, lon_index]
+        valid = ~np.isnan(values)
+        cell_weight = np.where(valid, cell_weight.astype(np.float32), np.float32(0))
+        total += np.where(valid, values, np.float32(0)) * cell_weight
+        weight += cell_weight
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(weight > 0, total / weight, np.nan).astype(np.float32)
+
+
+def _site_box(latitudes, longitudes, margin):
+    """Latitude and longitude ranges covering the sites, with a margin for the surrounding cells."""
+    lat_range = (str(np.min(latitudes) - margin), str(np.max(latitudes) + margin))
+    longitudes = (np.asarray(longitudes, dtype=float) + 180) % 360 - 180
+    low, high = np.min(longitudes) - margin, np.max(longitudes) + margin
+    # A box crossing the antimeridian is read whole
+    lon_range = (str(low), str(high)) if -180 <= low and high <= 180 else None
+    return lat_range, lon_range
+
+
+def sample_monthly(dataset, variable, latitudes, longitudes, method='nearest', time_range=None, level=0,
+                   progress=None):
+    """
+    Monthly means of a variable at many sites, in one streaming pass.
+
+    Only the box around the sites is read, one time chunk at a time; each chunk
+    costs one gather for all sites.
+
+    Parameters:
+    - dataset: A Dataset
+    - variable: Variable on a latitude/longitude grid with a time axis
+    - latitudes, longitudes: Site coordinates (decimal degrees)
+    - method: One of SAMPLING_METHODS
+    - time_range: Period to average, as for datasets.select (default: the whole record)
+    - level: Index along any other dimension, as for datasets.select
+    - progress: Optional callback called with (done, total) time steps
+
+    Returns: Array of shape (12, sites), NaN where a site has no data in a month
+
+    Raises: ValueError for an unknown method, or as for datasets.select
+    """
+    if method not in SAMPLING_METHODS:
+        raise ValueError(f"Unknown sampling method: {method}")
+    coords = datasets.coordinates(dataset.path)
+    spacing = max(float(np.abs(np.diff(coords[axis])).max()) if coords[axis].size > 1 else 0.0
+                  for axis in ('latitude', 'longitude'))
+    lat_range, lon_range = _site_box(latitudes, longitudes, 2 * spacing)
+    selection = datasets.select(dataset, variable, lat_range, lon_range, time_range, level)
+    if selection['time_index'] is None:
+        raise ValueError(f"{variable} has no time dimension")
+    calendar = datasets.calendar_fields(dataset.path)
+    cells = site_cells(selection, latitudes, longitudes, method)
+
+    total = np.zeros((12, np.size(latitudes)))
+    count = np.zeros((12, np.size(latitudes)), dtype=np.int64)
+    first, steps = selection['time_index'].start, selection['shape'][0]
+    for offset, block in datasets.iter_chunks(selection):
+        values = gather_sites(block, cells)
+        valid = ~np.isnan(values)
+        months = calendar['month'][first + offset:first + offset + block.shape[0]] - 1
+        np.add.at(total, months, np.where(valid, values, 0.0))
+        np.add.at(count, months, valid)
+        if progress is not None:
+            progress(offset + block.shape[0], steps)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(count > 0, total / np.maximum(count, 1), np.nan)
+
+
+def _irradiance_scale(units, step_seconds):
+    """Factor converting irradiance values to W/m2."""
+    key = ' '.join((units or '').split())
+    if key not in IRRADIANCE_UNITS:
+        raise ValueError(f"Irradiance must be in W m-2, or J m-2 accumulated over each time step, not {units}")
+    factor, accumulated = IRRADIANCE_UNITS[key]
+    if accumulated:
+        if not step_seconds:
+            raise ValueError("Accumulated irradiance needs at least two time steps")
+        factor /= step_seconds
+    return factor
+
+
+def assess_sites(dataset, projects, irradiance_variable, temperature_variable=None, method='nearest',
+                 time_range=None, level=0, progress=None):
+    """
+    Site-specific solar yield of projects from a climate dataset.
+
+    Parameters:
+    - dataset: A Dataset
+    - projects: SolarProject (or HybridProject) instances with latitude and longitude
+    - irradiance_variable: Surface downwelling shortwave radiation (W m-2, or
+      J m-2 accumulated per time step, e.g. ERA5 ssrd)
+    - temperature_variable: Optional near-surface air temperature (K or C);
+      without it the synthetic temperature profile is used
+    - method, time_range, level: As for sample_monthly
+    - progress: Optional callback called with (done, total) time steps
+
+    Returns: dict mapping project id to 'specific_yield' (MWh per MW per year,
+    before performance ratio), 'capacity_factor' and the site's 'monthly_ghi'
+    (W/m2) and 'monthly_temperature' (C, or None); projects outside the data
+    are left out
+
+    Raises: ValueError as for sample_monthly, or for irradiance units that cannot be converted
+    """
+    if not projects:
+        return {}
+    latitudes = np.array([project.latitude for project in projects], dtype=float)
+    longitudes = np.array([project.longitude for project in projects], dtype=float)
+    passes = 2 if temperature_variable else 1
+
+    def stage(position):
+        # Both variables are read over the same period, so each pass is an equal share
+        if progress is None:
+            return None
+        return lambda done, total: progress(position * total + done, passes * total)
+
+    scale = _irradiance_scale(datasets.variable_units(dataset, irradiance_variable),
+                              datasets.calendar_fields(dataset.path)['step_seconds'])
+    ghi = sample_monthly(dataset, irradiance_variable, latitudes, longitudes, method, time_range, level,
+                         stage(0)) * scale
+    temperature = None
+    if temperature_variable:
+        temperature = sample_monthly(dataset, temperature_variable, latitudes, longitudes, method, time_range,
+                                     level, stage(1))
+        if (datasets.variable_units(dataset, temperature_variable) or '').strip() in KELVIN_UNITS:
+            temperature = temperature - ZERO_CELSIUS
+
+    results = {}
+    for index, project in enumerate(projects):
+        if np.isnan(ghi[:, index]).any() or (temperature is not None and np.isnan(temperature[:, index]).any()):
+            continue
+        monthly_temperature = None if temperature is None else temperature[:, index]
+        specific_yield = float(solar.resource_production_per_mw(
+            project.latitude, project.longitude, project.tilt_angle, project.azimuth,
+            project.tracking_type or 'fixed', ghi[:, index], monthly_temperature).sum())
+        results[project.id] = {
+            'specific_yield': specific_yield,
+            'capacity_factor': specific_yield / solar.HOURS_PER_YEAR,
+            'monthly_ghi': ghi[:, index].tolist(),
+            'monthly_temperature': None if monthly_temperature is None else monthly_temperature.tolist(),
+        }
+    return results
+
+
+def assess_portfolio(dataset_id, irradiance_variable, temperature_variable=None, project_ids=None,
+                     method='nearest', time_range=None, level=0, revalue=True, assumptions=None, progress=None):
+    """
+    Assess every sited solar project against a climate dataset and revalue the
+    portfolio with the new yields, as a background job.
+
+    Running it again with another dataset or period (e.g. a future-climate
+    scenario) replaces the yields; only projects whose yield changed are
+    recomputed by the revaluation.
+
+    Parameters:
+    - dataset_id: Id of the climate Dataset
+    - irradiance_variable, temperature_variable, method, time_range, level: As for assess_sites
+    - project_ids: Projects to assess (default: all solar and hybrid projects with a site)
+    - revalue: Recompute the financial metrics of the assessed projects
+    - assumptions: Overrides of the SCENARIO_DEFAULTS assumptions for the revaluation
+    - progress: Optional callback called with (done, total)
+
+    Returns: dict with the number of projects 'assessed' and 'outside' the
+    data, the 'mean_capacity_factor' and the 'revaluation' summary (or None)
+
+    Raises: ValueError if the dataset does not exist, or as for assess_sites
+    """
+    dataset = db.session.get(Dataset, dataset_id)
+    if dataset is None:
+        raise ValueError(f"Dataset {dataset_id} not found")
+    projects = with_polymorphic(Project, list(PROJECT_SUBCLASSES))
+    query = (db.session.query(projects)
+             .filter(projects.SolarProject.latitude.isnot(None), projects.SolarProject.longitude.isnot(None)))
+    if project_ids is not None:
+        query = query.filter(projects.id.in_(project_ids))
+    sites = [project for project in query.order_by(projects.id) if isinstance(project, SolarProject)]
+
+    results = assess_sites(dataset, sites, irradiance_variable, temperature_variable, method, time_range, level,
+                           progress=progress)
+    if results:
+        db.session.execute(update(SolarProject), [
+            {'id': project_id, 'specific_yield': result['specific_yield'], 'resource_dataset_id': dataset.id}
+            for project_id, result in results.items()])
+        db.session.commit()
+    capacity_factors = [result['capacity_factor'] for result in results.values()]
+    return {
+        'assessed': len(results),
+        'outside': len(sites) - len(results),
+        'mean_capacity_factor': float(np.mean(capacity_factors)) if capacity_factors else None,
+        'revaluation': revalue_projects(list(results), assumptions) if revalue and results else None,
+    }
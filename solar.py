@@ -0,0 +1,287 @@
+"""
+Hourly solar production model for the Energy Finance application.
+Solar position, plane-of-array irradiance and temperature derating are
+computed as NumPy arrays over all 8760 hours of a typical year.
+"""
+
+import numpy as np
+
+from profile_cache import MONTH_START_HOURS, monthly_totals, profile_cache, profile_key
+
+
+HOURS_PER_YEAR = 8760
+
+# Solar constant (W/m2)
+SOLAR_CONSTANT = 1367.0
+
+# Module and site parameters
+GROUND_ALBEDO = 0.2
+NOCT = 45.0  # nominal operating cell temperature (C)
+TEMPERATURE_COEFFICIENT = -0.004  # power change per C above 25 C
+SINGLE_AXIS_MAX_ROTATION = 60.0  # degrees
+DEFAULT_CLEARNESS = 0.8  # average share of clear-sky irradiance reaching the site
+
+TRACKING_TYPES = ('fixed', 'single-axis', 'dual-axis')
+
+# Day of year and clock hour (mid-hour) of every hour in a non-leap year
+_DAY = np.repeat(np.arange(1, 366), 24)
+_HOUR = np.tile(np.arange(24) + 0.5, 365)
+
+# Calendar month (0-11) of every hour, and the hours in each month
+_MONTH = np.searchsorted(MONTH_START_HOURS, np.arange(HOURS_PER_YEAR), side='right') - 1
+_MONTH_HOURS = np.diff(np.append(MONTH_START_HOURS, HOURS_PER_YEAR))
+
+
+def solar_position(latitude, longitude):
+    """
+    Solar zenith and azimuth for every hour of the year, in local standard time.
+
+    Parameters:
+    - latitude: Site latitude (decimal degrees)
+    - longitude: Site longitude (decimal degrees, east positive)
+
+    Returns: (zenith, azimuth) arrays in degrees, azimuth clockwise from north
+    """
+    b = 2 * np.pi * (_DAY - 1) / 365
+    declination = (0.006918 - 0.399912 * np.cos(b) + 0.070257 * np.sin(b)
+                   - 0.006758 * np.cos(2 * b) + 0.000907 * np.sin(2 * b)
+                   - 0.002697 * np.cos(3 * b) + 0.00148 * np.sin(3 * b))
+    equation_of_time = 229.18 * (0.000075 + 0.001868 * np.cos(b) - 0.032077 * np.sin(b)
+                                 - 0.014615 * np.cos(2 * b) - 0.040849 * np.sin(2 * b))
+
+    standard_meridian = 15 * np.round(longitude / 15)
+    solar_time = _HOUR + (4 * (longitude - standard_meridian) + equation_of_time) / 60
+    hour_angle = np.radians(15 * (solar_time - 12))
+    phi = np.radians(latitude)
+
+    cos_zenith = (np.sin(phi) * np.sin(declination)
+                  + np.cos(phi) * np.cos(declination) * np.cos(hour_angle))
+    zenith = np.degrees(np.arccos(np.clip(cos_zenith, -1, 1)))
+    azimuth = np.degrees(np.arctan2(
+        np.sin(hour_angle),
+        np.cos(hour_angle) * np.sin(phi) - np.tan(declination) * np.cos(phi),
+    )) + 180
+    return zenith, azimuth
+
+
+def clear_sky_irradiance(zenith, clearness=DEFAULT_CLEARNESS):
+    """
+    Global, direct normal and diffuse irradiance (W/m2) from the Haurwitz
+    clear-sky model, attenuated by the site clearness and split into
+    components with the Erbs diffuse-fraction correlation.
+    """
+    cos_zenith = np.cos(np.radians(zenith))
+    sun_up = cos_zenith > 0.01
+    safe_cos = np.where(sun_up, cos_zenith, 1.0)
+
+    ghi = np.where(sun_up, 1098 * safe_cos * np.exp(-0.057 / safe_cos), 0.0) * clearness
+    extraterrestrial = SOLAR_CONSTANT * (1 + 0.033 * np.cos(2 * np.pi * _DAY / 365))
+    return decompose_irradiance(ghi, zenith, extraterrestrial)
+
+
+def decompose_irradiance(ghi, zenith, extraterrestrial=SOLAR_CONSTANT):
+    """
+    Split global horizontal irradiance into direct normal and diffuse parts
+    with the Erbs correlation.
+
+    Returns: (ghi, dni, dhi) arrays in W/m2
+    """
+    cos_zenith = np.cos(np.radians(zenith))
+    sun_up = cos_zenith > 0.01
+    safe_cos = np.where(sun_up, cos_zenith, 1.0)
+
+    kt = np.where(sun_up, np.clip(ghi / (extraterrestrial * safe_cos), 0, 1), 0.0)
+    diffuse_fraction = np.where(
+        kt <= 0.22, 1 - 0.09 * kt,
+        np.where(kt <= 0.8,
+                 0.9511 - 0.1604 * kt + 4.388 * kt ** 2 - 16.638 * kt ** 3 + 12.336 * kt ** 4,
+                 0.165))
+    dhi = ghi * diffuse_fraction
+    dni = np.where(sun_up, (ghi - dhi) / safe_cos, 0.0)
+    return ghi, dni, dhi
+
+
+def surface_orientation(zenith, azimuth, tracking_type='fixed', tilt_angle=0.0, panel_azimuth=180.0):
+    """
+    Surface tilt and azimuth (degrees) for every hour.
+
+    Single-axis trackers rotate about a horizontal axis aligned with
+    panel_azimuth (north-south by default), limited to SINGLE_AXIS_MAX_ROTATION.
+    Dual-axis trackers face the sun.
+    """
+    if tracking_type == 'dual-axis':
+        return np.minimum(zenith, 90.0), azimuth
+    if tracking_type == 'single-axis':
+        z = np.radians(zenith)
+        relative_azimuth = np.radians(azimuth - panel_azimuth)
+        rotation = np.degrees(np.arctan2(np.sin(z) * np.sin(relative_azimuth), np.cos(z)))
+        rotation = np.clip(rotation, -SINGLE_AXIS_MAX_ROTATION, SINGLE_AXIS_MAX_ROTATION)
+        surface_azimuth = np.where(rotation >= 0, panel_azimuth + 90, panel_azimuth - 90)
+        return np.abs(rotation), surface_azimuth
+    return np.full(zenith.shape, float(tilt_angle)), np.full(zenith.shape, float(panel_azimuth))
+
+
+def plane_of_array_irradiance(zenith, azimuth, ghi, dni, dhi, surface_tilt, surface_azimuth,
+                              albedo=GROUND_ALBEDO):
+    """
+    Plane-of-array irradiance (W/m2) with the isotropic sky transposition model.
+    """
+    z = np.radians(zenith)
+    tilt = np.radians(surface_tilt)
+    cos_aoi = (np.cos(z) * np.cos(tilt)
+               + np.sin(z) * np.sin(tilt) * np.cos(np.radians(azimuth - surface_azimuth)))
+    beam = dni * np.maximum(cos_aoi, 0)
+    sky_diffuse = dhi * (1 + np.cos(tilt)) / 2
+    ground_reflected = ghi * albedo * (1 - np.cos(tilt)) / 2
+    return beam + sky_diffuse + ground_reflected
+
+
+def ambient_temperature(latitude):
+    """
+    Synthetic hourly ambient temperature (C) with latitude-dependent annual
+    mean and seasonal swing plus a diurnal cycle peaking mid-afternoon.
+    """
+    abs_latitude = abs(latitude)
+    annual_mean = 27 - 0.35 * abs_latitude
+    seasonal_amplitude = 0.25 * abs_latitude
+    # Warmest around day 200 in the northern hemisphere, day 17 in the southern
+    seasonal = -np.cos(2 * np.pi * (_DAY - 17) / 365) * np.sign(latitude or 1)
+    diurnal = np.cos(2 * np.pi * (_HOUR - 15) / 24)
+    return annual_mean + seasonal_amplitude * seasonal + 5 * diurnal
+
+
+def temperature_derate(poa, temperature):
+    """
+    Power derating factor from cell temperature estimated with the NOCT model.
+    """
+    cell_temperature = temperature + poa / 800 * (NOCT - 20)
+    return 1 + TEMPERATURE_COEFFICIENT * (cell_temperature - 25)
+
+
+def hourly_production_per_mw(latitude, longitude, tilt_angle=None, azimuth=None,
+                             tracking_type='fixed', ghi=None, temperature=None,
+                             clearness=DEFAULT_CLEARNESS, position=None):
+    """
+    Hourly output (MWh per MW of capacity, before performance ratio) for a typical year.
+
+    Parameters:
+    - latitude, longitude: Site location (decimal degrees)
+    - tilt_angle: Fixed tilt (default: latitude)
+    - azimuth: Panel or tracker-axis azimuth (default: facing the equator)
+    - tracking_type: 'fixed', 'single-axis' or 'dual-axis'
+    - ghi: Optional measured hourly global horizontal irradiance (W/m2) replacing the clear-sky model
+    - temperature: Optional hourly ambient temperature (C) replacing the synthetic profile
+    - clearness: Share of clear-sky irradiance reaching the site when ghi is not given
+    - position: Optional (zenith, azimuth) of the site from solar_position, to avoid recomputing it
+
+    Returns: Array of 8760 hourly values
+    """
+    if tracking_type not in TRACKING_TYPES:
+        tracking_type = 'fixed'
+    if tilt_angle is None:
+        tilt_angle = abs(latitude)
+    if azimuth is None:
+        azimuth = 180.0 if latitude >= 0 else 0.0
+
+    zenith, sun_azimuth = position if position is not None else solar_position(latitude, longitude)
+    if ghi is None:
+        ghi, dni, dhi = clear_sky_irradiance(zenith, clearness)
+    else:
+        ghi, dni, dhi = decompose_irradiance(np.asarray(ghi, dtype=float), zenith)
+    if temperature is None:
+        temperature = ambient_temperature(latitude)
+
+    surface_tilt, surface_azimuth = surface_orientation(
+        zenith, sun_azimuth, tracking_type, tilt_angle, azimuth)
+    poa = plane_of_array_irradiance(zenith, sun_azimuth, ghi, dni, dhi, surface_tilt, surface_azimuth)
+    return poa / 1000 * temperature_derate(poa, temperature)
+
+
+def resource_production_per_mw(latitude, longitude, tilt_angle=None, azimuth=None, tracking_type='fixed',
+                               monthly_ghi=None, monthly_temperature=None):
+    """
+    Hourly output (MWh per MW of capacity, before performance ratio) for a
+    typical year matching a site's monthly climate.
+
+    The clear-sky irradiance of each month is scaled so its mean equals the
+    measured monthly mean, and the synthetic temperature profile is shifted
+    so its monthly means equal the measured ones, keeping the modelled
+    diurnal shapes.
+
+    Parameters:
+    - latitude, longitude, tilt_angle, azimuth, tracking_type: as for hourly_production_per_mw
+    - monthly_ghi: Mean global horizontal irradiance of each calendar month (W/m2, 12 values)
+    - monthly_temperature: Optional mean ambient temperature of each calendar month (C, 12 values)
+
+    Returns: Array of 8760 hourly values
+    """
+    position = solar_position(latitude, longitude)
+    clear_ghi = clear_sky_irradiance(position[0], clearness=1.0)[0]
+    clear_means = monthly_totals(clear_ghi) / _MONTH_HOURS
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scale = np.where(clear_means > 0, np.asarray(monthly_ghi, dtype=float) / clear_means, 0.0)
+    temperature = None
+    if monthly_temperature is not None:
+        synthetic = ambient_temperature(latitude)
+        shift = np.asarray(monthly_temperature, dtype=float) - monthly_totals(synthetic) / _MONTH_HOURS
+        temperature = synthetic + shift[_MONTH]
+    return hourly_production_per_mw(latitude, longitude, tilt_angle, azimuth, tracking_type,
+                                    ghi=clear_ghi * scale[_MONTH], temperature=temperature, position=position)
+
+
+def production_profile(latitude, longitude, tilt_angle=None, azimuth=None, tracking_type='fixed',
+                       cache=None):
+    """
+    Hourly output (MWh per MW, before performance ratio) for the site grid cell
+    and geometry, served from the production-profile cache.
+
+    Parameters:
+    - latitude, longitude, tilt_angle, azimuth, tracking_type: as for hourly_production_per_mw
+    - cache: ProductionProfileCache to use (default: the shared profile_cache)
+
+    Returns: Array of 8760 hourly values (float32, read-only)
+    """
+    cache = cache or profile_cache
+    key = profile_key(latitude, longitude, tilt_angle, azimuth, tracking_type)
+    cell_latitude, cell_longitude, cell_tilt, cell_azimuth, tracking_type = key
+    return cache.get_or_compute(key, lambda: hourly_production_per_mw(
+        cell_latitude, cell_longitude, cell_tilt, cell_azimuth, tracking_type))
+
+
+def annual_energy_per_mw(latitude, longitude, tilt_angle=None, azimuth=None, tracking_type='fixed'):
+    """
+    First-year energy (MWh per MW, before performance ratio) for a site and geometry.
+    """
+    return float(production_profile(latitude, longitude, tilt_angle, azimuth, tracking_type).sum())
+
+
+def degradation_factors(degradation_rate, n_years):
+    """
+    Production factor for each operational year (0-based), broadcast over degradation_rate (%).
+    """
+    rate = np.asarray(degradation_rate, dtype=float)
+    return (1 - rate[..., np.newaxis] / 100) ** np.arange(n_years)
+
+
+def hourly_production(solar_project, n_years=None):
+    """
+    Hourly production (MWh) over the project lifetime.
+
+    Parameters:
+    - solar_project: A SolarProject instance with latitude and longitude
+    - n_years: Number of operational years (default: expected lifetime)
+
+    Returns: Array of shape (n_years, 8760)
+    """
+    n_years = n_years or solar_project.expected_lifetime_years or 25
+    profile = production_profile(
+        solar_project.latitude, solar_project.longitude, solar_project.tilt_angle,
+        solar_project.azimuth, solar_project.tracking_type or 'fixed')
+    specific_yield = getattr(solar_project, 'specific_yield', None)
+    if specific_yield:
+        # Hourly shape from the site model, energy from the resource assessment
+        profile = profile * (specific_yield / profile.sum())
+    first_year = profile * solar_project.capacity_mw * (solar_project.performance_ratio or 1.0)
+    factors = degradation_factors(solar_project.degradation_rate or 0.0, n_years)
+    return factors[:, np.newaxis] * first_year
+
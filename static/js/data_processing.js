@@ -208,7 +208,10 @@ function loadAnalysisResult(analysisId) {
     fetch(`/api/analysis/${analysisId}`)
         .then(response => response.json())
         .then(data => {
-            if (data.success) {
+            if (data.success && ['queued', 'running'].includes(data.result.status)) {
+                // Still computing: poll until the background job finishes
+                setTimeout(() => loadAnalysisResult(analysisId), 1000);
+            } else if (data.success) {
                 currentAnalysis = data.result;
                 
                 // Display the analysis results
@@ -312,8 +315,8 @@ function displayTemperatureMean(container, textResult, result) {
     const data = [{
         type: 'contour',
         z: result.mean_temperature,
-        x: result.longitudes[0],  // Assuming all rows have the same longitude values
-        y: result.latitudes.map(row => row[0]),  // Get first column of latitudes
+        x: result.longitudes,
+        y: result.latitudes,
         colorscale: 'RdBu',
         reversescale: true,
         contours: {
@@ -346,7 +349,7 @@ function displayTemperatureMean(container, textResult, result) {
     
     // Add text summary
     const temperatures = result.mean_temperature.flat();
-    const validTemps = temperatures.filter(t => !isNaN(t));
+    const validTemps = temperatures.filter(t => t !== null);
     const min = Math.min(...validTemps).toFixed(2);
     const max = Math.max(...validTemps).toFixed(2);
     const mean = (validTemps.reduce((a, b) => a + b, 0) / validTemps.length).toFixed(2);
@@ -446,8 +449,8 @@ function displayTemperatureAnomaly(container, textResult, result) {
         const data = [{
             type: 'contour',
             z: anomalyData,
-            x: result.longitudes[0],  // Assuming all rows have the same longitude values
-            y: result.latitudes.map(row => row[0]),  // Get first column of latitudes
+            x: result.longitudes,
+            y: result.latitudes,
             colorscale: 'RdBu',
             reversescale: true,
             contours: {
@@ -519,8 +522,8 @@ function displayPrecipitationTotal(container, textResult, result) {
     const data = [{
         type: 'contour',
         z: result.total_precipitation,
-        x: result.longitudes[0],  // Assuming all rows have the same longitude values
-        y: result.latitudes.map(row => row[0]),  // Get first column of latitudes
+        x: result.longitudes,
+        y: result.latitudes,
         colorscale: 'YlGnBu',
         contours: {
             coloring: 'heatmap',
@@ -552,7 +555,7 @@ function displayPrecipitationTotal(container, textResult, result) {
     
     // Add text summary
     const precipitations = result.total_precipitation.flat();
-    const validPrecip = precipitations.filter(p => !isNaN(p));
+    const validPrecip = precipitations.filter(p => p !== null);
     const min = Math.min(...validPrecip).toFixed(2);
     const max = Math.max(...validPrecip).toFixed(2);
     const mean = (validPrecip.reduce((a, b) => a + b, 0) / validPrecip.length).toFixed(2);
@@ -620,8 +623,8 @@ function displayClimateIndices(container, textResult, result) {
     const data = [{
         type: 'contour',
         z: result.index_values,
-        x: result.longitudes[0],  // Assuming all rows have the same longitude values
-        y: result.latitudes.map(row => row[0]),  // Get first column of latitudes
+        x: result.longitudes,
+        y: result.latitudes,
         colorscale: 'Viridis',
         contours: {
             coloring: 'heatmap',
@@ -653,7 +656,7 @@ function displayClimateIndices(container, textResult, result) {
     
     // Add text summary
     const indexValues = result.index_values.flat();
-    const validValues = indexValues.filter(v => !isNaN(v));
+    const validValues = indexValues.filter(v => v !== null);
     const min = Math.min(...validValues).toFixed(2);
     const max = Math.max(...validValues).toFixed(2);
     const mean = (validValues.reduce((a, b) => a + b, 0) / validValues.length).toFixed(2);
@@ -737,7 +740,7 @@ function displaySeasonalCycle(container, textResult, result) {
         
         for (let i = 0; i < result.monthly_means.length; i++) {
             for (let j = 0; j < result.monthly_means[i].length; j++) {
-                if (!isNaN(result.monthly_means[i][j][m])) {
+                if (result.monthly_means[i][j][m] !== null) {
                     sum += result.monthly_means[i][j][m];
                     count++;
                 }
@@ -862,8 +865,8 @@ function exportResult() {
         .then(response => response.json())
         .then(data => {
             if (data.success) {
-                // Download the exported file
-                downloadExportedFile(data.result.export_url, `${filename}.${format}`);
+                // The export streams straight to the download, not through the page
+                downloadExportedFile(data.result.export_url, `${filename}.${data.result.extension}`);
             } else {
                 throw new Error(data.error || 'Export failed');
             }
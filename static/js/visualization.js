@@ -159,11 +159,14 @@ function updateVisualization() {
         return;
     }
     
-    // Build query parameters
+    // Build query parameters; the server sizes the grid and series to the container
+    const container = document.getElementById('map-container').parentElement;
     const params = new URLSearchParams({
         variable: variable,
         lat_range: `${latMin}:${latMax}`,
-        lon_range: `${lonMin}:${lonMax}`
+        lon_range: `${lonMin}:${lonMax}`,
+        width: Math.max(100, Math.round(container.clientWidth || 720)),
+        height: 500
     });
     
     // Add time parameter if time control is visible and has a selection
@@ -184,14 +187,14 @@ function updateVisualization() {
         .then(response => response.json())
         .then(data => {
             if (data.success) {
-                currentData = data.data;
+                currentData = decodeView(data.data);
                 currentVariable = variable;
                 
                 // Update statistics
-                updateStatistics(data.data.statistics);
+                updateStatistics(currentData.statistics);
                 
                 // Create visualization based on type
-                createVisualization(vizType, data.data);
+                createVisualization(vizType, currentData);
                 
                 document.getElementById('loading-viz').style.display = 'none';
                 document.getElementById('viz-stats').style.display = 'block';
@@ -207,6 +210,42 @@ function updateVisualization() {
         });
 }
 
+/**
+ * Decode a float32 array sent as base64, reshaped to nested rows
+ * @param {Object|Array} encoded - {dtype, shape, data} or a plain JSON array
+ * @returns {Array} - Nested arrays, with null for missing values
+ */
+function decodeArray(encoded) {
+    if (!encoded || Array.isArray(encoded)) {
+        return encoded;
+    }
+    const bytes = Uint8Array.from(atob(encoded.data), c => c.charCodeAt(0));
+    const values = Array.from(new Float32Array(bytes.buffer), v => (isNaN(v) ? null : v));
+    if (encoded.shape.length < 2) {
+        return values;
+    }
+    const columns = encoded.shape[encoded.shape.length - 1];
+    const rows = [];
+    for (let i = 0; i < values.length; i += columns) {
+        rows.push(values.slice(i, i + columns));
+    }
+    return rows;
+}
+
+/**
+ * Decode the arrays of a dataset view returned by /api/dataset/<id>/data
+ * @param {Object} data - View payload
+ * @returns {Object} - View with plain arrays
+ */
+function decodeView(data) {
+    const view = Object.assign({}, data);
+    view.grid = decodeArray(data.grid);
+    if (data.series) {
+        view.series = {times: data.series.times, values: decodeArray(data.series.values)};
+    }
+    return view;
+}
+
 /**
  * Create visualization based on the selected type
  * @param {string} type - Visualization type
@@ -258,17 +297,17 @@ function createMap(data) {
     mapContainer.innerHTML = '';
     
     // Check if we have sufficient data
-    if (!data.data || !data.longitudes || !data.latitudes) {
+    if (!data.grid || !data.longitudes || !data.latitudes) {
         mapContainer.innerHTML = '<div class="alert alert-warning">Insufficient data for map visualization</div>';
         return;
     }
     
-    // Create a Plotly map
+    // Create a Plotly map (the mean over the selected time steps)
     const plotData = [{
         type: 'contour',
-        z: data.data,
-        x: data.longitudes[0],  // Assuming all rows have the same longitude values
-        y: data.latitudes.map(row => row[0]),  // Get first column of latitudes
+        z: data.grid,
+        x: data.longitudes,
+        y: data.latitudes,
         colorscale: colormap,
         contours: {
             coloring: 'heatmap',
@@ -312,31 +351,14 @@ function createTimeSeries(data) {
     chartContainer.innerHTML = '';
     
     // Check if we have sufficient data
-    if (!data.data || !data.times) {
+    if (!data.series) {
         chartContainer.innerHTML = '<div class="alert alert-warning">Insufficient data for time series visualization</div>';
         return;
     }
     
-    // Process data for time series
-    const timeValues = data.times;
-    const dataValues = [];
-    
-    // Calculate area-weighted average for each time step
-    for (let t = 0; t < timeValues.length; t++) {
-        let sum = 0;
-        let count = 0;
-        
-        for (let i = 0; i < data.data.length; i++) {
-            for (let j = 0; j < data.data[i].length; j++) {
-                if (!isNaN(data.data[i][j][t])) {
-                    sum += data.data[i][j][t];
-                    count++;
-                }
-            }
-        }
-        
-        dataValues.push(count > 0 ? sum / count : null);
-    }
+    // Area-weighted box means, downsampled on the server to the chart width
+    const timeValues = data.series.times;
+    const dataValues = data.series.values;
     
     // Create a Plotly time series
     const plotData = [{
@@ -387,29 +409,17 @@ function createHistogram(data) {
     chartContainer.innerHTML = '';
     
     // Check if we have sufficient data
-    if (!data.data) {
+    if (!data.grid) {
         chartContainer.innerHTML = '<div class="alert alert-warning">Insufficient data for histogram visualization</div>';
         return;
     }
     
-    // Process data for histogram
+    // Flatten the grid
     const values = [];
-    
-    // Flatten the data array
-    for (let i = 0; i < data.data.length; i++) {
-        for (let j = 0; j < data.data[i].length; j++) {
-            // If data is 3D (with time dimension)
-            if (Array.isArray(data.data[i][j])) {
-                for (let t = 0; t < data.data[i][j].length; t++) {
-                    if (!isNaN(data.data[i][j][t])) {
-                        values.push(data.data[i][j][t]);
-                    }
-                }
-            } else {
-                // If data is 2D
-                if (!isNaN(data.data[i][j])) {
-                    values.push(data.data[i][j]);
-                }
+    for (let i = 0; i < data.grid.length; i++) {
+        for (let j = 0; j < data.grid[i].length; j++) {
+            if (data.grid[i][j] !== null) {
+                values.push(data.grid[i][j]);
             }
         }
     }
@@ -459,27 +469,17 @@ function createHeatmap(data) {
     chartContainer.innerHTML = '';
     
     // Check if we have sufficient data
-    if (!data.data || !data.longitudes || !data.latitudes) {
+    if (!data.grid || !data.longitudes || !data.latitudes) {
         chartContainer.innerHTML = '<div class="alert alert-warning">Insufficient data for heatmap visualization</div>';
         return;
     }
     
-    // Get a single time slice if data has time dimension
-    let heatmapData;
-    if (Array.isArray(data.data[0][0])) {
-        // 3D data (with time) - take the first time step
-        heatmapData = data.data.map(row => row.map(cell => cell[0]));
-    } else {
-        // 2D data
-        heatmapData = data.data;
-    }
-    
     // Create a Plotly heatmap
     const plotData = [{
         type: 'heatmap',
-        z: heatmapData,
-        x: data.longitudes[0],  // Assuming all rows have the same longitude values
-        y: data.latitudes.map(row => row[0]),  // Get first column of latitudes
+        z: data.grid,
+        x: data.longitudes,
+        y: data.latitudes,
         colorscale: colormap,
         colorbar: {
             title: `${data.variable} (${data.units})`
@@ -512,10 +512,11 @@ function createHeatmap(data) {
  * @param {Object} statistics - Statistics to display
  */
 function updateStatistics(statistics) {
-    document.getElementById('stat-min').textContent = statistics.min.toFixed(2);
-    document.getElementById('stat-max').textContent = statistics.max.toFixed(2);
-    document.getElementById('stat-mean').textContent = statistics.mean.toFixed(2);
-    document.getElementById('stat-std').textContent = statistics.std.toFixed(2);
+    const format = value => (value === null ? '-' : value.toFixed(2));
+    document.getElementById('stat-min').textContent = format(statistics.min);
+    document.getElementById('stat-max').textContent = format(statistics.max);
+    document.getElementById('stat-mean').textContent = format(statistics.mean);
+    document.getElementById('stat-std').textContent = format(statistics.std);
 }
 
 /**
@@ -564,46 +565,24 @@ function exportData() {
 function exportToCSV(filename, dataType) {
     let csv = 'latitude,longitude,value\n';
     
-    // Process data based on format
-    if (Array.isArray(currentData.data[0][0])) {
-        // 3D data (with time)
-        for (let i = 0; i < currentData.data.length; i++) {
-            for (let j = 0; j < currentData.data[i].length; j++) {
-                const lat = currentData.latitudes[i][j];
-                const lon = currentData.longitudes[i][j];
-                
-                if (dataType === 'current') {
-                    // Export only the first time step
-                    const value = currentData.data[i][j][0];
-                    if (!isNaN(value)) {
-                        csv += `${lat},${lon},${value}\n`;
-                    }
-                } else {
-                    // Export all time steps
-                    for (let t = 0; t < currentData.data[i][j].length; t++) {
-                        const value = currentData.data[i][j][t];
-                        if (!isNaN(value)) {
-                            csv += `${lat},${lon},${value}\n`;
-                        }
-                    }
-                }
-            }
-        }
-    } else {
-        // 2D data
-        for (let i = 0; i < currentData.data.length; i++) {
-            for (let j = 0; j < currentData.data[i].length; j++) {
-                const lat = currentData.latitudes[i][j];
-                const lon = currentData.longitudes[i][j];
-                const value = currentData.data[i][j];
-                
-                if (!isNaN(value)) {
-                    csv += `${lat},${lon},${value}\n`;
-                }
+    // The grid is the mean over the selected time steps
+    for (let i = 0; i < currentData.grid.length; i++) {
+        for (let j = 0; j < currentData.grid[i].length; j++) {
+            const value = currentData.grid[i][j];
+            if (value !== null) {
+                csv += `${currentData.latitudes[i]},${currentData.longitudes[j]},${value}\n`;
             }
         }
     }
     
+    // Append the box-mean time series when the full view is exported
+    if (dataType !== 'current' && currentData.series) {
+        csv += '\ntime,mean\n';
+        currentData.series.times.forEach((time, t) => {
+            csv += `${time},${currentData.series.values[t]}\n`;
+        });
+    }
+    
     // Create download link
     const blob = new Blob([csv], { type: 'text/csv' });
     const url = URL.createObjectURL(blob);
@@ -629,14 +608,14 @@ function exportToJSON(filename, dataType) {
         exportData = {
             variable: currentData.variable,
             units: currentData.units,
-            data: currentData.data,
+            grid: currentData.grid,
             latitudes: currentData.latitudes,
             longitudes: currentData.longitudes
         };
         
-        // Add times if available
-        if (currentData.times) {
-            exportData.times = currentData.times;
+        // Add the time series if available
+        if (currentData.series) {
+            exportData.series = currentData.series;
         }
     } else {
         // Export full dataset (same as current since we only have what was loaded)
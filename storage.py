@@ -0,0 +1,231 @@
+"""
+Battery storage dispatch for the Energy Finance application.
+Charge and discharge schedules for a battery co-located with a solar array
+are optimized against an hourly price curve by dynamic programming over a
+discretized state of charge. Each day is solved independently (the battery
+starts and ends the day at its minimum state of charge), so all days of a
+year, and all sizing variants of a site, are solved together as rows of one
+batch with the 24 hourly stages as the only loop.
+"""
+
+import numpy as np
+
+import solar
+
+
+HOURS_PER_DAY = 24
+HOURS_PER_YEAR = 8760
+DAYS_PER_YEAR = HOURS_PER_YEAR // HOURS_PER_DAY
+
+DEFAULT_ROUND_TRIP_EFFICIENCY = 0.85
+DEFAULT_MIN_STATE_OF_CHARGE = 0.1
+DEFAULT_MAX_STATE_OF_CHARGE = 1.0
+
+# Number of state-of-charge levels between the minimum and maximum
+DEFAULT_SOC_LEVELS = 41
+
+# Largest number of days solved together (variants x 365)
+MAX_BATCH_DAYS = 36_500
+
+# Tolerance on the power and solar limits, absorbing rounding in the level grid
+_LIMIT_TOLERANCE = 1e-9
+
+
+def _solve_days(prices, solar_mwh, level_mwh, power_mw, efficiency, export_limit, grid_charging, levels):
+    """
+    Optimal dispatch of a batch of independent days.
+
+    All inputs have one row per day: prices and solar_mwh are (rows, 24),
+    the battery parameters (rows,). level_mwh is the stored energy between two
+    adjacent state-of-charge levels.
+
+    The reward of a move depends only on its size in levels, so each stage
+    loops over the moves the power limit allows rather than over all pairs
+    of levels.
+
+    Returns: (charge, discharge, level) arrays of shape (rows, 24): energy drawn
+    and delivered at the battery terminals (MWh) and the level index at the
+    end of each hour
+    """
+    rows = prices.shape[0]
+    one_way = np.sqrt(efficiency)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        up = np.where(level_mwh > 0, np.floor(power_mw * one_way / level_mwh + _LIMIT_TOLERANCE), 0)
+        down = np.where(level_mwh > 0, np.floor(power_mw / one_way / level_mwh + _LIMIT_TOLERANCE), 0)
+    moves = range(-int(min(down.max(initial=0), levels - 1)), int(min(up.max(initial=0), levels - 1)) + 1)
+    stored = {move: move * level_mwh for move in moves}
+    charge = {move: np.maximum(value, 0) / one_way for move, value in stored.items()}
+    discharge = {move: np.maximum(-value, 0) * one_way for move, value in stored.items()}
+    within_power = {move: (move <= up) & (-move <= down) for move in moves}
+
+    # Backward pass: value of each level at the start of each hour and the level moved to
+    value = np.full((rows, levels), -np.inf)
+    value[:, 0] = 0.0
+    policy = np.empty((rows, HOURS_PER_DAY, levels), dtype=np.int16)
+    for hour in range(HOURS_PER_DAY - 1, -1, -1):
+        price, available = prices[:, hour], solar_mwh[:, hour]
+        baseline = np.minimum(available, export_limit)
+        best = np.full((rows, levels), -np.inf)
+        choice = np.tile(np.arange(levels, dtype=np.int16), (rows, 1))
+        for move in moves:
+            export = available + discharge[move] - charge[move]
+            feasible = within_power[move] & (export >= -export_limit)
+            if not grid_charging:
+                feasible &= charge[move] <= available + _LIMIT_TOLERANCE
+            # Revenue relative to the array alone, so clipped solar stored for later counts in full
+            reward = np.where(feasible, price * (np.minimum(export, export_limit) - baseline), -np.inf)
+            start, stop = max(0, -move), min(levels, levels - move)
+            candidate = reward[:, np.newaxis] + value[:, start + move:stop + move]
+            better = candidate > best[:, start:stop]
+            best[:, start:stop] = np.where(better, candidate, best[:, start:stop])
+            choice[:, start:stop] = np.where(better, np.arange(start + move, stop + move), choice[:, start:stop])
+        policy[:, hour] = choice
+        value = best
+
+    # Forward pass from the minimum state of charge
+    path = np.empty((rows, HOURS_PER_DAY), dtype=np.intp)
+    level = np.zeros(rows, dtype=np.intp)
+    for hour in range(HOURS_PER_DAY):
+        level = policy[np.arange(rows), hour, level].astype(np.intp)
+        path[:, hour] = level
+    previous = np.concatenate([np.zeros((rows, 1), dtype=np.intp), path[:, :-1]], axis=1)
+    delta = (path - previous) * level_mwh[:, np.newaxis]
+    one_way = one_way[:, np.newaxis]
+    return np.maximum(delta, 0) / one_way, np.maximum(-delta, 0) * one_way, path
+
+
+def dispatch(prices, solar_mwh, power_mw, energy_mwh, round_trip_efficiency=DEFAULT_ROUND_TRIP_EFFICIENCY,
+             min_state_of_charge=DEFAULT_MIN_STATE_OF_CHARGE, max_state_of_charge=DEFAULT_MAX_STATE_OF_CHARGE,
+             export_limit_mw=None, grid_charging=False, levels=DEFAULT_SOC_LEVELS, progress=None):
+    """
+    Optimize a year of hourly battery dispatch for one or many sizing variants.
+
+    Parameters:
+    - prices: Hourly market prices ($/MWh), 8760 values or (variants..., 8760)
+    - solar_mwh: Hourly solar production (MWh), broadcast like prices
+    - power_mw: Charge and discharge power limit (MW)
+    - energy_mwh: Energy capacity (MWh)
+    - round_trip_efficiency: Fraction of charged energy returned, split evenly
+      between charging and discharging
+    - min_state_of_charge, max_state_of_charge: Usable band as fractions of capacity
+    - export_limit_mw: Interconnection limit on export and import (default: none)
+    - grid_charging: Allow charging from the grid; otherwise only from the array
+    - levels: Number of state-of-charge levels in the optimization grid
+    - progress: Optional callback called with (variants solved, total variants)
+
+    The battery parameters broadcast over the variants; prices and solar may
+    vary by variant too.
+
+    Returns: dict with hourly 'charge', 'discharge' (MWh at the battery
+    terminals), 'state_of_charge' (MWh stored) and 'export' (MWh at the
+    meter) of shape variants + (8760,), and per variant 'revenue' (the first-
+    year gain over the array alone, $), 'energy_charged', 'energy_discharged'
+    and 'cycles' (equivalent full cycles of the usable band)
+
+    Raises: ValueError if the curves do not have 8760 hours
+    """
+    prices = np.asarray(prices, dtype=float)
+    solar_mwh = np.asarray(solar_mwh, dtype=float)
+    if prices.shape[-1] != HOURS_PER_YEAR or solar_mwh.shape[-1] != HOURS_PER_YEAR:
+        raise ValueError(f"Price and production curves need {HOURS_PER_YEAR} hourly values")
+    limit = np.inf if export_limit_mw is None else export_limit_mw
+    params = np.broadcast_arrays(*(np.asarray(value, dtype=float) for value in (
+        power_mw, energy_mwh, round_trip_efficiency, min_state_of_charge, max_state_of_charge, limit)))
+    shape = np.broadcast_shapes(params[0].shape, prices.shape[:-1], solar_mwh.shape[:-1])
+    power, energy, efficiency, low, high, limit = (np.broadcast_to(value, shape).ravel() for value in params)
+    prices = np.broadcast_to(prices, shape + (HOURS_PER_YEAR,)).reshape(-1, DAYS_PER_YEAR, HOURS_PER_DAY)
+    solar_mwh = np.broadcast_to(solar_mwh, shape + (HOURS_PER_YEAR,)).reshape(-1, DAYS_PER_YEAR,
+                                                                              HOURS_PER_DAY)
+    n_variants = power.size
+
+    floor = energy * np.clip(low, 0, 1)
+    usable = np.maximum(energy * np.clip(high, 0, 1) - floor, 0)
+    level_mwh = usable / (levels - 1)
+
+    charge = np.empty((n_variants, DAYS_PER_YEAR, HOURS_PER_DAY))
+    discharge = np.empty_like(charge)
+    path = np.empty(charge.shape, dtype=np.intp)
+    chunk = max(1, MAX_BATCH_DAYS // DAYS_PER_YEAR)
+    for start in range(0, n_variants, chunk):
+        rows = slice(start, start + chunk)
+        count = len(range(*rows.indices(n_variants)))
+
+        def per_day(value):
+            return np.repeat(value[rows], DAYS_PER_YEAR)
+
+        day_charge, day_discharge, day_path = _solve_days(
+            prices[rows].reshape(-1, HOURS_PER_DAY), solar_mwh[rows].reshape(-1, HOURS_PER_DAY),
+            per_day(level_mwh), per_day(power), per_day(efficiency), per_day(limit), grid_charging, levels)
+        charge[rows] = day_charge.reshape(count, DAYS_PER_YEAR, HOURS_PER_DAY)
+        discharge[rows] = day_discharge.reshape(count, DAYS_PER_YEAR, HOURS_PER_DAY)
+        path[rows] = day_path.reshape(count, DAYS_PER_YEAR, HOURS_PER_DAY)
+        if progress:
+            progress(start + count, n_variants)
+
+    charge = charge.reshape(n_variants, HOURS_PER_YEAR)
+    discharge = discharge.reshape(n_variants, HOURS_PER_YEAR)
+    solar_mwh = solar_mwh.reshape(n_variants, HOURS_PER_YEAR)
+    prices = prices.reshape(n_variants, HOURS_PER_YEAR)
+    export = solar_mwh + discharge - charge
+    limit = limit[:, np.newaxis]
+    revenue = (prices * (np.minimum(export, limit) - np.minimum(solar_mwh, limit))).sum(axis=-1)
+    energy_discharged = discharge.sum(axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cycles = np.where(usable > 0, energy_discharged / usable, 0.0)
+
+    def unflatten(value):
+        return value.reshape(shape + value.shape[1:])
+
+    return {
+        'charge': unflatten(charge),
+        'discharge': unflatten(discharge),
+        'state_of_charge': unflatten(floor[:, np.newaxis]
+                                     + path.reshape(n_variants, HOURS_PER_YEAR) * level_mwh[:, np.newaxis]),
+        'export': unflatten(np.minimum(export, limit)),
+        'revenue': unflatten(revenue),
+        'energy_charged': unflatten(charge.sum(axis=-1)),
+        'energy_discharged': unflatten(energy_discharged),
+        'cycles': unflatten(cycles),
+    }
+
+
+def project_solar_profile(hybrid_project):
+    """
+    First-year hourly solar production (MWh) of a hybrid project's array.
+
+    Raises: ValueError if the project has no latitude and longitude
+    """
+    if hybrid_project.latitude is None or hybrid_project.longitude is None:
+        raise ValueError("Storage dispatch needs the project's latitude and longitude")
+    return solar.hourly_production(hybrid_project, n_years=1)[0]
+
+
+def project_dispatch(hybrid_project, prices, power_mw=None, energy_mwh=None, progress=None):
+    """
+    Optimize dispatch of a hybrid project's battery, or of sizing variants of it.
+
+    Parameters:
+    - hybrid_project: A HybridProject instance
+    - prices: Hourly market prices ($/MWh), 8760 values
+    - power_mw, energy_mwh: Optional arrays of variant sizes (default: the
+      project's storage_power_mw and storage_energy_mwh)
+    - progress: Optional callback, as for dispatch
+
+    Returns: dispatch result, as for dispatch
+    """
+    def setting(name, default):
+        value = getattr(hybrid_project, name, None)
+        return default if value is None else value
+
+    return dispatch(
+        prices,
+        project_solar_profile(hybrid_project),
+        setting('storage_power_mw', 0.0) if power_mw is None else power_mw,
+        setting('storage_energy_mwh', 0.0) if energy_mwh is None else energy_mwh,
+        round_trip_efficiency=setting('round_trip_efficiency', DEFAULT_ROUND_TRIP_EFFICIENCY),
+        min_state_of_charge=setting('min_state_of_charge', DEFAULT_MIN_STATE_OF_CHARGE),
+        max_state_of_charge=setting('max_state_of_charge', DEFAULT_MAX_STATE_OF_CHARGE),
+        export_limit_mw=getattr(hybrid_project, 'export_limit_mw', None),
+        grid_charging=bool(getattr(hybrid_project, 'grid_charging', False)),
+        progress=progress,
+    )
@@ -0,0 +1,183 @@
+"""
+Tax depreciation and incentives for the Energy Finance application.
+Depreciation tables are precomputed as arrays indexed by method and recovery
+period and gathered for a whole batch of projects at once; credits and
+income taxes are computed with the year on the last axis, like the rest of
+the cash-flow engine. Only the net operating loss carryforward steps through
+the years, vectorized across the batch.
+"""
+
+import numpy as np
+
+
+# Depreciation methods, in the order of their numeric codes
+DEPRECIATION_METHODS = ('none', 'straight_line', 'macrs')
+
+# Federal corporate income tax rate
+DEFAULT_TAX_RATE = 0.21
+
+DEFAULT_DEPRECIATION_METHOD = 'macrs'
+DEFAULT_DEPRECIATION_YEARS = 5  # MACRS class of solar, wind and storage assets
+
+# MACRS general depreciation system, half-year convention: percent of basis
+# deducted in each recovery year, by recovery period (IRS Publication 946, Table A-1)
+MACRS_PERCENTAGES = {
+    3: (33.33, 44.45, 14.81, 7.41),
+    5: (20.00, 32.00, 19.20, 11.52, 11.52, 5.76),
+    7: (14.29, 24.49, 17.49, 12.49, 8.93, 8.92, 8.93, 4.46),
+    10: (10.00, 18.00, 14.40, 11.52, 9.22, 7.37, 6.55, 6.55, 6.56, 6.55, 3.28),
+    15: (5.00, 9.50, 8.55, 7.70, 6.93, 6.23, 5.90, 5.90, 5.91, 5.90, 5.91, 5.90, 5.91, 5.90, 5.91, 2.95),
+    20: (3.750, 7.219, 6.677, 6.177, 5.713, 5.285, 4.888, 4.522, 4.462, 4.461, 4.462, 4.461, 4.462, 4.461,
+         4.462, 4.461, 4.462, 4.461, 4.462, 4.461, 2.231),
+}
+
+# MACRS rates as fractions by recovery period, year 0 (construction) first and
+# zero padded; rows for periods without a table stay zero
+MACRS_RATES = np.zeros((max(MACRS_PERCENTAGES) + 1, max(map(len, MACRS_PERCENTAGES.values())) + 1))
+for _years, _percentages in MACRS_PERCENTAGES.items():
+    MACRS_RATES[_years, 1:len(_percentages) + 1] = np.array(_percentages) / 100
+
+# Share of the investment tax credit deducted from the depreciable basis
+ITC_BASIS_REDUCTION = 0.5
+
+# Production tax credits are earned for this many years from the start of operation
+PTC_YEARS = 10
+
+# Share of a year's taxable income that carried-forward losses may offset
+NOL_LIMIT = 0.8
+
+
+def method_code(method):
+    """
+    Numeric code of a depreciation method name; codes pass through.
+
+    Raises: ValueError for an unknown method
+    """
+    if isinstance(method, str):
+        if method not in DEPRECIATION_METHODS:
+            raise ValueError(f"Unknown depreciation method: {method}. "
+                             f"Expected one of {', '.join(DEPRECIATION_METHODS)}")
+        return DEPRECIATION_METHODS.index(method)
+    return method
+
+
+def _method_codes(method):
+    """Depreciation method names or codes as an array of codes"""
+    method = np.asarray(method)
+    if method.dtype.kind in 'OUS':
+        method = np.vectorize(method_code, otypes=[float])(method)
+    method = method.astype(float)
+    if not np.isin(method, range(len(DEPRECIATION_METHODS))).all():
+        raise ValueError(f"Depreciation method codes run from 0 to {len(DEPRECIATION_METHODS) - 1}")
+    return method
+
+
+def depreciation_rates(method, recovery_years, n_years):
+    """
+    Share of the depreciable basis deducted in each year.
+
+    MACRS rows are gathered from MACRS_RATES; straight-line rows spread the
+    basis evenly over the recovery period. Year 0 is the investment year,
+    year 1 the first operational year.
+
+    Parameters:
+    - method: Depreciation method name or code, scalar or array
+    - recovery_years: Recovery period in years (a MACRS_PERCENTAGES key for MACRS)
+    - n_years: Number of operational years in the output
+
+    Returns: Array of shape batch + (n_years + 1,)
+
+    Raises: ValueError for an unknown method or a MACRS period without a table
+    """
+    method, recovery_years = np.broadcast_arrays(_method_codes(method), np.asarray(recovery_years, dtype=float))
+    macrs = method == DEPRECIATION_METHODS.index('macrs')
+    periods = np.where(macrs, recovery_years, 0).astype(int)
+    if not np.isin(periods[macrs], list(MACRS_PERCENTAGES)).all():
+        raise ValueError(f"MACRS recovery periods are {', '.join(map(str, MACRS_PERCENTAGES))} years")
+
+    year = np.arange(n_years + 1)
+    table = MACRS_RATES[:, :n_years + 1]
+    if table.shape[1] < n_years + 1:
+        table = np.pad(table, ((0, 0), (0, n_years + 1 - table.shape[1])))
+    recovery = recovery_years[..., np.newaxis]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        straight = np.where((year >= 1) & (year <= recovery), 1 / recovery, 0.0)
+    return np.where(macrs[..., np.newaxis], table[periods],
+                    np.where((method == DEPRECIATION_METHODS.index('straight_line'))[..., np.newaxis],
+                             straight, 0.0))
+
+
+def depreciation(capex, method, recovery_years, lifetime_years, n_years, itc_rate=0.0):
+    """
+    Tax depreciation of a batch of projects.
+
+    The basis is the capex less ITC_BASIS_REDUCTION of the investment tax
+    credit. Basis still undepreciated when a project retires is written off
+    in its final year.
+
+    Returns: Array of shape batch + (n_years + 1,), positive deductions
+    """
+    basis = np.asarray(capex, dtype=float) * (1 - ITC_BASIS_REDUCTION * np.asarray(itc_rate, dtype=float))
+    life = np.asarray(lifetime_years, dtype=float)[..., np.newaxis]
+    year = np.arange(n_years + 1)
+    rates = depreciation_rates(method, recovery_years, n_years) * (year <= life)
+    depreciating = (_method_codes(method) != DEPRECIATION_METHODS.index('none'))[..., np.newaxis]
+    rates = rates + (1 - rates.sum(axis=-1, keepdims=True)) * ((year == life) & depreciating)
+    return basis[..., np.newaxis] * rates
+
+
+def tax_credits(capex, energy, itc_rate=0.0, ptc_rate=0.0, ptc_years=PTC_YEARS, indexation=0.0):
+    """
+    Investment and production tax credits, assumed monetized in the year
+    they are earned (e.g. by transfer).
+
+    Parameters:
+    - capex: Eligible capital expenditure ($)
+    - energy: Energy production per year (MWh), batch + (years,) with year 0 first
+    - itc_rate: Investment tax credit as a fraction of capex, earned in year 1
+    - ptc_rate: Production tax credit in the first operational year ($/MWh)
+    - ptc_years: Years of operation that earn the PTC
+    - indexation: Annual inflation adjustment of the PTC rate (fraction)
+
+    Projects normally claim one credit or the other; give zero for the unused one.
+
+    Returns: Array of credits per year, the shape of energy
+    """
+    energy = np.asarray(energy, dtype=float)
+    year = np.arange(energy.shape[-1])
+    age = np.maximum(year - 1, 0)
+
+    def per_year(value):
+        return np.asarray(value, dtype=float)[..., np.newaxis]
+
+    itc = per_year(itc_rate * np.asarray(capex, dtype=float)) * (year == 1)
+    ptc = (energy * per_year(ptc_rate) * (1 + per_year(indexation)) ** age
+           * ((year >= 1) & (year <= per_year(ptc_years))))
+    return itc + ptc
+
+
+def income_taxes(taxable_income, tax_rate, nol_limit=NOL_LIMIT):
+    """
+    Income tax on a batch of taxable income with losses carried forward.
+
+    A year's loss is carried forward indefinitely and offsets up to nol_limit
+    of each later year's taxable income.
+
+    Parameters:
+    - taxable_income: Taxable income per year, year on the last axis
+    - tax_rate: Tax rate (fraction), broadcast over the batch shape
+    - nol_limit: Share of taxable income carried-forward losses may offset
+
+    Returns: (tax per year as a positive amount, losses still carried forward at the end)
+    """
+    taxable_income = np.asarray(taxable_income, dtype=float)
+    limit = np.broadcast_to(np.asarray(nol_limit, dtype=float), taxable_income.shape[:-1])
+    taxable = np.empty(taxable_income.shape)
+    carried = np.zeros(taxable_income.shape[:-1])
+    for year in range(taxable_income.shape[-1]):
+        income = taxable_income[..., year]
+        profit = np.maximum(income, 0)
+        used = np.minimum(carried, profit * limit)
+        taxable[..., year] = profit - used
+        carried = carried - used + np.maximum(-income, 0)
+    return np.asarray(tax_rate, dtype=float)[..., np.newaxis] * taxable, carried
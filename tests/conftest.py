@@ -0,0 +1,43 @@
+"""
+Shared setup for the Energy Finance test suite.
+
+The application modules live at the repository root and bind to the
+database named by DATABASE_URL when app is imported, so the path and a
+throwaway SQLite database are set up before any test module imports them.
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+WORKDIR = tempfile.mkdtemp(prefix='energy_finance_tests_')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(WORKDIR, 'test.db')}"
+for name, folder in (('ANALYSIS_DIR', 'analyses'), ('DATASET_DIR', 'datasets'), ('PRICE_DECK_DIR', 'price_decks'),
+                     ('PYRAMID_DIR', 'pyramids')):
+    os.environ.setdefault(name, os.path.join(WORKDIR, folder))
+
+
+@pytest.fixture
+def database():
+    """An application context over empty tables, dropped again afterwards"""
+    from app import app, db
+    import models  # noqa: F401  (registers the tables)
+
+    with app.app_context():
+        db.create_all()
+        yield db
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(database):
+    """A test client of the web application over empty tables"""
+    from main import app
+
+    return app.test_client()
@@ -0,0 +1,120 @@
+import json
+
+import numpy as np
+import pytest
+
+from models import SolarProject
+from utils import SCENARIO_METRICS, evaluate_scenarios, iter_json_results
+
+INLINE = {'capex': 1e6, 'opex': 2e4, 'energy_mwh': 2000, 'lifetime_years': 20}
+
+
+@pytest.fixture
+def project(database):
+    project = SolarProject(name='Mesa Solar', project_type='solar', capacity_mw=10.0, capex=1e7,
+                           opex_per_year=1.5e5, latitude=35.0, longitude=-110.0)
+    database.session.add(project)
+    database.session.commit()
+    return project
+
+
+def test_calculate_single_inline_scenario(client):
+    response = client.post('/api/calculate', json={**INLINE, 'ppa_price': 70.0})
+    assert response.status_code == 200
+    metrics = response.get_json()['metrics']
+    expected = evaluate_scenarios([{**INLINE, 'ppa_price': 70.0}])
+    for name in SCENARIO_METRICS:
+        assert metrics[name] == pytest.approx(expected[name][0])
+    assert metrics['ppa_price'] == 70.0
+
+
+def test_calculate_batch_in_scenario_order(client, project):
+    scenarios = [{**INLINE, 'ppa_price': price} for price in (40.0, 60.0, 80.0)]
+    response = client.post('/api/calculate', json={'discount_rate': 0.07,
+                                                   'scenarios': scenarios + [{'project_id': project.id}]})
+    assert response.status_code == 200
+    results = json.loads(response.get_data(as_text=True))['results']
+    assert len(results) == 4
+    expected = evaluate_scenarios([{**scenario, 'discount_rate': 0.07} for scenario in scenarios])
+    assert [row['npv'] for row in results[:3]] == pytest.approx(list(expected['npv']))
+    assert set(results[0]) == set(SCENARIO_METRICS)
+
+    # A bare list is a batch too, and project scenarios match the single-project response
+    single = client.post('/api/calculate', json={'project_id': project.id, 'discount_rate': 0.07}).get_json()
+    listed = json.loads(client.post('/api/calculate', json=[{'project_id': project.id, 'discount_rate': 0.07}])
+                        .get_data(as_text=True))['results']
+    assert listed[0]['npv'] == pytest.approx(single['metrics']['npv'])
+    assert results[3]['npv'] == pytest.approx(single['metrics']['npv'])
+
+
+@pytest.mark.parametrize('body', [
+    None,
+    {'scenarios': {'capex': 1.0}},
+    {'scenarios': [1, 2]},
+    {'project_id': [1]},
+    {'project_id': {'id': 1}},
+    [{'project_id': '1'}],
+    {'capex': 1e6},
+    {**INLINE, 'depreciation_method': 'declining_balance'},
+])
+def test_calculate_rejects_invalid_input(client, body):
+    response = client.post('/api/calculate', data=json.dumps(body) if body is not None else 'not json',
+                           content_type='application/json')
+    assert response.status_code == 400
+    assert response.get_json()['status'] == 'error'
+
+
+def test_calculate_unknown_project(client, project):
+    response = client.post('/api/calculate', json=[{'project_id': project.id}, {'project_id': project.id + 1}])
+    assert response.status_code == 404
+    assert str(project.id + 1) in response.get_json()['message']
+
+
+def test_json_results_are_valid_across_chunks():
+    results = {'npv': np.array([1.5, np.nan, np.inf, -2e-300, 1e16]), 'irr': np.arange(5.0)}
+    records = json.loads(''.join(iter_json_results(results, chunk_size=2)))
+    assert [record['npv'] for record in records] == [1.5, None, None, -2e-300, 1e16]
+    assert [record['irr'] for record in records] == [0.0, 1.0, 2.0, 3.0, 4.0]
+    assert json.loads(''.join(iter_json_results({'npv': np.array([])}))) == []
+
+
+def test_goal_seek_solves_each_project(client, project):
+    response = client.post('/api/goal-seek', json={'project_ids': [project.id], 'variable': 'ppa_price'})
+    assert response.status_code == 200
+    [result] = response.get_json()['results']
+    assert result['project_id'] == project.id
+    assert result['converged'] and result['value'] > 0
+
+
+@pytest.mark.parametrize('body', [
+    {'project_ids': []},
+    {'project_ids': [[1]]},
+    {'project_ids': [{'id': 1}]},
+    {'project_ids': ['1']},
+    {'project_ids': [True]},
+])
+def test_goal_seek_rejects_invalid_project_ids(client, body):
+    response = client.post('/api/goal-seek', json=body)
+    assert response.status_code == 400
+    assert response.get_json()['status'] == 'error'
+
+
+def test_goal_seek_unknown_variable(client, project):
+    response = client.post('/api/goal-seek', json={'project_ids': [project.id], 'variable': 'opex'})
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('body', [
+    {'n_paths': 0},
+    {'n_paths': 10 ** 9},
+    {'n_paths': '1000'},
+    {'seed': -1},
+    {'distributions': {'rotor_diameter': {'dist': 'normal', 'mean': 1.0, 'std': 0.1}}},
+    {'distributions': {'capex': {'dist': 'beta'}}},
+    {'distributions': {'capex': {'dist': 'normal', 'mean': 1.0}}},
+    {'distributions': {'capex': 1.1}},
+])
+def test_monte_carlo_rejects_invalid_options(client, project, body):
+    response = client.post(f'/api/analysis/{project.id}/monte-carlo', json=body)
+    assert response.status_code == 400
+    assert response.get_json()['status'] == 'error'
@@ -0,0 +1,100 @@
+import csv
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import cashflows
+import finance
+from models import CashFlow, SolarProject
+
+
+@pytest.fixture
+def batch(database):
+    """Two stored projects and their schedule, with lifetimes of 10 and 15 years"""
+    projects = [SolarProject(name=name, project_type='solar', capacity_mw=10.0) for name in ('Mesa', 'Ridge')]
+    database.session.add_all(projects)
+    database.session.commit()
+    schedule = finance.cash_flow_schedule(capex=np.array([1e6, 2e6]), opex=np.array([2e4, 3e4]),
+                                          energy_mwh=np.array([2000.0, 3000.0]), lifetime_years=np.array([10, 15]))
+    return [project.id for project in projects], schedule
+
+
+def test_long_format_drops_padding(batch):
+    project_ids, schedule = batch
+    flat = cashflows.long_format(project_ids, schedule)
+    assert flat['year'].size == 11 + 16
+    assert (flat['project_id'] == project_ids[0]).sum() == 11
+    assert flat['net_cash_flow'][:11] == pytest.approx(schedule['net_cash_flow'][0, :11])
+
+
+def test_rows_are_replaced(database, batch):
+    project_ids, schedule = batch
+    cashflows.store_cash_flows(project_ids, schedule)
+    cashflows.store_cash_flows(project_ids, schedule)
+    database.session.commit()
+
+    stored = CashFlow.query.filter_by(project_id=project_ids[1]).order_by(CashFlow.year).all()
+    assert [row.year for row in stored] == list(range(16))
+    assert [row.net_cash_flow for row in stored] == pytest.approx(schedule['net_cash_flow'][1])
+    assert stored[-1].cumulative_cash_flow == pytest.approx(schedule['cumulative_cash_flow'][1, -1])
+    assert stored[0].created_at is not None
+    assert CashFlow.query.count() == 11 + 16
+
+
+def test_postgresql_rows_are_copied_as_csv(database, batch, monkeypatch):
+    project_ids, schedule = batch
+    copied = []
+
+    class Cursor:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def copy_expert(self, sql, buffer):
+            copied.append((sql, list(csv.reader(buffer))))
+
+    # Only the dialect name and the raw DB-API cursor of the connection are used
+    connection = SimpleNamespace(dialect=SimpleNamespace(name='postgresql'),
+                                 connection=SimpleNamespace(cursor=Cursor))
+    monkeypatch.setattr(database.session, 'connection', lambda: connection)
+    cashflows.replace_cash_flows(project_ids, schedule)
+
+    [(sql, rows)] = copied
+    assert sql.startswith('COPY cash_flows (project_id, year, capex,')
+    assert 'created_at, updated_at) FROM STDIN' in sql
+    assert len(rows) == 11 + 16
+    assert float(rows[-1][sql.split('(')[1].split(', ').index('net_cash_flow')]) == \
+        pytest.approx(schedule['net_cash_flow'][1, -1])
+
+
+def test_packed_schedules_round_trip(database, batch):
+    project_ids, schedule = batch
+    cashflows.store_cash_flows(project_ids, schedule, storage='packed', scenario='high')
+    database.session.commit()
+
+    loaded = cashflows.load_packed_schedules(project_ids, scenario='high')
+    assert set(loaded) == set(project_ids)
+    assert list(loaded[project_ids[0]]['year']) == list(range(11))
+    for index, project_id in enumerate(project_ids):
+        n_years = loaded[project_id]['year'].size
+        for name in finance.CASH_FLOW_COLUMNS:
+            assert np.array_equal(loaded[project_id][name], schedule[name][index, :n_years])
+    assert cashflows.load_packed_schedules(project_ids) == {}
+
+
+def test_unknown_storage_is_rejected(batch):
+    with pytest.raises(ValueError):
+        cashflows.store_cash_flows(*batch, storage='parquet')
+
+
+def test_parquet_round_trip(tmp_path, batch):
+    pytest.importorskip('pyarrow')
+    project_ids, schedule = batch
+    path = str(tmp_path / 'schedules.parquet')
+    cashflows.write_parquet(path, project_ids, schedule)
+    table = cashflows.read_parquet(path, project_ids=[project_ids[1]], columns=['net_cash_flow'])
+    assert list(table) == ['project_id', 'year', 'net_cash_flow']
+    assert table['net_cash_flow'] == pytest.approx(schedule['net_cash_flow'][1])
@@ -0,0 +1,106 @@
+import datetime
+import functools
+from types import SimpleNamespace
+
+import netCDF4
+import numpy as np
+import pytest
+
+import climate
+import datasets
+
+START = datetime.date(2001, 1, 1)
+DAYS = 730  # 2001 and 2002
+
+
+def day_of(month, day, year=2001):
+    return (datetime.date(year, month, day) - START).days
+
+
+def daily_celsius():
+    """Two years of daily temperatures on a 2 x 2 grid with known ETCCDI indices"""
+    values = np.full((DAYS, 2, 2), 10.0)
+    for year in (2001, 2002):
+        first = day_of(1, 1, year)
+        # Cell (0, 0): five frost and ice days at the start of each year
+        values[first:first + 5, 0, 0] = -3.0
+        # Cell (0, 1): a summer day every day of July
+        values[day_of(7, 1, year):day_of(7, 31, year) + 1, 0, 1] = 30.0
+        # Cell (1, 1): growing season from April 1 to October 1
+        values[first:day_of(4, 1, year), 1, 1] = 0.0
+        values[day_of(10, 1, year):first + 365, 1, 1] = 0.0
+    return values
+
+
+def write_dataset(path, celsius, steps_per_day=1):
+    """Write (steps, lat, lon) temperatures in °C as a kelvin NetCDF variable"""
+    with netCDF4.Dataset(path, 'w') as handle:
+        handle.createDimension('time', None)
+        handle.createDimension('lat', 2)
+        handle.createDimension('lon', 2)
+        time = handle.createVariable('time', 'f8', ('time',))
+        time.units = 'hours since 2001-01-01 00:00:00'
+        time.calendar = 'standard'
+        time[:] = np.arange(celsius.shape[0]) * 24 / steps_per_day
+        lat = handle.createVariable('lat', 'f4', ('lat',))
+        lat.units = 'degrees_north'
+        lat[:] = [10.0, 20.0]
+        lon = handle.createVariable('lon', 'f4', ('lon',))
+        lon.units = 'degrees_east'
+        lon[:] = [0.0, 10.0]
+        tas = handle.createVariable('tas', 'f4', ('time', 'lat', 'lon'))
+        tas.units = 'K'
+        tas[:] = celsius + climate.ZERO_CELSIUS
+    return SimpleNamespace(path=str(path))
+
+
+@pytest.fixture
+def daily(tmp_path):
+    return write_dataset(tmp_path / 'daily.nc', daily_celsius())
+
+
+def index_values(dataset, index_type):
+    selection = datasets.select(dataset, 'tas')
+    arrays, metadata = climate.climate_index(selection, datasets.calendar_fields(dataset.path), index_type, 'K')
+    return arrays['index_values'], metadata
+
+
+def test_count_indices(daily):
+    frost, metadata = index_values(daily, 'FD')
+    assert metadata['years'] == [2001, 2002]
+    assert np.allclose(frost, [[5, 0], [0, 0]])
+    assert np.allclose(index_values(daily, 'ID')[0], [[5, 0], [0, 0]])
+    assert np.allclose(index_values(daily, 'SU')[0], [[0, 31], [0, 0]])
+
+
+def test_extreme_indices(daily):
+    assert np.allclose(index_values(daily, 'TXx')[0], [[10, 30], [10, 10]])
+    assert np.allclose(index_values(daily, 'TNn')[0], [[-3, 10], [10, 0]])
+
+
+def test_growing_season_length(daily):
+    length = index_values(daily, 'GSL')[0]
+    # A season that never ends runs to the end of the year
+    assert length[0, 1] == 365
+    assert length[1, 0] == 365
+    assert length[1, 1] == day_of(10, 1) - day_of(4, 1)
+
+
+def test_sub_daily_data_split_across_chunks(tmp_path, monkeypatch):
+    celsius = daily_celsius()
+    # Colder nights: the daily minimum and maximum differ from the daily mean
+    six_hourly = np.repeat(celsius, 4, axis=0) + np.tile([-2.0, 0.0, 2.0, 0.0], DAYS)[:, np.newaxis, np.newaxis]
+    dataset = write_dataset(tmp_path / 'six_hourly.nc', six_hourly, steps_per_day=4)
+    # Seven steps per chunk, so chunks end part way through a day
+    monkeypatch.setattr(datasets, 'iter_chunks', functools.partial(datasets.iter_chunks, chunk_values=28))
+
+    assert np.allclose(index_values(dataset, 'TXx')[0], [[12, 32], [12, 12]])
+    assert np.allclose(index_values(dataset, 'TNn')[0], [[-5, 8], [8, -2]])
+    # Nights at -2°C make every day of the cold months at cell (1, 1) a frost day
+    assert np.allclose(index_values(dataset, 'FD')[0], [[5, 0], [0, 365 - (day_of(10, 1) - day_of(4, 1))]])
+
+
+def test_temperature_mean_in_celsius(daily):
+    arrays, metadata = climate.temperature_mean(datasets.select(daily, 'tas'), 'K')
+    assert metadata['units'] == 'degC'
+    assert np.allclose(arrays['mean_temperature'], daily_celsius().mean(axis=0), atol=1e-4)
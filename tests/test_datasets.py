@@ -0,0 +1,102 @@
+from types import SimpleNamespace
+
+import netCDF4
+import numpy as np
+import pytest
+
+import datasets
+
+LATITUDES = np.array([-40.0, -20.0, 0.0, 20.0, 40.0])
+LONGITUDES = np.arange(0.0, 360.0, 30.0)
+DAYS = 10
+
+# Without a longitude range the grid comes back on -180..180, west to east
+WEST_TO_EAST = np.argsort((LONGITUDES + 180) % 360 - 180)
+
+
+@pytest.fixture
+def grid(tmp_path):
+    """Ten daily steps on a 0..360 grid, stored as scaled shorts with a fill value"""
+    values = (np.arange(DAYS * LATITUDES.size * LONGITUDES.size, dtype=np.float32) / 10 + 250.0).reshape(
+        DAYS, LATITUDES.size, LONGITUDES.size)
+    values[3, 1, 2] = np.nan
+    path = str(tmp_path / 'packed.nc')
+    with netCDF4.Dataset(path, 'w') as handle:
+        handle.title = 'Packed test grid'
+        for name, size in (('time', None), ('lat', LATITUDES.size), ('lon', LONGITUDES.size)):
+            handle.createDimension(name, size)
+        time = handle.createVariable('time', 'f8', ('time',))
+        time.units = 'days since 2010-06-01'
+        time.calendar = 'standard'
+        time[:] = np.arange(DAYS)
+        handle.createVariable('lat', 'f4', ('lat',))[:] = LATITUDES
+        handle.createVariable('lon', 'f4', ('lon',))[:] = LONGITUDES
+        tas = handle.createVariable('tas', 'i2', ('time', 'lat', 'lon'), fill_value=np.int16(-32767),
+                                    chunksizes=(2, LATITUDES.size, LONGITUDES.size))
+        tas.units = 'K'
+        tas.scale_factor = 0.1
+        tas.add_offset = 250.0
+        tas[:] = np.ma.array(np.nan_to_num(values), mask=np.isnan(values))
+    return SimpleNamespace(path=path), values
+
+
+def test_metadata_describes_the_grid(grid):
+    dataset, _ = grid
+    metadata = datasets.extract_metadata(dataset.path)
+    assert metadata['coordinates'] == {'latitude': 'lat', 'longitude': 'lon', 'time': 'time'}
+    assert metadata['attributes']['title'] == 'Packed test grid'
+    assert metadata['variables']['tas']['shape'] == [DAYS, LATITUDES.size, LONGITUDES.size]
+    assert metadata['bounds']['time_start'].startswith('2010-06-01')
+    assert metadata['bounds']['time_steps'] == DAYS
+    assert metadata['bounds']['longitude_max'] == 330.0
+
+
+def test_register_dataset(database, grid):
+    dataset = datasets.register_dataset(grid[0].path, description='test')
+    database.session.commit()
+    assert dataset.file_type == 'NETCDF4'
+    assert datasets.dataset_metadata(dataset)['dimensions']['time']['unlimited']
+
+
+def test_subset_unpacks_values_in_float32(grid):
+    dataset, values = grid
+    subset = datasets.read_subset(dataset, 'tas')
+    assert subset['data'].dtype == np.float32
+    assert subset['data'].shape == (LATITUDES.size, LONGITUDES.size, DAYS)
+    assert list(subset['longitudes']) == list(np.arange(-180.0, 180.0, 30.0))
+    assert np.allclose(subset['data'], values[:, :, WEST_TO_EAST].transpose(1, 2, 0), atol=0.05, equal_nan=True)
+    assert np.isnan(subset['data'][1, list(WEST_TO_EAST).index(2), 3])
+    assert subset['statistics']['count'] == values.size - 1
+
+
+def test_box_across_the_prime_meridian(grid):
+    dataset, values = grid
+    subset = datasets.read_subset(dataset, 'tas', lat_range=(-25, 25), lon_range=(-60, 60),
+                                  time_range=('2010-06-03', '2010-06-05'))
+    assert list(subset['latitudes']) == [-20.0, 0.0, 20.0]
+    assert list(subset['longitudes']) == [-60.0, -30.0, 0.0, 30.0, 60.0]
+    assert subset['times'][0].startswith('2010-06-03') and len(subset['times']) == 3
+    expected = values[2:5, 1:4][:, :, [10, 11, 0, 1, 2]].transpose(1, 2, 0)
+    assert np.allclose(subset['data'], expected, atol=0.05, equal_nan=True)
+
+
+def test_chunks_follow_the_file_chunking(grid):
+    dataset, values = grid
+    selection = datasets.select(dataset, 'tas')
+    chunks = list(datasets.iter_chunks(selection, chunk_values=3 * LATITUDES.size * LONGITUDES.size))
+    # Three steps per chunk round down to whole two-step file chunks
+    assert [offset for offset, _ in chunks] == [0, 2, 4, 6, 8]
+    assert np.allclose(np.concatenate([block for _, block in chunks]), values[:, :, WEST_TO_EAST], atol=0.05,
+                       equal_nan=True)
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'lat_range': (60, 80)},
+    {'variable': 'missing'},
+    {'time_range': ('2010-06-05', '2010-06-03')},
+    {'max_values': 10},
+])
+def test_invalid_subsets(grid, kwargs):
+    kwargs = {'variable': 'tas', **kwargs}
+    with pytest.raises(ValueError):
+        datasets.read_subset(grid[0], **kwargs)
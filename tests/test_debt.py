@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+import debt
+import finance
+
+
+def make_schedule(**kwargs):
+    inputs = dict(capex=np.array([1e7, 1.2e7]), opex=2e5, energy_mwh=25000, lifetime_years=25,
+                  ppa_price=60.0)
+    inputs.update(kwargs)
+    return finance.cash_flow_schedule(**inputs)
+
+
+def test_sculpted_service_meets_the_target_dscr():
+    schedule = make_schedule(tax_rate=0.0)
+    result = debt.sculpt_debt(schedule, target_dscr=1.3, interest_rate=0.06, max_gearing=1.0, debt_term=15)
+    assert not result['gearing_limited'].any()
+    in_tenor = result['debt_service'] > 0
+    assert in_tenor.sum(axis=-1).tolist() == [15, 15]
+    assert np.allclose(result['dscr'][in_tenor], 1.3)
+    # The debt is the present value of the sculpted service and is fully repaid
+    discount = 1.06 ** -schedule['year']
+    assert np.allclose(result['debt_amount'], (result['debt_service'] * discount).sum(axis=-1))
+    assert np.allclose(result['closing_balance'][:, 15], 0.0, atol=1e-4)
+    assert np.allclose(result['principal'].sum(axis=-1), result['debt_amount'])
+
+
+def test_gearing_cap_limits_the_debt():
+    schedule = make_schedule(tax_rate=0.0)
+    result = debt.sculpt_debt(schedule, target_dscr=1.0, interest_rate=0.04, max_gearing=0.3)
+    assert result['gearing_limited'].all()
+    assert np.allclose(result['debt_amount'], 0.3 * np.array([1e7, 1.2e7]))
+    assert (result['min_dscr'] > 1.0).all()
+
+
+def test_levered_taxes_converge():
+    schedule = make_schedule(tax_rate=0.21)
+    result = debt.sculpt_debt(schedule, target_dscr=1.3, interest_rate=0.06, max_gearing=1.0)
+    assert result['converged'].all()
+    assert result['iterations'] > 1
+    in_tenor = result['debt_service'] > 0
+    assert np.allclose(result['dscr'][in_tenor], 1.3)
+    # Interest is deductible, so levered taxes are no higher than the unlevered ones
+    unlevered = debt.sculpt_debt(schedule, target_dscr=1.3, interest_rate=0.06, max_gearing=0.0)
+    assert (result['taxes'] >= unlevered['taxes'] - 1e-6).all()
+
+
+def test_sculpt_schedule_keeps_rows_without_a_target():
+    schedule = make_schedule()
+    sculpted, _ = debt.sculpt_schedule(schedule, np.array([1.3, np.nan]), interest_rate=0.05, max_gearing=0.7)
+    assert np.allclose(sculpted['debt_service'][1], schedule['debt_service'][1])
+    assert not np.allclose(sculpted['debt_service'][0], schedule['debt_service'][0])
+    assert sculpted['net_cash_flow'][1, 0] == pytest.approx(schedule['net_cash_flow'][1, 0])
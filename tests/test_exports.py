@@ -0,0 +1,102 @@
+import csv
+import io
+import json
+import os
+
+import netCDF4
+import numpy as np
+import pytest
+
+import cashflows
+import exports
+import finance
+from models import ClimateAnalysis, SolarProject
+
+COLUMNS = ('project_id', 'name', 'npv')
+
+
+def batches():
+    """Two batches and an empty one, with a NaN metric and a blank name"""
+    return [
+        {'project_id': np.array([1, 2]), 'name': np.array(['Mesa', ''], dtype=object),
+         'npv': np.array([1.5, np.nan])},
+        {'project_id': np.array([], dtype=int), 'name': np.array([], dtype=object), 'npv': np.array([])},
+        {'project_id': np.array([3]), 'name': np.array(['Ridge "North"'], dtype=object), 'npv': np.array([-2e6])},
+    ]
+
+
+def test_csv_round_trip():
+    rows = list(csv.reader(io.StringIO(''.join(exports.stream_csv(COLUMNS, batches())))))
+    assert rows == [list(COLUMNS), ['1', 'Mesa', '1.5'], ['2', '', ''], ['3', 'Ridge "North"', '-2000000.0']]
+
+
+def test_json_round_trip_across_batches():
+    records = json.loads(''.join(exports.stream_json(COLUMNS, batches())))
+    assert records == [{'project_id': 1, 'name': 'Mesa', 'npv': 1.5}, {'project_id': 2, 'name': '', 'npv': None},
+                       {'project_id': 3, 'name': 'Ridge "North"', 'npv': -2e6}]
+    assert json.loads(''.join(exports.stream_json(COLUMNS, []))) == []
+
+
+def test_netcdf_keeps_text_columns(tmp_path):
+    path = str(tmp_path / 'export.nc')
+    exports.write_netcdf(path, COLUMNS, batches(), attributes={'source': 'test'})
+    with netCDF4.Dataset(path) as stored:
+        assert stored.source == 'test'
+        assert list(stored['project_id'][:]) == [1, 2, 3]
+        assert list(stored['name'][:]) == ['Mesa', '', 'Ridge "North"']
+        assert stored['npv'][:][0] == 1.5 and np.isnan(stored['npv'][:][1])
+
+
+def test_temporary_file_is_removed_after_streaming(monkeypatch):
+    paths = []
+    make_path = exports._temporary_path
+
+    def record_path(export_format):
+        paths.append(make_path(export_format))
+        return paths[-1]
+
+    monkeypatch.setattr(exports, '_temporary_path', record_path)
+    chunks = exports.stream_export('netcdf', COLUMNS, batches())
+    assert next(chunks).startswith(b'\x89HDF')
+    assert os.path.exists(paths[0])
+    chunks.close()
+    assert not os.path.exists(paths[0])
+
+
+def test_analysis_rows_in_latitude_longitude_year_order(tmp_path):
+    path = str(tmp_path / 'analysis.npz')
+    latitude, longitude = np.array([10.0, 20.0, 30.0]), np.array([1.0, 2.0])
+    trend = np.arange(6.0).reshape(3, 2)
+    yearly = np.arange(24.0).reshape(4, 3, 2)
+    np.savez(path, latitude=latitude, longitude=longitude, trend=trend, yearly=yearly)
+    analysis = ClimateAnalysis(result_path=path, result_json=json.dumps({'times': ['2001', '2002', '2003', '2004']}))
+
+    assert exports.analysis_columns(analysis) == ['latitude', 'longitude', 'year', 'trend', 'yearly']
+    parts = list(exports.analysis_batches(analysis, batch_rows=8))
+    assert len(parts) == 3
+    rows = {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+    assert list(rows['latitude'][:9]) == [10.0] * 8 + [20.0]
+    assert list(rows['longitude'][:9]) == [1.0] * 4 + [2.0] * 4 + [1.0]
+    assert list(rows['year'][:5]) == [2001, 2002, 2003, 2004, 2001]
+    assert rows['trend'][4] == trend[0, 1]
+    # Row (latitude 20, longitude 2, 2003) holds yearly[2, 1, 1]
+    assert rows['yearly'][(1 * 2 + 1) * 4 + 2] == yearly[2, 1, 1]
+
+
+@pytest.mark.parametrize('storage', cashflows.CASH_FLOW_STORAGE)
+def test_cash_flow_export_reconciles_to_net_cash_flow(database, storage):
+    project = SolarProject(name='Mesa', project_type='solar', capacity_mw=10.0)
+    database.session.add(project)
+    database.session.commit()
+    schedule = finance.cash_flow_schedule(capex=np.array([1e6]), opex=np.array([2e4]),
+                                          energy_mwh=np.array([2000.0]), lifetime_years=np.array([10]),
+                                          debt_ratio=0.7)
+    cashflows.store_cash_flows([project.id], schedule, storage=storage)
+    database.session.commit()
+
+    [batch] = exports.cash_flow_batches(storage=storage)
+    assert set(batch) == set(exports.CASH_FLOW_EXPORT_COLUMNS)
+    assert batch['debt_drawdown'][0] == pytest.approx(7e5)
+    assert not batch['debt_drawdown'][1:].any()
+    components = sum(batch[name] for name in exports.CASH_FLOW_COMPONENTS) + batch['debt_drawdown']
+    assert components == pytest.approx(batch['net_cash_flow'])
@@ -0,0 +1,62 @@
+import inspect
+
+import numpy as np
+import pytest
+
+import finance
+
+PRETAX = {'tax_rate': 0.0, 'degradation_rate': 0.0, 'inflation_rate': 0.0}
+
+
+def test_npv_and_payback_known_answers():
+    assert finance.npv(np.array([-100.0, 110.0]), 0.10) == pytest.approx(0.0, abs=1e-12)
+    assert finance.npv(np.array([-100.0, 50.0, 50.0]), 0.0) == pytest.approx(0.0)
+    assert finance.payback_period(np.array([-100.0, 50.0, 50.0, 50.0])) == pytest.approx(2.0)
+    assert finance.payback_period(np.array([-100.0, 40.0, 40.0, 40.0])) == pytest.approx(2.5)
+    assert np.isnan(finance.payback_period(np.array([-100.0, 10.0, 10.0])))
+
+
+def test_unlevered_schedule_matches_closed_form():
+    schedule = finance.cash_flow_schedule(capex=1e6, opex=2e4, energy_mwh=5000, lifetime_years=20,
+                                          debt_ratio=0.0, ppa_price=40.0, **PRETAX)
+    net = schedule['net_cash_flow']
+    assert net.shape == (21,)
+    assert net[0] == pytest.approx(-1e6)
+    assert np.allclose(net[1:], 5000 * 40.0 - 2e4)
+
+    rate = 0.07
+    annuity = (1 - (1 + rate) ** -20) / rate
+    assert finance.npv(net, rate) == pytest.approx(-1e6 + (5000 * 40.0 - 2e4) * annuity)
+    assert finance.lcoe(schedule, rate) == pytest.approx((1e6 / annuity + 2e4) / 5000)
+
+
+def test_annuity_debt_repays_principal_and_splits_interest():
+    schedule = finance.cash_flow_schedule(capex=1e6, opex=0.0, energy_mwh=5000, lifetime_years=25,
+                                          debt_ratio=0.6, interest_rate=0.05, debt_term=15, **PRETAX)
+    service = -schedule['debt_service']
+    interest = schedule['interest']
+    assert schedule['debt_drawdown'] == pytest.approx(6e5)
+    assert np.count_nonzero(service) == 15
+    assert np.allclose(service[1:16], service[1])
+    assert interest[1] == pytest.approx(0.05 * 6e5)
+    assert (service - interest).sum() == pytest.approx(6e5)
+    assert interest[16:].max() == 0.0
+
+
+def test_batch_rows_match_single_projects():
+    capex = np.array([1e6, 2e6, 1.5e6])
+    lifetime = np.array([20, 25, 30])
+    batch = finance.cash_flow_schedule(capex=capex, opex=3e4, energy_mwh=6000, lifetime_years=lifetime)
+    assert batch['net_cash_flow'].shape == (3, 31)
+    for row in range(3):
+        single = finance.cash_flow_schedule(capex=capex[row], opex=3e4, energy_mwh=6000,
+                                            lifetime_years=lifetime[row], n_years=30)
+        assert np.allclose(batch['net_cash_flow'][row], single['net_cash_flow'])
+    # Years after a project retires are zero padding
+    assert not batch['net_cash_flow'][0, 21:].any()
+
+
+def test_cash_flow_inputs_cover_the_schedule_arguments():
+    parameters = set(inspect.signature(finance.cash_flow_schedule).parameters) - {'n_years'}
+    assert set(finance.CASH_FLOW_INPUTS) == parameters
+    assert finance.cash_flow_inputs({'capex': 1.0, 'discount_rate': 0.08, 'target_dscr': None}) == {'capex': 1.0}
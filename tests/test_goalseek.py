@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+import debt
+import finance
+import returns
+from goalseek import goal_seek
+from utils import SCENARIO_DEFAULTS
+
+CAPEX = np.array([8e5, 1e6, 1.2e6])
+
+
+def batched(**overrides):
+    """Goal-seek parameters for three projects that differ only in capex"""
+    row = {**SCENARIO_DEFAULTS, 'opex': 2e4, 'energy_mwh': 2000.0, 'lifetime_years': 20,
+           'degradation_rate': 0.0, 'ppa_term': 20, 'performance_ratio': 1.0, **overrides}
+    params = {name: np.full(CAPEX.size, np.nan if value is None else float(value)) for name, value in row.items()}
+    params['capex'] = CAPEX.copy()
+    return params
+
+
+def net_cash_flow(params, **values):
+    """Recompute each project's cash flows from scratch with the solved values"""
+    schedule = finance.cash_flow_schedule(**{**finance.cash_flow_inputs(params), **values})
+    if not np.isnan(params['target_dscr']).all():
+        schedule, _ = debt.sculpt_schedule(schedule, params['target_dscr'], interest_rate=params['interest_rate'],
+                                           max_gearing=params['debt_ratio'])
+    return schedule['net_cash_flow']
+
+
+def test_breakeven_ppa_price_in_closed_form():
+    # Unlevered, untaxed, flat revenue: price = capex / (energy x annuity factor) + opex / energy
+    params = batched(inflation_rate=0.0, debt_ratio=0.0, tax_rate=0.0)
+    solution = goal_seek(params, 'ppa_price')
+    annuity = (1 - 1.08 ** -20) / 0.08
+    assert solution['closed_form'].all()
+    assert solution['value'] == pytest.approx(CAPEX / (2000 * annuity) + 2e4 / 2000, rel=1e-9)
+
+
+def test_sculpted_debt_falls_back_to_the_root_finder():
+    params = batched(target_dscr=1.3)
+    solution = goal_seek(params, 'ppa_price')
+    assert not solution['closed_form'].any()
+    assert solution['converged'].all()
+    npv = finance.npv(net_cash_flow(params, ppa_price=solution['value']), 0.08)
+    assert np.abs(npv).max() < 1e-3
+
+
+def test_capex_for_a_target_irr():
+    params = batched()
+    solution = goal_seek(params, 'capex', objective='irr', target=0.10)
+    assert solution['converged'].all()
+    assert returns.irr(net_cash_flow(params, capex=solution['value'])) == pytest.approx(np.full(3, 0.10), abs=1e-8)
+
+
+def test_unknown_variable_is_rejected():
+    with pytest.raises(ValueError):
+        goal_seek(batched(), 'opex')
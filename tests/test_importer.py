@@ -0,0 +1,51 @@
+import pytest
+
+import wind
+from importer import import_projects
+from models import Project, SolarProject, WindProject
+from utils import estimate_energy_production
+
+HEADER = 'name,capacity_mw,project_type,latitude,longitude,hub_height_m,mean_wind_speed,measurement_height_m,weibull_k'
+
+
+def write_csv(tmp_path, *rows):
+    path = tmp_path / 'projects.csv'
+    path.write_text('\n'.join((HEADER,) + rows) + '\n')
+    return str(path)
+
+
+def test_wind_resource_columns_are_imported(database, tmp_path):
+    path = write_csv(tmp_path,
+                     'Ridge Wind,50,wind,41.0,-100.0,100,7.5,80,2.2',
+                     'Plains Wind,50,wind,41.0,-100.0,,,,',
+                     'Mesa Solar,10,solar,35.0,-110.0,100,7.5,80,2.2')
+    report = import_projects(path)
+    assert report['imported'] == 3 and report['failed'] == 0
+
+    ridge = WindProject.query.filter_by(name='Ridge Wind').one()
+    assert (ridge.hub_height_m, ridge.mean_wind_speed, ridge.measurement_height_m, ridge.weibull_k) == \
+        (100.0, 7.5, 80.0, 2.2)
+    assert wind.gross_capacity_factor(ridge) != wind.DEFAULT_GROSS_CAPACITY_FACTOR
+    assert estimate_energy_production(ridge, 0) == pytest.approx(wind.annual_energy_mwh(ridge))
+
+    plains = WindProject.query.filter_by(name='Plains Wind').one()
+    assert plains.mean_wind_speed is None and plains.weibull_k == wind.DEFAULT_WEIBULL_K
+    assert SolarProject.query.filter_by(name='Mesa Solar').count() == 1
+
+
+def test_out_of_range_wind_speeds_are_reported(database, tmp_path):
+    report = import_projects(write_csv(tmp_path, 'Gusty Wind,50,wind,41.0,-100.0,100,55,,'))
+    assert report['imported'] == 0
+    assert report['errors'] == [{'row': 2, 'errors': ['mean_wind_speed: out of range']}]
+    assert Project.query.count() == 0
+
+
+def test_unknown_project_types_are_reported(database, tmp_path):
+    report = import_projects(write_csv(tmp_path,
+                                       'Hot Rocks,20,geothermal,38.0,-117.0,,,,',
+                                       'Typo Solar,10,solr,35.0,-110.0,,,,',
+                                       'Mesa Solar,10,Solar,35.0,-110.0,,,,'))
+    assert report['imported'] == 1
+    assert [error['row'] for error in report['errors']] == [2, 3]
+    assert report['errors'][0]['errors'] == ['project_type: must be one of solar, hybrid, wind']
+    assert [project.project_type for project in Project.query.all()] == ['solar']
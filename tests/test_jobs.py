@@ -0,0 +1,71 @@
+import time
+
+import pytest
+
+import jobs
+from models import Job
+
+
+def wait_for(database, job_id, timeout=10.0):
+    """Poll a job until it finishes"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        database.session.expire_all()
+        job = database.session.get(Job, job_id)
+        if job.status in ('completed', 'failed'):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f'Job {job_id} did not finish')
+
+
+def add(a, b, progress):
+    progress(1, 1)
+    return {'sum': a + b}
+
+
+def fail(progress):
+    raise ValueError('no convergence')
+
+
+@pytest.fixture
+def app(database):
+    from app import app
+
+    return app
+
+
+def test_completed_job_records_its_result(app, database):
+    job = wait_for(database, jobs.submit_job(app, 'test', add, 2, b=3))
+    assert job.status == 'completed'
+    assert job.progress == 100.0
+    assert job.started_at is not None and job.finished_at is not None
+    assert jobs.job_to_dict(job, include_result=True)['result'] == {'sum': 5}
+
+
+def test_failed_job_records_the_error(app, database):
+    job = wait_for(database, jobs.submit_job(app, 'test', fail))
+    assert job.status == 'failed'
+    assert job.error == 'no convergence'
+    assert jobs.job_to_dict(job)['has_result'] is False
+
+
+def test_progress_writes_are_throttled(database):
+    database.session.add(Job(id='a' * 32, kind='test', status='running', progress=0.0))
+    database.session.commit()
+    progress = jobs.JobProgress('a' * 32)
+    progress(1, 4)
+    progress(3, 4)
+    assert database.session.get(Job, 'a' * 32).progress == 25.0
+
+
+def test_interrupted_jobs_are_failed_at_startup(database):
+    for index, status in enumerate(('queued', 'running', 'completed', 'failed')):
+        database.session.add(Job(id=str(index) * 32, kind='test', status=status))
+    database.session.commit()
+
+    assert jobs.fail_interrupted_jobs() == 2
+    database.session.expire_all()
+    statuses = [database.session.get(Job, str(index) * 32) for index in range(4)]
+    assert [job.status for job in statuses] == ['failed', 'failed', 'completed', 'failed']
+    assert statuses[0].error == statuses[1].error == 'Interrupted by an application restart'
+    assert statuses[3].error is None
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from merchant import merchant_valuation, register_price_deck, write_price_deck
+from models import SolarProject
+from utils import calculate_financial_metrics
+
+
+@pytest.fixture
+def project(database):
+    project = SolarProject(name='Mesa Solar', project_type='solar', capacity_mw=10.0, capex=1e7,
+                           opex_per_year=1.5e5, latitude=35.0, longitude=-110.0)
+    database.session.add(project)
+    database.session.commit()
+    return project
+
+
+@pytest.fixture
+def price_deck(database, tmp_path):
+    path = str(tmp_path / 'deck.npy')
+    write_price_deck(path, np.full((2, 3, 8760), 40.0))
+    deck = register_price_deck('Flat', path, start_year=2025)
+    database.session.commit()
+    return deck
+
+
+def test_full_ppa_matches_the_project_metrics(project, price_deck):
+    for target_dscr in (None, 1.3):
+        result = merchant_valuation(project, price_deck, ppa_share=1.0, assumptions={'target_dscr': target_dscr})
+        expected = calculate_financial_metrics(project, target_dscr=target_dscr)['npv']
+        assert np.allclose(result['npv'], expected)
+
+
+def test_target_dscr_sculpts_the_debt(project, price_deck):
+    level = merchant_valuation(project, price_deck, ppa_share=0.5)
+    sculpted = merchant_valuation(project, price_deck, ppa_share=0.5, assumptions={'target_dscr': 1.3})
+    assert not np.allclose(level['npv'], sculpted['npv'])
@@ -0,0 +1,50 @@
+import os
+
+import pytest
+import sqlalchemy as sa
+from flask_migrate import downgrade, upgrade
+
+from conftest import ROOT
+
+MIGRATIONS = os.path.join(ROOT, 'migrations')
+
+
+@pytest.fixture
+def migrated(database):
+    """The test database, with the migration history removed again afterwards"""
+    yield database
+    database.session.execute(sa.text('DROP TABLE IF EXISTS alembic_version'))
+    database.session.commit()
+
+
+def columns(database, table):
+    return {column['name'] for column in sa.inspect(database.engine).get_columns(table)}
+
+
+def indexes(database, table):
+    return {index['name'] for index in sa.inspect(database.engine).get_indexes(table)}
+
+
+def test_upgrade_of_a_current_schema_changes_nothing(migrated):
+    tables = sa.inspect(migrated.engine).get_table_names()
+    before = {table: (columns(migrated, table), indexes(migrated, table)) for table in tables}
+    upgrade(MIGRATIONS)
+    assert {table: (columns(migrated, table), indexes(migrated, table)) for table in tables} == before
+
+
+def test_downgrade_and_upgrade_round_trip(migrated):
+    upgrade(MIGRATIONS)
+    downgrade(MIGRATIONS, revision='base')
+    assert not {'input_hash', 'target_dscr', 'tax_rate'} & columns(migrated, 'financial_metrics')
+    assert 'itc_rate' not in columns(migrated, 'projects')
+    assert not any(name.startswith('ix_projects_') for name in indexes(migrated, 'projects'))
+
+    upgrade(MIGRATIONS)
+    assert {'input_hash', 'target_dscr', 'tax_rate'} <= columns(migrated, 'financial_metrics')
+    assert {'depreciation_method', 'depreciation_years', 'itc_rate', 'ptc_rate'} <= columns(migrated, 'projects')
+    assert {'specific_yield', 'resource_dataset_id'} <= columns(migrated, 'solar_projects')
+    foreign_keys = sa.inspect(migrated.engine).get_foreign_keys('solar_projects')
+    assert ['resource_dataset_id'] in [key['constrained_columns'] for key in foreign_keys]
+    assert 'ix_financial_metrics_input_hash' in indexes(migrated, 'financial_metrics')
+    assert 'ix_projects_status_created_at_id' in indexes(migrated, 'projects')
+    assert 'ix_cash_flows_project_id_year' in indexes(migrated, 'cash_flows')
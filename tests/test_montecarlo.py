@@ -0,0 +1,29 @@
+import pytest
+
+import montecarlo
+from utils import SCENARIO_DEFAULTS
+
+BASE = {**SCENARIO_DEFAULTS, 'capex': 1e6, 'opex': 2e4, 'energy_mwh': 2000, 'lifetime_years': 20,
+        'degradation_rate': 0.005, 'performance_ratio': 1.0}
+
+
+def test_same_seed_gives_same_results_for_any_chunking():
+    reference = montecarlo.run_monte_carlo(BASE, n_paths=5000, seed=7, workers=1)
+    for chunk_size in (1000, 1234, 5000):
+        result = montecarlo.run_monte_carlo(BASE, n_paths=5000, seed=7, chunk_size=chunk_size, workers=1)
+        assert result['npv'] == pytest.approx(reference['npv'], rel=1e-12)
+        assert result['irr']['p50'] == pytest.approx(reference['irr']['p50'], rel=1e-12)
+        assert result['irr']['histogram'] == reference['irr']['histogram']
+
+
+def test_same_seed_gives_same_results_across_workers():
+    serial = montecarlo.run_monte_carlo(BASE, n_paths=4000, seed=11, chunk_size=1000, workers=1)
+    parallel = montecarlo.run_monte_carlo(BASE, n_paths=4000, seed=11, chunk_size=1000, workers=2)
+    assert parallel['npv'] == pytest.approx(serial['npv'], rel=1e-12)
+    assert parallel['probability_of_loss'] == serial['probability_of_loss']
+
+
+def test_different_seeds_differ():
+    first = montecarlo.run_monte_carlo(BASE, n_paths=2000, seed=1, workers=1)
+    second = montecarlo.run_monte_carlo(BASE, n_paths=2000, seed=2, workers=1)
+    assert first['npv']['p50'] != second['npv']['p50']
@@ -0,0 +1,63 @@
+from datetime import date
+
+import pytest
+
+from models import CashFlow, CashFlowSchedule, SolarProject, WindProject
+from portfolio import cash_flow_coverage, portfolio_summary, project_totals, yearly_cash_flows
+
+
+def add_cash_flows(database, project, nets):
+    """Stored CashFlow rows with the given net cash flow per project year"""
+    database.session.add_all(CashFlow(project=project, year=year, net_cash_flow=net, revenue=max(net, 0.0))
+                             for year, net in enumerate(nets))
+
+
+def test_capex_priced_per_mw_counts_towards_the_totals(database):
+    database.session.add_all([
+        SolarProject(name='Mesa Solar', project_type='solar', capacity_mw=10.0, capex=1e7),
+        SolarProject(name='Ridge Solar', project_type='solar', capacity_mw=20.0, capex_per_mw=9e5),
+        WindProject(name='Plains Wind', project_type='wind', capacity_mw=50.0),
+    ])
+    database.session.commit()
+
+    assert project_totals()['capex'] == pytest.approx(1e7 + 1.8e7)
+    by_type = {row['key']: row for row in project_totals('project_type')}
+    assert by_type['solar']['capex'] == pytest.approx(2.8e7)
+    assert by_type['wind']['capex'] == 0.0
+
+
+def test_cash_flows_are_summed_on_calendar_years(database):
+    early = SolarProject(name='Mesa Solar', project_type='solar', capacity_mw=10.0,
+                         commercial_operation_date=date(2026, 6, 1))
+    late = WindProject(name='Plains Wind', project_type='wind', capacity_mw=50.0,
+                       commercial_operation_date=date(2028, 1, 1))
+    undated = SolarProject(name='Ridge Solar', project_type='solar', capacity_mw=20.0)
+    add_cash_flows(database, early, [-100.0, 30.0, 30.0])
+    add_cash_flows(database, late, [-200.0, 50.0])
+    add_cash_flows(database, undated, [-10.0, 5.0])
+    database.session.commit()
+
+    curves = yearly_cash_flows(start_year=2030)
+    assert curves['year'].tolist() == [2025, 2026, 2027, 2028, 2029, 2030]
+    assert curves['net_cash_flow'].tolist() == [-100.0, 30.0, 30.0 - 200.0, 50.0, -10.0, 5.0]
+    assert curves['cumulative_cash_flow'][-1] == pytest.approx(-195.0)
+
+    summary = portfolio_summary(0.0, start_year=2030)
+    assert summary['npv'] == pytest.approx(-195.0)
+    wind = {group['key']: group for group in summary['breakdowns']['project_type']}['wind']
+    assert wind['npv'] == pytest.approx(-150.0)
+
+
+def test_coverage_counts_projects_left_out_of_the_curves(database):
+    valued = SolarProject(name='Mesa Solar', project_type='solar', capacity_mw=10.0)
+    packed = SolarProject(name='Ridge Solar', project_type='solar', capacity_mw=20.0,
+                          commercial_operation_date=date(2027, 1, 1))
+    database.session.add_all([valued, packed, WindProject(name='Plains Wind', project_type='wind', capacity_mw=50.0)])
+    add_cash_flows(database, valued, [-100.0, 60.0])
+    database.session.add(CashFlowSchedule(project=packed, columns='net_cash_flow', n_years=1, data=b'\0' * 8))
+    database.session.commit()
+
+    assert cash_flow_coverage() == {'with_cash_flows': 1, 'packed_only': 1, 'without_cash_flows': 2, 'undated': 1}
+    assert cash_flow_coverage({'project_type': 'wind'}) == {
+        'with_cash_flows': 0, 'packed_only': 0, 'without_cash_flows': 1, 'undated': 0}
+    assert portfolio_summary()['coverage']['without_cash_flows'] == 2
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from profile_cache import ProductionProfileCache, profile_key
+
+
+def profile(value):
+    return np.full(8760, value, dtype=np.float32)
+
+
+def test_keys_snap_to_the_grid_cell():
+    assert profile_key(35.01, -110.04, 24.6, 180.2, None) == profile_key(35.09, -110.01, 25.4, 179.8, 'fixed')
+    assert profile_key(35.01, -110.0, 25, 180, 'fixed') != profile_key(35.11, -110.0, 25, 180, 'fixed')
+
+
+def test_least_recently_used_profile_is_evicted():
+    cache = ProductionProfileCache(maxsize=2)
+    cache.put('a', profile(1))
+    cache.put('b', profile(2))
+    cache.get('a')
+    cache.put('c', profile(3))
+    assert cache.get('b') is None
+    assert cache.get('a')[0] == 1 and cache.get('c')[0] == 3
+    assert cache.stats()['evictions'] == 1
+    assert cache.stats()['size'] == 2
+
+
+def test_cached_profiles_are_read_only():
+    cache = ProductionProfileCache()
+    source = np.ones(8760, dtype=np.float32)
+    cached = cache.put('a', source)
+    with pytest.raises(ValueError):
+        cached[0] = 2.0
+    # The caller's own array stays writeable
+    source[0] = 2.0
+    assert cache.get('a')[0] == 1.0
+
+
+def test_disk_tier_reloads_in_a_new_cache(tmp_path):
+    ProductionProfileCache(directory=str(tmp_path)).put('a', profile(0.5))
+    cache = ProductionProfileCache(directory=str(tmp_path))
+    reloaded = cache.get('a')
+    assert isinstance(reloaded, np.memmap)
+    assert np.array_equal(reloaded, profile(0.5))
+    assert cache.get('a') is reloaded
+    assert cache.stats()['disk_hits'] == 1 and cache.stats()['hits'] == 1
+    assert not list(tmp_path.glob('*.tmp'))
+
+
+def test_counters_track_hits_and_misses():
+    cache = ProductionProfileCache()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return profile(1)
+
+    for _ in range(3):
+        cache.get_or_compute('a', compute)
+    assert len(calls) == 1
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['disk_hits']) == (2, 1, 0)
+    assert stats['hit_rate'] == pytest.approx(2 / 3)
+
+    cache.clear()
+    assert cache.stats()['hits'] == cache.stats()['misses'] == cache.stats()['size'] == 0
@@ -0,0 +1,94 @@
+from types import SimpleNamespace
+
+import netCDF4
+import numpy as np
+import pytest
+
+import pyramid
+
+STEPS, N_LAT, N_LON = 24, 16, 32
+
+
+@pytest.fixture
+def dataset(tmp_path, monkeypatch):
+    """A small monthly grid whose pyramid has levels 1 to 3"""
+    monkeypatch.setattr(pyramid, 'PYRAMID_DIR', str(tmp_path / 'pyramids'))
+    monkeypatch.setattr(pyramid, 'MIN_PYRAMID_SIZE', 4)
+    values = np.random.default_rng(3).normal(280.0, 5.0, (STEPS, N_LAT, N_LON)).astype(np.float32)
+    values[:, 0, 0] = np.nan
+    path = str(tmp_path / 'grid.nc')
+    with netCDF4.Dataset(path, 'w') as handle:
+        for name, size in (('time', None), ('lat', N_LAT), ('lon', N_LON)):
+            handle.createDimension(name, size)
+        time = handle.createVariable('time', 'f8', ('time',))
+        time.units = 'days since 2001-01-01'
+        time[:] = np.arange(STEPS) * 30.0
+        handle.createVariable('lat', 'f4', ('lat',))[:] = np.linspace(-37.5, 37.5, N_LAT)
+        handle.createVariable('lon', 'f4', ('lon',))[:] = np.linspace(0.0, 155.0, N_LON)
+        tas = handle.createVariable('tas', 'f4', ('time', 'lat', 'lon'), fill_value=np.float32(1e20))
+        tas.units = 'K'
+        tas[:] = np.ma.masked_invalid(values)
+    return SimpleNamespace(id=1, path=path), values
+
+
+def test_block_mean_ignores_missing_cells():
+    values = np.array([[1.0, 3.0, 5.0], [np.nan, 2.0, 7.0]])
+    assert np.allclose(pyramid.block_mean(values, 2), [[2.0, 6.0]])
+    assert pyramid.coarsening(16, 32, width=8, height=4) == 4
+
+
+def test_levels_hold_block_means_of_the_full_grid(dataset):
+    dataset, values = dataset
+    built = pyramid.build_pyramid(dataset, 'tas')
+    assert [level['zoom'] for level in built['levels']] == [1, 2, 3]
+    for zoom in (1, 2, 3):
+        level = pyramid.open_level(dataset, 'tas', 0, zoom)
+        assert level.shape == (STEPS, N_LAT // 2 ** zoom, N_LON // 2 ** zoom)
+        assert np.allclose(level, pyramid.block_mean(values, 2 ** zoom), rtol=1e-6)
+
+
+def test_view_reads_the_level_that_fills_the_budget(dataset):
+    dataset, values = dataset
+    from_file = pyramid.render(dataset, 'tas', width=8, height=4)
+    assert (from_file['source'], from_file['coarsening']) == ('file', 4)
+    assert from_file['grid'].shape == (4, 8)
+    assert np.allclose(from_file['grid'], np.nanmean(pyramid.block_mean(values, 4), axis=0), rtol=1e-5)
+
+    pyramid.build_pyramid(dataset, 'tas')
+    from_pyramid = pyramid.render(dataset, 'tas', width=8, height=4)
+    assert (from_pyramid['source'], from_pyramid['coarsening']) == ('pyramid', 4)
+    assert np.allclose(from_pyramid['grid'], from_file['grid'], rtol=1e-5)
+    assert np.allclose(from_pyramid['series']['values'], from_file['series']['values'], rtol=1e-5)
+
+    # A box is cut from the level at the same coarsening
+    box = pyramid.render(dataset, 'tas', lat_range=(0, 40), width=8, height=4)
+    assert box['source'] == 'pyramid' and box['grid'].shape == (2, 8)
+    assert np.allclose(box['grid'], from_pyramid['grid'][2:], rtol=1e-5)
+
+
+def test_long_series_move_to_a_coarser_level(dataset, monkeypatch):
+    dataset, _ = dataset
+    pyramid.build_pyramid(dataset, 'tas')
+    monkeypatch.setattr(pyramid, 'MAX_VIEW_VALUES', STEPS * 8)
+    view = pyramid.render(dataset, 'tas', width=32, height=16)
+    assert view['coarsening'] == 8
+    assert view['grid'].shape == (2, 4)
+
+
+def test_lttb_keeps_the_ends_and_the_peaks():
+    x = np.arange(1000.0)
+    y = np.sin(x / 50)
+    y[437] = 25.0
+    kept = pyramid.lttb(x, y, 50)
+    assert kept.size == 50
+    assert kept[0] == 0 and kept[-1] == 999
+    assert 437 in kept
+    assert np.all(np.diff(kept) > 0)
+    assert list(pyramid.lttb(x[:10], y[:10], 50)) == list(range(10))
+
+
+def test_series_is_downsampled_to_the_width(dataset):
+    dataset, _ = dataset
+    view = pyramid.render(dataset, 'tas', width=10, height=4)
+    assert len(view['series']['values']) == 10
+    assert view['series']['times'][0].startswith('2001-01-01')
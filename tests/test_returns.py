@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+import finance
+import returns
+
+
+def test_irr_known_answers():
+    cash_flows = np.array([
+        [-100.0, 110.0, 0.0],
+        [-100.0, 0.0, 121.0],
+        [-100.0, 60.0, 60.0],
+    ])
+    rates = returns.irr(cash_flows)
+    assert rates[0] == pytest.approx(0.10, abs=1e-10)
+    assert rates[1] == pytest.approx(0.10, abs=1e-10)
+    # 100 = 60/(1+r) + 60/(1+r)^2  =>  r = (3 + sqrt(69)) / 10 - 1
+    assert rates[2] == pytest.approx((3 + np.sqrt(69)) / 10 - 1, abs=1e-10)
+
+
+def test_irr_zeroes_npv_for_a_batch():
+    rng = np.random.default_rng(1)
+    cash_flows = np.concatenate([-rng.uniform(500, 1500, (4, 3, 1)), rng.uniform(50, 200, (4, 3, 25))], axis=-1)
+    result = returns.solve_irr(cash_flows)
+    assert result['irr'].shape == (4, 3)
+    assert result['converged'].all()
+    assert np.abs(finance.npv(cash_flows, result['irr'])).max() < 1e-6
+
+
+def test_irr_without_a_sign_change_is_nan():
+    result = returns.solve_irr(np.array([[100.0, 10.0, 10.0], [-100.0, -10.0, -10.0]]))
+    assert np.isnan(result['irr']).all()
+    assert not result['bracketed'].any()
+
+
+def test_mirr_known_answer():
+    # Spreadsheet MIRR example: finance rate 10%, reinvestment rate 12%
+    cash_flows = np.array([-120000.0, 39000.0, 30000.0, 21000.0, 37000.0, 46000.0])
+    assert returns.mirr(cash_flows, 0.10, 0.12) == pytest.approx(0.126094, abs=1e-6)
+
+
+def test_mirr_needs_inflows_and_outflows():
+    assert np.isnan(returns.mirr(np.array([100.0, 10.0]), 0.1, 0.1))
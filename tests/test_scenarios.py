@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from models import Scenario, ScenarioResult, SolarProject
+from scenarios import BOARD_SCENARIOS, create_board_scenarios, evaluate_scenario_grid, run_scenarios
+from utils import SCENARIO_DEFAULTS, SCENARIO_METRICS, evaluate_scenarios
+
+PROJECTS = [
+    {'capex': 1e6, 'opex': 2e4, 'energy_mwh': 2000.0, 'lifetime_years': 20, 'degradation_rate': 0.5},
+    {'capex': 3e6, 'opex': 5e4, 'energy_mwh': 7000.0, 'lifetime_years': 30, 'degradation_rate': 0.3,
+     'itc_rate': 0.3, 'depreciation_method': 1},
+    {'capex': 5e5, 'opex': 1e4, 'energy_mwh': 900.0, 'lifetime_years': 12, 'merchant_revenue': 5000.0},
+]
+
+ASSUMPTIONS = [
+    dict(SCENARIO_DEFAULTS),
+    {**SCENARIO_DEFAULTS, 'discount_rate': 0.1, 'ppa_price': 42.5, 'ppa_term': 10, 'inflation_rate': 0.035},
+    {**SCENARIO_DEFAULTS, 'target_dscr': 1.35, 'debt_ratio': 0.8, 'tax_rate': 0.25},
+]
+
+
+def test_grid_matches_each_scenario_evaluated_alone():
+    grid = evaluate_scenario_grid(PROJECTS, ASSUMPTIONS)
+    for row, inputs in enumerate(PROJECTS):
+        for column, assumptions in enumerate(ASSUMPTIONS):
+            alone = evaluate_scenarios([{**inputs, **assumptions}])
+            for name in SCENARIO_METRICS:
+                # IRR and MIRR agree to the solver tolerance
+                expected = pytest.approx(alone[name][0], rel=1e-9, abs=1e-9, nan_ok=True)
+                assert grid[name][row, column] == expected, (row, column, name)
+
+
+def test_run_scenarios_stores_every_pair(database):
+    projects = [SolarProject(name=f'Site {index}', project_type='solar', capacity_mw=capacity, capex=capacity * 1e6,
+                             opex_per_year=capacity * 2e4, latitude=35.0, longitude=-110.0 + index)
+                for index, capacity in enumerate((5.0, 12.0))]
+    database.session.add_all(projects)
+    create_board_scenarios()
+    database.session.commit()
+    scenarios = Scenario.query.order_by(Scenario.id).all()
+    assert [scenario.name for scenario in scenarios] == list(BOARD_SCENARIOS)
+
+    assert run_scenarios() == {'projects': 2, 'scenarios': 3, 'results': 6}
+    # Running again updates the rows in place
+    run_scenarios()
+    assert ScenarioResult.query.count() == 6
+    downside = ScenarioResult.query.filter_by(scenario_id=scenarios[1].id, project_id=projects[1].id).one()
+    base = ScenarioResult.query.filter_by(scenario_id=scenarios[0].id, project_id=projects[1].id).one()
+    assert downside.npv < base.npv
+    assert np.isfinite(base.irr)
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from models import SolarProject
+from sensitivity import DRIVERS, sensitivity_analysis
+
+
+@pytest.fixture
+def project(database):
+    project = SolarProject(name='Mesa Solar', project_type='solar', capacity_mw=10.0, capex=1e7,
+                           opex_per_year=1.5e5, latitude=35.0, longitude=-110.0, performance_ratio=0.8,
+                           degradation_rate=0.5, expected_lifetime_years=25)
+    database.session.add(project)
+    database.session.commit()
+    return project
+
+
+def calculate(client, **scenario):
+    response = client.post('/api/calculate', json=scenario)
+    assert response.status_code == 200
+    return response.get_json()['metrics']
+
+
+def test_base_case_matches_calculate(client, project):
+    response = client.post(f'/api/analysis/{project.id}/sensitivity', json={'steps': 5})
+    assert response.status_code == 200
+    base = response.get_json()['sensitivity']['base']
+    metrics = calculate(client, project_id=project.id)
+    for name in ('npv', 'irr', 'lcoe'):
+        assert base[name] == pytest.approx(metrics[name], rel=1e-9)
+
+
+def test_discount_rate_row_matches_a_full_recompute(client, project):
+    result = sensitivity_analysis(project, {'target_dscr': 1.3}, drivers=('discount_rate', 'capex'), steps=5)
+    rates = 0.08 * (1 + np.array(result['changes']))
+    assert result['spider']['discount_rate']['values'] == pytest.approx(rates)
+    for rate, npv, lcoe in zip(rates, result['spider']['discount_rate']['npv'],
+                               result['spider']['discount_rate']['lcoe']):
+        metrics = calculate(client, project_id=project.id, discount_rate=rate, target_dscr=1.3)
+        assert npv == pytest.approx(metrics['npv'], rel=1e-9)
+        assert lcoe == pytest.approx(metrics['lcoe'], rel=1e-9)
+
+
+def test_tornado_is_sorted_by_spread(project):
+    result = sensitivity_analysis(project)
+    for bars in result['tornado'].values():
+        assert len(bars) == len(DRIVERS)
+        assert [bar['spread'] for bar in bars] == sorted((bar['spread'] for bar in bars), reverse=True)
+    # Higher capex lowers NPV
+    capex = result['spider']['capex']['npv']
+    assert capex == sorted(capex, reverse=True)
+
+
+def test_unknown_driver(project):
+    with pytest.raises(ValueError):
+        sensitivity_analysis(project, drivers=('tax_rate',))
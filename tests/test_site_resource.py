@@ -0,0 +1,87 @@
+import datetime
+
+import netCDF4
+import numpy as np
+import pytest
+
+import datasets
+import solar
+from models import FinancialMetric, SolarProject, WindProject
+from site_resource import assess_portfolio, assess_sites
+
+# Monthly mean irradiance (W m-2) and temperature (K) of the synthetic record
+GHI = np.array([110, 150, 200, 250, 290, 310, 300, 270, 230, 180, 130, 100], dtype=float)
+TEMPERATURE = np.linspace(275.0, 300.0, 12)
+
+
+@pytest.fixture
+def dataset(tmp_path, database):
+    """One year of monthly irradiance and temperature, uniform over a 1-degree grid"""
+    path = str(tmp_path / 'resource.nc')
+    with netCDF4.Dataset(path, 'w') as handle:
+        for name, size in (('time', None), ('lat', 11), ('lon', 11)):
+            handle.createDimension(name, size)
+        time = handle.createVariable('time', 'f8', ('time',))
+        time.units = 'days since 2020-01-01'
+        time.calendar = 'standard'
+        time[:] = [(datetime.date(2020, month, 15) - datetime.date(2020, 1, 1)).days for month in range(1, 13)]
+        handle.createVariable('lat', 'f4', ('lat',))[:] = np.arange(30.0, 41.0)
+        handle.createVariable('lon', 'f4', ('lon',))[:] = np.arange(-115.0, -104.0)
+        rsds = handle.createVariable('rsds', 'f4', ('time', 'lat', 'lon'))
+        rsds.units = 'W m-2'
+        rsds[:] = np.broadcast_to(GHI[:, np.newaxis, np.newaxis], (12, 11, 11))
+        tas = handle.createVariable('tas', 'f4', ('time', 'lat', 'lon'))
+        tas.units = 'K'
+        tas[:] = np.broadcast_to(TEMPERATURE[:, np.newaxis, np.newaxis], (12, 11, 11))
+    dataset = datasets.register_dataset(path)
+    database.session.commit()
+    return dataset
+
+
+@pytest.fixture
+def projects(database):
+    rows = [
+        SolarProject(name='Mesa', project_type='solar', capacity_mw=10.0, capex=1e7, opex_per_year=1.5e5,
+                     latitude=35.2, longitude=-110.4, tracking_type='fixed'),
+        SolarProject(name='Ridge', project_type='solar', capacity_mw=20.0, capex=2e7, opex_per_year=3e5,
+                     latitude=33.7, longitude=-108.1, tracking_type='single-axis'),
+        SolarProject(name='Tundra', project_type='solar', capacity_mw=5.0, capex=5e6, opex_per_year=1e5,
+                     latitude=60.0, longitude=-110.0),
+        WindProject(name='Gusts', project_type='wind', capacity_mw=50.0, capex=6e7, opex_per_year=1e6),
+    ]
+    database.session.add_all(rows)
+    database.session.commit()
+    return rows
+
+
+def test_assessment_writes_site_yields_and_revalues(dataset, projects):
+    mesa, ridge, tundra, wind = projects
+    summary = assess_portfolio(dataset.id, 'rsds', 'tas')
+    assert (summary['assessed'], summary['outside']) == (2, 1)
+    assert summary['revaluation'] is not None
+
+    for project in (mesa, ridge):
+        assert project.resource_dataset_id == dataset.id
+        expected = solar.resource_production_per_mw(project.latitude, project.longitude, project.tilt_angle,
+                                                    project.azimuth, project.tracking_type, GHI,
+                                                    TEMPERATURE - 273.15).sum()
+        assert project.specific_yield == pytest.approx(expected, rel=1e-5)
+        assert FinancialMetric.query.filter_by(project_id=project.id).one().npv is not None
+    assert ridge.specific_yield > mesa.specific_yield
+    assert tundra.specific_yield is None and tundra.resource_dataset_id is None
+    assert summary['mean_capacity_factor'] == pytest.approx(
+        (mesa.specific_yield + ridge.specific_yield) / 2 / solar.HOURS_PER_YEAR, rel=1e-6)
+
+
+def test_bilinear_sampling_of_a_uniform_field(dataset, projects):
+    nearest = assess_sites(dataset, projects[:2], 'rsds', method='nearest')
+    bilinear = assess_sites(dataset, projects[:2], 'rsds', method='bilinear')
+    for project_id, result in nearest.items():
+        assert result['monthly_ghi'] == pytest.approx(list(GHI), rel=1e-6)
+        assert bilinear[project_id]['specific_yield'] == pytest.approx(result['specific_yield'], rel=1e-6)
+        assert result['monthly_temperature'] is None
+
+
+def test_unknown_dataset(database):
+    with pytest.raises(ValueError):
+        assess_portfolio(12345, 'rsds')
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+import solar
+from models import SolarProject
+from utils import build_project_cash_flows
+
+
+def make_project(**kwargs):
+    fields = dict(name='Mesa Solar', project_type='solar', capacity_mw=10.0, capex=1e7, opex_per_year=1.5e5,
+                  latitude=35.0, longitude=-110.0, tracking_type='fixed', degradation_rate=0.5,
+                  performance_ratio=0.8, expected_lifetime_years=25)
+    fields.update(kwargs)
+    return SolarProject(**fields)
+
+
+def test_tracking_increases_yield():
+    fixed = solar.annual_energy_per_mw(35.0, -110.0, tracking_type='fixed')
+    single_axis = solar.annual_energy_per_mw(35.0, -110.0, tracking_type='single-axis')
+    dual_axis = solar.annual_energy_per_mw(35.0, -110.0, tracking_type='dual-axis')
+    assert 1000 < fixed < single_axis < dual_axis < 3500
+
+
+@pytest.mark.parametrize('specific_yield', [None, 1900.0])
+def test_cash_flow_energy_matches_the_hourly_model(specific_yield):
+    project = make_project(specific_yield=specific_yield)
+    schedule = build_project_cash_flows(project)
+    hourly = solar.hourly_production(project)
+    assert np.allclose(schedule['energy_production_mwh'][1:], hourly.sum(axis=-1), rtol=1e-6)
+    if specific_yield:
+        assert schedule['energy_production_mwh'][1] == pytest.approx(specific_yield * 10.0 * 0.8)
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+import storage
+
+# Free energy in the morning, 100 $/MWh in the afternoon
+PRICES = np.tile(np.r_[np.zeros(12), np.full(12, 100.0)], storage.DAYS_PER_YEAR)
+NO_SOLAR = np.zeros(storage.HOURS_PER_YEAR)
+
+
+def test_grid_arbitrage_known_answer():
+    result = storage.dispatch(PRICES, NO_SOLAR, power_mw=100.0, energy_mwh=10.0, round_trip_efficiency=1.0,
+                              min_state_of_charge=0.0, grid_charging=True, levels=11)
+    # One full cycle a day: 10 MWh bought at 0 and sold at 100
+    assert result['revenue'] == pytest.approx(365 * 1000.0)
+    assert result['cycles'] == pytest.approx(365.0)
+
+
+def test_losses_reduce_the_energy_delivered():
+    result = storage.dispatch(PRICES, NO_SOLAR, power_mw=100.0, energy_mwh=10.0, round_trip_efficiency=0.81,
+                              min_state_of_charge=0.0, grid_charging=True, levels=11)
+    assert result['revenue'] == pytest.approx(365 * 900.0)
+    assert result['energy_charged'] == pytest.approx(365 * 10.0 / 0.9)
+
+
+def test_power_limit_and_state_of_charge_band():
+    result = storage.dispatch(PRICES, NO_SOLAR, power_mw=2.0, energy_mwh=10.0, round_trip_efficiency=1.0,
+                              min_state_of_charge=0.2, max_state_of_charge=0.9, grid_charging=True, levels=15)
+    assert result['charge'].max() <= 2.0 + 1e-9
+    assert result['discharge'].max() <= 2.0 + 1e-9
+    assert result['state_of_charge'].min() >= 2.0 - 1e-9
+    assert result['state_of_charge'].max() <= 9.0 + 1e-9
+    # The 7 MWh band is filled within the 12 cheap hours and emptied within the 12 dear ones
+    assert result['revenue'] == pytest.approx(365 * 700.0)
+
+
+def test_without_grid_charging_the_battery_only_stores_solar():
+    assert storage.dispatch(PRICES, NO_SOLAR, power_mw=5.0, energy_mwh=10.0, levels=11)['revenue'] == 0.0
+
+    solar = np.tile(np.r_[np.zeros(6), np.full(6, 1.0), np.zeros(12)], storage.DAYS_PER_YEAR)
+    result = storage.dispatch(PRICES, solar, power_mw=5.0, energy_mwh=10.0, round_trip_efficiency=1.0,
+                              min_state_of_charge=0.0, levels=11)
+    # The 6 MWh of free-hour solar is shifted into the priced hours
+    assert result['revenue'] == pytest.approx(365 * 600.0)
+    assert (result['charge'] <= solar + 1e-9).all()
+
+
+def test_sizing_variants_are_solved_together():
+    calls = []
+    result = storage.dispatch(PRICES, NO_SOLAR, power_mw=np.array([100.0, 100.0, 1.0]),
+                              energy_mwh=np.array([10.0, 20.0, 20.0]), round_trip_efficiency=1.0,
+                              min_state_of_charge=0.0, grid_charging=True,
+                              progress=lambda done, total: calls.append((done, total)))
+    assert calls[-1] == (3, 3)
+    assert result['charge'].shape == (3, storage.HOURS_PER_YEAR)
+    # The 1 MW variant moves 12 MWh through its 20 MWh in the 12 priced hours
+    assert np.allclose(result['revenue'], 365 * np.array([1000.0, 2000.0, 1200.0]))
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+import tax
+
+
+def test_macrs_tables_match_publication_946():
+    for years, percentages in tax.MACRS_PERCENTAGES.items():
+        assert sum(percentages) == pytest.approx(100.0, abs=0.01)
+        assert len(percentages) == years + 1
+    rates = tax.depreciation_rates('macrs', 5, 8)
+    assert np.allclose(rates, [0.0, 0.20, 0.32, 0.192, 0.1152, 0.1152, 0.0576, 0.0, 0.0])
+
+
+def test_straight_line_and_none():
+    assert np.allclose(tax.depreciation_rates('straight_line', 4, 6), [0, 0.25, 0.25, 0.25, 0.25, 0, 0])
+    assert not tax.depreciation_rates('none', 5, 6).any()
+
+
+def test_methods_broadcast_across_projects():
+    methods = np.array([tax.method_code('macrs'), tax.method_code('straight_line'), tax.method_code('none')])
+    rates = tax.depreciation_rates(methods, np.array([7, 10, 5]), 12)
+    assert rates.shape == (3, 13)
+    assert np.allclose(rates[0], tax.depreciation_rates('macrs', 7, 12))
+    assert np.allclose(rates[1], tax.depreciation_rates('straight_line', 10, 12))
+    assert not rates[2].any()
+
+
+def test_depreciation_basis_and_final_year_write_off():
+    # The ITC reduces the basis by half the credit
+    schedule = tax.depreciation(1000.0, 'macrs', 5, 25, 25, itc_rate=0.3)
+    assert schedule.sum() == pytest.approx(1000.0 * (1 - 0.15))
+    # Basis left when the project retires is written off in its last year
+    short = tax.depreciation(1000.0, 'macrs', 20, 10, 12)
+    assert short.sum() == pytest.approx(1000.0)
+    assert short[10] > short[9]
+    assert not short[11:].any()
+    assert not tax.depreciation(1000.0, 'none', 5, 10, 12).any()
+
+
+def test_invalid_methods_are_rejected():
+    with pytest.raises(ValueError):
+        tax.method_code('declining_balance')
+    with pytest.raises(ValueError):
+        tax.depreciation_rates('macrs', 6, 10)
+    with pytest.raises(ValueError):
+        tax.depreciation_rates(7, 5, 10)
+
+
+def test_income_taxes_carry_losses_forward():
+    taxes, carried = tax.income_taxes(np.array([-100.0, 50.0, 100.0]), 0.2, nol_limit=0.8)
+    # Year 1: 80% of 50 offset by the loss, 10 taxed; year 2: the remaining 60 of loss offset, 40 taxed
+    assert np.allclose(taxes, [0.0, 2.0, 8.0])
+    assert carried == pytest.approx(0.0)
+
+    taxes, carried = tax.income_taxes(np.array([[-100.0, 50.0], [30.0, 30.0]]), np.array([0.2, 0.1]),
+                                      nol_limit=1.0)
+    assert np.allclose(taxes, [[0.0, 0.0], [3.0, 3.0]])
+    assert np.allclose(carried, [50.0, 0.0])
+
+
+def test_tax_credits():
+    energy = np.array([0.0, 100.0, 100.0, 100.0])
+    ptc = tax.tax_credits(0.0, energy, ptc_rate=10.0, ptc_years=2, indexation=0.1)
+    assert np.allclose(ptc, [0.0, 1000.0, 1100.0, 0.0])
+    itc = tax.tax_credits(1000.0, energy, itc_rate=0.3)
+    assert np.allclose(itc, [0.0, 300.0, 0.0, 0.0])
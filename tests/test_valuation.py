@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from models import FinancialMetric, SolarProject
+from utils import evaluate_scenarios, project_cash_flow_inputs
+from valuation import evaluate_project_scenarios, project_metrics, project_metrics_by_id
+
+
+@pytest.fixture
+def project(database):
+    project = SolarProject(name='Mesa Solar', project_type='solar', capacity_mw=10.0, capex=1e7,
+                           opex_per_year=1.5e5, latitude=35.0, longitude=-110.0)
+    database.session.add(project)
+    database.session.commit()
+    return project
+
+
+def test_stored_metrics_are_reused(project):
+    metric = project_metrics(project)
+    results = evaluate_project_scenarios([{'project_id': project.id}], [project])
+    assert results['npv'][0] == pytest.approx(metric.npv)
+    assert FinancialMetric.query.count() == 1
+
+
+def test_inline_overrides_bypass_stored_metrics(project):
+    stored = project_metrics(project).npv
+    scenario = {'project_id': project.id, 'capex': 1e6}
+    results = evaluate_project_scenarios([scenario, {'project_id': project.id}], [project])
+    expected = evaluate_scenarios([scenario], {project.id: project_cash_flow_inputs(project)})['npv'][0]
+    assert results['npv'][0] == pytest.approx(expected)
+    assert not np.isclose(results['npv'][0], stored)
+    assert results['npv'][1] == pytest.approx(stored)
+
+
+def test_project_metrics_job(project):
+    result = project_metrics_by_id(project.id)
+    assert result['npv'] == pytest.approx(project.financial_metrics.npv)
+    with pytest.raises(ValueError):
+        project_metrics_by_id(project.id + 1)
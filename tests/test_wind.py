@@ -0,0 +1,80 @@
+import math
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import wind
+
+
+def wind_project(**columns):
+    """A wind project row with no turbine, resource or loss details unless given"""
+    defaults = {'capacity_mw': 30.0, 'num_turbines': None, 'turbine_capacity_mw': None,
+                'rotor_diameter_m': None, 'power_curve': None, 'mean_wind_speed': None,
+                'measurement_height_m': None, 'hub_height_m': None, 'shear_exponent': None,
+                'weibull_k': None, 'wake_loss': 0.0, 'availability': 100.0, 'electrical_loss': 0.0}
+    return SimpleNamespace(**{**defaults, **columns})
+
+
+def test_flat_curve_capacity_factor_is_the_weibull_probability_between_cut_in_and_cut_out():
+    # Full output from 4 to 25 m/s, both on bin edges, so the binned integral is exact
+    curve = [[4.0, 2000.0], [25.0, 2000.0]]
+    scale = wind.weibull_scale(7.0, 2.0)
+    expected = math.exp(-(4.0 / scale) ** 2) - math.exp(-(25.0 / scale) ** 2)
+    assert wind.weibull_capacity_factor(7.0, 2.0, curve) == pytest.approx(expected, rel=1e-9)
+
+
+def test_reference_curve_capacity_factor_matches_a_fine_integration():
+    speeds, fraction = wind.power_curve_arrays()
+    step = 1e-4
+    grid = np.arange(step / 2, 40.0, step)
+    for mean_speed, k in ((6.0, 2.0), (8.5, 2.4)):
+        scale = wind.weibull_scale(mean_speed, k)
+        density = k / scale * (grid / scale) ** (k - 1) * np.exp(-(grid / scale) ** k)
+        expected = (density * wind.power_output(grid, speeds, fraction)).sum() * step
+        assert wind.weibull_capacity_factor(mean_speed, k) == pytest.approx(expected, abs=2e-3)
+    # Broadcasting a portfolio gives the same values as one call per project
+    batch = wind.weibull_capacity_factor(np.array([6.0, 8.5]), np.array([2.0, 2.4]))
+    assert batch.tolist() == pytest.approx([wind.weibull_capacity_factor(6.0, 2.0),
+                                            wind.weibull_capacity_factor(8.5, 2.4)])
+
+
+def test_mean_speed_is_sheared_to_hub_height():
+    assert wind.hub_height_speed(6.0, 80.0, 120.0, 0.2) == pytest.approx(6.0 * 1.5 ** 0.2)
+    assert wind.hub_height_speed(6.0, None, 120.0) == 6.0
+
+    measured = wind_project(mean_wind_speed=6.0, measurement_height_m=80.0, hub_height_m=120.0, shear_exponent=0.2)
+    hub_mean = 6.0 * 1.5 ** 0.2
+    assert wind.gross_capacity_factor(measured) == pytest.approx(wind.weibull_capacity_factor(hub_mean))
+    assert wind.gross_capacity_factor(measured) > wind.weibull_capacity_factor(6.0)
+
+    series = np.array([5.0, 8.0, np.nan, 11.0])
+    hourly = wind.gross_capacity_factor(measured, wind_speeds=series)
+    speeds, fraction = wind.power_curve_arrays()
+    expected = wind.power_output(series[~np.isnan(series)] * 1.5 ** 0.2, speeds, fraction).mean()
+    assert hourly == pytest.approx(expected)
+
+
+def test_energy_comes_from_the_turbine_array_rating():
+    project = wind_project(capacity_mw=30.0, num_turbines=10, turbine_capacity_mw=3.1, mean_wind_speed=7.5)
+    gross = wind.weibull_capacity_factor(7.5)
+    assert wind.installed_capacity_mw(project) == pytest.approx(31.0)
+    assert wind.annual_energy_mwh(project) == pytest.approx(31.0 * wind.HOURS_PER_YEAR * gross)
+
+    unknown_turbines = wind_project(capacity_mw=30.0, mean_wind_speed=7.5)
+    assert wind.annual_energy_mwh(unknown_turbines) == pytest.approx(30.0 * wind.HOURS_PER_YEAR * gross)
+
+
+def test_turbine_fields_are_checked_against_the_capacity_and_rotor():
+    wind.check_turbines(wind_project(capacity_mw=30.0, num_turbines=10, turbine_capacity_mw=3.1,
+                                     rotor_diameter_m=100.0))
+    with pytest.raises(ValueError, match='project capacity'):
+        wind.check_turbines(wind_project(capacity_mw=30.0, num_turbines=12, turbine_capacity_mw=3.0))
+    with pytest.raises(ValueError, match='at least 1'):
+        wind.check_turbines(wind_project(num_turbines=0))
+    # 16/27 x 0.5 x 1.225 x pi 20^2 x 13^3 is about 1 MW, well short of 3 MW
+    with pytest.raises(ValueError, match='40 m rotor'):
+        wind.check_turbines(wind_project(capacity_mw=30.0, num_turbines=10, turbine_capacity_mw=3.0,
+                                         rotor_diameter_m=40.0))
+    assert wind.rated_wind_speed() == 13.0
+    assert wind.rated_wind_speed([[3.0, 0.0], [11.5, 3450.0], [25.0, 3450.0]]) == 11.5
@@ -3,10 +3,57 @@ Utility functions for the Energy Finance application.
 """
 
 import os
+import json
+import hashlib
 import pandas as pd
 import numpy as np
 from datetime import datetime, date
 
+import debt
+import finance
+import returns
+import solar
+import tax
+import wind
+
+
+# Template structure with columns and example data, shared with the importer
+PROJECT_TEMPLATE_DATA = {
+    'name': ['Solar Farm Example', ''],
+    'description': ['5.5 MW solar PV project located in California', ''],
+    'location': ['Sunny Valley, CA', ''],
+    'capacity_mw': [5.5, ''],
+    'project_type': ['solar', ''],
+    'capex': [5500000, ''],
+    'capex_per_mw': [1000000, ''],
+    'opex_per_year': [75000, ''],
+    'opex_per_mw': [15000, ''],
+    'start_date': [date(2025, 1, 1), ''],
+    'commercial_operation_date': [date(2025, 6, 1), ''],
+    'expected_lifetime_years': [25, ''],
+    'status': ['planning', ''],
+    'panel_type': ['monocrystalline', ''],
+    'panel_efficiency': [21.5, ''],
+    'num_panels': [13750, ''],
+    'panel_capacity_w': [400, ''],
+    'latitude': [34.5, ''],
+    'longitude': [-118.2, ''],
+    'tilt_angle': [20, ''],
+    'azimuth': [180, ''],
+    'degradation_rate': [0.5, ''],
+    'performance_ratio': [0.75, ''],
+    'land_area_acres': [25, ''],
+    'tracking_type': ['fixed', ''],
+    'depreciation_method': ['macrs', ''],
+    'depreciation_years': [5, ''],
+    'itc_rate': [0.3, ''],
+    'ptc_rate': [0, ''],
+    'hub_height_m': ['', ''],
+    'mean_wind_speed': ['', ''],
+    'measurement_height_m': ['', ''],
+    'weibull_k': ['', '']
+}
+
 
 def generate_project_templates():
     """
@@ -16,37 +63,8 @@ def generate_project_templates():
     templates_dir = 'static/templates'
     os.makedirs(templates_dir, exist_ok=True)
     
-    # Define the template structure with columns and example data
-    template_data = {
-        'name': ['Solar Farm Example', ''],
-        'description': ['5.5 MW solar PV project located in California', ''],
-        'location': ['Sunny Valley, CA', ''],
-        'capacity_mw': [5.5, ''],
-        'project_type': ['solar', ''],
-        'capex': [5500000, ''],
-        'capex_per_mw': [1000000, ''],
-        'opex_per_year': [75000, ''],
-        'opex_per_mw': [15000, ''],
-        'start_date': [date(2025, 1, 1), ''],
-        'commercial_operation_date': [date(2025, 6, 1), ''],
-        'expected_lifetime_years': [25, ''],
-        'status': ['planning', ''],
-        'panel_type': ['monocrystalline', ''],
-        'panel_efficiency': [21.5, ''],
-        'num_panels': [13750, ''],
-        'panel_capacity_w': [400, ''],
-        'latitude': [34.5, ''],
-        'longitude': [-118.2, ''],
-        'tilt_angle': [20, ''],
-        'azimuth': [180, ''],
-        'degradation_rate': [0.5, ''],
-        'performance_ratio': [0.75, ''],
-        'land_area_acres': [25, ''],
-        'tracking_type': ['fixed', '']
-    }
-    
     # Create dataframe
-    df = pd.DataFrame(template_data)
+    df = pd.DataFrame(PROJECT_TEMPLATE_DATA)
     
     # Save as Excel template
     excel_path = os.path.join(templates_dir, 'solar_project_template.xlsx')
@@ -96,7 +114,15 @@ def generate_project_templates():
             'degradation_rate': 'Annual panel degradation rate (%)',
             'performance_ratio': 'System performance ratio (0-1)',
             'land_area_acres': 'Total land area (acres)',
-            'tracking_type': 'Tracking system type (fixed, single-axis, dual-axis)'
+            'tracking_type': 'Tracking system type (fixed, single-axis, dual-axis)',
+            'depreciation_method': 'Tax depreciation method (macrs, straight_line, none)',
+            'depreciation_years': 'MACRS recovery period (3, 5, 7, 10, 15, 20) or straight-line years',
+            'itc_rate': 'Investment tax credit (fraction of capex, 0-1)',
+            'ptc_rate': 'Production tax credit in the first year ($/MWh)',
+            'hub_height_m': 'Wind turbine hub height (m, wind projects)',
+            'mean_wind_speed': 'Long-term mean wind speed (m/s, wind projects)',
+            'measurement_height_m': 'Height of the mean wind speed (m, default: hub height)',
+            'weibull_k': 'Weibull shape parameter of the wind speeds (default 2.0)'
         }
         
         for col_num, column in enumerate(df.columns):
@@ -110,7 +136,7 @@ def generate_project_templates():
         instructions_df = pd.DataFrame({
             'Field': list(descriptions.keys()),
             'Description': list(descriptions.values()),
-            'Example': [template_data[col][0] for col in descriptions.keys()]
+            'Example': [PROJECT_TEMPLATE_DATA[col][0] for col in descriptions.keys()]
         })
         
         instructions_df.to_excel(writer, sheet_name='Instructions', index=False)
@@ -131,7 +157,63 @@ def generate_project_templates():
     }
 
 
-def calculate_financial_metrics(project, discount_rate=0.08, inflation_rate=0.025, debt_ratio=0.7, interest_rate=0.05):
+def project_cash_flow_inputs(project):
+    """
+    Collect the cash-flow engine inputs for a project.
+    
+    Parameters:
+    - project: A Project instance
+    
+    Returns: dict of keyword arguments for finance.cash_flow_schedule
+    """
+    capacity_mw = project.capacity_mw or 0
+    
+    capex = project.capex
+    if capex is None:
+        capex = (project.capex_per_mw or 0) * capacity_mw
+    
+    opex = project.opex_per_year
+    if opex is None:
+        opex = (project.opex_per_mw or 0) * capacity_mw
+    
+    degradation_rate = getattr(project, 'degradation_rate', None)
+    
+    # Storage arbitrage of hybrid projects, from their latest dispatch run
+    merchant_revenue = getattr(project, 'arbitrage_revenue', None)
+    
+    return {
+        'capex': capex,
+        'opex': opex,
+        'energy_mwh': estimate_energy_production(project, 0),
+        'lifetime_years': project.expected_lifetime_years or 25,
+        'degradation_rate': degradation_rate or 0.0,
+        'merchant_revenue': merchant_revenue or 0.0,
+        'depreciation_method': tax.method_code(project.depreciation_method or tax.DEFAULT_DEPRECIATION_METHOD),
+        'depreciation_years': project.depreciation_years or tax.DEFAULT_DEPRECIATION_YEARS,
+        'itc_rate': project.itc_rate or 0.0,
+        'ptc_rate': project.ptc_rate or 0.0,
+    }
+
+
+def build_project_cash_flows(project, **assumptions):
+    """
+    Build the full year-by-year cash-flow table for a project.
+    
+    Parameters:
+    - project: A Project instance
+    - assumptions: Keyword arguments forwarded to finance.cash_flow_schedule
+      (inflation_rate, debt_ratio, interest_rate, ppa_price, ...)
+    
+    Returns: dict of NumPy arrays keyed by CashFlow column, plus 'year'
+    """
+    inputs = project_cash_flow_inputs(project)
+    inputs.update(assumptions)
+    return finance.cash_flow_schedule(**inputs)
+
+
+def calculate_financial_metrics(project, discount_rate=0.08, inflation_rate=0.025, debt_ratio=0.7, interest_rate=0.05,
+                                ppa_price=finance.DEFAULT_PPA_PRICE, ppa_escalation=0.0, ppa_term=None,
+                                target_dscr=None, tax_rate=tax.DEFAULT_TAX_RATE):
     """
     Calculate financial metrics for a project.
     
@@ -141,75 +223,279 @@ def calculate_financial_metrics(project, discount_rate=0.08, inflation_rate=0.02
     - inflation_rate: Inflation rate (default 2.5%)
     - debt_ratio: Debt to capital ratio (default 70%)
     - interest_rate: Interest rate on debt (default 5%)
+    - ppa_price: PPA price in the first operational year ($/MWh)
+    - ppa_escalation: Annual PPA price escalation (default 0%)
+    - ppa_term: PPA term in years (default: project lifetime)
+    - target_dscr: Sculpt debt to this DSCR, capped at debt_ratio of capex
+      (default: level annuity debt at debt_ratio)
+    - tax_rate: Income tax rate (default 21%, the federal corporate rate)
     
-    Returns: FinancialMetric instance
+    Returns: dict of FinancialMetric fields
     """
-    # This is a placeholder implementation
-    # In a real application, this would perform actual financial calculations
-    
-    # Example calculation for NPV
-    npv = 0
-    irr = 0
-    payback_period = 0
-    lcoe = 0
+    schedule = build_project_cash_flows(
+        project,
+        inflation_rate=inflation_rate,
+        debt_ratio=debt_ratio,
+        interest_rate=interest_rate,
+        ppa_price=ppa_price,
+        ppa_escalation=ppa_escalation,
+        ppa_term=ppa_term,
+        tax_rate=tax_rate,
+    )
+    if target_dscr is not None:
+        schedule, _ = debt.sculpt_schedule(schedule, target_dscr, interest_rate=interest_rate,
+                                           max_gearing=debt_ratio)
+    metrics = finance.schedule_metrics(schedule, discount_rate, finance_rate=interest_rate)
     
-    # In a real implementation, we would:
-    # 1. Generate cash flows for each year of the project
-    # 2. Calculate NPV using the discount rate
-    # 3. Calculate IRR by solving for the discount rate that makes NPV = 0
-    # 4. Calculate payback period by finding when cumulative cash flow becomes positive
-    # 5. Calculate LCOE by dividing total costs by total energy production
+    metrics['irr'] = returns.irr(schedule['net_cash_flow'])
+    metrics['debt_service_coverage_ratio'] = debt.schedule_dscr(schedule)
     
-    # Return financial metrics
-    return {
-        'npv': npv,
-        'irr': irr,
-        'payback_period': payback_period,
-        'lcoe': lcoe,
+    result = {name: json_float(value) for name, value in metrics.items()}
+    result.update({
         'discount_rate': discount_rate,
         'inflation_rate': inflation_rate,
         'debt_ratio': debt_ratio,
-        'interest_rate': interest_rate
-    }
+        'interest_rate': interest_rate,
+        'ppa_price': ppa_price,
+        'ppa_escalation': ppa_escalation,
+        'ppa_term': ppa_term if ppa_term is not None else int(schedule['lifetime_years']),
+        'target_dscr': target_dscr,
+        'tax_rate': tax_rate,
+    })
+    return result
 
 
-def estimate_energy_production(solar_project, year):
+def json_float(value):
+    """Convert a NumPy scalar to a float, mapping NaN to None."""
+    value = float(value)
+    return None if np.isnan(value) else value
+
+
+# Assumptions accepted per scenario by evaluate_scenarios, with their defaults
+SCENARIO_DEFAULTS = {
+    'discount_rate': 0.08,
+    'inflation_rate': 0.025,
+    'debt_ratio': 0.7,
+    'interest_rate': 0.05,
+    'ppa_price': finance.DEFAULT_PPA_PRICE,
+    'ppa_escalation': 0.0,
+    'ppa_term': None,
+    'target_dscr': None,  # Sculpt debt to this DSCR, with debt_ratio as the gearing cap
+    'tax_rate': tax.DEFAULT_TAX_RATE,
+}
+
+# Project inputs a scenario may give inline instead of referencing a project_id
+PROJECT_INPUT_FIELDS = ('capex', 'opex', 'energy_mwh', 'lifetime_years', 'degradation_rate',
+                        'merchant_revenue', 'depreciation_method', 'depreciation_years', 'itc_rate',
+                        'ptc_rate')
+
+# Project inputs that may be omitted, with the value used instead
+OPTIONAL_INPUT_DEFAULTS = {'degradation_rate': 0.0, 'merchant_revenue': 0.0,
+                           'depreciation_method': tax.method_code(tax.DEFAULT_DEPRECIATION_METHOD),
+                           'depreciation_years': tax.DEFAULT_DEPRECIATION_YEARS, 'itc_rate': 0.0, 'ptc_rate': 0.0}
+
+# Metrics returned for each scenario, in output order
+SCENARIO_METRICS = ('npv', 'irr', 'payback_period', 'lcoe', 'mirr', 'profitability_index',
+                    'debt_service_coverage_ratio')
+
+
+def scenario_metrics(schedule, discount_rate, interest_rate):
+    """
+    SCENARIO_METRICS of every row of a batch schedule.
+    
+    Parameters:
+    - schedule: Output of finance.cash_flow_schedule, of any batch shape
+    - discount_rate: Discount rate (fraction), broadcast over the batch shape
+    - interest_rate: Interest rate on debt, the finance rate for MIRR
+    
+    Returns: dict of arrays with the batch shape of the schedule
+    """
+    metrics = finance.schedule_metrics(schedule, discount_rate, finance_rate=interest_rate)
+    metrics['irr'] = returns.irr(schedule['net_cash_flow'])
+    metrics['debt_service_coverage_ratio'] = debt.schedule_dscr(schedule)
+    return {name: metrics[name] for name in SCENARIO_METRICS}
+
+
+def evaluate_scenarios(scenarios, project_inputs=None, include_schedule=False):
     """
-    Estimate energy production for a solar project in a given year.
+    Evaluate many assumption sets in one vectorized pass.
+    
+    Parameters:
+    - scenarios: List of dicts holding SCENARIO_DEFAULTS keys and either a
+      'project_id' or inline PROJECT_INPUT_FIELDS values
+    - project_inputs: dict mapping project_id to project_cash_flow_inputs output
+    - include_schedule: Also return the batch cash-flow schedule under 'schedule'
+    
+    Returns: dict of NumPy arrays, one entry per scenario, keyed by SCENARIO_METRICS
+    and SCENARIO_DEFAULTS names
+    
+    Raises: ValueError if a scenario references an unknown project or lacks project inputs
+    """
+    project_inputs = project_inputs or {}
+    required = [field for field in PROJECT_INPUT_FIELDS if field not in OPTIONAL_INPUT_DEFAULTS]
+    
+    rows = []
+    for index, scenario in enumerate(scenarios):
+        project_id = scenario.get('project_id')
+        if project_id is not None:
+            if project_id not in project_inputs:
+                raise ValueError(f"Scenario {index}: unknown project_id {project_id}")
+            scenario = {**project_inputs[project_id], **scenario}
+        missing = [field for field in required if field not in scenario]
+        if missing:
+            raise ValueError(f"Scenario {index}: missing project_id or inputs {', '.join(missing)}")
+        if isinstance(scenario.get('depreciation_method'), str):
+            scenario = {**scenario, 'depreciation_method': tax.method_code(scenario['depreciation_method'])}
+        rows.append(scenario)
+    
+    def column(name, default=None):
+        return np.array([row.get(name, default) for row in rows], dtype=float)
+    
+    arrays = {name: column(name, default) for name, default in SCENARIO_DEFAULTS.items()}
+    arrays.update({name: column(name) for name in required})
+    arrays.update({name: column(name, default) for name, default in OPTIONAL_INPUT_DEFAULTS.items()})
+    arrays['ppa_term'] = np.where(np.isnan(arrays['ppa_term']), arrays['lifetime_years'], arrays['ppa_term'])
+    
+    schedule = finance.cash_flow_schedule(**finance.cash_flow_inputs(arrays))
+    if not np.isnan(arrays['target_dscr']).all():
+        schedule, _ = debt.sculpt_schedule(schedule, arrays['target_dscr'],
+                                           interest_rate=arrays['interest_rate'],
+                                           max_gearing=arrays['debt_ratio'])
+    results = scenario_metrics(schedule, arrays['discount_rate'], arrays['interest_rate'])
+    results.update({name: arrays[name] for name in SCENARIO_DEFAULTS})
+    if include_schedule:
+        results['schedule'] = schedule
+    return results
+
+
+# Bump when the cash-flow or metric model changes so stored metrics are recomputed
+METRICS_MODEL_VERSION = 5
+
+# Project attributes the cash-flow inputs are derived from
+FINGERPRINT_FIELDS = ('project_type', 'capacity_mw', 'capex', 'capex_per_mw', 'opex_per_year',
+                      'opex_per_mw', 'expected_lifetime_years', 'latitude', 'longitude', 'tilt_angle',
+                      'azimuth', 'tracking_type', 'degradation_rate', 'performance_ratio',
+                      'num_turbines', 'turbine_capacity_mw', 'hub_height_m', 'power_curve',
+                      'mean_wind_speed', 'measurement_height_m', 'weibull_k', 'shear_exponent',
+                      'wake_loss', 'availability', 'electrical_loss',
+                      'arbitrage_revenue', 'specific_yield', 'depreciation_method', 'depreciation_years',
+                      'itc_rate', 'ptc_rate')
+
+
+def input_fingerprint(project, assumptions=None):
+    """
+    Hash the project fields and assumptions a set of metrics is derived from.
+    
+    Assumptions missing from the mapping take their SCENARIO_DEFAULTS value, so
+    explicit defaults and omitted keys give the same fingerprint.
     
     Parameters:
-    - solar_project: A SolarProject instance
-    - year: Year of operation (0-based, where 0 is the first year)
+    - project: A Project instance, or any row exposing FINGERPRINT_FIELDS as attributes
+    - assumptions: Mapping of SCENARIO_DEFAULTS overrides; other keys are ignored
     
-    Returns: Estimated energy production in MWh
+    Returns: Hex digest identifying the inputs
     """
-    # This is a placeholder implementation
-    # In a real application, this would use location, panel characteristics, etc.
+    assumptions = assumptions or {}
     
+    def normalize(value):
+        if value is None or isinstance(value, str):
+            return value
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return str(value)
+    
+    values = [METRICS_MODEL_VERSION]
+    values += [normalize(getattr(project, field, None)) for field in FINGERPRINT_FIELDS]
+    values += [normalize(assumptions.get(name, default)) for name, default in SCENARIO_DEFAULTS.items()]
+    return hashlib.sha256(json.dumps(values).encode()).hexdigest()
+
+
+def iter_json_results(results, chunk_size=1000):
+    """
+    Serialize columnar results as a JSON array of objects, chunk by chunk.
+    
+    Parameters:
+    - results: dict of equal-length NumPy arrays, e.g. from evaluate_scenarios
+    - chunk_size: Number of records serialized per yielded chunk
+    
+    Yields: JSON text fragments that concatenate to a single array
+    """
+    names = list(results)
+    size = len(results[names[0]]) if names else 0
+    # Records are formatted from a template with the keys already encoded
+    template = '{' + ', '.join(f'{json.dumps(name)}: %s' for name in names) + '}'
+    
+    yield '['
+    for start in range(0, size, chunk_size):
+        columns = []
+        for name in names:
+            values = np.asarray(results[name][start:start + chunk_size], dtype=float)
+            # Encode the whole column at once, then split it into its values
+            encoded = json.dumps(values.tolist())[1:-1].split(', ')
+            # NaN and infinities are not valid JSON
+            for index in np.flatnonzero(~np.isfinite(values)):
+                encoded[index] = 'null'
+            columns.append(encoded)
+        yield (', ' if start else '') + ', '.join(template % record for record in zip(*columns))
+    yield ']'
+
+
+def estimate_energy_production(solar_project, year):
+    """
+    Estimate energy production for a solar or wind project in a given year.
+    
+    Parameters:
+    - solar_project: A SolarProject or WindProject instance
+    - year: Year of operation (0-based, where 0 is the first year), or an array of years
+    
+    Returns: Estimated energy production in MWh (an array if year is an array)
+    """
     # Basic calculation:
-    # 1. Calculate theoretical production based on capacity
-    # 2. Apply performance ratio
+    # 1. Calculate theoretical production based on capacity and site
+    # 2. Apply performance ratio (solar) or wake, availability and electrical losses (wind)
     # 3. Apply degradation over time
     
     if not solar_project.capacity_mw:
-        return 0
-    
-    # Typical capacity factor for solar PV (location dependent)
-    capacity_factor = 0.2  # 20%
+        return np.zeros(np.shape(year)) if np.ndim(year) else 0
     
     # Hours in a year
     hours_per_year = 8760
     
+    if solar_project.project_type == 'wind':
+        base_production = wind.annual_energy_mwh(solar_project)
+        degradation_rate = getattr(solar_project, 'degradation_rate', None)
+        if degradation_rate:
+            base_production = base_production * (1 - degradation_rate / 100) ** np.maximum(year, 0)
+        return base_production
+    
+    latitude = getattr(solar_project, 'latitude', None)
+    longitude = getattr(solar_project, 'longitude', None)
+    specific_yield = getattr(solar_project, 'specific_yield', None)
+    if specific_yield:
+        # Site yield from a resource assessment against a climate dataset
+        capacity_factor = specific_yield / hours_per_year
+    elif latitude is not None and longitude is not None:
+        # Site capacity factor from the hourly model, cached per site and geometry
+        capacity_factor = solar.annual_energy_per_mw(
+            latitude, longitude, solar_project.tilt_angle, solar_project.azimuth,
+            solar_project.tracking_type or 'fixed') / hours_per_year
+    else:
+        # Typical capacity factor for solar PV when the site is unknown
+        capacity_factor = 0.2  # 20%
+    
     # Base production in MWh
     base_production = solar_project.capacity_mw * capacity_factor * hours_per_year
     
     # Apply performance ratio
-    if solar_project.performance_ratio:
-        base_production *= solar_project.performance_ratio
+    performance_ratio = getattr(solar_project, 'performance_ratio', None)
+    if performance_ratio:
+        base_production *= performance_ratio
     
     # Apply degradation over time
-    if solar_project.degradation_rate and year > 0:
-        degradation_factor = (1 - solar_project.degradation_rate / 100) ** year
-        base_production *= degradation_factor
+    degradation_rate = getattr(solar_project, 'degradation_rate', None)
+    if degradation_rate:
+        degradation_factor = (1 - degradation_rate / 100) ** np.maximum(year, 0)
+        base_production = base_production * degradation_factor
     
-    return base_production
\ No newline at end of file
+    return base_production
@@ -0,0 +1,289 @@
+"""
+Portfolio valuation for the Energy Finance application.
+Projects are revalued in batches through the vectorized scenario evaluator
+and their FinancialMetric rows written with bulk statements. Each row keeps
+a fingerprint of its inputs, so only projects whose inputs changed are
+recomputed.
+"""
+
+import numpy as np
+from sqlalchemy import func, insert, update
+from sqlalchemy.orm import with_polymorphic
+
+import montecarlo
+from app import db
+from cashflows import CASH_FLOW_STORAGE, store_cash_flows
+from models import PROJECT_SUBCLASSES, FinancialMetric, HybridProject, Project
+from storage import project_dispatch
+from utils import (FINGERPRINT_FIELDS, PROJECT_INPUT_FIELDS, SCENARIO_DEFAULTS, SCENARIO_METRICS,
+                   evaluate_scenarios, input_fingerprint, json_float, project_cash_flow_inputs)
+
+
+# Projects evaluated per batch
+VALUATION_BATCH_SIZE = 1000
+
+
+def load_projects(project_ids):
+    """
+    Load projects with their subclass columns in one query, avoiding a lazy
+    load per row for joined-table subclasses.
+    """
+    projects = with_polymorphic(Project, list(PROJECT_SUBCLASSES))
+    return db.session.query(projects).filter(projects.id.in_(project_ids)).all()
+
+
+def project_fingerprints(project_ids, assumptions=None):
+    """
+    Fingerprint projects from their input columns alone, without loading
+    full ORM objects or running the production model.
+
+    Returns: dict mapping project id to input_fingerprint
+    """
+    projects = with_polymorphic(Project, list(PROJECT_SUBCLASSES))
+    columns = []
+    for field in FINGERPRINT_FIELDS:
+        if hasattr(Project, field):
+            columns.append(getattr(projects, field).label(field))
+            continue
+        # Fields shared by several subclasses (latitude, degradation_rate) come from whichever row exists
+        sources = [getattr(getattr(projects, subclass.__name__), field) for subclass in PROJECT_SUBCLASSES
+                   if field in subclass.__table__.c]
+        columns.append((func.coalesce(*sources) if len(sources) > 1 else sources[0]).label(field))
+    rows = db.session.query(projects.id, *columns).filter(projects.id.in_(project_ids))
+    return {row.id: input_fingerprint(row, assumptions) for row in rows}
+
+
+def stored_metrics(fingerprints):
+    """
+    Look up stored FinancialMetric rows by input fingerprint.
+
+    Returns: dict mapping fingerprint to the stored metric and assumption values
+    """
+    fingerprints = set(fingerprints)
+    # Inline-only requests have nothing to look up
+    if not fingerprints:
+        return {}
+    names = SCENARIO_METRICS + tuple(SCENARIO_DEFAULTS)
+    columns = [getattr(FinancialMetric, name) for name in names]
+    rows = (db.session.query(FinancialMetric.input_hash, *columns)
+            .filter(FinancialMetric.input_hash.in_(fingerprints)))
+    return {row.input_hash: dict(zip(names, row[1:])) for row in rows}
+
+
+def _metric_rows(project_ids, results, fingerprints):
+    """Convert columnar evaluation results to FinancialMetric column dicts."""
+    rows = []
+    for index, project_id in enumerate(project_ids):
+        row = {'project_id': project_id, 'input_hash': fingerprints[project_id]}
+        for name in SCENARIO_METRICS + tuple(SCENARIO_DEFAULTS):
+            row[name] = json_float(results[name][index])
+        row['ppa_term'] = int(row['ppa_term']) if row['ppa_term'] is not None else None
+        rows.append(row)
+    return rows
+
+
+def save_metrics(rows):
+    """
+    Upsert FinancialMetric rows with one bulk UPDATE and one bulk INSERT.
+    """
+    project_ids = [row['project_id'] for row in rows]
+    existing = dict(db.session.query(FinancialMetric.project_id, FinancialMetric.id)
+                    .filter(FinancialMetric.project_id.in_(project_ids)))
+    updates = [{**row, 'id': existing[row['project_id']]} for row in rows if row['project_id'] in existing]
+    inserts = [row for row in rows if row['project_id'] not in existing]
+    if updates:
+        db.session.execute(update(FinancialMetric), updates)
+    if inserts:
+        db.session.execute(insert(FinancialMetric), inserts)
+
+
+def revalue_projects(project_ids=None, assumptions=None, force=False, cash_flows=None,
+                     batch_size=VALUATION_BATCH_SIZE, progress=None):
+    """
+    Recompute and store financial metrics for many projects.
+
+    Projects whose stored metrics were derived from the same inputs are
+    skipped unless force is set.
+
+    Parameters:
+    - project_ids: Projects to revalue (default: all projects)
+    - assumptions: Overrides of the SCENARIO_DEFAULTS assumptions
+    - force: Recompute every project even if its inputs are unchanged
+    - cash_flows: Also store the schedules of recomputed projects, as CashFlow
+      'rows' or 'packed' CashFlowSchedule blobs (default: metrics only)
+    - batch_size: Projects fingerprinted, evaluated and committed per batch
+    - progress: Optional callback called with (done, total)
+
+    Returns: dict with the number of projects considered, recomputed and unchanged
+    """
+    assumptions = assumptions or {}
+    if cash_flows is not None and cash_flows not in CASH_FLOW_STORAGE:
+        raise ValueError(f"Unknown cash-flow storage: {cash_flows}")
+    query = db.session.query(Project.id).order_by(Project.id)
+    if project_ids is not None:
+        query = query.filter(Project.id.in_(project_ids))
+    ids = [project_id for project_id, in query]
+    recomputed = 0
+
+    for start in range(0, len(ids), batch_size):
+        batch_ids = ids[start:start + batch_size]
+        fingerprints = project_fingerprints(batch_ids, assumptions)
+        if not force:
+            stored = dict(db.session.query(FinancialMetric.project_id, FinancialMetric.input_hash)
+                          .filter(FinancialMetric.project_id.in_(batch_ids)))
+            batch_ids = [project_id for project_id in batch_ids
+                         if stored.get(project_id) != fingerprints[project_id]]
+
+        if batch_ids:
+            projects = load_projects(batch_ids)
+            inputs = {project.id: project_cash_flow_inputs(project) for project in projects}
+            changed_ids = list(inputs)
+            results = evaluate_scenarios(
+                [{**assumptions, 'project_id': project_id} for project_id in changed_ids], inputs,
+                include_schedule=cash_flows is not None)
+            save_metrics(_metric_rows(changed_ids, results, fingerprints))
+            if cash_flows is not None:
+                store_cash_flows(changed_ids, results['schedule'], cash_flows)
+            db.session.commit()
+            recomputed += len(changed_ids)
+        if progress:
+            progress(min(start + batch_size, len(ids)), len(ids))
+
+    return {'projects': len(ids), 'recomputed': recomputed, 'unchanged': len(ids) - recomputed}
+
+
+def project_metrics(project, assumptions=None):
+    """
+    Return current financial metrics for one project, recomputing and storing
+    them only if the project or assumptions changed since they were saved.
+
+    Returns: The project's FinancialMetric row
+    """
+    fingerprint = input_fingerprint(project, assumptions)
+    metric = project.financial_metrics
+    if metric is None or metric.input_hash != fingerprint:
+        results = evaluate_scenarios([{**(assumptions or {}), 'project_id': project.id}],
+                                     {project.id: project_cash_flow_inputs(project)})
+        save_metrics(_metric_rows([project.id], results, {project.id: fingerprint}))
+        db.session.commit()
+        db.session.expire(project, ['financial_metrics'])
+        metric = project.financial_metrics
+    return metric
+
+
+def project_metrics_by_id(project_id, assumptions=None, progress=None):
+    """
+    Bring a stored project's financial metrics up to date, as a background job.
+
+    Parameters:
+    - project_id: Id of the project
+    - assumptions: Overrides of the SCENARIO_DEFAULTS assumptions
+    - progress: Unused; accepted for the jobs interface
+
+    Returns: dict of the project's SCENARIO_METRICS values
+
+    Raises: ValueError if the project does not exist
+    """
+    projects = load_projects([project_id])
+    if not projects:
+        raise ValueError(f"Project {project_id} not found")
+    metric = project_metrics(projects[0], assumptions)
+    return {name: getattr(metric, name) for name in SCENARIO_METRICS}
+
+
+def evaluate_project_scenarios(scenarios, projects):
+    """
+    Evaluate scenarios like utils.evaluate_scenarios, returning stored
+    metrics for scenarios whose project and assumptions match a saved
+    FinancialMetric fingerprint and evaluating only the rest. Scenarios that
+    override any PROJECT_INPUT_FIELDS inline are always evaluated.
+
+    Parameters:
+    - scenarios: List of scenario dicts; project-linked ones carry a 'project_id'
+    - projects: The Project instances referenced by the scenarios
+
+    Returns: dict of NumPy arrays keyed by SCENARIO_METRICS and SCENARIO_DEFAULTS names
+    """
+    projects = {project.id: project for project in projects}
+    fingerprints = [input_fingerprint(projects[scenario['project_id']], scenario)
+                    if scenario.get('project_id') in projects
+                    and not any(field in scenario for field in PROJECT_INPUT_FIELDS) else None
+                    for scenario in scenarios]
+    stored = stored_metrics(fingerprint for fingerprint in fingerprints if fingerprint)
+
+    names = SCENARIO_METRICS + tuple(SCENARIO_DEFAULTS)
+    results = {name: np.full(len(scenarios), np.nan) for name in names}
+    pending = [index for index, fingerprint in enumerate(fingerprints) if fingerprint not in stored]
+    if pending:
+        pending_ids = {scenarios[index].get('project_id') for index in pending} & set(projects)
+        inputs = {project_id: project_cash_flow_inputs(projects[project_id]) for project_id in pending_ids}
+        computed = evaluate_scenarios([scenarios[index] for index in pending], inputs)
+        for name in names:
+            results[name][pending] = computed[name]
+
+    for index, fingerprint in enumerate(fingerprints):
+        if fingerprint in stored:
+            for name, value in stored[fingerprint].items():
+                results[name][index] = np.nan if value is None else value
+    return results
+
+
+def simulate_project_by_id(project_id, assumptions=None, progress=None, **options):
+    """
+    Run a Monte Carlo simulation for a stored project.
+
+    Parameters:
+    - project_id: Id of the project
+    - assumptions: Overrides of the SCENARIO_DEFAULTS assumptions
+    - progress: Optional callback called with (done, total) chunks
+    - options: Forwarded to montecarlo.run_monte_carlo (n_paths, seed, distributions, ...)
+
+    Returns: Result of montecarlo.run_monte_carlo
+
+    Raises: ValueError if the project does not exist
+    """
+    projects = load_projects([project_id])
+    if not projects:
+        raise ValueError(f"Project {project_id} not found")
+    return montecarlo.simulate_project(projects[0], assumptions, progress=progress, **options)
+
+
+def value_storage_variants_by_id(project_id, prices, variants, assumptions=None, progress=None):
+    """
+    Optimize dispatch of storage sizing variants of a hybrid project and value
+    each variant with its arbitrage revenue, as a background job.
+
+    Parameters:
+    - project_id: Id of the hybrid project
+    - prices: Hourly market prices ($/MWh), 8760 values
+    - variants: List of dicts with storage_power_mw, storage_energy_mwh and
+      an optional total 'capex'
+    - assumptions: Overrides of the SCENARIO_DEFAULTS assumptions
+    - progress: Optional callback called with (variants solved, total variants)
+
+    Returns: dict with a 'variants' list holding each size, its dispatch
+    totals and its SCENARIO_METRICS
+
+    Raises: ValueError if the project does not exist or is not a hybrid project
+    """
+    projects = load_projects([project_id])
+    if not projects or not isinstance(projects[0], HybridProject):
+        raise ValueError(f"Hybrid project {project_id} not found")
+    project = projects[0]
+    power_mw = [variant['storage_power_mw'] for variant in variants]
+    energy_mwh = [variant['storage_energy_mwh'] for variant in variants]
+    result = project_dispatch(project, prices, power_mw, energy_mwh, progress=progress)
+
+    # Value every sizing variant in one vectorized pass
+    inputs = project_cash_flow_inputs(project)
+    scenarios = [{**(assumptions or {}), **inputs, 'merchant_revenue': float(revenue),
+                  **({'capex': variant['capex']} if variant.get('capex') is not None else {})}
+                 for variant, revenue in zip(variants, result['revenue'])]
+    metrics = evaluate_scenarios(scenarios)
+    return {'variants': [{
+        'storage_power_mw': power_mw[index],
+        'storage_energy_mwh': energy_mwh[index],
+        **{name: json_float(result[name][index]) for name in
+           ('revenue', 'energy_charged', 'energy_discharged', 'cycles')},
+        **{name: json_float(metrics[name][index]) for name in SCENARIO_METRICS},
+    } for index in range(len(variants))]}
@@ -0,0 +1,264 @@
+"""
+Wind production model for the Energy Finance application.
+Wind speeds are extrapolated to hub height with a power-law shear profile
+and mapped through the turbine power curve with NumPy interpolation, either
+hour by hour for a measured time series or integrated over a Weibull
+distribution of the long-term mean wind speed. Wake, availability and
+electrical losses are applied to the gross output of the turbine array.
+"""
+
+import json
+import math
+from functools import lru_cache
+
+import numpy as np
+
+
+HOURS_PER_YEAR = 8760
+
+# Generic 3 MW-class power curve: (wind speed m/s, fraction of rated power).
+# Output is zero below the first and above the last point (cut-in, cut-out).
+DEFAULT_POWER_CURVE = (
+    (3.0, 0.0), (4.0, 0.04), (5.0, 0.10), (6.0, 0.19), (7.0, 0.31), (8.0, 0.46),
+    (9.0, 0.63), (10.0, 0.79), (11.0, 0.91), (12.0, 0.98), (13.0, 1.0), (25.0, 1.0),
+)
+
+DEFAULT_WEIBULL_K = 2.0
+DEFAULT_SHEAR_EXPONENT = 0.143  # 1/7 power law
+DEFAULT_WAKE_LOSS = 8.0  # %
+DEFAULT_AVAILABILITY = 97.0  # %
+DEFAULT_ELECTRICAL_LOSS = 2.0  # %
+
+# Gross capacity factor used when the site wind speed is unknown
+DEFAULT_GROSS_CAPACITY_FACTOR = 0.4
+
+# Relative mismatch tolerated between the turbine array rating and the project capacity
+CAPACITY_TOLERANCE = 0.05
+
+# Largest share of the wind's kinetic power a rotor can extract (Betz limit)
+BETZ_LIMIT = 16 / 27
+AIR_DENSITY = 1.225  # kg/m3, sea level at 15 C
+
+# Wind-speed bins (m/s) the Weibull distribution is integrated over
+SPEED_BIN_EDGES = np.arange(0.0, 40.25, 0.25)
+_SPEED_BIN_CENTRES = (SPEED_BIN_EDGES[:-1] + SPEED_BIN_EDGES[1:]) / 2
+
+
+@lru_cache(maxsize=256)
+def _parse_power_curve(power_curve):
+    points = DEFAULT_POWER_CURVE if power_curve is None else json.loads(power_curve)
+    points = np.array(sorted((float(speed), float(power)) for speed, power in points))
+    if points.ndim != 2 or len(points) < 2:
+        raise ValueError("A power curve needs at least two [wind speed, power] points")
+    speeds, power = points[:, 0], points[:, 1]
+    rated = power.max()
+    if rated <= 0:
+        raise ValueError("A power curve needs a positive rated power")
+    speeds.flags.writeable = False
+    fraction = power / rated
+    fraction.flags.writeable = False
+    return speeds, fraction
+
+
+def power_curve_arrays(power_curve=None):
+    """
+    Wind speeds and normalized output of a power curve.
+
+    Parameters:
+    - power_curve: JSON text or a list of [wind speed m/s, power] points in any
+      power unit; None for DEFAULT_POWER_CURVE
+
+    Returns: (speeds, fraction of rated power) arrays sorted by speed (read-only)
+
+    Raises: ValueError if the curve has fewer than two points or no output
+    """
+    if power_curve is not None and not isinstance(power_curve, str):
+        power_curve = json.dumps([[float(speed), float(power)] for speed, power in power_curve])
+    return _parse_power_curve(power_curve or None)
+
+
+def power_output(wind_speeds, speeds, fraction):
+    """
+    Fraction of rated power at each wind speed, zero outside the curve.
+    """
+    return np.interp(wind_speeds, speeds, fraction, left=0.0, right=0.0)
+
+
+def rated_wind_speed(power_curve=None):
+    """
+    Lowest wind speed (m/s) at which a power curve reaches its rated output.
+    """
+    speeds, fraction = power_curve_arrays(power_curve)
+    return float(speeds[np.argmax(fraction >= 1.0)])
+
+
+def installed_capacity_mw(wind_project):
+    """
+    Rated capacity (MW) of a wind project: the turbine count times the
+    per-turbine rating when both are known, otherwise capacity_mw.
+    """
+    num_turbines = getattr(wind_project, 'num_turbines', None)
+    turbine_capacity_mw = getattr(wind_project, 'turbine_capacity_mw', None)
+    if num_turbines and turbine_capacity_mw:
+        return num_turbines * turbine_capacity_mw
+    return wind_project.capacity_mw or 0.0
+
+
+def check_turbines(wind_project):
+    """
+    Check a wind project's turbine fields against each other.
+
+    Parameters:
+    - wind_project: A WindProject instance, or any row exposing its columns
+
+    Raises: ValueError if num_turbines x turbine_capacity_mw differs from
+    capacity_mw by more than CAPACITY_TOLERANCE, or if the turbine rating exceeds
+    the Betz limit for rotor_diameter_m at the power curve's rated wind speed
+    """
+    num_turbines = getattr(wind_project, 'num_turbines', None)
+    turbine_capacity_mw = getattr(wind_project, 'turbine_capacity_mw', None)
+    capacity_mw = wind_project.capacity_mw
+    if num_turbines is not None and num_turbines < 1:
+        raise ValueError("num_turbines must be at least 1")
+    if num_turbines and turbine_capacity_mw and capacity_mw:
+        array_mw = num_turbines * turbine_capacity_mw
+        if abs(array_mw - capacity_mw) > CAPACITY_TOLERANCE * capacity_mw:
+            raise ValueError(f"{num_turbines} turbines of {turbine_capacity_mw:g} MW give {array_mw:g} MW, "
+                             f"not the project capacity of {capacity_mw:g} MW")
+
+    rotor_diameter_m = getattr(wind_project, 'rotor_diameter_m', None)
+    if rotor_diameter_m and turbine_capacity_mw:
+        swept_area = math.pi * (rotor_diameter_m / 2) ** 2
+        speed = rated_wind_speed(getattr(wind_project, 'power_curve', None))
+        limit_mw = BETZ_LIMIT * 0.5 * AIR_DENSITY * swept_area * speed ** 3 / 1e6
+        if turbine_capacity_mw > limit_mw:
+            raise ValueError(f"A {rotor_diameter_m:g} m rotor can deliver at most {limit_mw:.2f} MW "
+                             f"at the rated wind speed of {speed:g} m/s")
+
+
+def hub_height_speed(wind_speed, measurement_height=None, hub_height=None,
+                     shear_exponent=DEFAULT_SHEAR_EXPONENT):
+    """
+    Extrapolate wind speeds to hub height with the power law v2 = v1 (h2 / h1)^alpha.
+
+    Speeds are returned unchanged when either height is unknown.
+    """
+    if not measurement_height or not hub_height:
+        return np.asarray(wind_speed, dtype=float)
+    alpha = DEFAULT_SHEAR_EXPONENT if shear_exponent is None else shear_exponent
+    return np.asarray(wind_speed, dtype=float) * (hub_height / measurement_height) ** alpha
+
+
+def weibull_scale(mean_speed, k=DEFAULT_WEIBULL_K):
+    """
+    Weibull scale parameter giving mean_speed for shape k: c = mean / Gamma(1 + 1/k).
+    """
+    k = np.asarray(k, dtype=float)
+    gamma = np.vectorize(math.gamma, otypes=[float])(1 + 1 / k)
+    return np.asarray(mean_speed, dtype=float) / gamma
+
+
+def weibull_capacity_factor(mean_speed, k=DEFAULT_WEIBULL_K, power_curve=None):
+    """
+    Gross capacity factor for Weibull-distributed wind speeds.
+
+    The distribution is integrated over SPEED_BIN_EDGES: each bin's probability
+    is a difference of the Weibull CDF, weighted by the curve output at the bin
+    centre. mean_speed and k broadcast, so whole portfolios go in one call.
+
+    Parameters:
+    - mean_speed: Mean wind speed at hub height (m/s)
+    - k: Weibull shape parameter
+    - power_curve: As for power_curve_arrays
+
+    Returns: Gross capacity factor (fraction), shaped like the broadcast inputs
+    """
+    speeds, fraction = power_curve_arrays(power_curve)
+    mean_speed, k = np.broadcast_arrays(np.asarray(mean_speed, dtype=float), np.asarray(k, dtype=float))
+    scale = np.maximum(weibull_scale(mean_speed, k), 1e-9)[..., np.newaxis]
+    cdf = -np.expm1(-(SPEED_BIN_EDGES / scale) ** k[..., np.newaxis])
+    probability = np.diff(cdf, axis=-1)
+    return probability @ power_output(_SPEED_BIN_CENTRES, speeds, fraction)
+
+
+def series_capacity_factor(wind_speeds, power_curve=None):
+    """
+    Gross capacity factor of a hub-height wind-speed time series.
+
+    Parameters:
+    - wind_speeds: Wind speeds (m/s) with time on the last axis; NaN gaps are skipped
+    - power_curve: As for power_curve_arrays
+
+    Returns: Mean fraction of rated power over the last axis
+    """
+    speeds, fraction = power_curve_arrays(power_curve)
+    wind_speeds = np.asarray(wind_speeds, dtype=float)
+    output = power_output(wind_speeds, speeds, fraction)
+    return np.nanmean(np.where(np.isnan(wind_speeds), np.nan, output), axis=-1)
+
+
+def loss_factor(wake_loss=DEFAULT_WAKE_LOSS, availability=DEFAULT_AVAILABILITY,
+                electrical_loss=DEFAULT_ELECTRICAL_LOSS):
+    """
+    Share of gross output delivered after wake, availability and electrical
+    losses (all in %). Broadcasts over its inputs.
+    """
+    return ((1 - np.asarray(wake_loss, dtype=float) / 100) * np.asarray(availability, dtype=float) / 100
+            * (1 - np.asarray(electrical_loss, dtype=float) / 100))
+
+
+def _project_loss_factor(wind_project):
+    def value(name, default):
+        setting = getattr(wind_project, name, None)
+        return default if setting is None else setting
+
+    return float(loss_factor(value('wake_loss', DEFAULT_WAKE_LOSS),
+                             value('availability', DEFAULT_AVAILABILITY),
+                             value('electrical_loss', DEFAULT_ELECTRICAL_LOSS)))
+
+
+def gross_capacity_factor(wind_project, wind_speeds=None):
+    """
+    Gross capacity factor of a wind project.
+
+    Parameters:
+    - wind_project: A WindProject instance, or any row exposing its columns
+    - wind_speeds: Optional wind-speed time series at the project's measurement
+      height; otherwise the Weibull distribution of mean_wind_speed is used
+
+    Returns: Gross capacity factor (fraction); DEFAULT_GROSS_CAPACITY_FACTOR when
+    neither a time series nor a mean wind speed is available
+    """
+    measurement_height = getattr(wind_project, 'measurement_height_m', None)
+    hub_height = getattr(wind_project, 'hub_height_m', None)
+    shear_exponent = getattr(wind_project, 'shear_exponent', None)
+    power_curve = getattr(wind_project, 'power_curve', None)
+
+    if wind_speeds is not None:
+        hub_speeds = hub_height_speed(wind_speeds, measurement_height, hub_height, shear_exponent)
+        return float(series_capacity_factor(hub_speeds, power_curve))
+
+    mean_speed = getattr(wind_project, 'mean_wind_speed', None)
+    if not mean_speed:
+        return DEFAULT_GROSS_CAPACITY_FACTOR
+    hub_mean = hub_height_speed(mean_speed, measurement_height, hub_height, shear_exponent)
+    k = getattr(wind_project, 'weibull_k', None) or DEFAULT_WEIBULL_K
+    return float(weibull_capacity_factor(hub_mean, k, power_curve))
+
+
+def annual_energy_mwh(wind_project, wind_speeds=None):
+    """
+    First-year net energy (MWh) of a wind project's turbine array after wake,
+    availability and electrical losses.
+
+    Parameters:
+    - wind_project: A WindProject instance
+    - wind_speeds: Optional wind-speed time series, as for gross_capacity_factor
+
+    Returns: Net annual energy in MWh
+    """
+    if not wind_project.capacity_mw:
+        return 0.0
+    return (installed_capacity_mw(wind_project) * HOURS_PER_YEAR * gross_capacity_factor(wind_project, wind_speeds)
+            * _project_loss_factor(wind_project))
+